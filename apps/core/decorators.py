@@ -1,5 +1,10 @@
 import functools
 from datetime import timedelta
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.views import redirect_to_login
+from django.http import HttpResponseNotAllowed
+from django.shortcuts import resolve_url
 from django.utils import timezone
 from .models import Subscription
 
@@ -59,4 +64,45 @@ def check_subscription_credits(view_func):
             # Still call the original view function to avoid breaking the request
             return view_func(request, *args, **kwargs)
             
-    return wrapper
\ No newline at end of file
+    return wrapper
+
+
+# Django 4.2's login_required, csrf_exempt and require_http_methods wrap views
+# in sync functions, which turns an async view back into a sync one. These
+# keep the wrapped view a coroutine function.
+
+def async_login_required(login_url=None):
+    """
+    login_required for async views. request.user is loaded from the session
+    outside the event loop, so the view can use it without further queries.
+    """
+    def decorator(view_func):
+        @functools.wraps(view_func)
+        async def wrapper(request, *args, **kwargs):
+            is_authenticated = await sync_to_async(lambda: request.user.is_authenticated)()
+            if not is_authenticated:
+                return redirect_to_login(request.get_full_path(), resolve_url(login_url or settings.LOGIN_URL))
+            return await view_func(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def async_require_http_methods(methods):
+    """require_http_methods for async views"""
+    def decorator(view_func):
+        @functools.wraps(view_func)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                return HttpResponseNotAllowed(methods)
+            return await view_func(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def async_csrf_exempt(view_func):
+    """csrf_exempt for async views"""
+    @functools.wraps(view_func)
+    async def wrapper(*args, **kwargs):
+        return await view_func(*args, **kwargs)
+    wrapper.csrf_exempt = True
+    return wrapper
@@ -0,0 +1,41 @@
+import json
+
+from django.core.management.base import BaseCommand
+from apps.core.services.asset_expiry import apply_lifecycle_rules, get_expiry_runs, lifecycle_rules
+
+class Command(BaseCommand):
+    help = 'Show recent asset expiry runs, or print/apply the S3 lifecycle rules that back them up'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=10, help='Number of recent runs to show')
+        parser.add_argument('--lifecycle', action='store_true', help='Print the generated lifecycle configuration')
+        parser.add_argument('--apply-lifecycle', action='store_true', help='Install the lifecycle rules on the bucket')
+        parser.add_argument('--days', type=int, default=1, help='Expiry of the legacy asset library prefix')
+
+    def handle(self, *args, **options):
+        if options['lifecycle']:
+            self.stdout.write(json.dumps({'Rules': lifecycle_rules(options['days'])}, indent=2))
+            return
+
+        if options['apply_lifecycle']:
+            rules, written = apply_lifecycle_rules(options['days'], force=True)
+            self.stdout.write(self.style.SUCCESS(f'Installed {len(rules)} lifecycle rules'))
+            return
+
+        try:
+            runs = get_expiry_runs(options['runs'])
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'Could not read expiry metrics: {e}'))
+            return
+
+        if not runs:
+            self.stdout.write('No expiry runs recorded yet')
+            return
+
+        for run in runs:
+            self.stdout.write(
+                f"{run['started_at']}: {run['objects']} objects ({run['bytes'] / (1024 * 1024):.1f} MB), "
+                f"{run['user_assets']} assets, {run['video_outputs']} video outputs, "
+                f"{run.get('error_count', 0)} errors, {run['duration']:.1f}s"
+                + (' (run cap reached)' if run.get('budget_exhausted') else '')
+            )
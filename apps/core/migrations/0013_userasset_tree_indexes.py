@@ -0,0 +1,21 @@
+# Generated by Django 4.2.23 on 2026-10-19 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_alter_transitions_duration'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='userasset',
+            index=models.Index(fields=['user', 'parent_folder', 'is_folder'], name='user_asset_parent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userasset',
+            index=models.Index(fields=['key'], name='user_asset_key_prefix_idx', opclasses=['varchar_pattern_ops']),
+        ),
+    ]
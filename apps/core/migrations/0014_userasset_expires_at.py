@@ -0,0 +1,18 @@
+# Generated by Django 4.2.23 on 2026-10-19 13:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_userasset_tree_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userasset',
+            name='expires_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
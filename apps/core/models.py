@@ -1,5 +1,9 @@
+from datetime import timedelta
+
+from django.conf import settings
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 # Create your models here.
 class Font(models.Model):
@@ -111,6 +115,12 @@ class TempSubscription(models.Model):
     def __str__(self):
         return f"Temp subscription {self.temp_id}"
 
+def asset_expires_at():
+    """Expiry of an asset stored now (ASSET_RETENTION_DAYS from now, None when retention is off)"""
+    days = getattr(settings, 'ASSET_RETENTION_DAYS', 0)
+    return timezone.now() + timedelta(days=days) if days else None
+
+
 class UserAsset(models.Model):
     """Tracks user-uploaded assets stored in S3"""
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='assets')
@@ -120,12 +130,19 @@ class UserAsset(models.Model):
     content_type = models.CharField(max_length=100, blank=True)
     is_folder = models.BooleanField(default=False)
     parent_folder = models.CharField(max_length=512, blank=True, default='')
+    expires_at = models.DateTimeField(blank=True, null=True, db_index=True)  # Deleted with its S3 object once passed
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         unique_together = ('user', 'key')
         ordering = ['-updated_at']
+        indexes = [
+            # One folder level of the asset tree
+            models.Index(fields=['user', 'parent_folder', 'is_folder'], name='user_asset_parent_idx'),
+            # Subtree (key__startswith) lookups; the opclass only applies on PostgreSQL
+            models.Index(fields=['key'], name='user_asset_key_prefix_idx', opclasses=['varchar_pattern_ops']),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.filename} ({self.key})"
@@ -140,6 +157,10 @@ class UserAsset(models.Model):
         if not self.parent_folder and '/' in self.key:
             self.parent_folder = self.key.rsplit('/', 2)[0] if self.key.endswith('/') else self.key.rsplit('/', 1)[0]
             
+        # New assets expire after the retention period
+        if self._state.adding and self.expires_at is None:
+            self.expires_at = asset_expires_at()
+            
         # Remove any double slashes
         self.key = self.key.replace('//', '/')
         if self.parent_folder:
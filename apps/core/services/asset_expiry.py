@@ -0,0 +1,275 @@
+import json
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from botocore.exceptions import ClientError
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db.models import Q
+from django.utils import timezone
+
+from ..models import UserAsset
+from .storage_io import get_s3_client, s3_location
+
+logger = logging.getLogger(__name__)
+
+# delete_objects accepts at most 1000 keys per request
+DELETE_BATCH_SIZE = 1000
+METRICS_KEY = "asset_expiry:runs"
+METRICS_KEEP = 100
+
+# Rendered outputs of a Video that expire with OUTPUT_RETENTION_DAYS
+VIDEO_OUTPUT_FIELDS = ("output", "output_with_bg", "output_with_watermark", "output_with_bg_watermark")
+
+LIFECYCLE_RULE_PREFIX = "videocrafter-"
+
+
+def _redis():
+    from django_redis import get_redis_connection
+    return get_redis_connection("default")
+
+
+def delete_keys(keys: Iterable[str], bucket: Optional[str] = None) -> Dict[str, str]:
+    """
+    Delete bucket keys with delete_objects, DELETE_BATCH_SIZE keys per
+    request, the batches spread over a small thread pool.
+
+    Returns:
+        Dict: key -> error message for every key that could not be deleted
+    """
+    keys = list(dict.fromkeys(keys))
+    if not keys:
+        return {}
+    bucket = bucket or settings.AWS_STORAGE_BUCKET_NAME
+    batches = [keys[i:i + DELETE_BATCH_SIZE] for i in range(0, len(keys), DELETE_BATCH_SIZE)]
+
+    def delete_batch(batch):
+        try:
+            response = get_s3_client().delete_objects(
+                Bucket=bucket,
+                Delete={"Objects": [{"Key": key} for key in batch], "Quiet": True},
+            )
+        except Exception as e:
+            logger.error(f"delete_objects failed for {len(batch)} keys: {e}")
+            return {key: str(e) for key in batch}
+        return {error["Key"]: error.get("Message", error.get("Code", "")) for error in response.get("Errors", [])}
+
+    failed = {}
+    workers = max(1, min(getattr(settings, "ASSET_EXPIRY_WORKERS", 4), len(batches)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for errors in pool.map(delete_batch, batches):
+            failed.update(errors)
+    return failed
+
+
+def _delete_media(names: Iterable[str]) -> Dict[str, str]:
+    """delete_keys for names in default_storage; other storages delete one by one"""
+    names = list(names)
+    targets = {name: s3_location(name) for name in names}
+    s3_names = {name: target for name, target in targets.items() if target}
+    failed = {}
+    by_bucket = {}
+    for name, (bucket, key) in s3_names.items():
+        by_bucket.setdefault(bucket, {})[key] = name
+    for bucket, keys in by_bucket.items():
+        for key, error in delete_keys(keys, bucket).items():
+            failed[keys[key]] = error
+    for name in names:
+        if name in s3_names:
+            continue
+        try:
+            default_storage.delete(name)
+        except Exception as e:
+            failed[name] = str(e)
+    return failed
+
+
+def _expire_user_assets(now, budget: int, metrics: Dict):
+    """Delete UserAsset rows whose expires_at has passed, together with their objects"""
+    skipped = set()
+    while budget > 0:
+        batch = list(
+            UserAsset.objects.filter(expires_at__lte=now)
+            .exclude(id__in=skipped)
+            .order_by("expires_at")
+            .values_list("id", "key", "file_size")[:min(budget, DELETE_BATCH_SIZE * 4)]
+        )
+        if not batch:
+            break
+        failed = delete_keys(key for _, key, _ in batch)
+        deleted_ids = [asset_id for asset_id, key, _ in batch if key not in failed]
+        skipped.update(asset_id for asset_id, key, _ in batch if key in failed)
+        UserAsset.objects.filter(id__in=deleted_ids).delete()
+
+        metrics["user_assets"] += len(deleted_ids)
+        metrics["objects"] += len(deleted_ids)
+        metrics["bytes"] += sum(size for asset_id, key, size in batch if key not in failed)
+        metrics["errors"].extend(f"{key}: {error}" for key, error in failed.items())
+        budget -= len(batch)
+    return budget
+
+
+def _expire_video_outputs(cutoff, budget: int, metrics: Dict):
+    """Delete rendered outputs of videos not updated since ``cutoff`` and clear their fields"""
+    from apps.processors.models import Video
+
+    has_output = Q()
+    for field in VIDEO_OUTPUT_FIELDS:
+        has_output |= Q(**{f"{field}__gt": ""})
+    skipped = set()
+    while budget > 0:
+        videos = list(
+            Video.objects.filter(has_output, updated_at__lt=cutoff)
+            .exclude(id__in=skipped)
+            .order_by("updated_at")
+            .values_list("id", *VIDEO_OUTPUT_FIELDS)[:min(budget, DELETE_BATCH_SIZE)]
+        )
+        if not videos:
+            break
+        names = [name for row in videos for name in row[1:] if name]
+        failed = _delete_media(names)
+        cleared = [row[0] for row in videos if not any(name in failed for name in row[1:] if name)]
+        skipped.update(row[0] for row in videos if row[0] not in cleared)
+        # One UPDATE; it leaves updated_at alone, so the videos' history stays intact
+        Video.objects.filter(id__in=cleared).update(**{field: "" for field in VIDEO_OUTPUT_FIELDS})
+
+        metrics["video_outputs"] += len(names) - len(failed)
+        metrics["objects"] += len(names) - len(failed)
+        metrics["errors"].extend(f"{name}: {error}" for name, error in failed.items())
+        budget -= len(names)
+    return budget
+
+
+def expire_assets(now=None, max_objects: Optional[int] = None) -> Dict:
+    """
+    Delete expired storage objects, driven by indexed queries rather than
+    bucket listings, so a run costs what has expired, not what is stored.
+
+    Expired are UserAsset rows with ``expires_at`` in the past and, when
+    OUTPUT_RETENTION_DAYS is set, rendered outputs of videos not updated
+    for that many days. Objects without rows are left to the bucket
+    lifecycle rules (see lifecycle_rules).
+
+    Args:
+        now: Reference time (defaults to now)
+        max_objects: Cap on objects handled in one run (ASSET_EXPIRY_MAX_PER_RUN)
+
+    Returns:
+        Dict: Run metrics, also recorded for get_expiry_runs
+    """
+    now = now or timezone.now()
+    budget = max_objects or getattr(settings, "ASSET_EXPIRY_MAX_PER_RUN", 50000)
+    metrics = {
+        "started_at": now.isoformat(),
+        "user_assets": 0,
+        "video_outputs": 0,
+        "objects": 0,
+        "bytes": 0,
+        "error_count": 0,
+        "errors": [],
+    }
+    start = time.time()
+
+    budget = _expire_user_assets(now, budget, metrics)
+    retention_days = getattr(settings, "OUTPUT_RETENTION_DAYS", 0)
+    if retention_days and budget > 0:
+        budget = _expire_video_outputs(now - timedelta(days=retention_days), budget, metrics)
+
+    # Keep the recorded run small; error_count has the full number
+    metrics["error_count"] = len(metrics["errors"])
+    metrics["errors"] = metrics["errors"][:50]
+    metrics["duration"] = round(time.time() - start, 3)
+    metrics["budget_exhausted"] = budget <= 0
+    record_run(metrics)
+    print(
+        f"🧹 Asset expiry: {metrics['objects']} objects ({metrics['bytes'] / (1024 * 1024):.1f} MB) "
+        f"in {metrics['duration']:.1f}s, {metrics['error_count']} errors"
+    )
+    return metrics
+
+
+def record_run(metrics: Dict):
+    try:
+        pipe = _redis().pipeline()
+        pipe.lpush(METRICS_KEY, json.dumps(metrics, default=str))
+        pipe.ltrim(METRICS_KEY, 0, METRICS_KEEP - 1)
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"Could not record asset expiry metrics: {e}")
+
+
+def get_expiry_runs(limit: int = 20) -> List[Dict]:
+    """Metrics of the most recent expiry runs, newest first"""
+    return [json.loads(raw) for raw in _redis().lrange(METRICS_KEY, 0, limit - 1)]
+
+
+def lifecycle_rules(days: int = 1) -> List[Dict]:
+    """
+    Bucket lifecycle rules that catch objects no database row points at:
+    objects uploaded to a ``videocrafter/users/*/assetlibrary/`` library
+    (tagged at upload, expired after ``days``), ZIP archives left in
+    staging, and multipart uploads that were never completed.
+
+    Installed only by the asset_expiry management command.
+    """
+    from .s3_service import ASSET_LIBRARY_TAG_KEY, ASSET_LIBRARY_TAG_VALUE
+    from .zip_ingest import STAGING_PREFIX
+
+    return [
+        {
+            "ID": f"{LIFECYCLE_RULE_PREFIX}asset-library-expiry",
+            "Filter": {
+                "And": {
+                    "Prefix": "videocrafter/users/",
+                    "Tags": [{"Key": ASSET_LIBRARY_TAG_KEY, "Value": ASSET_LIBRARY_TAG_VALUE}],
+                }
+            },
+            "Status": "Enabled",
+            "Expiration": {"Days": max(1, int(days))},
+        },
+        {
+            "ID": f"{LIFECYCLE_RULE_PREFIX}zip-staging-expiry",
+            "Filter": {"Prefix": f"{STAGING_PREFIX}/"},
+            "Status": "Enabled",
+            "Expiration": {"Days": 1},
+        },
+        {
+            "ID": f"{LIFECYCLE_RULE_PREFIX}abort-incomplete-multipart",
+            "Filter": {"Prefix": ""},
+            "Status": "Enabled",
+            "AbortIncompleteMultipartUpload": {"DaysAfterInitiation": 1},
+        },
+    ]
+
+
+def apply_lifecycle_rules(days: int = 1, bucket: Optional[str] = None, force: bool = False) -> Tuple[List[Dict], bool]:
+    """
+    Install lifecycle_rules on the bucket, replacing earlier versions of
+    these rules and keeping any other rules the bucket has. Nothing is
+    written when the bucket already has exactly these rules, unless
+    ``force`` is set.
+
+    Returns:
+        tuple: (rules installed, whether the configuration was written)
+    """
+    bucket = bucket or settings.AWS_STORAGE_BUCKET_NAME
+    s3_client = get_s3_client()
+    try:
+        existing = s3_client.get_bucket_lifecycle_configuration(Bucket=bucket).get("Rules", [])
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "NoSuchLifecycleConfiguration":
+            raise
+        existing = []
+
+    kept = [rule for rule in existing if not rule.get("ID", "").startswith(LIFECYCLE_RULE_PREFIX)]
+    ours = sorted((rule for rule in existing if rule not in kept), key=lambda rule: rule["ID"])
+    rules = lifecycle_rules(days)
+    if not force and ours == sorted(rules, key=lambda rule: rule["ID"]):
+        return rules, False
+
+    s3_client.put_bucket_lifecycle_configuration(Bucket=bucket, LifecycleConfiguration={"Rules": kept + rules})
+    print(f"♻️ Installed {len(rules)} lifecycle rules on {bucket} ({len(kept)} other rules kept)")
+    return rules, True
@@ -0,0 +1,238 @@
+import os
+import time
+import uuid
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import CharField, F, Value, When, Case
+from django.db.models.functions import Concat, Substr
+
+from ..models import UserAsset
+from .storage_io import get_s3_client, get_transfer_config
+
+logger = logging.getLogger(__name__)
+
+# Jobs are kept long enough to be inspected and resumed after a failure
+MOVE_TTL = 7 * 24 * 3600
+
+
+class AssetMoveError(Exception):
+    """The move can't be started (bad destination, name clash, ...)"""
+
+
+def _job_key(job_id: str) -> str:
+    return f"asset_move:{job_id}"
+
+
+def _save_job(job: Dict) -> Dict:
+    cache.set(_job_key(job["job_id"]), job, timeout=MOVE_TTL)
+    return job
+
+
+def get_move_job(job_id: str, user=None) -> Optional[Dict]:
+    """State of a move job, or None if it's unknown (or not the user's)"""
+    job = cache.get(_job_key(job_id))
+    if job is None or (user is not None and job["user_id"] != user.id):
+        return None
+    return job
+
+
+def start_folder_move(user, folder: UserAsset, destination: str, new_name: Optional[str] = None) -> str:
+    """
+    Queue a background move of a folder and everything below it.
+
+    Args:
+        user: Owner of the folder
+        folder: Folder UserAsset to move
+        destination: New folder key (e.g. ``users/1/assets/Renamed/``)
+        new_name: New filename of the folder row; the last part of ``destination`` if None
+
+    Returns:
+        str: Job ID for get_move_job
+
+    Raises:
+        AssetMoveError: If the destination isn't usable
+    """
+    from .s3_service import get_user_root_folder
+
+    source = folder.key if folder.key.endswith("/") else folder.key + "/"
+    destination = destination.replace("//", "/")
+    if not destination.endswith("/"):
+        destination += "/"
+    if not destination.startswith(get_user_root_folder(user.id)) or "/../" in destination:
+        raise AssetMoveError("Invalid destination folder")
+    if destination == source:
+        raise AssetMoveError("The folder is already there")
+    if destination.startswith(source):
+        raise AssetMoveError("A folder can't be moved into itself")
+    if UserAsset.objects.filter(user=user, key=destination).exists():
+        raise AssetMoveError(f"A folder named {os.path.basename(destination.rstrip('/'))} already exists")
+
+    from ..tasks import move_asset_folder_task
+
+    job = _save_job({
+        "job_id": uuid.uuid4().hex,
+        "user_id": user.id,
+        "source": source,
+        "destination": destination,
+        "new_name": new_name or os.path.basename(destination.rstrip("/")),
+        "status": "queued",
+        "stage": None,
+        "total": 0,
+        "copied": 0,
+        "bytes_total": 0,
+        "bytes_copied": 0,
+        "attempts": 0,
+        "error": None,
+    })
+    move_asset_folder_task.delay(job["job_id"])
+    print(f"📁 Queued move of {source} to {destination} for user {user.id} ({job['job_id']})")
+    return job["job_id"]
+
+
+def resume_folder_move(job_id: str, user=None) -> Optional[Dict]:
+    """Queue a failed move again; it picks up where it stopped"""
+    from ..tasks import move_asset_folder_task
+
+    job = get_move_job(job_id, user)
+    if job is None or job["status"] != "failed":
+        return job
+    job["status"] = "queued"
+    _save_job(job)
+    move_asset_folder_task.delay(job_id)
+    return job
+
+
+def _list_prefix(s3_client, bucket: str, prefix: str) -> Dict[str, int]:
+    """Key -> size of every object under ``prefix``, from one paginated listing"""
+    objects = {}
+    paginator = s3_client.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for item in page.get("Contents", []):
+            objects[item["Key"]] = item["Size"]
+    return objects
+
+
+def _update_rows(user_id: int, source: str, destination: str, new_name: str) -> int:
+    """
+    Point the folder's rows at the destination with one UPDATE. Rows that
+    were already moved no longer match, so running it again is harmless.
+    """
+    cut = len(source) + 1
+    old_parent = source.rstrip("/")
+    new_parent = destination.rstrip("/")
+    with transaction.atomic():
+        # Assignments only read the old values, filename and parent_folder come
+        # first for databases that evaluate SET left to right
+        return UserAsset.objects.filter(user_id=user_id, key__startswith=source).update(
+            filename=Case(When(key=source, then=Value(new_name)), default=F("filename")),
+            parent_folder=Case(
+                When(key=source, then=Value(os.path.dirname(new_parent))),
+                When(parent_folder__in=[old_parent, source], then=Value(new_parent)),
+                When(
+                    parent_folder__startswith=source,
+                    then=Concat(Value(destination), Substr("parent_folder", cut), output_field=CharField()),
+                ),
+                default=F("parent_folder"),
+            ),
+            key=Concat(Value(destination), Substr("key", cut), output_field=CharField()),
+        )
+
+
+def run_folder_move(job_id: str) -> Optional[Dict]:
+    """
+    Worker side of a move job. Every step is idempotent, so a failed job is
+    resumed by running it again:
+
+    1. list the source and destination prefixes once each;
+    2. server-side copy whatever isn't at the destination yet, concurrently
+       (managed copies, multipart for large objects);
+    3. move the rows with a single bulk UPDATE;
+    4. delete the originals with batched delete_objects.
+    """
+    from .asset_expiry import delete_keys
+    from .asset_tree import invalidate_asset_tree
+
+    job = get_move_job(job_id)
+    if job is None:
+        logger.error(f"Asset move {job_id} not found")
+        return None
+
+    job.update(status="processing", attempts=job["attempts"] + 1, error=None)
+    _save_job(job)
+    source, destination = job["source"], job["destination"]
+    bucket = settings.AWS_STORAGE_BUCKET_NAME
+    s3_client = get_s3_client()
+    start = time.time()
+
+    try:
+        job["stage"] = "copy"
+        originals = _list_prefix(s3_client, bucket, source)
+        copied = _list_prefix(s3_client, bucket, destination)
+        pending = {
+            key: size for key, size in originals.items()
+            if copied.get(destination + key[len(source):]) != size
+        }
+        job.update(
+            total=len(originals),
+            copied=len(originals) - len(pending),
+            bytes_total=sum(originals.values()),
+            bytes_copied=sum(originals.values()) - sum(pending.values()),
+        )
+        _save_job(job)
+
+        def copy(key):
+            s3_client.copy(
+                {"Bucket": bucket, "Key": key},
+                bucket,
+                destination + key[len(source):],
+                Config=get_transfer_config(),
+            )
+
+        failed = []
+        last_report = time.time()
+        workers = max(1, getattr(settings, "ASSET_MOVE_WORKERS", 16))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(copy, key): key for key in pending}
+            for future in as_completed(futures):
+                key = futures[future]
+                try:
+                    future.result()
+                    job["copied"] += 1
+                    job["bytes_copied"] += pending[key]
+                except Exception as e:
+                    logger.error(f"Error copying {key}: {str(e)}")
+                    failed.append(key)
+                if time.time() - last_report >= 1:
+                    last_report = time.time()
+                    _save_job(job)
+        if failed:
+            raise RuntimeError(f"{len(failed)} objects could not be copied")
+
+        job["stage"] = "update"
+        _save_job(job)
+        moved_rows = _update_rows(job["user_id"], source, destination, job["new_name"])
+        # A queryset update sends no signals
+        invalidate_asset_tree(job["user_id"])
+
+        job["stage"] = "delete"
+        _save_job(job)
+        errors = delete_keys(originals, bucket)
+        if errors:
+            raise RuntimeError(f"{len(errors)} originals could not be deleted")
+
+        job.update(status="completed", stage=None)
+        _save_job(job)
+        print(
+            f"📁 Moved {source} to {destination}: {len(originals)} objects "
+            f"({job['bytes_total'] / (1024 * 1024):.1f} MB), {moved_rows} rows in {time.time() - start:.1f}s"
+        )
+        return job
+    except Exception as e:
+        logger.error(f"Asset move {job_id} failed at {job['stage']}: {str(e)}")
+        job.update(status="failed", error=str(e))
+        return _save_job(job)
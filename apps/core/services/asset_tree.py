@@ -0,0 +1,226 @@
+import time
+import hashlib
+import logging
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db.models import Count, Sum
+
+from ..models import UserAsset
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+# Entries are keyed by the tree version, so stale ones are never read and just age out
+CACHE_TTL = 3600
+
+
+class AssetTreeError(Exception):
+    """The requested folder isn't in the user's library"""
+
+
+def _version_key(user_id: int) -> str:
+    return f"asset_tree:version:{user_id}"
+
+
+def tree_version(user_id: int) -> int:
+    """
+    Version of a user's asset tree; it changes whenever one of their assets
+    is created, changed or deleted. Cached listings, counts and ETags are
+    keyed by it.
+    """
+    # Start from a timestamp, so a version lost from the cache is never reused
+    cache.add(_version_key(user_id), int(time.time() * 1000), timeout=None)
+    return cache.get(_version_key(user_id)) or 0
+
+
+def invalidate_asset_tree(user_id: int):
+    """Drop every cached listing and count of the user's tree"""
+    try:
+        cache.incr(_version_key(user_id))
+    except ValueError:
+        cache.set(_version_key(user_id), int(time.time() * 1000), timeout=None)
+
+
+def _root_folder(user_id: int) -> str:
+    from .s3_service import get_user_root_folder
+
+    return get_user_root_folder(user_id)
+
+
+def normalize_folder(user_id: int, folder: Optional[str] = None) -> str:
+    """
+    Folder key with a trailing slash; the user's root folder when empty.
+
+    Raises:
+        AssetTreeError: If the folder is outside the user's root
+    """
+    root = _root_folder(user_id)
+    folder = (folder or root).replace("//", "/")
+    if not folder.endswith("/"):
+        folder += "/"
+    if not folder.startswith(root) or "/../" in folder:
+        raise AssetTreeError("Folder not found")
+    return folder
+
+
+def folder_stats(user_id: int) -> Dict[str, Dict[str, int]]:
+    """
+    Counts and sizes of every folder in the user's tree, from a single
+    grouped query and cached until the tree changes.
+
+    Returns:
+        Dict: folder key (with trailing slash) -> files, folders and bytes
+        directly inside it, plus total_files and total_bytes of its subtree
+    """
+    key = f"asset_tree:stats:{user_id}:{tree_version(user_id)}"
+    stats = cache.get(key)
+    if stats is not None:
+        return stats
+
+    root = _root_folder(user_id)
+    stats = defaultdict(lambda: {"files": 0, "folders": 0, "bytes": 0, "total_files": 0, "total_bytes": 0})
+    rows = (
+        UserAsset.objects.filter(user_id=user_id)
+        .values("parent_folder", "is_folder")
+        .annotate(count=Count("id"), size=Sum("file_size"))
+    )
+    for row in rows:
+        parent = row["parent_folder"].rstrip("/") + "/"
+        if row["is_folder"]:
+            stats[parent]["folders"] += row["count"]
+            continue
+        stats[parent]["files"] += row["count"]
+        stats[parent]["bytes"] += row["size"] or 0
+        # Roll the files up into every ancestor up to the user's root
+        ancestor = parent
+        while ancestor.startswith(root):
+            stats[ancestor]["total_files"] += row["count"]
+            stats[ancestor]["total_bytes"] += row["size"] or 0
+            if ancestor == root:
+                break
+            ancestor = ancestor.rstrip("/").rsplit("/", 1)[0] + "/"
+
+    stats = dict(stats)
+    cache.set(key, stats, timeout=CACHE_TTL)
+    return stats
+
+
+def _serialize(asset: UserAsset, stats: Dict) -> Dict:
+    item = {
+        "id": asset.id,
+        "filename": asset.filename,
+        "key": asset.key,
+        "is_folder": asset.is_folder,
+        "file_size": asset.file_size,
+        "content_type": asset.content_type,
+        "updated_at": asset.updated_at.isoformat() if asset.updated_at else None,
+        "url": asset.s3_url,
+    }
+    if asset.is_folder:
+        item["stats"] = stats.get(asset.key, {"files": 0, "folders": 0, "bytes": 0, "total_files": 0, "total_bytes": 0})
+    return item
+
+
+def list_folder(user_id: int, folder: Optional[str] = None, page: int = 1, page_size: int = DEFAULT_PAGE_SIZE) -> Dict:
+    """
+    One page of one folder level: subfolders first, then files, by name.
+    Pages are served from the indexed (user, parent_folder) lookup and
+    cached until the tree changes.
+
+    Args:
+        user_id: Owner of the library
+        folder: Folder key; the user's root folder when None
+        page: 1-based page number
+        page_size: Items per page (capped at MAX_PAGE_SIZE)
+
+    Returns:
+        Dict: folder, parent, stats, items, page, num_pages, count and version
+
+    Raises:
+        AssetTreeError: If the folder is outside the user's root
+    """
+    folder = normalize_folder(user_id, folder)
+    page_size = max(1, min(int(page_size or DEFAULT_PAGE_SIZE), MAX_PAGE_SIZE))
+    version = tree_version(user_id)
+    digest = hashlib.sha256(folder.encode("utf-8")).hexdigest()[:16]
+    key = f"asset_tree:page:{user_id}:{version}:{digest}:{page}:{page_size}"
+    payload = cache.get(key)
+    if payload is not None:
+        return payload
+
+    stats = folder_stats(user_id)
+    # Older rows may store their parent with a trailing slash
+    queryset = UserAsset.objects.filter(
+        user_id=user_id, parent_folder__in=[folder.rstrip("/"), folder]
+    ).order_by("-is_folder", "filename", "id")
+    paginator = Paginator(queryset, page_size)
+    page_obj = paginator.get_page(page)
+
+    root = _root_folder(user_id)
+    payload = {
+        "folder": folder,
+        "parent": None if folder == root else folder.rstrip("/").rsplit("/", 1)[0] + "/",
+        "stats": stats.get(folder, {"files": 0, "folders": 0, "bytes": 0, "total_files": 0, "total_bytes": 0}),
+        "items": [_serialize(asset, stats) for asset in page_obj.object_list],
+        "page": page_obj.number,
+        "num_pages": paginator.num_pages,
+        "count": paginator.count,
+        "version": version,
+    }
+    cache.set(key, payload, timeout=CACHE_TTL)
+    return payload
+
+
+def folder_etag(user_id: int, folder: Optional[str], page, page_size) -> str:
+    """ETag of a list_folder page; it changes with the tree version"""
+    raw = f"{user_id}|{tree_version(user_id)}|{folder or ''}|{page}|{page_size}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+
+def build_asset_tree(user_id: int) -> Tuple[List[Dict], List[UserAsset]]:
+    """
+    Folders with their direct files, and files outside any folder, for the
+    asset library page. One query, grouped by parent in a single pass.
+
+    Returns:
+        tuple: (folder_structure sorted by folder name, root_assets sorted by name)
+    """
+    folders = []
+    children = defaultdict(list)
+    for asset in UserAsset.objects.filter(user_id=user_id):
+        if asset.is_folder:
+            folders.append(asset)
+        else:
+            children[asset.parent_folder.rstrip("/")].append(asset)
+
+    folder_structure = []
+    for folder in folders:
+        folder_structure.append({
+            "folder": folder,
+            "children": sorted(children.pop(folder.key.rstrip("/"), []), key=lambda x: x.filename.lower()),
+        })
+    folder_structure.sort(key=lambda x: x["folder"].filename.lower())
+
+    # Whatever is left has no folder row
+    root_assets = sorted((asset for assets in children.values() for asset in assets), key=lambda x: x.filename.lower())
+    return folder_structure, root_assets
+
+
+def folder_assets(user_id: int) -> List[Dict]:
+    """
+    Every folder by name with the assets directly inside it, from one query
+    (the scene editor's asset picker).
+    """
+    assets = UserAsset.objects.filter(user_id=user_id).order_by("filename")
+    by_parent = defaultdict(list)
+    folders = []
+    for asset in assets:
+        if asset.is_folder:
+            folders.append(asset)
+        # Older rows may store their parent with a trailing slash
+        by_parent[asset.parent_folder.rstrip("/")].append(asset)
+    return [{"name": folder.filename, "assets": by_parent.get(folder.key.rstrip("/"), [])} for folder in folders]
@@ -0,0 +1,323 @@
+import os
+import math
+import uuid
+import logging
+import mimetypes
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+
+from .storage_io import get_s3_client, s3_location
+
+logger = logging.getLogger(__name__)
+
+# S3 multipart limits
+MIN_PART_SIZE = 5 * 1024 * 1024
+MAX_PARTS = 10000
+
+PURPOSE_ASSET = "asset"
+PURPOSE_SUBCLIP = "subclip"
+PURPOSE_ZIP = "zip"
+
+
+class DirectUploadError(Exception):
+    """The upload request is invalid or the session can't be used"""
+
+
+def _session_key(upload_id: str) -> str:
+    return f"direct_upload:{upload_id}"
+
+
+def _session_ttl() -> int:
+    return getattr(settings, "DIRECT_UPLOAD_SESSION_TTL", 24 * 3600)
+
+
+def _save_session(session: Dict):
+    cache.set(_session_key(session["upload_id"]), session, timeout=_session_ttl())
+
+
+def plan_parts(size: int):
+    """
+    Part size and count for a file of ``size`` bytes: the configured
+    multipart chunk size, grown when needed to stay within S3's part limit.
+
+    Returns:
+        tuple: (part size in bytes, number of parts)
+    """
+    part_size = max(MIN_PART_SIZE, getattr(settings, "S3_MULTIPART_CHUNKSIZE", 16 * 1024 * 1024))
+    if size > part_size * MAX_PARTS:
+        # Round up to a whole MB so every part but the last has the same size
+        part_size = math.ceil(size / MAX_PARTS / (1024 * 1024)) * 1024 * 1024
+    return part_size, max(1, math.ceil(size / part_size))
+
+
+def _asset_target(user, filename: str, target_folder: str):
+    from .s3_service import get_user_root_folder
+
+    target_folder = (target_folder or "").replace("//", "/")
+    if not target_folder.endswith("/"):
+        target_folder += "/"
+    if not target_folder.startswith(get_user_root_folder(user.id)):
+        raise DirectUploadError("Invalid target folder")
+    return f"{target_folder}{filename}", {"parent_folder": target_folder.rstrip("/")}
+
+
+def _subclip_target(user, filename: str, clip_id, text: str):
+    from apps.processors.models import Clips, Subclip
+
+    if not text:
+        raise DirectUploadError("Highlighted text is required")
+    try:
+        clip = Clips.objects.get(id=clip_id, video__user=user)
+    except (Clips.DoesNotExist, ValueError, TypeError):
+        raise DirectUploadError("Clip not found")
+
+    name = Subclip._meta.get_field("video_file").generate_filename(
+        None, f"subclip_{uuid.uuid4()}{os.path.splitext(filename)[1]}"
+    )
+    target = s3_location(name)
+    if not target:
+        raise DirectUploadError("Direct uploads need S3 media storage")
+    return target[1], {"storage_name": name, "clip_id": clip.id, "text": text}
+
+
+def _zip_target(user, filename: str, parent_folder: str):
+    from .zip_ingest import staging_key
+
+    if not filename.lower().endswith(".zip"):
+        raise DirectUploadError("Only ZIP archives can be uploaded for extraction")
+    parent_folder = (parent_folder or "").strip("/")
+    if ".." in parent_folder.split("/"):
+        raise DirectUploadError("Invalid target folder")
+    # The archive goes to the staging prefix; the ingest job extracts it from there
+    job_id = uuid.uuid4().hex
+    return staging_key(user.id, job_id), {"job_id": job_id, "parent_folder": parent_folder}
+
+
+def start_upload(user, purpose: str, filename: str, size: int, content_type: Optional[str] = None, **target) -> Dict:
+    """
+    Open a multipart upload that the browser sends straight to S3.
+
+    Args:
+        user: Uploading user
+        purpose: PURPOSE_ASSET (``target_folder``), PURPOSE_SUBCLIP
+            (``clip_id`` and highlighted ``text``) or PURPOSE_ZIP
+            (``parent_folder`` to extract into, relative to the user's root)
+        filename: Original file name
+        size: File size in bytes
+        content_type: MIME type, guessed from the name if None
+
+    Returns:
+        Dict: Session with upload_id, key, part_size and part_count
+
+    Raises:
+        DirectUploadError: If the request is invalid
+    """
+    filename = os.path.basename((filename or "").replace("\\", "/")).strip()
+    if not filename:
+        raise DirectUploadError("File name is required")
+    try:
+        size = int(size)
+    except (TypeError, ValueError):
+        raise DirectUploadError("File size is required")
+    max_bytes = getattr(settings, "DIRECT_UPLOAD_MAX_BYTES", 10 * 1024 ** 3)
+    if size <= 0 or size > max_bytes:
+        raise DirectUploadError(f"File size must be between 1 byte and {max_bytes // (1024 ** 2)} MB")
+
+    if purpose == PURPOSE_ASSET:
+        key, extra = _asset_target(user, filename, target.get("target_folder"))
+        bucket = settings.AWS_STORAGE_BUCKET_NAME
+    elif purpose == PURPOSE_SUBCLIP:
+        key, extra = _subclip_target(user, filename, target.get("clip_id"), target.get("text"))
+        bucket = default_storage.bucket_name
+    elif purpose == PURPOSE_ZIP:
+        key, extra = _zip_target(user, filename, target.get("parent_folder"))
+        bucket = settings.AWS_STORAGE_BUCKET_NAME
+    else:
+        raise DirectUploadError(f"Unknown upload purpose: {purpose}")
+
+    if not content_type:
+        content_type, _ = mimetypes.guess_type(filename)
+    content_type = content_type or "application/octet-stream"
+
+    response = get_s3_client().create_multipart_upload(Bucket=bucket, Key=key, ContentType=content_type)
+    part_size, part_count = plan_parts(size)
+    session = {
+        "upload_id": response["UploadId"],
+        "user_id": user.id,
+        "purpose": purpose,
+        "bucket": bucket,
+        "key": key,
+        "filename": filename,
+        "content_type": content_type,
+        "size": size,
+        "part_size": part_size,
+        "part_count": part_count,
+        "result": None,
+        **extra,
+    }
+    _save_session(session)
+    print(f"📤 Direct upload started for user {user.id}: {key} ({size / (1024 * 1024):.1f} MB, {part_count} parts)")
+    return session
+
+
+def get_session(upload_id: str, user) -> Dict:
+    """
+    Raises:
+        DirectUploadError: If the session doesn't exist, expired or isn't the user's
+    """
+    session = cache.get(_session_key(upload_id or ""))
+    if not session or session["user_id"] != user.id:
+        raise DirectUploadError("Upload session not found")
+    return session
+
+
+def part_urls(session: Dict, part_numbers: Optional[List[int]] = None) -> Dict[int, str]:
+    """
+    Presigned PUT URLs for parts of the upload (all of them by default).
+    Browsers can ask for them in batches, so long uploads don't outlive
+    their URLs.
+    """
+    if part_numbers is None:
+        part_numbers = range(1, session["part_count"] + 1)
+    expires_in = getattr(settings, "DIRECT_UPLOAD_URL_TTL", 3600)
+    s3_client = get_s3_client()
+    urls = {}
+    for number in part_numbers:
+        number = int(number)
+        if not 1 <= number <= session["part_count"]:
+            raise DirectUploadError(f"Invalid part number: {number}")
+        urls[number] = s3_client.generate_presigned_url(
+            "upload_part",
+            Params={
+                "Bucket": session["bucket"],
+                "Key": session["key"],
+                "UploadId": session["upload_id"],
+                "PartNumber": number,
+            },
+            ExpiresIn=expires_in,
+        )
+    return urls
+
+
+def complete_upload(session: Dict, parts: List[Dict]) -> Dict:
+    """
+    Assemble the uploaded parts and run the completion callback of the
+    session's purpose. Completing twice returns the first result, so a
+    browser may safely retry.
+
+    Args:
+        session: Session from get_session
+        parts: [{"PartNumber": int, "ETag": str}, ...] as reported by S3
+
+    Returns:
+        Dict: Result of the completion callback
+    """
+    if session.get("result"):
+        return session["result"]
+
+    try:
+        parts = sorted(
+            ({"PartNumber": int(part["PartNumber"]), "ETag": str(part["ETag"])} for part in parts),
+            key=lambda part: part["PartNumber"],
+        )
+    except (KeyError, TypeError, ValueError):
+        raise DirectUploadError("Invalid parts list")
+    if len(parts) != session["part_count"]:
+        raise DirectUploadError(f"Expected {session['part_count']} parts, got {len(parts)}")
+
+    s3_client = get_s3_client()
+    s3_client.complete_multipart_upload(
+        Bucket=session["bucket"],
+        Key=session["key"],
+        UploadId=session["upload_id"],
+        MultipartUpload={"Parts": parts},
+    )
+    head = s3_client.head_object(Bucket=session["bucket"], Key=session["key"])
+    # Presigned part URLs don't bound Content-Length, so the declared size is checked here
+    size = head["ContentLength"]
+    max_bytes = getattr(settings, "DIRECT_UPLOAD_MAX_BYTES", 10 * 1024 ** 3)
+    if size > max_bytes or abs(size - session["size"]) > session["part_size"]:
+        s3_client.delete_object(Bucket=session["bucket"], Key=session["key"])
+        cache.delete(_session_key(session["upload_id"]))
+        logger.warning(
+            f"Rejected direct upload {session['key']}: {size} bytes uploaded, {session['size']} declared"
+        )
+        raise DirectUploadError("Uploaded file size doesn't match the declared size or exceeds the limit")
+    session["size"] = size
+
+    session["result"] = COMPLETION_CALLBACKS[session["purpose"]](session)
+    _save_session(session)
+    print(f"✅ Direct upload completed: {session['key']} ({session['size'] / (1024 * 1024):.1f} MB)")
+    return session["result"]
+
+
+def abort_upload(session: Dict):
+    """Discard the uploaded parts of an unfinished upload"""
+    if not session.get("result"):
+        try:
+            get_s3_client().abort_multipart_upload(
+                Bucket=session["bucket"], Key=session["key"], UploadId=session["upload_id"]
+            )
+        except Exception as e:
+            logger.warning(f"Could not abort multipart upload {session['upload_id']}: {e}")
+    cache.delete(_session_key(session["upload_id"]))
+
+
+def _complete_asset(session: Dict) -> Dict:
+    from ..models import UserAsset, asset_expires_at
+
+    asset, _ = UserAsset.objects.update_or_create(
+        user_id=session["user_id"],
+        key=session["key"],
+        defaults={
+            "filename": session["filename"],
+            "file_size": session["size"],
+            "content_type": session["content_type"],
+            "is_folder": False,
+            "parent_folder": session["parent_folder"],
+            # A re-upload starts a new retention period
+            "expires_at": asset_expires_at(),
+        },
+    )
+    return {"asset_id": asset.id, "key": asset.key}
+
+
+def _complete_subclip(session: Dict) -> Dict:
+    """Replace the highlight's subclip with one using the uploaded file, as save_slides_data does"""
+    from django.db import transaction
+    from apps.processors.models import Clips, Subclip
+    from apps.processors.services.timing_solver import IMAGE_EXTENSIONS
+
+    with transaction.atomic():
+        clip = Clips.objects.select_for_update().get(id=session["clip_id"])
+        Subclip.objects.filter(clip=clip, text=session["text"]).delete()
+        subclip = Subclip.objects.create(
+            clip=clip,
+            text=session["text"],
+            video_file=session["storage_name"],
+            is_image=session["storage_name"].lower().endswith(IMAGE_EXTENSIONS),
+        )
+        clip.is_changed = True
+        clip.save(update_fields=["is_changed"])
+    return {"subclip_id": subclip.id, "file_url": subclip.video_file.url}
+
+
+def _complete_zip(session: Dict) -> Dict:
+    """Queue the ingest of the uploaded archive; the browser polls its progress"""
+    from django.contrib.auth.models import User
+    from .zip_ingest import start_zip_ingest
+
+    user = User.objects.get(id=session["user_id"])
+    job_id = start_zip_ingest(user, session["key"], session["parent_folder"], job_id=session["job_id"])
+    return {"job_id": job_id}
+
+
+# Completion callback per upload purpose: creates the database rows for the uploaded object
+COMPLETION_CALLBACKS = {
+    PURPOSE_ASSET: _complete_asset,
+    PURPOSE_SUBCLIP: _complete_subclip,
+    PURPOSE_ZIP: _complete_zip,
+}
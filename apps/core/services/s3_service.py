@@ -1,16 +1,58 @@
 import os
-import io
+import re
+import shutil
+import tempfile
+import hashlib
 import logging
 import boto3
 from botocore.exceptions import ClientError
 from typing import Optional, Union, BinaryIO
 from pathlib import Path
 from django.conf import settings
+from django.core.cache import cache
+
+# The shared client lives in storage_io; re-exported for existing imports
+from .storage_io import CHUNK_SIZE, get_client_config, get_s3_client, get_transfer_config, upload_fileobj_to_key
 
 # from apps.core.api.serializers import UserAssetSerializer
 
 logger = logging.getLogger(__name__)
 
+# download_fileobj keeps objects up to this size in memory, larger ones spill to disk
+SPOOL_MAX_SIZE = 8 * 1024 * 1024
+
+# Asset library prefix of the StorageInterface helpers in core.utils
+ASSET_LIBRARY_PREFIX = "videocrafter/users/{user_id}/assetlibrary/"
+_ASSET_LIBRARY_RE = re.compile(r"^(videocrafter/users/[^/]+/assetlibrary/)")
+# Object tag that scopes the asset library lifecycle rule to assetlibrary/ objects
+# (a lifecycle prefix can't match the per-user path segment)
+ASSET_LIBRARY_TAG_KEY = "videocrafter-expiry"
+ASSET_LIBRARY_TAG_VALUE = "assetlibrary"
+
+
+def asset_library_tagging(object_key: str) -> Optional[str]:
+    """Tagging header for an upload to ``object_key``, or None outside the asset library"""
+    if _ASSET_LIBRARY_RE.match(object_key or ''):
+        return f"{ASSET_LIBRARY_TAG_KEY}={ASSET_LIBRARY_TAG_VALUE}"
+    return None
+
+
+def asset_listing_cache_key(prefix: str) -> str:
+    """Redis key of the cached flat S3 listing of an asset library prefix"""
+    return f"s3_listing:{hashlib.sha256(prefix.encode('utf-8')).hexdigest()[:32]}"
+
+
+def invalidate_asset_listing(object_key: str):
+    """Drop the cached listing of the asset library ``object_key`` belongs to, if any"""
+    match = _ASSET_LIBRARY_RE.match(object_key or '')
+    if not match:
+        return
+    try:
+        cache.delete(asset_listing_cache_key(match.group(1)))
+    except Exception as e:
+        logger.warning(f"Could not invalidate S3 listing cache for {object_key}: {e}")
+
+
 class S3Config:
     """Configuration for S3 access."""
     
@@ -49,8 +91,11 @@ class StorageInterface:
         """Download a file from storage."""
         raise NotImplementedError
         
-    def download_fileobj(self, object_key: str) -> Optional[BinaryIO]:
-        """Download and return a file-like object."""
+    def download_fileobj(self, object_key: str, file_obj: Optional[BinaryIO] = None) -> Optional[BinaryIO]:
+        """
+        Stream an object into ``file_obj`` (a spooled temp file, kept in
+        memory only while small, when None) and return it rewound.
+        """
         raise NotImplementedError
         
     def get_url(self, object_key: str) -> str:
@@ -75,23 +120,34 @@ class S3Storage(StorageInterface):
     
     def __init__(self, config: S3Config):
         self.config = config
-        self.s3_client = boto3.client(
-            's3',
-            aws_access_key_id=config.access_key,
-            aws_secret_access_key=config.secret_key,
-            region_name=config.region,
-            endpoint_url=config.endpoint_url
-        )
+        if (config.access_key == settings.AWS_ACCESS_KEY_ID
+                and config.secret_key == settings.AWS_SECRET_ACCESS_KEY
+                and not config.endpoint_url):
+            # The process-wide pooled client (storage_io)
+            self.s3_client = get_s3_client(config.region)
+        else:
+            self.s3_client = boto3.client(
+                's3',
+                aws_access_key_id=config.access_key,
+                aws_secret_access_key=config.secret_key,
+                region_name=config.region,
+                endpoint_url=config.endpoint_url,
+                config=get_client_config()
+            )
         self.bucket_name = config.bucket_name
         
     def upload(self, file_path: Union[str, Path], object_key: str) -> bool:
         try:
             file_path = Path(file_path)
+            tagging = asset_library_tagging(object_key)
             self.s3_client.upload_file(
                 str(file_path),
                 self.bucket_name,
-                object_key
+                object_key,
+                ExtraArgs={'Tagging': tagging} if tagging else None,
+                Config=get_transfer_config()
             )
+            invalidate_asset_listing(object_key)
             logger.info(f"Uploaded {file_path} to S3 as {object_key}")
             return True
         except ClientError as e:
@@ -100,11 +156,15 @@ class S3Storage(StorageInterface):
             
     def upload_fileobj(self, file_obj: BinaryIO, object_key: str) -> bool:
         try:
+            tagging = asset_library_tagging(object_key)
             self.s3_client.upload_fileobj(
                 file_obj,
                 self.bucket_name,
-                object_key
+                object_key,
+                ExtraArgs={'Tagging': tagging} if tagging else None,
+                Config=get_transfer_config()
             )
+            invalidate_asset_listing(object_key)
             logger.info(f"Uploaded file object to S3 as {object_key}")
             return True
         except ClientError as e:
@@ -118,7 +178,8 @@ class S3Storage(StorageInterface):
             self.s3_client.download_file(
                 self.bucket_name,
                 object_key,
-                str(file_path)
+                str(file_path),
+                Config=get_transfer_config()
             )
             logger.info(f"Downloaded {object_key} from S3 to {file_path}")
             return True
@@ -126,13 +187,16 @@ class S3Storage(StorageInterface):
             logger.error(f"S3 download error: {e}")
             return False
             
-    def download_fileobj(self, object_key: str) -> Optional[BinaryIO]:
+    def download_fileobj(self, object_key: str, file_obj: Optional[BinaryIO] = None) -> Optional[BinaryIO]:
         try:
-            file_obj = io.BytesIO()
+            if file_obj is None:
+                file_obj = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+            # Ranged parts are written straight into file_obj
             self.s3_client.download_fileobj(
                 self.bucket_name,
                 object_key,
-                file_obj
+                file_obj,
+                Config=get_transfer_config()
             )
             file_obj.seek(0)
             logger.info(f"Downloaded {object_key} from S3 to file object")
@@ -162,6 +226,7 @@ class S3Storage(StorageInterface):
                 Bucket=self.bucket_name,
                 Key=object_key
             )
+            invalidate_asset_listing(object_key)
             logger.info(f"Deleted {object_key} from S3")
             return True
         except ClientError as e:
@@ -210,7 +275,7 @@ class LocalStorage(StorageInterface):
             os.makedirs(destination.parent, exist_ok=True)
             
             with open(file_path, 'rb') as src, open(destination, 'wb') as dst:
-                dst.write(src.read())
+                shutil.copyfileobj(src, dst, length=CHUNK_SIZE)
                 
             logger.info(f"Copied {file_path} to local storage as {object_key}")
             return True
@@ -224,7 +289,7 @@ class LocalStorage(StorageInterface):
             os.makedirs(destination.parent, exist_ok=True)
             
             with open(destination, 'wb') as dst:
-                dst.write(file_obj.read())
+                shutil.copyfileobj(file_obj, dst, length=CHUNK_SIZE)
                 
             logger.info(f"Saved file object to local storage as {object_key}")
             return True
@@ -239,7 +304,7 @@ class LocalStorage(StorageInterface):
             os.makedirs(file_path.parent, exist_ok=True)
             
             with open(source, 'rb') as src, open(file_path, 'wb') as dst:
-                dst.write(src.read())
+                shutil.copyfileobj(src, dst, length=CHUNK_SIZE)
                 
             logger.info(f"Copied {object_key} from local storage to {file_path}")
             return True
@@ -247,13 +312,14 @@ class LocalStorage(StorageInterface):
             logger.error(f"Local download error: {e}")
             return False
             
-    def download_fileobj(self, object_key: str) -> Optional[BinaryIO]:
+    def download_fileobj(self, object_key: str, file_obj: Optional[BinaryIO] = None) -> Optional[BinaryIO]:
         try:
             source = self._get_full_path(object_key)
-            file_obj = io.BytesIO()
+            if file_obj is None:
+                file_obj = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
             
             with open(source, 'rb') as src:
-                file_obj.write(src.read())
+                shutil.copyfileobj(src, file_obj, length=CHUNK_SIZE)
                 
             file_obj.seek(0)
             logger.info(f"Read {object_key} from local storage to file object")
@@ -320,20 +386,10 @@ class StorageFactory:
             logger.info("S3 not configured, using local storage")
             return LocalStorage(local_path)
 
-import zipfile
 import mimetypes
 from typing import List, Dict, Any
 from ..models import UserAsset, User
 
-def get_s3_client():
-    """Get a configured S3 client"""
-    return boto3.client(
-        's3',
-        aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-        aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-        region_name=settings.AWS_REGION
-    )
-
 def get_user_root_folder(user_id: int) -> str:
     """Get the root S3 folder path for a user"""
     return f"users/{user_id}/assets/"
@@ -350,23 +406,12 @@ def upload_file_to_s3(file_obj, key: str, content_type: str = None) -> bool:
     Returns:
         True if successful, False otherwise
     """
-    s3_client = get_s3_client()
-    
     if not content_type:
         # Try to guess the content type
         content_type, _ = mimetypes.guess_type(key)
         
     try:
-        extra_args = {}
-        if content_type:
-            extra_args['ContentType'] = content_type
-        
-        s3_client.upload_fileobj(
-            file_obj,
-            settings.AWS_STORAGE_BUCKET_NAME,
-            key,
-            ExtraArgs=extra_args
-        )
+        upload_fileobj_to_key(file_obj, key, content_type)
         return True
     except ClientError:
         return False
@@ -477,11 +522,12 @@ def rename_in_s3(old_key: str, new_key: str) -> bool:
         if old_key.endswith('/') and new_key.endswith('/'):
             return True
             
-        # Copy the object to the new key
-        s3_client.copy_object(
-            Bucket=settings.AWS_STORAGE_BUCKET_NAME,
-            CopySource={'Bucket': settings.AWS_STORAGE_BUCKET_NAME, 'Key': old_key},
-            Key=new_key
+        # Copy the object to the new key (managed copy: multipart for large objects)
+        s3_client.copy(
+            {'Bucket': settings.AWS_STORAGE_BUCKET_NAME, 'Key': old_key},
+            settings.AWS_STORAGE_BUCKET_NAME,
+            new_key,
+            Config=get_transfer_config()
         )
         
         # Delete the old object
@@ -490,6 +536,8 @@ def rename_in_s3(old_key: str, new_key: str) -> bool:
             Key=old_key
         )
         
+        invalidate_asset_listing(old_key)
+        invalidate_asset_listing(new_key)
         logger.info(f"Successfully renamed {old_key} to {new_key}")
         return True
         
@@ -500,113 +548,103 @@ def rename_in_s3(old_key: str, new_key: str) -> bool:
         logger.error(f"Unexpected error renaming in S3: {str(e)}")
         return False
 
+class S3MultipartWriter:
+    """
+    File-like sink that streams writes into an S3 multipart upload.
+
+    Data is buffered until a part is full (S3 requires at least 5 MB for
+    every part but the last) and uploaded as it arrives, so a producer can
+    write a large object without holding it in memory or on disk first.
+    Call ``close`` to complete the upload or ``abort`` to discard it.
+    """
+
+    MIN_PART_SIZE = 5 * 1024 * 1024
+
+    def __init__(self, key: str, content_type: str = None, part_size: int = 8 * 1024 * 1024,
+                 bucket: str = None, s3_client=None):
+        self.key = key
+        self.bucket = bucket or settings.AWS_STORAGE_BUCKET_NAME
+        self.part_size = max(part_size, self.MIN_PART_SIZE)
+        self.s3_client = s3_client or get_s3_client()
+        extra_args = {'ContentType': content_type} if content_type else {}
+        response = self.s3_client.create_multipart_upload(Bucket=self.bucket, Key=key, **extra_args)
+        self.upload_id = response['UploadId']
+        self.parts = []
+        self.bytes_written = 0
+        self._buffer = bytearray()
+        self._closed = False
+
+    def write(self, data: bytes) -> int:
+        self._buffer.extend(data)
+        self.bytes_written += len(data)
+        while len(self._buffer) >= self.part_size:
+            self._upload_part(bytes(self._buffer[:self.part_size]))
+            del self._buffer[:self.part_size]
+        return len(data)
+
+    def _upload_part(self, body: bytes):
+        part_number = len(self.parts) + 1
+        response = self.s3_client.upload_part(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self.upload_id,
+            PartNumber=part_number,
+            Body=body,
+        )
+        self.parts.append({'ETag': response['ETag'], 'PartNumber': part_number})
+
+    def close(self):
+        """Upload whatever is buffered and complete the upload"""
+        if self._closed:
+            return
+        if self._buffer or not self.parts:
+            self._upload_part(bytes(self._buffer))
+            self._buffer.clear()
+        self.s3_client.complete_multipart_upload(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self.upload_id,
+            MultipartUpload={'Parts': self.parts},
+        )
+        self._closed = True
+        logger.info(f"Streamed {self.bytes_written} bytes to S3 as {self.key} in {len(self.parts)} parts")
+
+    def abort(self):
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self.s3_client.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id)
+        except ClientError as e:
+            logger.error(f"S3 abort multipart upload error for {self.key}: {e}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+
 def extract_and_upload_zip(user: User, zip_file, parent_folder: str = '') -> List[UserAsset]:
     """
-    Extract ZIP file and upload its contents to S3 maintaining folder structure
+    Extract ZIP file and upload its contents to S3 maintaining folder structure.
+    Members are streamed to S3 in parallel; see zip_ingest.ingest_zip.
     
     Args:
         user: User object
-        zip_file: ZIP file object
+        zip_file: ZIP file object or path
         parent_folder: Parent folder to extract the ZIP into
         
     Returns:
-        List of created UserAsset objects
+        List of UserAsset objects for the folders and uploaded files
     """
-    user_root = get_user_root_folder(user.id)
-    
-    # Combine user root with optional parent folder
-    if parent_folder:
-        user_folder = f"{user_root}{parent_folder.strip('/')}/"
-    else:
-        user_folder = user_root
-    
-    created_assets = []
-    folder_set = set()  # Track folders to avoid duplicates
-    
-    with zipfile.ZipFile(zip_file) as zip_ref:
-        # Process directories first to ensure the structure exists
-        for file_info in zip_ref.infolist():
-            if file_info.is_dir():
-                folder_path = file_info.filename
-                s3_key = f"{user_folder}{folder_path}"
-                
-                # Create folder asset in database
-                asset, created = UserAsset.objects.update_or_create(
-                    user=user,
-                    key=s3_key,
-                    defaults={
-                        'filename': os.path.basename(folder_path.rstrip('/')),
-                        'is_folder': True,
-                        'parent_folder': os.path.dirname(s3_key.rstrip('/'))
-                    }
-                )
-                
-                if created:
-                    created_assets.append(asset)
-                
-                # Add to tracking set
-                folder_set.add(s3_key)
-                
-                # Also add parent folders
-                parts = folder_path.split('/')
-                for i in range(1, len(parts)):
-                    parent_path = '/'.join(parts[:i]) + '/'
-                    parent_key = f"{user_folder}{parent_path}"
-                    
-                    if parent_key not in folder_set:
-                        folder_set.add(parent_key)
-                        parent_name = os.path.basename(parent_path.rstrip('/'))
-                        parent_parent = os.path.dirname(parent_key.rstrip('/'))
-                        
-                        asset, created = UserAsset.objects.update_or_create(
-                            user=user,
-                            key=parent_key,
-                            defaults={
-                                'filename': parent_name,
-                                'is_folder': True,
-                                'parent_folder': parent_parent
-                            }
-                        )
-                        
-                        if created:
-                            created_assets.append(asset)
-        
-        # Now process files
-        for file_info in zip_ref.infolist():
-            if not file_info.is_dir():
-                file_path = file_info.filename
-                file_name = os.path.basename(file_path)
-                file_size = file_info.file_size
-                
-                # Determine the S3 key
-                s3_key = f"{user_folder}{file_path}"
-                parent_folder_key = os.path.dirname(s3_key)
-                
-                # Read file content
-                with zip_ref.open(file_info) as file_obj:
-                    content = io.BytesIO(file_obj.read())
-                    
-                    # Guess content type
-                    content_type, _ = mimetypes.guess_type(file_path)
-                    
-                    # Upload to S3
-                    upload_result = upload_file_to_s3(content, s3_key, content_type)
-                    
-                    if upload_result:
-                        # Create asset record
-                        asset = UserAsset.objects.create(
-                            user=user,
-                            key=s3_key,
-                            filename=file_name,
-                            file_size=file_size,
-                            content_type=content_type or '',
-                            is_folder=False,
-                            parent_folder=parent_folder_key
-                        )
-                        
-                        created_assets.append(asset)
-    
-    return created_assets
+    from .zip_ingest import ingest_zip
+
+    return ingest_zip(user, zip_file, parent_folder)
 
 # def list_user_assets(user: User, folder: str = '') -> Dict[str, Any]:
 #     """
@@ -0,0 +1,353 @@
+import os
+import time
+import fcntl
+import shutil
+import hashlib
+import logging
+import tempfile
+import threading
+from typing import Optional
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+
+from .storage_io import download_key_to_path, download_to_path, download_to_tempfile, get_s3_client, s3_location
+
+logger = logging.getLogger(__name__)
+
+LOCK_SUFFIX = ".lock"
+PART_SUFFIX = ".part"
+# Downloads that died half way leave .part files behind; they are swept after this long
+STALE_PART_SECONDS = 3600
+# Eviction frees space down to this fraction of the budget so it doesn't run on every fill
+EVICT_TARGET_RATIO = 0.9
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+class CachedFile:
+    """
+    A local copy of a storage object, pinned while it is being read. The pin
+    is a shared flock on the entry's lock file: eviction skips the entry
+    until release() is called or the process exits.
+    """
+
+    def __init__(self, path: str, lock_file=None, temporary: bool = False):
+        self.path = path
+        self._lock_file = lock_file
+        self._temporary = temporary
+
+    def release(self):
+        if self._lock_file is not None:
+            # Closing the descriptor drops the flock
+            self._lock_file.close()
+            self._lock_file = None
+        if self._temporary and os.path.exists(self.path):
+            os.remove(self.path)
+            self._temporary = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+class StorageCache:
+    """
+    Size-bounded LRU disk cache of storage objects, shared by every process
+    on a worker.
+
+    Entries are keyed by storage key and ETag, so an object that is
+    replaced under the same name is fetched again. Each entry has a lock
+    file: readers hold it shared while they use the file, the one process
+    that downloads a missing entry holds it exclusively (everyone else
+    asking for the same object waits and then reads the finished copy),
+    and eviction only removes entries whose lock it can take exclusively.
+    Downloads go to a .part file that is renamed into place, so a reader
+    never sees a partial file.
+    """
+
+    def __init__(self, root: Optional[str] = None, max_bytes: Optional[int] = None):
+        self.root = root or getattr(settings, "STORAGE_CACHE_DIR", "") or os.path.join(
+            tempfile.gettempdir(), "videocrafter_storage_cache"
+        )
+        if max_bytes is None:
+            max_bytes = getattr(settings, "STORAGE_CACHE_MAX_BYTES", 20 * 1024 ** 3)
+        self.max_bytes = max_bytes
+        self.enabled = getattr(settings, "STORAGE_CACHE_ENABLED", True)
+        self.hits = 0
+        self.misses = 0
+        if self.enabled:
+            os.makedirs(self.root, exist_ok=True)
+
+    def _source(self, name, storage=None, absolute_key=False):
+        """
+        Identity, version and fetch function of a storage object.
+
+        Returns:
+            tuple: (identity str, version str, callable downloading to a path)
+        """
+        if absolute_key:
+            target = (settings.AWS_STORAGE_BUCKET_NAME, name)
+        else:
+            storage = storage or default_storage
+            target = s3_location(name, storage)
+
+        if target:
+            bucket, key = target
+            head = get_s3_client().head_object(Bucket=bucket, Key=key)
+            version = f"{head['ETag'].strip(chr(34))}-{head['ContentLength']}"
+            return f"s3://{bucket}/{key}", version, lambda path: download_key_to_path(key, path, bucket)
+
+        version = f"{storage.get_modified_time(name).timestamp()}-{storage.size(name)}"
+        return f"{type(storage).__name__}:{name}", version, lambda path: download_to_path(name, path, storage)
+
+    def _entry_paths(self, name, identity, version):
+        digest = hashlib.sha256(f"{identity}|{version}".encode("utf-8")).hexdigest()[:40]
+        # Keep the extension: ffmpeg and FreeType pick demuxers/loaders from it
+        extension = os.path.splitext(name)[1][:10]
+        return os.path.join(self.root, digest + extension), os.path.join(self.root, digest + LOCK_SUFFIX)
+
+    @staticmethod
+    def _is_current(lock_file, lock_path):
+        """Whether lock_file is still the entry's lock (eviction may have unlinked it meanwhile)"""
+        try:
+            return os.fstat(lock_file.fileno()).st_ino == os.stat(lock_path).st_ino
+        except FileNotFoundError:
+            return False
+
+    def _lock(self, lock_path, mode):
+        while True:
+            lock_file = open(lock_path, "a")
+            fcntl.flock(lock_file, mode)
+            if self._is_current(lock_file, lock_path):
+                return lock_file
+            lock_file.close()
+
+    def open(self, name: str, storage=None, absolute_key: bool = False) -> CachedFile:
+        """
+        Local copy of ``name``, downloaded on a miss and pinned until the
+        returned CachedFile is released.
+
+        Args:
+            name: Storage name (e.g. ``video.audio_file.name``)
+            storage: Storage holding ``name``; default_storage when None
+            absolute_key: ``name`` is a bucket key outside the media location
+
+        Returns:
+            CachedFile: Read-only local file; never modify or delete ``path``
+        """
+        if not self.enabled:
+            if absolute_key:
+                fd, path = tempfile.mkstemp(suffix=os.path.splitext(name)[1])
+                os.close(fd)
+                return CachedFile(download_key_to_path(name, path), temporary=True)
+            return CachedFile(download_to_tempfile(name, storage=storage), temporary=True)
+
+        identity, version, fetch = self._source(name, storage, absolute_key)
+        data_path, lock_path = self._entry_paths(name, identity, version)
+
+        filled = False
+        while True:
+            lock_file = self._lock(lock_path, fcntl.LOCK_SH)
+            try:
+                if not os.path.exists(data_path):
+                    # Single flight: the first process to get the exclusive lock downloads,
+                    # the others block here and find the file in place afterwards
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                    if self._is_current(lock_file, lock_path) and not os.path.exists(data_path):
+                        self._fill(data_path, fetch, name)
+                        filled = True
+                    fcntl.flock(lock_file, fcntl.LOCK_SH)
+                if self._is_current(lock_file, lock_path) and os.path.exists(data_path):
+                    break
+            except BaseException:
+                lock_file.close()
+                raise
+            # Evicted between locks; start over
+            lock_file.close()
+
+        if filled:
+            self.misses += 1
+            self.evict()
+        else:
+            self.hits += 1
+            # Reads refresh the entry's place in the LRU order
+            os.utime(data_path)
+        return CachedFile(data_path, lock_file)
+
+    def _fill(self, data_path, fetch, name):
+        part_path = f"{data_path}.{os.getpid()}.{threading.get_ident()}{PART_SUFFIX}"
+        start = time.time()
+        try:
+            fetch(part_path)
+            os.replace(part_path, data_path)
+        except BaseException:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+            raise
+        size = os.path.getsize(data_path)
+        print(f"📦 Cached {name} ({size / (1024 * 1024):.1f} MB) in {time.time() - start:.2f}s")
+
+    def add(self, name: str, local_path: str, storage=None):
+        """
+        Move a file that was just uploaded as ``name`` into the cache, so the
+        next read on this worker doesn't download it again. ``local_path``
+        is consumed either way.
+        """
+        if not self.enabled:
+            os.remove(local_path)
+            return
+        try:
+            identity, version, _ = self._source(name, storage)
+            data_path, lock_path = self._entry_paths(name, identity, version)
+            with self._lock(lock_path, fcntl.LOCK_EX):
+                if not os.path.exists(data_path):
+                    part_path = f"{data_path}.{os.getpid()}.{threading.get_ident()}{PART_SUFFIX}"
+                    shutil.move(local_path, part_path)
+                    os.replace(part_path, data_path)
+        except Exception as e:
+            logger.warning(f"Could not add {name} to the storage cache: {e}")
+        finally:
+            if os.path.exists(local_path):
+                os.remove(local_path)
+        self.evict()
+
+    def _entries(self):
+        """(mtime, size, data path, lock path) of every complete entry, and their total size"""
+        entries = []
+        total = 0
+        now = time.time()
+        for entry in os.scandir(self.root):
+            if entry.name.startswith(".") or entry.name.endswith(LOCK_SUFFIX):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            if entry.name.endswith(PART_SUFFIX):
+                if now - stat.st_mtime > STALE_PART_SECONDS:
+                    try:
+                        os.remove(entry.path)
+                    except FileNotFoundError:
+                        pass
+                continue
+            digest = os.path.splitext(entry.name)[0]
+            entries.append((stat.st_mtime, stat.st_size, entry.path, os.path.join(self.root, digest + LOCK_SUFFIX)))
+            total += stat.st_size
+        return entries, total
+
+    def evict(self) -> int:
+        """
+        Remove least recently used entries that nobody has pinned until the
+        cache is back under its budget.
+
+        Returns:
+            int: Number of entries removed
+        """
+        if not self.enabled:
+            return 0
+        entries, total = self._entries()
+        if total <= self.max_bytes:
+            return 0
+
+        with open(os.path.join(self.root, ".evict.lock"), "a") as guard:
+            try:
+                fcntl.flock(guard, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                # Another process is already evicting
+                return 0
+
+            removed = 0
+            target = int(self.max_bytes * EVICT_TARGET_RATIO)
+            for _, size, data_path, lock_path in sorted(entries):
+                if total <= target:
+                    break
+                with open(lock_path, "a") as lock_file:
+                    try:
+                        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except BlockingIOError:
+                        # Pinned by a running job
+                        continue
+                    if not self._is_current(lock_file, lock_path):
+                        continue
+                    try:
+                        os.remove(data_path)
+                    except FileNotFoundError:
+                        pass
+                    os.remove(lock_path)
+                total -= size
+                removed += 1
+
+        if removed:
+            print(f"🧹 Evicted {removed} files from the storage cache, {total / (1024 ** 3):.2f} GB in use")
+        return removed
+
+    def stats(self):
+        """Hit/miss counters of this process and the cache's size on disk"""
+        entries, total = self._entries() if self.enabled else ([], 0)
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(entries),
+            "bytes": total,
+            "max_bytes": self.max_bytes,
+        }
+
+
+def get_storage_cache() -> StorageCache:
+    """Storage cache of this worker (one instance per process)"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = StorageCache()
+        return _cache
+
+
+class PinnedFiles:
+    """
+    The storage files one job reads, each fetched through the worker cache
+    once and kept pinned until close().
+
+    Usage:
+        with PinnedFiles() as files:
+            audio_path = files.get(video.audio_file.name)
+    """
+
+    def __init__(self, cache: Optional[StorageCache] = None):
+        self.cache = cache or get_storage_cache()
+        self._pins = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str, storage=None, absolute_key: bool = False) -> str:
+        """
+        Local path of ``name``; the file is shared with other jobs, so it
+        must only be read.
+        """
+        key = (name, absolute_key)
+        with self._lock:
+            pinned = self._pins.get(key)
+        if pinned is not None:
+            return pinned.path
+
+        pinned = self.cache.open(name, storage, absolute_key)
+        with self._lock:
+            existing = self._pins.setdefault(key, pinned)
+        if existing is not pinned:
+            # Another thread of this job pinned it first
+            pinned.release()
+        return existing.path
+
+    def close(self):
+        with self._lock:
+            pins, self._pins = list(self._pins.values()), {}
+        for pinned in pins:
+            pinned.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,167 @@
+import os
+import shutil
+import logging
+import tempfile
+import threading
+from typing import Optional, Tuple
+
+import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from django.conf import settings
+from django.core.files.storage import default_storage
+
+logger = logging.getLogger(__name__)
+
+# Copy size for storages that aren't S3 (local media in development)
+CHUNK_SIZE = 1024 * 1024
+
+_clients = {}
+_clients_pid = None
+_clients_lock = threading.Lock()
+
+
+def get_client_config() -> Config:
+    """botocore config shared by every S3 client: a pool large enough for multipart concurrency"""
+    return Config(
+        max_pool_connections=getattr(settings, "S3_MAX_POOL_CONNECTIONS", 50),
+        retries={"max_attempts": 5, "mode": "adaptive"},
+        tcp_keepalive=True,
+    )
+
+
+def get_transfer_config() -> TransferConfig:
+    """Multipart settings for uploads and downloads; parts are streamed, never held whole in memory"""
+    return TransferConfig(
+        multipart_threshold=getattr(settings, "S3_MULTIPART_THRESHOLD", 16 * 1024 * 1024),
+        multipart_chunksize=getattr(settings, "S3_MULTIPART_CHUNKSIZE", 16 * 1024 * 1024),
+        max_concurrency=getattr(settings, "S3_TRANSFER_CONCURRENCY", 8),
+        io_chunksize=256 * 1024,
+        use_threads=True,
+    )
+
+
+def get_s3_client(region_name: Optional[str] = None):
+    """
+    S3 client shared by the whole process. boto3 clients are thread-safe, so
+    every thread reuses one connection pool instead of building a client
+    (and new TLS connections) per call. Recreated after a fork, since pooled
+    sockets must not be shared between Celery prefork children.
+    """
+    global _clients_pid
+    region = region_name or getattr(settings, "AWS_REGION", None)
+    with _clients_lock:
+        if _clients_pid != os.getpid():
+            _clients.clear()
+            _clients_pid = os.getpid()
+        client = _clients.get(region)
+        if client is None:
+            client = boto3.session.Session().client(
+                "s3",
+                aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+                aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+                region_name=region,
+                config=get_client_config(),
+            )
+            _clients[region] = client
+        return client
+
+
+def s3_location(name: str, storage=None) -> Optional[Tuple[str, str]]:
+    """
+    Bucket and object key of ``name`` in ``storage`` (default_storage), or
+    None when the storage isn't S3-backed.
+    """
+    storage = storage or default_storage
+    if not hasattr(storage, "bucket_name"):
+        return None
+    location = (getattr(storage, "location", "") or "").strip("/")
+    name = name.lstrip("/")
+    return storage.bucket_name, f"{location}/{name}" if location else name
+
+
+def download_to_path(name: str, path: str, storage=None) -> str:
+    """
+    Download a stored file to ``path`` without reading it into memory.
+    S3 objects are fetched as concurrent ranged parts; other storages are
+    copied in CHUNK_SIZE pieces.
+
+    Args:
+        name: Storage name (e.g. ``video.audio_file.name``)
+        path: Local destination
+        storage: Storage holding ``name``; default_storage when None
+
+    Returns:
+        str: ``path``
+    """
+    storage = storage or default_storage
+    target = s3_location(name, storage)
+    if target:
+        bucket, key = target
+        get_s3_client().download_file(bucket, key, path, Config=get_transfer_config())
+    else:
+        with storage.open(name, "rb") as src, open(path, "wb") as dst:
+            shutil.copyfileobj(src, dst, length=CHUNK_SIZE)
+    return path
+
+
+def download_to_tempfile(name: str, suffix: Optional[str] = None, storage=None) -> str:
+    """
+    Download a stored file into a new temp file (deleted on failure).
+
+    Returns:
+        str: Path of the temp file; the caller removes it when done
+    """
+    if suffix is None:
+        suffix = os.path.splitext(name)[1]
+    fd, path = tempfile.mkstemp(suffix=suffix)
+    os.close(fd)
+    try:
+        return download_to_path(name, path, storage)
+    except Exception:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+
+
+def upload_from_path(path: str, name: str, content_type: Optional[str] = None, storage=None) -> str:
+    """
+    Upload a local file to ``name`` in ``storage`` as a streamed (multipart
+    when large) upload. Unlike ``storage.save`` the name is used as given,
+    so existing objects are overwritten.
+
+    Returns:
+        str: ``name``
+    """
+    storage = storage or default_storage
+    target = s3_location(name, storage)
+    if target:
+        bucket, key = target
+        extra_args = {"ContentType": content_type} if content_type else None
+        get_s3_client().upload_file(path, bucket, key, ExtraArgs=extra_args, Config=get_transfer_config())
+    else:
+        with open(path, "rb") as src:
+            if storage.exists(name):
+                storage.delete(name)
+            storage.save(name, src)
+    return name
+
+
+def download_key_to_path(key: str, path: str, bucket: Optional[str] = None) -> str:
+    """Download an absolute bucket key (outside the media location) to ``path``"""
+    get_s3_client().download_file(
+        bucket or settings.AWS_STORAGE_BUCKET_NAME, key, path, Config=get_transfer_config()
+    )
+    return path
+
+
+def upload_fileobj_to_key(file_obj, key: str, content_type: Optional[str] = None, bucket: Optional[str] = None):
+    """Stream a file-like object to an absolute bucket key with the shared client and transfer config"""
+    extra_args = {"ContentType": content_type} if content_type else None
+    get_s3_client().upload_fileobj(
+        file_obj,
+        bucket or settings.AWS_STORAGE_BUCKET_NAME,
+        key,
+        ExtraArgs=extra_args,
+        Config=get_transfer_config(),
+    )
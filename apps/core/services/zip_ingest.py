@@ -0,0 +1,264 @@
+import os
+import uuid
+import time
+import zipfile
+import logging
+import mimetypes
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from ..models import UserAsset, asset_expires_at
+from .asset_tree import invalidate_asset_tree
+from .storage_io import download_key_to_path, upload_fileobj_to_key
+
+logger = logging.getLogger(__name__)
+
+# Archives wait here between the upload and the ingest worker
+STAGING_PREFIX = "zip_ingest"
+PROGRESS_TTL = 24 * 3600
+# Names of failed members kept in the progress; "failed" has the full count
+FAILED_NAMES_KEEP = 50
+
+
+def staging_key(user_id: int, job_id: str) -> str:
+    return f"{STAGING_PREFIX}/{user_id}/{job_id}.zip"
+
+
+def _progress_key(job_id: str) -> str:
+    return f"zip_ingest:{job_id}"
+
+
+def get_ingest_progress(job_id: str, user=None) -> Optional[Dict]:
+    """Progress of an ingest job, or None if it's unknown (or not the user's)"""
+    progress = cache.get(_progress_key(job_id))
+    if progress is None or (user is not None and progress.get("user_id") != user.id):
+        return None
+    return progress
+
+
+def _set_progress(job_id: str, **fields):
+    progress = cache.get(_progress_key(job_id)) or {}
+    progress.update(fields)
+    cache.set(_progress_key(job_id), progress, timeout=PROGRESS_TTL)
+    return progress
+
+
+def _safe_member_path(name: str) -> Optional[str]:
+    """Member path relative to the target folder, or None for names that would escape it"""
+    name = name.replace("\\", "/")
+    parts = [part for part in name.split("/") if part not in ("", ".")]
+    if not parts or name.startswith("/") or ".." in parts:
+        return None
+    return "/".join(parts) + ("/" if name.endswith("/") else "")
+
+
+def _folder_asset(user, key: str, expires_at) -> UserAsset:
+    # bulk_create skips UserAsset.save(), so keys are normalised and expiry set here the same way
+    key = key.replace("//", "/")
+    return UserAsset(
+        user=user,
+        key=key,
+        filename=os.path.basename(key.rstrip("/")),
+        is_folder=True,
+        parent_folder=os.path.dirname(key.rstrip("/")),
+        expires_at=expires_at,
+    )
+
+
+def ingest_zip(
+    user,
+    zip_source,
+    parent_folder: str = "",
+    progress: Optional[Callable] = None,
+    failed: Optional[List[str]] = None,
+) -> List[UserAsset]:
+    """
+    Upload the contents of a ZIP archive to the user's asset library.
+
+    The archive is read once. Members are streamed straight into
+    (multipart) S3 uploads by a bounded thread pool, never held whole in
+    memory, and the folder and file rows are written with bulk_create in
+    one transaction at the end.
+
+    Args:
+        user: Owner of the assets
+        zip_source: Path or seekable file object of the archive
+        parent_folder: Folder (relative to the user's root) to extract into
+        progress: Called as progress(done, total, bytes_done, bytes_total)
+        failed: Optional list that receives the names of members that could not be uploaded
+
+    Returns:
+        List of UserAsset objects for the folders and uploaded files
+    """
+    from .s3_service import get_user_root_folder
+
+    user_folder = get_user_root_folder(user.id)
+    expires_at = asset_expires_at()
+    if parent_folder:
+        user_folder = f"{user_folder}{parent_folder.strip('/')}/"
+
+    with zipfile.ZipFile(zip_source) as archive:
+        folder_keys = set()
+        members = []
+        for info in archive.infolist():
+            path = _safe_member_path(info.filename)
+            if path is None:
+                logger.warning(f"Skipping unsafe ZIP member: {info.filename}")
+                continue
+            # Every ancestor becomes a folder, whether or not the archive lists it
+            parts = path.rstrip("/").split("/")
+            depth = len(parts) if info.is_dir() else len(parts) - 1
+            for i in range(1, depth + 1):
+                folder_keys.add(f"{user_folder}{'/'.join(parts[:i])}/")
+            if not info.is_dir():
+                members.append((info, f"{user_folder}{path}"))
+
+        total = len(members)
+        bytes_total = sum(info.file_size for info, _ in members)
+        done = 0
+        bytes_done = 0
+        file_assets = []
+        if failed is None:
+            failed = []
+
+        def upload(info, key):
+            content_type, _ = mimetypes.guess_type(info.filename)
+            with archive.open(info) as member:
+                upload_fileobj_to_key(member, key, content_type)
+            return UserAsset(
+                user=user,
+                key=key,
+                filename=os.path.basename(key),
+                file_size=info.file_size,
+                content_type=content_type or "",
+                is_folder=False,
+                parent_folder=os.path.dirname(key),
+                expires_at=expires_at,
+            )
+
+        workers = max(1, getattr(settings, "ZIP_INGEST_WORKERS", 8))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(upload, info, key): (info, key) for info, key in members}
+            for future in as_completed(futures):
+                info, key = futures[future]
+                try:
+                    file_assets.append(future.result())
+                except Exception as e:
+                    logger.error(f"Error uploading ZIP member {info.filename}: {str(e)}")
+                    failed.append(info.filename)
+                done += 1
+                bytes_done += info.file_size
+                if progress:
+                    progress(done, total, bytes_done, bytes_total)
+
+    folder_assets = [_folder_asset(user, key, expires_at) for key in sorted(folder_keys)]
+    with transaction.atomic():
+        UserAsset.objects.bulk_create(
+            folder_assets,
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=["user", "key"],
+            update_fields=["filename", "is_folder", "parent_folder", "expires_at"],
+        )
+        UserAsset.objects.bulk_create(
+            file_assets,
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=["user", "key"],
+            update_fields=["filename", "file_size", "content_type", "is_folder", "parent_folder", "expires_at"],
+        )
+
+    # bulk_create sends no post_save signals
+    invalidate_asset_tree(user.id)
+
+    if failed:
+        print(f"⚠️ {len(failed)} of {total} ZIP members failed to upload for user {user.id}")
+    return folder_assets + file_assets
+
+
+def start_zip_ingest(user, zip_key: str, parent_folder: str = "", job_id: Optional[str] = None) -> str:
+    """
+    Queue the ingest of an archive already staged at ``zip_key`` in the bucket.
+
+    Returns:
+        str: Job ID for get_ingest_progress
+    """
+    from ..tasks import ingest_zip_task
+
+    job_id = job_id or uuid.uuid4().hex
+    _set_progress(
+        job_id,
+        user_id=user.id,
+        status="queued",
+        done=0,
+        total=0,
+        bytes_done=0,
+        bytes_total=0,
+        created=0,
+        failed=0,
+        failed_files=[],
+        error=None,
+    )
+    ingest_zip_task.delay(job_id, user.id, zip_key, parent_folder)
+    return job_id
+
+
+def stage_and_ingest(user, uploaded_file, parent_folder: str = "") -> str:
+    """Stream an archive posted through Django to the staging prefix and queue its ingest"""
+    job_id = uuid.uuid4().hex
+    key = staging_key(user.id, job_id)
+    uploaded_file.seek(0)
+    upload_fileobj_to_key(uploaded_file, key, "application/zip")
+    return start_zip_ingest(user, key, parent_folder, job_id=job_id)
+
+
+def run_zip_ingest(job_id: str, user, zip_key: str, parent_folder: str = "") -> Dict:
+    """Worker side of an ingest job: fetch the staged archive, ingest it and report progress"""
+    from .s3_service import delete_from_s3
+
+    _set_progress(job_id, status="processing")
+    start = time.time()
+    last_report = [0.0]
+
+    def report(done, total, bytes_done, bytes_total):
+        # Progress lives in the cache; writes are throttled for archives with many small files
+        now = time.time()
+        if done == total or now - last_report[0] >= 1:
+            last_report[0] = now
+            _set_progress(job_id, done=done, total=total, bytes_done=bytes_done, bytes_total=bytes_total)
+
+    fd, zip_path = tempfile.mkstemp(suffix=".zip")
+    os.close(fd)
+    try:
+        download_key_to_path(zip_key, zip_path)
+        failed = []
+        assets = ingest_zip(user, zip_path, parent_folder, progress=report, failed=failed)
+        if failed:
+            # The rest of the archive is in the library, but the browser has to know what's missing
+            progress = _set_progress(
+                job_id,
+                status="partial",
+                created=len(assets),
+                failed=len(failed),
+                failed_files=failed[:FAILED_NAMES_KEEP],
+                error=f"{len(failed)} files could not be uploaded",
+            )
+        else:
+            progress = _set_progress(job_id, status="completed", created=len(assets))
+        print(
+            f"📦 Ingested ZIP for user {user.id}: {len(assets)} assets, {len(failed)} failed "
+            f"in {time.time() - start:.1f}s"
+        )
+        return progress
+    except Exception as e:
+        logger.error(f"ZIP ingest {job_id} failed: {str(e)}")
+        return _set_progress(job_id, status="failed", error=str(e))
+    finally:
+        if os.path.exists(zip_path):
+            os.remove(zip_path)
+        delete_from_s3(zip_key)
@@ -0,0 +1,12 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from apps.core.models import UserAsset
+from apps.core.services.asset_tree import invalidate_asset_tree
+
+
+@receiver(post_save, sender=UserAsset)
+@receiver(post_delete, sender=UserAsset)
+def invalidate_user_asset_tree(sender, instance, **kwargs):
+    """Cached asset listings and counts are rebuilt after any change to the user's assets"""
+    invalidate_asset_tree(instance.user_id)
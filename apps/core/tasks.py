@@ -20,3 +20,39 @@ def cleanup_old_assets_task(days=1):
         logger.warning(f"Encountered {len(result['errors'])} errors during cleanup.")
         
     return result
+
+
+@shared_task(name='ingest_zip_task')
+def ingest_zip_task(job_id, user_id, zip_key, parent_folder=''):
+    """
+    Celery task that uploads the contents of a staged ZIP archive to a
+    user's asset library; progress is read with get_ingest_progress.
+    
+    Args:
+        job_id: Ingest job ID
+        user_id: Owner of the assets
+        zip_key: Bucket key of the staged archive
+        parent_folder: Folder (relative to the user's root) to extract into
+    """
+    from django.contrib.auth.models import User
+    from .services.zip_ingest import run_zip_ingest
+
+    user = User.objects.get(id=user_id)
+    return run_zip_ingest(job_id, user, zip_key, parent_folder)
+
+
+@shared_task(name='move_asset_folder_task', bind=True, max_retries=3)
+def move_asset_folder_task(self, job_id):
+    """
+    Celery task that moves an asset folder (S3 objects and rows) to a new key.
+    Failed moves are retried; each attempt resumes where the last one stopped.
+    
+    Args:
+        job_id: Move job ID from start_folder_move
+    """
+    from .services.asset_move import run_folder_move
+
+    job = run_folder_move(job_id)
+    if job and job['status'] == 'failed' and self.request.retries < self.max_retries:
+        raise self.retry(countdown=30 * (self.request.retries + 1))
+    return job
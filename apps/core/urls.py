@@ -7,7 +7,8 @@ from apps.core.views import (
     upgrade_plan, asset_view, delete_asset, rename_asset, verify_email,
     register_view, register, password_reset_request, password_reset_confirm, loading_view, proxy_video_download,
     cancel_subscription, speed_up_video, affiliate_program, refund, privacy, terms_and_condition,bulk_delete_assets,
-upload_to_folder
+upload_to_folder, direct_upload_start, direct_upload_parts, direct_upload_complete, direct_upload_abort, zip_ingest_status,
+asset_tree_api, asset_move_status
 )
 
 urlpatterns = [
@@ -38,6 +39,7 @@ path('download-video/<int:video_id>/', proxy_video_download, name='proxy_video_d
    # Stripe webhook
    path("webhook/", stripe_webhook, name="stripe_webhook"),
    path("asset-library/", asset_view, name="asset_library"),
+   path("asset-library/tree/", asset_tree_api, name="asset_tree_api"),
    path("delete-asset/<int:asset_id>/", delete_asset, name="delete_asset"),  # Add asset deletion URL
    path("rename-asset/<int:asset_id>/", rename_asset, name="rename_asset"),  # Add asset rename URL
        path('verify-email/<str:uidb64>/<str:token>/', verify_email, name='verify-email'),
@@ -56,6 +58,12 @@ path('download-video/<int:video_id>/', proxy_video_download, name='proxy_video_d
         # ADD these two lines to your urlpatterns list:
 path("bulk-delete-assets/", bulk_delete_assets, name="bulk_delete_assets"),
 path("upload-to-folder/", upload_to_folder, name="upload_to_folder"),
+path("direct-upload/start/", direct_upload_start, name="direct_upload_start"),
+path("direct-upload/parts/", direct_upload_parts, name="direct_upload_parts"),
+path("direct-upload/complete/", direct_upload_complete, name="direct_upload_complete"),
+path("direct-upload/abort/", direct_upload_abort, name="direct_upload_abort"),
+path("zip-ingest/<str:job_id>/", zip_ingest_status, name="zip_ingest_status"),
+path("asset-move/<str:job_id>/", asset_move_status, name="asset_move_status"),
 
 
 ]
@@ -1,9 +1,8 @@
 import logging
 from typing import Dict, List, Optional, Set, Any, Union
 from pathlib import Path
-from .services.s3_service import StorageFactory, S3Config
+from .services.s3_service import StorageFactory, S3Config, ASSET_LIBRARY_PREFIX, asset_listing_cache_key
 import os
-import subprocess
 import os
 from pathlib import Path
 import tempfile
@@ -15,6 +14,8 @@ from functools import partial
 from django.core.files import File
 from django.core.files.storage import default_storage
 from django.conf import settings
+from apps.processors.services.ffmpeg_governor import PRIORITY_INTERACTIVE
+from apps.processors.services.process_control import check_ffmpeg_output, run_ffmpeg
 # Set up logging
 logger = logging.getLogger(__name__)
 
@@ -35,7 +36,7 @@ def get_user_asset_tree(user_id: str,
     if not storage:
         storage = StorageFactory.get_storage()
     
-    prefix = f"videocrafter/users/{user_id}/assetlibrary/"
+    prefix = ASSET_LIBRARY_PREFIX.format(user_id=user_id)
     
     # For S3 storage, we need to list objects by prefix
     if hasattr(storage, 's3_client'):
@@ -46,50 +47,85 @@ def get_user_asset_tree(user_id: str,
     
     return tree
 
+def _list_s3_prefix(storage, prefix: str) -> List[Dict[str, Any]]:
+    """
+    Every object under ``prefix`` from one paginated flat listing (no
+    delimiter), cached in Redis until something under the prefix is
+    uploaded, renamed or deleted (see s3_service.invalidate_asset_listing).
+    """
+    from django.core.cache import cache
+
+    cache_key = asset_listing_cache_key(prefix)
+    try:
+        objects = cache.get(cache_key)
+    except Exception as e:
+        logger.warning(f"S3 listing cache unavailable: {e}")
+        objects = None
+    if objects is not None:
+        return objects
+
+    objects = []
+    paginator = storage.s3_client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=storage.bucket_name, Prefix=prefix):
+        for item in page.get('Contents', []):
+            objects.append({
+                "key": item['Key'],
+                "size": item['Size'],
+                "modified": item['LastModified'],
+            })
+
+    try:
+        cache.set(cache_key, objects, timeout=getattr(settings, 'S3_LISTING_CACHE_TTL', 300))
+    except Exception as e:
+        logger.warning(f"Could not cache S3 listing for {prefix}: {e}")
+    return objects
+
 def _get_s3_folder_tree(storage, prefix: str, file_extensions: Optional[Set[str]] = None) -> Dict[str, Any]:
-    """Build a folder tree from S3 storage."""
+    """Build a folder tree from S3 storage in memory from a single flat listing."""
     try:
-        # Use boto3 client to list objects with the given prefix
-        response = storage.s3_client.list_objects_v2(
-            Bucket=storage.bucket_name,
-            Prefix=prefix,
-            Delimiter='/'  # Use delimiter to simulate folder structure
-        )
-        
         tree = {"name": Path(prefix).name or "root", "type": "folder", "children": []}
-        
-        # Process common prefixes (folders)
-        if 'CommonPrefixes' in response:
-            for common_prefix in response['CommonPrefixes']:
-                subfolder = common_prefix['Prefix']
-                # Recursively get the tree for this subfolder
-                subtree = _get_s3_folder_tree(storage, subfolder, file_extensions)
-                tree["children"].append(subtree)
-        
-        # Process objects (files)
-        if 'Contents' in response:
-            for item in response['Contents']:
-                key = item['Key']
-                # Skip the prefix itself
-                if key == prefix:
-                    continue
-                
-                # Get the filename without the prefix
-                filename = key[len(prefix):]
-                
-                # Skip files that don't match the extension filter
-                if file_extensions and not any(filename.lower().endswith(ext.lower()) for ext in file_extensions):
-                    continue
-                
-                file_info = {
-                    "name": filename,
-                    "type": "file",
-                    "size": item['Size'],
-                    "path": key,
-                    "modified": item['LastModified']
-                }
-                tree["children"].append(file_info)
-        
+        # Folder nodes by their prefix, so each object is placed without searching
+        folders = {prefix: tree}
+        files = []
+
+        def _folder(folder_prefix):
+            node = folders.get(folder_prefix)
+            if node is None:
+                parent_prefix = folder_prefix[:folder_prefix.rstrip('/').rfind('/') + 1]
+                node = {"name": Path(folder_prefix).name, "type": "folder", "children": []}
+                _folder(parent_prefix)["children"].append(node)
+                folders[folder_prefix] = node
+            return node
+
+        for item in _list_s3_prefix(storage, prefix):
+            key = item["key"]
+            # Skip the prefix itself
+            if key == prefix:
+                continue
+
+            folder_prefix, _, filename = key.rpartition('/')
+            folder_prefix += '/'
+            folder = _folder(folder_prefix)
+            # Folder placeholder objects only create the folder
+            if not filename:
+                continue
+
+            # Skip files that don't match the extension filter
+            if file_extensions and not any(filename.lower().endswith(ext.lower()) for ext in file_extensions):
+                continue
+
+            files.append((folder, {
+                "name": filename,
+                "type": "file",
+                "size": item["size"],
+                "path": key,
+                "modified": item["modified"]
+            }))
+
+        # Subfolders are listed before the files of each folder
+        for folder, file_info in files:
+            folder["children"].append(file_info)
+
         return tree
     except Exception as e:
         logger.error(f"Error getting S3 folder tree: {e}")
@@ -179,16 +215,15 @@ def download_user_assets(user_id: str,
     # Get the list of files in the user's asset library
     asset_list = list_user_assets(user_id, file_extensions, storage)
     local_path = Path(local_path)
-    downloaded_files = []
+    prefix = ASSET_LIBRARY_PREFIX.format(user_id=user_id)
     
     # Create the local directory structure if it doesn't exist
     os.makedirs(local_path, exist_ok=True)
     
-    # Download each file
-    for asset in asset_list:
+    def _download(asset):
         try:
             s3_key = asset["path"]
-            relative_path = s3_key.split(f"videocrafter/users/{user_id}/assetlibrary/", 1)[1]
+            relative_path = s3_key.split(prefix, 1)[1]
             target_path = local_path / relative_path
             
             # Ensure the directory exists
@@ -197,15 +232,19 @@ def download_user_assets(user_id: str,
             # Download the file
             if storage.download(s3_key, target_path):
                 asset["local_path"] = str(target_path)
-                downloaded_files.append(asset)
                 logger.info(f"Downloaded {s3_key} to {target_path}")
-            else:
-                logger.error(f"Failed to download {s3_key}")
-                
+                return asset
+            logger.error(f"Failed to download {s3_key}")
         except Exception as e:
             logger.error(f"Error downloading asset {asset.get('path', 'unknown')}: {e}")
-            
-    return downloaded_files
+        return None
+    
+    # Download with bounded parallelism; results keep the listing order
+    max_workers = max(1, getattr(settings, 'ASSET_DOWNLOAD_CONCURRENCY', 8))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(_download, asset_list))
+    
+    return [asset for asset in results if asset is not None]
 
 def upload_to_user_library(user_id: str, 
                           local_path: Union[str, Path],
@@ -233,7 +272,7 @@ def upload_to_user_library(user_id: str,
         logger.error(f"Local path {local_path} does not exist or is not a directory")
         return []
         
-    s3_prefix = f"videocrafter/users/{user_id}/assetlibrary/"
+    s3_prefix = ASSET_LIBRARY_PREFIX.format(user_id=user_id)
     if s3_subpath:
         s3_prefix = f"{s3_prefix}{s3_subpath.strip('/')}/"
         
@@ -302,7 +341,13 @@ def sync_user_assets(user_id: str,
 
 def cleanup_old_assets(days: int = 1, storage=None) -> Dict[str, Any]:
     """
-    Clean up assets older than the specified number of days.
+    Clean up expired assets.
+    
+    On S3, expired UserAsset rows and video outputs are deleted in batches
+    (see services.asset_expiry); tagged asset library objects expire
+    through the bucket lifecycle rule installed with
+    ``manage.py asset_expiry --apply-lifecycle``. Local storage is swept
+    for files older than ``days``.
     
     Args:
         days: Number of days to keep assets (default: 1)
@@ -323,38 +368,16 @@ def cleanup_old_assets(days: int = 1, storage=None) -> Dict[str, Any]:
     deleted_files = []
     errors = []
     
-    # For S3 storage
+    # For S3 storage, expiry is driven by the database instead of bucket listings
     if hasattr(storage, 's3_client'):
+        from .services.asset_expiry import expire_assets
+
         try:
-            # List all objects in the bucket
-            paginator = storage.s3_client.get_paginator('list_objects_v2')
-            # Only look at videocrafter/users/*/assetlibrary paths
-            prefix = "videocrafter/users/"
-            
-            for page in paginator.paginate(Bucket=storage.bucket_name, Prefix=prefix):
-                if 'Contents' not in page:
-                    continue
-                
-                for obj in page['Contents']:
-                    key = obj['Key']
-                    last_modified = obj['LastModified']
-                    
-                    # Skip if not in assetlibrary
-                    if 'assetlibrary' not in key:
-                        continue
-                        
-                    # Check if the file is older than the cutoff date
-                    if last_modified < cutoff_date:
-                        # Delete the file
-                        if storage.delete(key):
-                            deleted_count += 1
-                            deleted_files.append(key)
-                            logger.info(f"Deleted old asset: {key}")
-                        else:
-                            errors.append(f"Failed to delete {key}")
-            
+            metrics = expire_assets()
+            deleted_count = metrics["objects"]
+            errors.extend(metrics["errors"])
         except Exception as e:
-            error_msg = f"Error cleaning up S3 assets: {e}"
+            error_msg = f"Error expiring S3 assets: {e}"
             logger.error(error_msg)
             errors.append(error_msg)
     
@@ -427,7 +450,7 @@ def get_media_info(file_path):
             "-of", "default=noprint_wrappers=1:nokey=1",
             file_path
         ]
-        duration = float(subprocess.check_output(duration_cmd).decode().strip())
+        duration = float(check_ffmpeg_output(duration_cmd).decode().strip())
         
         # Check for audio stream
         audio_cmd = [
@@ -437,7 +460,7 @@ def get_media_info(file_path):
             "-of", "default=noprint_wrappers=1:nokey=1",
             file_path
         ]
-        audio_result = subprocess.run(audio_cmd, capture_output=True, text=True)
+        audio_result = run_ffmpeg(audio_cmd, capture_output=True, text=True)
         has_audio = audio_result.stdout.strip() == "audio"
         
         return {
@@ -487,7 +510,7 @@ def process_background_track(audio_path, video_duration, start_time, end_time, v
             output_path
         ]
         
-        result = subprocess.run(cmd, capture_output=True)
+        result = run_ffmpeg(cmd, capture_output=True)
         
         if result.returncode != 0:
             logger.error(f"Failed to process track {track_index}: {result.stderr}")
@@ -569,7 +592,7 @@ def create_final_mix(video_path, processed_tracks, output_path, has_original_aud
         print(f"\nCreating final mix with {len(processed_tracks)} background tracks")
         print(f"Filter: {filter_complex}")
         
-        result = subprocess.run(cmd, capture_output=True, text=True)
+        result = run_ffmpeg(cmd, capture_output=True, text=True)
         
         if result.returncode != 0:
             logger.error(f"FFmpeg error: {result.stderr}")
@@ -610,12 +633,7 @@ def process_video_speed(video_file, speed):
         
         has_audio = False
         try:
-            result = subprocess.run(
-                check_audio_cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
-            )
+            result = run_ffmpeg(check_audio_cmd, capture_output=True, text=True)
             has_audio = "audio" in result.stdout
             print(f"Audio stream detected: {has_audio}")
         except Exception as e:
@@ -644,11 +662,8 @@ def process_video_speed(video_file, speed):
 
         # Run FFmpeg
         print(f"FFmpeg command: {' '.join(ffmpeg_cmd)}")
-        result = subprocess.run(
-            ffmpeg_cmd, 
-            stdout=subprocess.PIPE, 
-            stderr=subprocess.PIPE
-        )
+        # A user is waiting on this upload, so it jumps the render queue
+        result = run_ffmpeg(ffmpeg_cmd, capture_output=True, priority=PRIORITY_INTERACTIVE)
         
         if result.returncode != 0:
             error_output = result.stderr.decode()
@@ -698,11 +713,8 @@ def process_video_speed(video_file, speed):
         # Run FFmpeg
         print(f"Processing video with speed {speed}x")
         print(f"FFmpeg command: {' '.join(ffmpeg_cmd)}")
-        result = subprocess.run(
-            ffmpeg_cmd, 
-            stdout=subprocess.PIPE, 
-            stderr=subprocess.PIPE
-        )
+        # A user is waiting on this upload, so it jumps the render queue
+        result = run_ffmpeg(ffmpeg_cmd, capture_output=True, priority=PRIORITY_INTERACTIVE)
         
         if result.returncode != 0:
             print(f"FFmpeg error: {result.stderr.decode()}")
@@ -7,6 +7,8 @@ from django.utils import timezone
 from django.shortcuts import render, redirect, get_object_or_404
 from django.http import HttpResponse, Http404
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition, require_GET
+from django.utils.cache import patch_cache_control
 from django.contrib import messages
 from django.contrib.auth.models import User
 from django.contrib.auth import login, logout, authenticate
@@ -31,10 +33,11 @@ from django.urls import reverse
 from django.http import HttpResponse, JsonResponse, FileResponse
 from datetime import datetime, timedelta
 from django.conf import settings
-from apps.core.models import UserAsset
+from apps.core.models import UserAsset, asset_expires_at
 from django.utils.encoding import force_bytes, force_str
 from apps.processors.utils import generate_signed_url, generate_signed_url_for_upload
 from apps.core.utils import process_video_speed
+from apps.processors.services.ffmpeg_governor import PRIORITY_INTERACTIVE, ffmpeg_priority
 # ADD these imports to your existing imports:
 from django.http import JsonResponse
 import json
@@ -428,13 +431,8 @@ def scene_view(request, video_id):
                     print("Text file content unchanged, skipping update")
         # Get clips in sequence order
         clips = Clips.objects.filter(video=video).order_by('sequence')
-        asset_folders = UserAsset.objects.filter(user=request.user, is_folder=True).order_by('filename')
-        user_folder_structure = []
-        for folder in asset_folders:
-            user_folder_structure.append({
-                'name': folder.filename,
-                'assets': UserAsset.objects.filter(parent_folder=folder.key.rstrip('/'), user=request.user).order_by('filename')
-            })
+        from apps.core.services.asset_tree import folder_assets
+        user_folder_structure = folder_assets(request.user.id)
         
         # Get all subclips for this video
         subclip_objects = []
@@ -480,27 +478,31 @@ def download_video(request, video_id):
         # Check if there's background music to apply
         if bg_music_queryset.exists():
             # Create background music version using the batch processing method
-            video_processor = VideoProcessorService(video)
-            
-            # Apply all background music tracks at once
-            print("------------------------------------------------------------------")
-            print("------------------------------------------------------------------")
-            result = video_processor.apply_background_music(bg_music_queryset)
-            print("------------------------------------------------------------------")
-            print("------------------------------------------------------------------")
-            print("------------------------------------------------------------------")
-            print("------------------------------------------------------------------")
-            if result:
-                print(f"Successfully applied {bg_music_queryset.count()} background music tracks to video {video.id}")
-            else:
-                print(f"Failed to apply background music to video {video.id}")
-            
-            # Apply background music to watermarked version
-            result_watermark = video_processor.apply_all_background_music_watermark(bg_music_queryset)
-            if result_watermark:
-                print(f"Successfully applied {bg_music_queryset.count()} background music tracks to watermarked video {video.id}")
-            else:
-                print(f"Failed to apply background music to watermarked video {video.id}")
+            # The user is waiting on this download, so these mixes jump the render queue
+            with ffmpeg_priority(PRIORITY_INTERACTIVE):
+                video_processor = VideoProcessorService(video)
+                try:
+                    # Apply all background music tracks at once
+                    print("------------------------------------------------------------------")
+                    print("------------------------------------------------------------------")
+                    result = video_processor.apply_background_music(bg_music_queryset)
+                    print("------------------------------------------------------------------")
+                    print("------------------------------------------------------------------")
+                    print("------------------------------------------------------------------")
+                    print("------------------------------------------------------------------")
+                    if result:
+                        print(f"Successfully applied {bg_music_queryset.count()} background music tracks to video {video.id}")
+                    else:
+                        print(f"Failed to apply background music to video {video.id}")
+
+                    # Apply background music to watermarked version
+                    result_watermark = video_processor.apply_all_background_music_watermark(bg_music_queryset)
+                    if result_watermark:
+                        print(f"Successfully applied {bg_music_queryset.count()} background music tracks to watermarked video {video.id}")
+                    else:
+                        print(f"Failed to apply background music to watermarked video {video.id}")
+                finally:
+                    video_processor.close()
                 
         else:
             # If no background music, use original outputs
@@ -1358,75 +1360,21 @@ def asset_view(request):
         if 'zip_file' in request.FILES:
             zip_file = request.FILES['zip_file']
             try:
-                # Use the extract_and_upload_zip function from s3_service
-                from apps.core.services.s3_service import extract_and_upload_zip
-                created_assets = extract_and_upload_zip(request.user, zip_file)
-                
-                if created_assets:
-                    print(request, f'Successfully uploaded {len(created_assets)} assets')
-                else:
-                    messages.warning(request, 'No assets were found in the uploaded ZIP file')
-                    
+                # Fallback for when direct uploads aren't available (the asset library
+                # sends archives straight to S3 with purpose "zip"): the archive is
+                # staged to S3 and extracted by a Celery worker, the browser polls
+                # zip_ingest_status with the job ID
+                from apps.core.services.zip_ingest import stage_and_ingest
+                job_id = stage_and_ingest(request.user, zip_file)
+                print(f'📦 Queued ZIP ingest {job_id} for user {request.user.id}')
+                return JsonResponse({'success': True, 'job_id': job_id})
             except Exception as e:
-                print(request, f'Error uploading ZIP file: {str(e)}')
                 print(f'ZIP upload error: {str(e)}')
+                return JsonResponse({'success': False, 'error': str(e)}, status=500)
     
-    # Get all user assets
-    user_folders = UserAsset.objects.filter(user=request.user, is_folder=True)
-    user_files = UserAsset.objects.filter(user=request.user, is_folder=False)
-    
-    # Organize assets into folders and their children
-    folders = {}
-    root_assets = []
-    
-    # First, identify all folders
-    for folder in user_folders:
-        folders[folder.key] = {
-            'folder': folder,
-            'children': []
-        }
-    
-    # Identify files that belong to specific folders
-    for file in user_files:
-        # If the file has a parent folder, add it to that folder's children
-        if file.parent_folder:
-            # Clean the parent folder key to ensure consistent matching
-            parent_key = file.parent_folder
-            if not parent_key.endswith('/'):
-                parent_key += '/'
-                
-            # Find the folder this file belongs to
-            for folder_key in folders:
-                if folder_key == parent_key or folder_key.rstrip('/') == file.parent_folder:
-                    folders[folder_key]['children'].append(file)
-                    break
-            else:
-                # If no folder found, add to root assets (this shouldn't typically happen)
-                root_assets.append(file)
-        else:
-            # No parent folder, so it's a root asset
-            root_assets.append(file)
-    
-    # Prepare the hierarchical structure for the template
-    folder_structure = []
-    
-    # Add folders with their children
-    for folder_key, folder_info in folders.items():
-        # Get all files directly under this folder
-        children = [child for child in user_files if 
-                   (child.parent_folder == folder_key.rstrip('/') or 
-                    child.parent_folder == folder_key)]
-        
-        folder_structure.append({
-            'folder': folder_info['folder'],
-            'children': sorted(children, key=lambda x: x.filename.lower())
-        })
-    
-    # Sort folders by name
-    folder_structure.sort(key=lambda x: x['folder'].filename.lower())
-    
-    # Sort root-level files
-    root_assets.sort(key=lambda x: x.filename.lower())
+    # Folders with their direct files, grouped in one pass over one query
+    from apps.core.services.asset_tree import build_asset_tree
+    folder_structure, root_assets = build_asset_tree(request.user.id)
     
     return render(request, "manage/asset-library.html", {
         "folder_structure": folder_structure,
@@ -1540,72 +1488,53 @@ def rename_asset(request, asset_id):
         
         print(f"DEBUG: Starting rename transaction for {old_key} to {new_name}")
         
+        if asset.is_folder:
+            # Folders are moved by a background job: concurrent server-side copies,
+            # one bulk row update and batched deletes (see services.asset_move)
+            from apps.core.services.asset_move import AssetMoveError, start_folder_move
+            
+            parent_path = os.path.dirname(old_key.rstrip('/'))
+            new_key = parent_path + '/' + new_name + '/' if parent_path else new_name + '/'
+            print(f"DEBUG: Moving folder from {old_key} to {new_key} in the background")
+            
+            try:
+                job_id = start_folder_move(request.user, asset, new_key, new_name)
+            except AssetMoveError as e:
+                if request.content_type and 'application/json' in request.content_type:
+                    return JsonResponse({'success': False, 'error': str(e)}, status=400)
+                print(request, f"Error renaming asset: {str(e)}")
+                return redirect('asset_library')
+            
+            if request.content_type and 'application/json' in request.content_type:
+                return JsonResponse({
+                    'success': True,
+                    'message': f"Renaming {old_filename} to {new_name}",
+                    'job_id': job_id,
+                    'old_key': old_key,
+                    'new_key': new_key,
+                    'id': asset.id,
+                    'is_folder': True
+                })
+            return redirect('asset_library')
+        
         # Rename the asset both in S3 and the database
         with transaction.atomic():
-            # Update S3 key (path) - maintain the same directory structure
-            if asset.is_folder:
-                # For folders we need to update all child assets too
-                folder_prefix = asset.key
-                if not folder_prefix.endswith('/'):
-                    folder_prefix += '/'
-                    
-                # Calculate the new folder key
-                parent_path = os.path.dirname(old_key.rstrip('/'))
-                if parent_path:
-                    new_key = parent_path + '/' + new_name + '/'
-                else:
-                    new_key = new_name + '/'
-                
-                print(f"DEBUG: Renaming folder from {old_key} to {new_key}")
-                
-                # Rename all assets in the folder
-                child_assets = UserAsset.objects.filter(
-                    user=request.user, 
-                    key__startswith=folder_prefix
-                ).exclude(id=asset_id)
-                
-                print(f"DEBUG: Found {child_assets.count()} child assets to update")
-                
-                for child in child_assets:
-                    child_new_key = child.key.replace(folder_prefix, new_key, 1)
-                    print(f"DEBUG: Renaming child {child.key} to {child_new_key}")
-                    
-                    # Update S3
-                    success = rename_in_s3(child.key, child_new_key)
-                    print(f"DEBUG: S3 rename result for child: {success}")
-                    
-                    # Update the child's key and parent folder
-                    child.key = child_new_key
-                    child.parent_folder = os.path.dirname(child_new_key.rstrip('/'))
-                    child.save()
-                    print(f"DEBUG: Updated child in database: {child.key}, parent_folder={child.parent_folder}")
-                
-                # Update folder itself
-                success = rename_in_s3(old_key, new_key)
-                print(f"DEBUG: S3 rename result for folder: {success}")
-                
-                asset.key = new_key
-                asset.filename = new_name
-                asset.save()
-                print(f"DEBUG: Updated folder in database: {asset.key}, filename={asset.filename}")
-                
-            else:
-                # For files, rename just the file
-                parent_path = os.path.dirname(old_key)
-                new_key = parent_path + '/' + new_name if parent_path else new_name
-                
-                print(f"DEBUG: Renaming file from {old_key} to {new_key}")
-                
-                # Update S3
-                success = rename_in_s3(old_key, new_key)
-                print(f"DEBUG: S3 rename result for file: {success}")
-                
-                # Update database
-                asset.key = new_key
-                asset.filename = new_name
-                asset.save()
-                print(f"DEBUG: Updated file in database: {asset.key}, filename={asset.filename}")
-        
+            # For files, rename just the file
+            parent_path = os.path.dirname(old_key)
+            new_key = parent_path + '/' + new_name if parent_path else new_name
+            
+            print(f"DEBUG: Renaming file from {old_key} to {new_key}")
+            
+            # Update S3
+            success = rename_in_s3(old_key, new_key)
+            print(f"DEBUG: S3 rename result for file: {success}")
+            
+            # Update database
+            asset.key = new_key
+            asset.filename = new_name
+            asset.save()
+            print(f"DEBUG: Updated file in database: {asset.key}, filename={asset.filename}")
+    
         success_message = f"Successfully renamed {old_filename} to {new_name}"
         print(f"DEBUG: {success_message}")
         
@@ -2072,72 +2001,103 @@ def terms_and_condition(request):
     return render(request, "terms/terms-and-conditions.html")
 
 
-from django.http import HttpResponse, Http404
+from django.http import HttpResponse, Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-import requests
+from django.db.models import F
+from asgiref.sync import sync_to_async
+import httpx
 import traceback
+from apps.core.decorators import async_login_required
+from apps.processors.services.async_http import get_async_http_client
 
-@login_required(login_url='login')
-def proxy_video_download(request, video_id):
+
+def _video_download_source(user, video_id):
+    """
+    Database and signing work of proxy_video_download.
+
+    Returns:
+        Optional[tuple]: (video, subscription, signed URL), or None when the
+        user's plan doesn't include downloads
+    """
+    video = get_object_or_404(Video, id=video_id, user=user)
+    print(f"Video found: {video}")
+    user_subscription = Subscription.objects.select_related('plan').filter(user=user).first()
+    if 'free' in user_subscription.plan.name.lower():
+        print("You need to upgrade to download videos.")
+        return None
+    
+    # Check if video has output file
+    if not video.output_with_bg:
+        print(f"No output_with_bg for video {video_id}")
+        if video.output:
+            print(f"Using fallback video.output for video {video_id}")
+            output_file = video.output
+        else:
+            print(f"No output file at all for video {video_id}")
+            raise Http404("No video file available for download")
+    else:
+        output_file = video.output_with_bg
+        print(f"Using output_with_bg: {output_file.name}")
+    
+    if not output_file.name:
+        print(f"Output file has no name for video {video_id}")
+        raise Http404("Video file name is missing")
+    
+    # Generate signed URL
+    print(f"Generating signed URL for: {output_file.name}")
+    if BackgroundMusic.objects.filter(video=video).exists():
+        print("Using signed URL for upload")
+        video_url = generate_signed_url_for_upload(output_file.name, expires_in=7200)
+    else:
+        print("Using regular signed URL")
+        video_url = generate_signed_url(output_file.name, expires_in=7200)
+    
+    print(f"Generated video URL: {video_url}")
+    
+    if not video_url:
+        print("Failed to generate signed URL")
+        raise Http404("Could not generate download URL")
+    return video, user_subscription, video_url
+
+
+@async_login_required(login_url='login')
+async def proxy_video_download(request, video_id):
     """
-    Proxy download view that ensures proper headers for all browsers
+    Proxy download view that ensures proper headers for all browsers.
+    The file is streamed from S3 on the shared AsyncClient, so a slow
+    download doesn't hold a worker thread.
     """
     try:
         # Debug: Print basic info
         print(f"Attempting to download video {video_id} for user {request.user}")
         
-        video = get_object_or_404(Video, id=video_id, user=request.user)
-        print(f"Video found: {video}")
-        user_subscription = Subscription.objects.filter(user=request.user).first()
-        if 'free' in user_subscription.plan.name.lower():
-            print(request, "You need to upgrade to download videos.")
+        source = await sync_to_async(_video_download_source)(request.user, video_id)
+        if source is None:
             return redirect('download_video', video_id=video_id)
-        
-        # Check if video has output file
-        if not video.output_with_bg:
-            print(f"No output_with_bg for video {video_id}")
-            if video.output:
-                print(f"Using fallback video.output for video {video_id}")
-                output_file = video.output
-            else:
-                print(f"No output file at all for video {video_id}")
-                raise Http404("No video file available for download")
-        else:
-            output_file = video.output_with_bg
-            print(f"Using output_with_bg: {output_file.name}")
-        
-        if not output_file.name:
-            print(f"Output file has no name for video {video_id}")
-            raise Http404("Video file name is missing")
-        
-        # Generate signed URL
-        print(f"Generating signed URL for: {output_file.name}")
-        if BackgroundMusic.objects.filter(video=video).exists():
-            print("Using signed URL for upload")
-            video_url = generate_signed_url_for_upload(output_file.name, expires_in=7200)
-        else:
-            print("Using regular signed URL")
-            video_url = generate_signed_url(output_file.name, expires_in=7200)
-        
-        print(f"Generated video URL: {video_url}")
-        
-        if not video_url:
-            print("Failed to generate signed URL")
-            raise Http404("Could not generate download URL")
+        video, user_subscription, video_url = source
         
         # Fetch the video file
         print("Fetching video file...")
-        response = requests.get(video_url, stream=True, timeout=30)
+        client = get_async_http_client()
+        response = await client.send(client.build_request("GET", video_url, timeout=30), stream=True)
         print(f"Response status: {response.status_code}")
         print(f"Response headers: {dict(response.headers)}")
         
-        response.raise_for_status()
+        try:
+            response.raise_for_status()
+        except httpx.HTTPStatusError:
+            await response.aclose()
+            raise
+        
+        async def stream_video():
+            try:
+                async for chunk in response.aiter_bytes(chunk_size=64 * 1024):
+                    yield chunk
+            finally:
+                await response.aclose()
         
         # Create Django response with proper headers
-        django_response = HttpResponse(
-            response.iter_content(chunk_size=8192),
-            content_type='video/mp4'
-        )
+        django_response = StreamingHttpResponse(stream_video(), content_type='video/mp4')
         
         # Force download with proper filename
         filename = f"video_{video.id}.mp4"
@@ -2145,8 +2105,7 @@ def proxy_video_download(request, video_id):
         
         # Set content length if available
         content_length = response.headers.get('Content-Length')
-        user_subscription.unused_credits -= 1
-        user_subscription.save()
+        await Subscription.objects.filter(pk=user_subscription.pk).aupdate(unused_credits=F('unused_credits') - 1)
         if content_length:
             django_response['Content-Length'] = content_length
         
@@ -2161,7 +2120,7 @@ def proxy_video_download(request, video_id):
     except Video.DoesNotExist:
         print(f"Video {video_id} not found for user {request.user}")
         raise Http404("Video not found")
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         print(f"Request error for video {video_id}: {str(e)}")
         traceback.print_exc()
         raise Http404("Failed to fetch video file")
@@ -2281,7 +2240,8 @@ def upload_to_folder(request):
                         file_size=file.size,
                         content_type=content_type or '',
                         is_folder=False,
-                        parent_folder=target_folder.rstrip('/')
+                        parent_folder=target_folder.rstrip('/'),
+                        expires_at=asset_expires_at()
                     )
                     uploaded_count += 1
                 else:
@@ -2305,4 +2265,172 @@ def upload_to_folder(request):
         messages.error(request, f'Error uploading files: {str(e)}')
         logger.error(f"Upload to folder error: {str(e)}")
     
-    return redirect('asset_library')
\ No newline at end of file
+    return redirect('asset_library')
+
+
+# Direct browser-to-S3 uploads: the file never passes through a web worker.
+# The browser starts a session, PUTs each part to its presigned URL and
+# reports the part ETags on completion, which creates the database rows.
+
+def _direct_upload_json(request):
+    """JSON body of a direct upload request, or an error response"""
+    if request.method != 'POST':
+        return None, JsonResponse({'success': False, 'error': 'Method not allowed'}, status=405)
+    try:
+        return json.loads(request.body), None
+    except json.JSONDecodeError:
+        return None, JsonResponse({'success': False, 'error': 'Invalid JSON data'}, status=400)
+
+
+@login_required(login_url='login')
+def direct_upload_start(request):
+    """Open a multipart upload for an asset-library file, a subclip or a ZIP to extract"""
+    from apps.core.services.direct_upload import DirectUploadError, part_urls, start_upload
+
+    data, error = _direct_upload_json(request)
+    if error:
+        return error
+    try:
+        session = start_upload(
+            request.user,
+            data.get('purpose'),
+            data.get('filename'),
+            data.get('size'),
+            content_type=data.get('content_type'),
+            target_folder=data.get('target_folder'),
+            parent_folder=data.get('parent_folder'),
+            clip_id=data.get('clip_id'),
+            text=data.get('text'),
+        )
+        # URLs for the first parts come with the session; the rest are requested in batches
+        first_parts = list(range(1, min(session['part_count'], 20) + 1))
+        return JsonResponse({
+            'success': True,
+            'upload_id': session['upload_id'],
+            'key': session['key'],
+            'part_size': session['part_size'],
+            'part_count': session['part_count'],
+            'urls': part_urls(session, first_parts),
+        })
+    except DirectUploadError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    except Exception as e:
+        logger.error(f"Direct upload start error: {str(e)}")
+        return JsonResponse({'success': False, 'error': str(e)}, status=500)
+
+
+@login_required(login_url='login')
+def direct_upload_parts(request):
+    """Presigned URLs for more parts of an open upload"""
+    from apps.core.services.direct_upload import DirectUploadError, get_session, part_urls
+
+    data, error = _direct_upload_json(request)
+    if error:
+        return error
+    try:
+        session = get_session(data.get('upload_id'), request.user)
+        return JsonResponse({'success': True, 'urls': part_urls(session, data.get('part_numbers') or [])})
+    except DirectUploadError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    except Exception as e:
+        logger.error(f"Direct upload parts error: {str(e)}")
+        return JsonResponse({'success': False, 'error': str(e)}, status=500)
+
+
+@login_required(login_url='login')
+def direct_upload_complete(request):
+    """Assemble the parts and create the UserAsset/Subclip row for the upload"""
+    from apps.core.services.direct_upload import DirectUploadError, complete_upload, get_session
+
+    data, error = _direct_upload_json(request)
+    if error:
+        return error
+    try:
+        session = get_session(data.get('upload_id'), request.user)
+        result = complete_upload(session, data.get('parts') or [])
+        return JsonResponse({'success': True, **result})
+    except DirectUploadError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    except Exception as e:
+        logger.error(f"Direct upload complete error: {str(e)}")
+        return JsonResponse({'success': False, 'error': str(e)}, status=500)
+
+
+def _asset_tree_etag(request):
+    from apps.core.services.asset_tree import folder_etag
+
+    if not request.user.is_authenticated:
+        return None
+    return folder_etag(
+        request.user.id,
+        request.GET.get('folder'),
+        request.GET.get('page', 1),
+        request.GET.get('page_size'),
+    )
+
+
+@login_required(login_url='login')
+@require_GET
+@condition(etag_func=_asset_tree_etag)
+def asset_tree_api(request):
+    """
+    One folder level of the asset library as JSON, paginated.
+    
+    Query params: folder (key, the user's root by default), page, page_size.
+    Responses carry an ETag that changes with the user's assets, so
+    unchanged folders are answered with 304 Not Modified.
+    """
+    from apps.core.services.asset_tree import AssetTreeError, DEFAULT_PAGE_SIZE, list_folder
+
+    try:
+        page = int(request.GET.get('page', 1))
+        page_size = int(request.GET.get('page_size') or DEFAULT_PAGE_SIZE)
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Invalid page'}, status=400)
+    try:
+        payload = list_folder(request.user.id, request.GET.get('folder'), page, page_size)
+    except AssetTreeError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=404)
+    response = JsonResponse({'success': True, **payload})
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+@login_required(login_url='login')
+def asset_move_status(request, job_id):
+    """State of a folder move job; POST resumes a failed one"""
+    from apps.core.services.asset_move import get_move_job, resume_folder_move
+
+    if request.method == 'POST':
+        job = resume_folder_move(job_id, request.user)
+    else:
+        job = get_move_job(job_id, request.user)
+    if job is None:
+        return JsonResponse({'success': False, 'error': 'Job not found'}, status=404)
+    return JsonResponse({'success': True, **job})
+
+
+@login_required(login_url='login')
+def zip_ingest_status(request, job_id):
+    """Progress of a ZIP ingest job started from the asset library"""
+    from apps.core.services.zip_ingest import get_ingest_progress
+
+    progress = get_ingest_progress(job_id, request.user)
+    if progress is None:
+        return JsonResponse({'success': False, 'error': 'Job not found'}, status=404)
+    return JsonResponse({'success': True, 'job_id': job_id, **progress})
+
+
+@login_required(login_url='login')
+def direct_upload_abort(request):
+    """Cancel an upload and discard its parts"""
+    from apps.core.services.direct_upload import DirectUploadError, abort_upload, get_session
+
+    data, error = _direct_upload_json(request)
+    if error:
+        return error
+    try:
+        abort_upload(get_session(data.get('upload_id'), request.user))
+        return JsonResponse({'success': True})
+    except DirectUploadError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
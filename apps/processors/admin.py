@@ -4,7 +4,7 @@ from .models import Video, Clips, Subclip, BackgroundMusic, ProcessingStatus
 from django.contrib import messages
 from .utils import generate_final_video, generate_audio_file, generate_srt_file, generate_clips_from_srt, generate_signed_url
 import json
-from .models import VideoLogs
+from .models import VideoLogs, AlignmentCache
 from django.utils.html import format_html
 import requests
 
@@ -172,4 +172,12 @@ class VideoLogsAdmin(admin.ModelAdmin):
                     return "Could not fetch log file"
             return "No log file available"
         except Exception as e:
-            return f"Error reading log file: {str(e)}"
\ No newline at end of file
+            return f"Error reading log file: {str(e)}"
+
+
+@admin.register(AlignmentCache)
+class AlignmentCacheAdmin(admin.ModelAdmin):
+    list_display = ('id', 'engine', 'word_count', 'hits', 'created_at', 'last_used_at')
+    list_filter = ('engine',)
+    search_fields = ('audio_hash', 'words_hash')
+    readonly_fields = ('audio_hash', 'words_hash', 'engine', 'fragments', 'word_count', 'hits', 'created_at', 'last_used_at')
@@ -1,15 +1,196 @@
 import os
-import requests
+import httpx
 import json
-from typing import Dict, Any, Optional, Tuple
+import asyncio
+import hashlib
+import threading
+from typing import Dict, Any, Optional, Tuple, BinaryIO
 import time
 
+from django.conf import settings
+from django.core.cache import cache
+
+from apps.processors.services.api_limiter import ApiLimiter, retry_after_seconds
+from apps.processors.services.async_http import get_async_http_client
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def get_http_client() -> httpx.Client:
+    """
+    Keep-alive client shared by every handler in this process, so repeated
+    calls reuse TCP/TLS connections. Recreated after a fork (Celery prefork
+    workers) because pooled sockets must not be shared between processes.
+    """
+    global _client, _client_pid
+    with _client_lock:
+        if _client is None or _client_pid != os.getpid():
+            _client = httpx.Client(
+                timeout=httpx.Timeout(120.0, connect=10.0),
+                limits=httpx.Limits(max_connections=50, max_keepalive_connections=20, keepalive_expiry=60),
+            )
+            _client_pid = os.getpid()
+        return _client
+
+
 class ElevenLabsHandler:
-    def __init__(self, api_key: str, voice_id: str = "21m00Tcm4TlvDq8ikWAM"):
+    DEFAULT_MODEL_ID = "eleven_multilingual_v2"
+    STREAM_CHUNK_SIZE = 64 * 1024
+    DEFAULT_VOICE_SETTINGS = {
+        "stability": 0.84,
+        "similarity_boost": 1,
+        "style": 0.0,
+        "use_speaker_boost": True,
+        "speed": 1.1,
+    }
+
+    def __init__(self, api_key: str, voice_id: str = "21m00Tcm4TlvDq8ikWAM", verify: bool = True):
         self.api_key = api_key
         self.voice_id = voice_id
         self.base_url = "https://api.elevenlabs.io/v1"
-        self._verify_api_key()
+        self.limiter = ApiLimiter("elevenlabs", api_key)
+        self.key_hash = hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:16]
+        if verify:
+            self._verify_api_key()
+    
+    @classmethod
+    async def acreate(cls, api_key: str, voice_id: str = "21m00Tcm4TlvDq8ikWAM") -> "ElevenLabsHandler":
+        """Build a handler from an async view, verifying the API key without blocking the event loop"""
+        handler = cls(api_key, voice_id, verify=False)
+        await handler._averify_api_key()
+        return handler
+        
+    def _cache_key(self, name: str, versioned: bool = True) -> str:
+        """Cache key for this API key; versioned entries are dropped by invalidate_account_cache"""
+        prefix = f"elevenlabs:{self.key_hash}"
+        if not versioned:
+            return f"{prefix}:{name}"
+        version = cache.get(f"{prefix}:version") or 0
+        return f"{prefix}:v{version}:{name}"
+    
+    def _cached(self, name: str, ttl: int, fetch, versioned: bool = True):
+        """Return a cached API result, calling ``fetch`` on a miss. Errors aren't cached."""
+        key = self._cache_key(name, versioned)
+        try:
+            value = cache.get(key)
+        except Exception:
+            value = None
+        if value is not None:
+            return value
+        value = fetch()
+        try:
+            cache.set(key, value, ttl)
+        except Exception as e:
+            print(f"Could not cache ElevenLabs {name}: {e}")
+        return value
+    
+    async def _acached(self, name: str, ttl: int, fetch, versioned: bool = True):
+        """_cached for async callers; ``fetch`` is a coroutine function"""
+        prefix = f"elevenlabs:{self.key_hash}"
+        if versioned:
+            version = await cache.aget(f"{prefix}:version") or 0
+            key = f"{prefix}:v{version}:{name}"
+        else:
+            key = f"{prefix}:{name}"
+        try:
+            value = await cache.aget(key)
+        except Exception:
+            value = None
+        if value is not None:
+            return value
+        value = await fetch()
+        try:
+            await cache.aset(key, value, ttl)
+        except Exception as e:
+            print(f"Could not cache ElevenLabs {name}: {e}")
+        return value
+    
+    def invalidate_account_cache(self):
+        """Forget cached credits and history after a generation changed them"""
+        key = f"elevenlabs:{self.key_hash}:version"
+        try:
+            if not cache.add(key, 1, None):
+                cache.incr(key)
+        except Exception as e:
+            print(f"Could not invalidate ElevenLabs cache: {e}")
+        
+    def _request(self, method: str, endpoint: str, url: str, max_attempts: int = 3, **kwargs):
+        """
+        Send a request through the shared rate limiter.
+        
+        A 429 pauses the shared budget for every worker using this key and is
+        retried once a token is free; 5xx responses and connection errors count
+        towards the circuit breaker and are retried with jittered backoff. The
+        last response is returned as-is so callers keep their error handling.
+        """
+        stream = kwargs.pop("stream", False)
+        client = get_http_client()
+        for attempt in range(max_attempts):
+            self.limiter.acquire(endpoint)
+            try:
+                response = client.send(client.build_request(method, url, **kwargs), stream=stream)
+            except httpx.TransportError:
+                self.limiter.record_failure(endpoint)
+                if attempt == max_attempts - 1:
+                    raise
+                time.sleep(self.limiter.backoff(attempt))
+                continue
+            
+            if attempt == max_attempts - 1:
+                break
+            if response.status_code == 429:
+                self.limiter.throttled(endpoint, retry_after_seconds(response))
+                response.close()
+                continue
+            if response.status_code >= 500:
+                self.limiter.record_failure(endpoint)
+                response.close()
+                time.sleep(self.limiter.backoff(attempt))
+                continue
+            break
+        
+        if response.status_code < 500 and response.status_code != 429:
+            self.limiter.record_success()
+        if stream and response.status_code != 200:
+            # Error bodies are small; read them so callers can use response.text
+            response.read()
+            response.close()
+        return response
+    
+    async def _arequest(self, method: str, endpoint: str, url: str, max_attempts: int = 3, **kwargs):
+        """
+        _request for async views, sent on the shared AsyncClient. Throttling
+        and backoff sleep on the event loop instead of holding a thread.
+        Responses are read in full; streaming downloads stay on _request.
+        """
+        client = get_async_http_client()
+        for attempt in range(max_attempts):
+            await self.limiter.aacquire(endpoint)
+            try:
+                response = await client.request(method, url, **kwargs)
+            except httpx.TransportError:
+                await self.limiter.arecord_failure(endpoint)
+                if attempt == max_attempts - 1:
+                    raise
+                await asyncio.sleep(self.limiter.backoff(attempt))
+                continue
+            
+            if attempt == max_attempts - 1:
+                break
+            if response.status_code == 429:
+                await self.limiter.athrottled(endpoint, retry_after_seconds(response))
+                continue
+            if response.status_code >= 500:
+                await self.limiter.arecord_failure(endpoint)
+                await asyncio.sleep(self.limiter.backoff(attempt))
+                continue
+            break
+        
+        if response.status_code < 500 and response.status_code != 429:
+            await self.limiter.arecord_success()
+        return response
         
     def _verify_voice_id(self) -> bool:
         """Verify if the voice ID is valid by directly checking with the API"""
@@ -20,7 +201,7 @@ class ElevenLabsHandler:
         
         url = f"{self.base_url}/voices/{self.voice_id}"
         
-        response = requests.get(url, headers=headers)
+        response = self._request("GET", "account", url, headers=headers)
         
         if response.status_code == 200:
             return True
@@ -41,6 +222,51 @@ class ElevenLabsHandler:
         except Exception as e:
             raise ValueError(f"Invalid Elevenlabs Api Key")
     
+    async def _averify_api_key(self) -> bool:
+        try:
+            await self.aget_user_info()
+            return True
+        except Exception as e:
+            raise ValueError(f"Invalid Elevenlabs Api Key")
+    
+    def _account_headers(self) -> Dict:
+        return {
+            "Accept": "application/json",
+            "xi-api-key": self.api_key
+        }
+    
+    @staticmethod
+    def _user_info_result(response) -> Dict:
+        if response.status_code == 200:
+            return response.json()
+        else:
+            raise Exception(f"Error getting user info: {response.text}")
+    
+    @staticmethod
+    def _voices_result(response) -> Dict:
+        if response.status_code == 200:
+            return response.json()
+        else:
+            raise Exception(f"Error getting voices: {response.text}")
+    
+    @staticmethod
+    def _history_result(response, voice_id: Optional[str] = None) -> Dict:
+        if response.status_code == 200:
+            return response.json()
+        else:
+            error_msg = response.text
+            if response.status_code == 401:
+                raise Exception("Invalid ElevenLabs API key")
+            elif response.status_code == 404 and voice_id is not None:
+                raise Exception(f"Voice ID {voice_id} not found in history")
+            else:
+                raise Exception(f"Error getting history: {error_msg}")
+    
+    def _history_url(self, voice_id: Optional[str] = None) -> str:
+        if voice_id is None:
+            return f"{self.base_url}/history?page_size=20&source=TTS"
+        return f"{self.base_url}/history?voice_id={voice_id}"
+    
     def get_user_info(self) -> Dict:
         """Get user information including subscription and remaining credits"""
         headers = {
@@ -50,12 +276,18 @@ class ElevenLabsHandler:
         
         url = f"{self.base_url}/user"
         
-        response = requests.get(url, headers=headers)
+        def fetch():
+            return self._user_info_result(self._request("GET", "account", url, headers=headers))
         
-        if response.status_code == 200:
-            return response.json()
-        else:
-            raise Exception(f"Error getting user info: {response.text}")
+        return self._cached("user", getattr(settings, "ELEVENLABS_USER_CACHE_TTL", 60), fetch)
+    
+    async def aget_user_info(self) -> Dict:
+        """get_user_info for async views"""
+        async def fetch():
+            response = await self._arequest("GET", "account", f"{self.base_url}/user", headers=self._account_headers())
+            return self._user_info_result(response)
+        
+        return await self._acached("user", getattr(settings, "ELEVENLABS_USER_CACHE_TTL", 60), fetch)
     
     def get_remaining_credits(self) -> Tuple[int, int]:
         """Get remaining character credits and total character quota"""
@@ -67,8 +299,16 @@ class ElevenLabsHandler:
     
     def has_sufficient_credits(self, text_length: int) -> bool:
         """Check if there are sufficient credits for the given text length"""
-        remaining, _ = self.get_remaining_credits()
-        print(self.get_remaining_credits())
+        remaining, used = self.get_remaining_credits()
+        print((remaining, used))
+        print(f"Remaining credits: {remaining}")
+        print(f"Text length: {text_length}")
+        return remaining >= (text_length*2.5)
+    
+    async def ahas_sufficient_credits(self, text_length: int) -> bool:
+        """has_sufficient_credits for async views"""
+        subscription = (await self.aget_user_info()).get("subscription", {})
+        remaining = subscription.get("character_limit", 0)
         print(f"Remaining credits: {remaining}")
         print(f"Text length: {text_length}")
         return remaining >= (text_length*2.5)
@@ -76,21 +316,22 @@ class ElevenLabsHandler:
     def generate_voiceover(self, 
                           text: str, 
                           output_path: str, 
-                          voice_settings: Optional[Dict[str, Any]] = None) -> str:
-        """Generate voiceover using ElevenLabs API"""
+                          voice_settings: Optional[Dict[str, Any]] = None,
+                          model_id: Optional[str] = None,
+                          check_credits: bool = True,
+                          sink: Optional[BinaryIO] = None) -> str:
+        """
+        Generate voiceover using ElevenLabs API. Audio is written to
+        ``output_path`` as it streams in and, if given, copied to ``sink``
+        (e.g. an S3MultipartWriter) at the same time.
+        """
         
-        # Check for sufficient credits
-        if not self.has_sufficient_credits(len(text)):
+        # Check for sufficient credits (callers synthesizing many segments check once up front)
+        if check_credits and not self.has_sufficient_credits(len(text)):
             raise Exception("Insufficient credits to generate voiceover")
         
         if voice_settings is None:
-            voice_settings = {
-                "stability": 0.84,
-                "similarity_boost": 1,
-                "style": 0.0,
-                "use_speaker_boost": True,
-                "speed": 1.1,
-            }
+            voice_settings = dict(self.DEFAULT_VOICE_SETTINGS)
             
         headers = {
             "Accept": "audio/mpeg",
@@ -100,17 +341,18 @@ class ElevenLabsHandler:
         
         data = {
             "text": text,
-            "model_id": "eleven_multilingual_v2",
+            "model_id": model_id or self.DEFAULT_MODEL_ID,
             "voice_settings": voice_settings
         }
         
         url = f"{self.base_url}/text-to-speech/{self.voice_id}/stream"
         
-        response = requests.post(url, json=data, headers=headers)
+        response = self._request("POST", "tts", url, json=data, headers=headers, stream=True)
         
         if response.status_code == 200:
-            with open(output_path, "wb") as f:
-                f.write(response.content)
+            self._stream_to_file(response, output_path, sink)
+            # Credits and history changed
+            self.invalidate_account_cache()
             return output_path
         else:
             error_msg = response.text
@@ -124,6 +366,20 @@ class ElevenLabsHandler:
             else:
                 raise Exception(f"Error generating voiceover: {response.text}")
                     
+    def _stream_to_file(self, response, output_path: str, sink: Optional[BinaryIO] = None) -> str:
+        """Write a streamed audio response to disk chunk by chunk, teeing to ``sink``"""
+        try:
+            with open(output_path, "wb") as f:
+                for chunk in response.iter_bytes(chunk_size=self.STREAM_CHUNK_SIZE):
+                    if not chunk:
+                        continue
+                    f.write(chunk)
+                    if sink is not None:
+                        sink.write(chunk)
+        finally:
+            response.close()
+        return output_path
+
     def get_available_voices(self) -> Dict:
         """Get list of available voices from ElevenLabs"""
         headers = {
@@ -133,12 +389,21 @@ class ElevenLabsHandler:
         
         url = f"{self.base_url}/voices"
         
-        response = requests.get(url, headers=headers)
+        def fetch():
+            return self._voices_result(self._request("GET", "account", url, headers=headers))
         
-        if response.status_code == 200:
-            return response.json()
-        else:
-            raise Exception(f"Error getting voices: {response.text}")
+        # The voice library doesn't change with generations
+        return self._cached("voices", getattr(settings, "ELEVENLABS_VOICES_CACHE_TTL", 600), fetch, versioned=False)
+    
+    async def aget_available_voices(self) -> Dict:
+        """get_available_voices for async views"""
+        async def fetch():
+            response = await self._arequest("GET", "account", f"{self.base_url}/voices", headers=self._account_headers())
+            return self._voices_result(response)
+        
+        return await self._acached(
+            "voices", getattr(settings, "ELEVENLABS_VOICES_CACHE_TTL", 600), fetch, versioned=False
+        )
 
 
     def get_history(self, voice_id: Optional[str] = None) -> Dict:
@@ -147,21 +412,23 @@ class ElevenLabsHandler:
             "Accept": "application/json",
             "xi-api-key": self.api_key
         }
-        url = f"{self.base_url}/history?voice_id={voice_id}"
-        if voice_id is None:
-            url = f"{self.base_url}/history?page_size=20&source=TTS"
+        url = self._history_url(voice_id)
         print(f"Requesting history for voice ID: {voice_id}")
-        response = requests.get(url, headers=headers)
-        if response.status_code == 200:
-            return response.json()
-        else:
-            error_msg = response.text
-            if response.status_code == 401:
-                raise Exception("Invalid ElevenLabs API key")
-            elif response.status_code == 404:
-                raise Exception(f"Voice ID {voice_id} not found in history")
-            else:
-                raise Exception(f"Error getting history: {error_msg}")
+        
+        def fetch():
+            return self._history_result(self._request("GET", "account", url, headers=headers), voice_id)
+        
+        return self._cached(f"history:{voice_id}", getattr(settings, "ELEVENLABS_HISTORY_CACHE_TTL", 60), fetch)
+    
+    async def aget_history(self, voice_id: Optional[str] = None) -> Dict:
+        """get_history for async views"""
+        print(f"Requesting history for voice ID: {voice_id}")
+        
+        async def fetch():
+            response = await self._arequest("GET", "account", self._history_url(voice_id), headers=self._account_headers())
+            return self._history_result(response, voice_id)
+        
+        return await self._acached(f"history:{voice_id}", getattr(settings, "ELEVENLABS_HISTORY_CACHE_TTL", 60), fetch)
 
     def get_history_by_id(self, history_id) -> Dict:
         """Get history of generated voiceovers"""
@@ -171,20 +438,31 @@ class ElevenLabsHandler:
         }
 
         url = f"{self.base_url}/history/{history_id}"
-        response = requests.get(url, headers=headers)
 
-        if response.status_code == 200:
-            return response.json()
-        else:
-            error_msg = response.text
-            if response.status_code == 401:
-                raise Exception("Invalid ElevenLabs API key")
-            else:
-                raise Exception(f"Error getting history: {error_msg}")
+        def fetch():
+            return self._history_result(self._request("GET", "account", url, headers=headers))
+
+        # A history item never changes once generated
+        return self._cached(
+            f"history_item:{history_id}", getattr(settings, "ELEVENLABS_HISTORY_CACHE_TTL", 60) * 10, fetch, versioned=False
+        )
+
+    async def aget_history_by_id(self, history_id) -> Dict:
+        """get_history_by_id for async views"""
+        async def fetch():
+            response = await self._arequest(
+                "GET", "account", f"{self.base_url}/history/{history_id}", headers=self._account_headers()
+            )
+            return self._history_result(response)
+
+        return await self._acached(
+            f"history_item:{history_id}", getattr(settings, "ELEVENLABS_HISTORY_CACHE_TTL", 60) * 10, fetch, versioned=False
+        )
 
     
-    def get_history_audio(self, history_id: str, output_path: str) -> str:
-        """Download audio from a specific history entry"""
+    def get_history_audio(self, history_id: str, output_path: str,
+                          sink: Optional[BinaryIO] = None) -> str:
+        """Download audio from a specific history entry, streaming it like generate_voiceover"""
         print(f"Downloading audio for history ID: {history_id}")
         headers = {
             "Accept": "audio/mpeg",
@@ -193,12 +471,10 @@ class ElevenLabsHandler:
         
         url = f"{self.base_url}/history/{history_id}/audio"
         
-        response = requests.get(url, headers=headers)
+        response = self._request("GET", "account", url, headers=headers, stream=True)
         
         if response.status_code == 200:
-            with open(output_path, "wb") as f:
-                f.write(response.content)
-            return output_path
+            return self._stream_to_file(response, output_path, sink)
         else:
             error_msg = response.text
             if response.status_code == 401:
@@ -1,8 +1,33 @@
 import os
 import json
+import time
+import asyncio
+import hashlib
 import urllib.parse
-from typing import List, Dict, Any, Tuple
-from openai import OpenAI
+from typing import List, Dict, Any, Tuple, Optional
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from openai import AsyncOpenAI, OpenAI, APIConnectionError, APIStatusError, APITimeoutError, RateLimitError
+
+from apps.processors.services.api_limiter import ApiLimiter, retry_after_seconds
+from apps.processors.services.async_http import get_async_http_client
+
+SCENE_SYSTEM_PROMPT = "You are a professional video producer who specializes in creating compelling video advertisements."
+SCENE_CACHE_PREFIX = "scene_suggestions"
+# How many highlights go into one completion; larger scripts take several calls
+SCENE_BATCH_SIZE = 15
+SCENE_TOKENS_PER_PHRASE = 300
+
+
+def normalize_phrase(phrase: Optional[str]) -> str:
+    """Lowercase ``phrase`` and collapse its whitespace, so trivially different highlights share a cache entry"""
+    return " ".join((phrase or "").lower().split())
+
+
+def _phrase_key(normalized: str, kind: str = "result") -> str:
+    digest = hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+    return f"{SCENE_CACHE_PREFIX}:{kind}:{digest}"
 
 
 class OpenAIHandler:
@@ -23,7 +48,77 @@ class OpenAIHandler:
         if not self.api_key:
             raise ValueError("OpenAI API key is required. Provide it directly or set OPENAI_API_KEY environment variable.")
             
-        self.client = OpenAI(api_key=self.api_key)
+        # Retries are driven by the shared limiter instead of the client's own sleeps
+        self.client = OpenAI(api_key=self.api_key, max_retries=0)
+        self.limiter = ApiLimiter("openai", self.api_key)
+        self._async_client = None
+
+    @property
+    def async_client(self) -> AsyncOpenAI:
+        """AsyncOpenAI client on the worker's shared AsyncClient; only usable inside the event loop"""
+        if self._async_client is None:
+            self._async_client = AsyncOpenAI(
+                api_key=self.api_key, max_retries=0, http_client=get_async_http_client()
+            )
+        return self._async_client
+
+    def _create_completion(self, max_attempts: int = 3, **kwargs):
+        """
+        Create a chat completion through the shared rate limiter. A 429 pauses
+        every caller on this key; timeouts and 5xx count towards the circuit
+        breaker and are retried with jittered backoff.
+        """
+        for attempt in range(max_attempts):
+            self.limiter.acquire("chat")
+            try:
+                response = self.client.chat.completions.create(**kwargs)
+            except RateLimitError as e:
+                self.limiter.throttled("chat", retry_after_seconds(e.response))
+                if attempt == max_attempts - 1:
+                    raise
+                continue
+            except (APIConnectionError, APITimeoutError):
+                self.limiter.record_failure("chat")
+                if attempt == max_attempts - 1:
+                    raise
+                time.sleep(self.limiter.backoff(attempt))
+                continue
+            except APIStatusError as e:
+                if e.status_code >= 500:
+                    self.limiter.record_failure("chat")
+                if e.status_code < 500 or attempt == max_attempts - 1:
+                    raise
+                time.sleep(self.limiter.backoff(attempt))
+                continue
+            self.limiter.record_success()
+            return response
+
+    async def _acreate_completion(self, max_attempts: int = 3, **kwargs):
+        """_create_completion for async views; waits sleep on the event loop"""
+        for attempt in range(max_attempts):
+            await self.limiter.aacquire("chat")
+            try:
+                response = await self.async_client.chat.completions.create(**kwargs)
+            except RateLimitError as e:
+                await self.limiter.athrottled("chat", retry_after_seconds(e.response))
+                if attempt == max_attempts - 1:
+                    raise
+                continue
+            except (APIConnectionError, APITimeoutError):
+                await self.limiter.arecord_failure("chat")
+                if attempt == max_attempts - 1:
+                    raise
+                await asyncio.sleep(self.limiter.backoff(attempt))
+                continue
+            except APIStatusError as e:
+                if e.status_code >= 500:
+                    await self.limiter.arecord_failure("chat")
+                if e.status_code < 500 or attempt == max_attempts - 1:
+                    raise
+                await asyncio.sleep(self.limiter.backoff(attempt))
+                continue
+            await self.limiter.arecord_success()
+            return response
 
     def generate_scene_suggestions(self, words: str) -> Dict[str, Any]:
         """
@@ -35,106 +130,296 @@ class OpenAIHandler:
         Returns:
             Dict: Contains scene suggestions and search URLs.
         """
-        try:
-            # Create a chat completion using the new OpenAI client format
-            response = self.client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": "You are a professional video producer who specializes in creating compelling video advertisements."},
-                    {"role": "user", "content": self._build_prompt(words)}
-                ],
-                temperature=0.7,
-                max_tokens=1000
-            )
-            
-            # Extract suggestions from the response
-            response_content = response.choices[0].message.content
-            scene_suggestions = self._parse_scene_suggestions(response_content)
-            
-            # Generate search URLs for each suggestion
-            for suggestion in scene_suggestions["suggestions"]:
-                search_term = suggestion["search_term"]
-                encoded_term = urllib.parse.quote(search_term)
-                
-                suggestion["pexels_url"] = f"https://www.pexels.com/search/videos/{encoded_term}/"
-                suggestion["storyblocks_url"] = f"https://www.storyblocks.com/all-video/search/{encoded_term}?search-origin=search_bar"
-            
-            return scene_suggestions
+        return self.generate_scene_suggestions_batch([words])[0]
+
+    def generate_scene_suggestions_batch(self, phrases: List[str]) -> List[Dict[str, Any]]:
+        """
+        Generate scene suggestions for several highlights at once.
+        
+        Cached phrases are answered from the cache (keyed by the hash of the
+        normalized phrase). The rest are sent to OpenAI in structured batches
+        of SCENE_BATCH_SIZE. A phrase another request is already generating
+        is not requested twice: this call waits for that result instead.
+        
+        Args:
+            phrases (List[str]): Highlight texts, e.g. every subclip of a clip.
             
+        Returns:
+            List[Dict]: One result per phrase, in input order, shaped like the
+            result of generate_scene_suggestions.
+        """
+        normalized = [normalize_phrase(phrase) for phrase in phrases]
+        unique = list(dict.fromkeys(n for n in normalized if n))
+
+        results = self._cached_suggestions(unique)
+        missing = [n for n in unique if n not in results]
+        if missing:
+            print(f"🎬 Scene suggestions: {len(unique) - len(missing)} cached, {len(missing)} to generate")
+
+        lock_ttl = getattr(settings, "SCENE_SUGGESTIONS_LOCK_TIMEOUT", 90)
+        owned, waiting = self._claim_phrases(missing, lock_ttl)
+        try:
+            results.update(self._generate_and_cache(owned))
+        finally:
+            self._release_phrases(owned)
+
+        if waiting:
+            results.update(self._wait_for_suggestions(waiting, lock_ttl))
+            # The other request failed or timed out; generate what's still missing here
+            leftover = [phrase for phrase in waiting if phrase not in results]
+            results.update(self._generate_and_cache(leftover))
+
+        return self._ordered_suggestions(normalized, results)
+
+    async def agenerate_scene_suggestions(self, words: str) -> Dict[str, Any]:
+        """generate_scene_suggestions for async views"""
+        return (await self.agenerate_scene_suggestions_batch([words]))[0]
+
+    async def agenerate_scene_suggestions_batch(self, phrases: List[str]) -> List[Dict[str, Any]]:
+        """
+        generate_scene_suggestions_batch for async views: cache and lock
+        lookups run off the event loop, and the OpenAI call and waits for
+        other requests don't hold a thread.
+        """
+        in_thread = lambda func: sync_to_async(func, thread_sensitive=False)
+
+        normalized = [normalize_phrase(phrase) for phrase in phrases]
+        unique = list(dict.fromkeys(n for n in normalized if n))
+
+        results = await in_thread(self._cached_suggestions)(unique)
+        missing = [n for n in unique if n not in results]
+        if missing:
+            print(f"🎬 Scene suggestions: {len(unique) - len(missing)} cached, {len(missing)} to generate")
+
+        lock_ttl = getattr(settings, "SCENE_SUGGESTIONS_LOCK_TIMEOUT", 90)
+        owned, waiting = await in_thread(self._claim_phrases)(missing, lock_ttl)
+        try:
+            results.update(await self._agenerate_and_cache(owned))
+        finally:
+            await in_thread(self._release_phrases)(owned)
+
+        if waiting:
+            pending = list(waiting)
+            deadline = time.monotonic() + lock_ttl
+            while pending and time.monotonic() < deadline:
+                await asyncio.sleep(0.25)
+                found, pending = await in_thread(self._poll_suggestions)(pending)
+                results.update(found)
+            leftover = [phrase for phrase in waiting if phrase not in results]
+            results.update(await self._agenerate_and_cache(leftover))
+
+        return self._ordered_suggestions(normalized, results)
+
+    def _ordered_suggestions(self, normalized: List[str], results: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return [
+            results.get(n) or self._failed_suggestions("Prompt is empty" if not n else "No suggestions returned")
+            for n in normalized
+        ]
+
+    def _cached_suggestions(self, phrases: List[str]) -> Dict[str, Dict[str, Any]]:
+        if not phrases:
+            return {}
+        try:
+            found = cache.get_many([_phrase_key(phrase) for phrase in phrases])
         except Exception as e:
-            return {
-                "error": str(e),
-                "status": "failed",
-                "suggestions": []
-            }
+            print(f"⚠️ Scene suggestion cache unavailable: {e}")
+            return {}
+        return {
+            phrase: found[_phrase_key(phrase)]
+            for phrase in phrases
+            if _phrase_key(phrase) in found
+        }
+
+    def _claim_phrases(self, phrases: List[str], lock_ttl: int) -> Tuple[List[str], List[str]]:
+        """
+        Single flight: only the request holding a phrase's lock calls OpenAI for it.
+
+        Returns:
+            Tuple: (phrases this request generates, phrases another request is generating)
+        """
+        owned, waiting = [], []
+        for phrase in phrases:
+            try:
+                acquired = cache.add(_phrase_key(phrase, "lock"), 1, timeout=lock_ttl)
+            except Exception as e:
+                print(f"⚠️ Scene suggestion lock unavailable: {e}")
+                acquired = True
+            (owned if acquired else waiting).append(phrase)
+        return owned, waiting
+
+    def _release_phrases(self, phrases: List[str]):
+        if not phrases:
+            return
+        try:
+            cache.delete_many([_phrase_key(phrase, "lock") for phrase in phrases])
+        except Exception:
+            pass
+
+    def _poll_suggestions(self, pending: List[str]) -> Tuple[Dict[str, Dict[str, Any]], List[str]]:
+        """
+        Results other requests have stored for ``pending`` so far, and the
+        phrases still worth waiting for (not stored, lock still held).
+        """
+        found = self._cached_suggestions(pending)
+        pending = [phrase for phrase in pending if phrase not in found]
+        try:
+            locked = cache.get_many([_phrase_key(phrase, "lock") for phrase in pending])
+        except Exception:
+            return found, []
+        return found, [phrase for phrase in pending if _phrase_key(phrase, "lock") in locked]
+
+    def _wait_for_suggestions(self, phrases: List[str], timeout: float) -> Dict[str, Dict[str, Any]]:
+        """Poll the cache until other requests have stored ``phrases`` or released their locks"""
+        results = {}
+        pending = list(phrases)
+        deadline = time.monotonic() + timeout
+        while pending and time.monotonic() < deadline:
+            time.sleep(0.25)
+            found, pending = self._poll_suggestions(pending)
+            results.update(found)
+        return results
+
+    def _store_suggestions(self, generated: Dict[str, Dict[str, Any]]):
+        """Cache the successful results of one request"""
+        ttl = getattr(settings, "SCENE_SUGGESTIONS_CACHE_TTL", 7 * 24 * 3600)
+        successful = {
+            _phrase_key(phrase): result
+            for phrase, result in generated.items()
+            if result["status"] == "success" and result["suggestions"]
+        }
+        try:
+            cache.set_many(successful, timeout=ttl)
+        except Exception as e:
+            print(f"⚠️ Could not cache scene suggestions: {e}")
+
+    def _generate_and_cache(self, phrases: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Request suggestions for ``phrases`` in batches and cache the successful results"""
+        results = {}
+        for start in range(0, len(phrases), SCENE_BATCH_SIZE):
+            group = phrases[start:start + SCENE_BATCH_SIZE]
+            try:
+                generated = self._request_scene_suggestions(group)
+            except Exception as e:
+                print(f"❌ Scene suggestion request failed: {e}")
+                results.update({phrase: self._failed_suggestions(str(e)) for phrase in group})
+                continue
+            results.update(generated)
+            self._store_suggestions(generated)
+        return results
+
+    async def _agenerate_and_cache(self, phrases: List[str]) -> Dict[str, Dict[str, Any]]:
+        """_generate_and_cache for async views; the batches are requested concurrently"""
+        groups = [phrases[start:start + SCENE_BATCH_SIZE] for start in range(0, len(phrases), SCENE_BATCH_SIZE)]
+        responses = await asyncio.gather(
+            *(self._arequest_scene_suggestions(group) for group in groups), return_exceptions=True
+        )
+        results = {}
+        for group, generated in zip(groups, responses):
+            if isinstance(generated, Exception):
+                print(f"❌ Scene suggestion request failed: {generated}")
+                results.update({phrase: self._failed_suggestions(str(generated)) for phrase in group})
+                continue
+            results.update(generated)
+            await sync_to_async(self._store_suggestions, thread_sensitive=False)(generated)
+        return results
+
+    def _request_scene_suggestions(self, phrases: List[str]) -> Dict[str, Dict[str, Any]]:
+        """One structured completion covering every phrase in ``phrases``"""
+        response = self._create_completion(**self._scene_completion_args(phrases))
+        return self._parse_scene_suggestions(response.choices[0].message.content, phrases)
+
+    async def _arequest_scene_suggestions(self, phrases: List[str]) -> Dict[str, Dict[str, Any]]:
+        response = await self._acreate_completion(**self._scene_completion_args(phrases))
+        return self._parse_scene_suggestions(response.choices[0].message.content, phrases)
+
+    def _scene_completion_args(self, phrases: List[str]) -> Dict[str, Any]:
+        return dict(
+            model="gpt-4o",
+            messages=[
+                {"role": "system", "content": SCENE_SYSTEM_PROMPT},
+                {"role": "user", "content": self._build_prompt(phrases)}
+            ],
+            response_format={"type": "json_object"},
+            temperature=0.7,
+            max_tokens=200 + SCENE_TOKENS_PER_PHRASE * len(phrases)
+        )
+
+    def _failed_suggestions(self, error: str) -> Dict[str, Any]:
+        return {
+            "error": error,
+            "status": "failed",
+            "suggestions": []
+        }
     
-    def _build_prompt(self, words: str) -> str:
+    def _build_prompt(self, phrases: List[str]) -> str:
         """
         Build the prompt for OpenAI.
         
         Args:
-            words (str): The words to build the prompt for.
+            phrases (List[str]): The highlights to build the prompt for.
             
         Returns:
             str: The complete prompt.
         """
+        numbered = "\n".join(f'{i}. "{phrase}"' for i, phrase in enumerate(phrases, 1))
         return f"""
-I want you to think like a top movie producer and think of the best video scene that will fit the following words. It will go on a video advert that will be posted on Facebook:
-
-"{words}"
-
-Please provide 3 straight-to-the-point video scene suggestions in 3 bullet points.
+I want you to think like a top movie producer and think of the best video scene that will fit each of the following highlights. They will go on a video advert that will be posted on Facebook:
 
-Then, think about what I can search for each bullet point on Pexels and Storyblocks. Provide a clear search term for each scene.
+{numbered}
 
-Format your response like this:
-1. [Scene description]
-   Search term: [term]
+For each highlight, provide 3 straight-to-the-point video scene suggestions.
 
-2. [Scene description]
-   Search term: [term]
+Then, think about what I can search for each scene on Pexels and Storyblocks. Provide a clear search term for each scene.
 
-3. [Scene description]
-   Search term: [term]
+Respond with JSON only, in this format, with one entry per highlight number:
+{{"highlights": [{{"index": 1, "suggestions": [{{"description": "[Scene description]", "search_term": "[term]"}}]}}]}}
 """
 
-    def _parse_scene_suggestions(self, content: str) -> Dict[str, Any]:
+    def _parse_scene_suggestions(self, content: str, phrases: List[str]) -> Dict[str, Dict[str, Any]]:
         """
-        Parse the scene suggestions from the OpenAI response.
+        Parse the per-highlight scene suggestions from the OpenAI response.
         
         Args:
-            content (str): The raw response content.
+            content (str): The raw JSON response content.
+            phrases (List[str]): The highlights, in prompt order.
             
         Returns:
-            Dict: Structured scene suggestions.
+            Dict: Structured scene suggestions keyed by highlight.
         """
-        lines = content.strip().split('\n')
-        suggestions = []
-        
-        current_suggestion = None
-        for line in lines:
-            line = line.strip()
-            
-            # Check for new suggestion (starts with number and period)
-            if line and line[0].isdigit() and line[1:].startswith('. '):
-                if current_suggestion:
-                    suggestions.append(current_suggestion)
-                
-                current_suggestion = {
-                    "description": line[2:].strip(),
-                    "search_term": ""
-                }
-            
-            # Check for search term
-            elif line.lower().startswith('search term:') and current_suggestion:
-                current_suggestion["search_term"] = line[12:].strip()
-        
-        # Add the last suggestion if it exists
-        if current_suggestion:
-            suggestions.append(current_suggestion)
-        
-        return {
-            "status": "success",
-            "count": len(suggestions),
-            "suggestions": suggestions
-        }
\ No newline at end of file
+        try:
+            highlights = json.loads(content).get("highlights", [])
+        except (json.JSONDecodeError, AttributeError) as e:
+            raise ValueError(f"Invalid scene suggestion response: {e}")
+
+        results = {}
+        for entry in highlights:
+            if not isinstance(entry, dict):
+                continue
+            try:
+                index = int(entry.get("index"))
+            except (TypeError, ValueError):
+                continue
+            # Indexes are 1-based; 0 or a negative index would wrap around to the last phrases
+            if not 1 <= index <= len(phrases):
+                continue
+            phrase = phrases[index - 1]
+
+            suggestions = []
+            for item in entry.get("suggestions") or []:
+                if not isinstance(item, dict) or not item.get("description"):
+                    continue
+                search_term = str(item.get("search_term") or "").strip()
+                encoded_term = urllib.parse.quote(search_term)
+                suggestions.append({
+                    "description": str(item["description"]).strip(),
+                    "search_term": search_term,
+                    "pexels_url": f"https://www.pexels.com/search/videos/{encoded_term}/",
+                    "storyblocks_url": f"https://www.storyblocks.com/all-video/search/{encoded_term}?search-origin=search_bar",
+                })
+
+            results[phrase] = {
+                "status": "success",
+                "count": len(suggestions),
+                "suggestions": suggestions
+            }
+        return results
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Sum
+from apps.processors.models import AlignmentCache
+from apps.processors.services.alignment_cache import get_alignment_cache_stats
+
+class Command(BaseCommand):
+    help = 'Show forced-alignment cache size and hit rates'
+
+    def handle(self, *args, **options):
+        totals = AlignmentCache.objects.aggregate(entries=Count('id'), hits=Sum('hits'))
+        self.stdout.write(f"Entries: {totals['entries']} (lifetime hits: {totals['hits'] or 0})")
+
+        try:
+            stats = get_alignment_cache_stats()
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'Could not read lookup counters: {e}'))
+            return
+
+        self.stdout.write(
+            f"Lookups: {stats['hits'] + stats['misses']} "
+            f"(hits {stats['hits']}, misses {stats['misses']}, hit rate {stats['hit_rate']:.1%})"
+        )
+        for engine in ('elevenlabs', 'aeneas'):
+            hits = stats.get(f'{engine}_hits', 0)
+            misses = stats.get(f'{engine}_misses', 0)
+            if hits or misses:
+                self.stdout.write(f"  {engine}: {hits}/{hits + misses} hits ({hits / (hits + misses):.1%})")
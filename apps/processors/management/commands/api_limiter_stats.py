@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from apps.processors.services.api_limiter import get_api_limiter_stats
+
+class Command(BaseCommand):
+    help = 'Show rate limiter waits, rejections, 429s and circuit breaker trips per API endpoint'
+
+    def handle(self, *args, **options):
+        try:
+            stats = get_api_limiter_stats()
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'Could not read limiter stats: {e}'))
+            return
+
+        if not stats:
+            self.stdout.write('No API calls recorded yet')
+            return
+
+        for endpoint, counters in sorted(stats.items()):
+            acquired = counters.get('acquired', 0)
+            waited = counters.get('wait_seconds', 0)
+            avg_wait = waited / acquired if acquired else 0
+            self.stdout.write(
+                f"{endpoint}: {acquired:.0f} calls, avg wait {avg_wait:.2f}s (total {waited:.0f}s), "
+                f"rejected {counters.get('rejected', 0):.0f}, 429s {counters.get('throttled', 0):.0f}, "
+                f"failures {counters.get('failures', 0):.0f}, short-circuited {counters.get('short_circuited', 0):.0f}"
+            )
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from apps.processors.services.ffmpeg_governor import get_governor
+
+class Command(BaseCommand):
+    help = 'Show ffmpeg slot usage and queue wait times for this host'
+
+    def handle(self, *args, **options):
+        try:
+            stats = get_governor().stats()
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'Could not read governor stats: {e}'))
+            return
+
+        self.stdout.write(
+            f"Running: {stats['running']}/{stats['max_processes']} processes, "
+            f"{stats['threads_in_use']}/{stats['max_threads']} threads"
+        )
+        self.stdout.write(f"Waiting: {stats['waiting']}")
+        self.stdout.write(
+            f"Acquired: {stats['acquired']} "
+            f"(avg wait {stats['avg_wait_ms']:.0f}ms, p50 {stats['p50_wait_ms']}ms, "
+            f"p95 {stats['p95_wait_ms']}ms, max recent {stats['max_recent_wait_ms']}ms)"
+        )
+        for key, value in sorted(stats['counters'].items()):
+            if key.startswith('acquired_p'):
+                priority = key[len('acquired_p'):]
+                total = stats['counters'].get(f'wait_ms_total_p{priority}', 0)
+                self.stdout.write(f"  priority {priority}: {value} runs, avg wait {total / value:.0f}ms")
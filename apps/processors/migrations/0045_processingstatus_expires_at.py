@@ -0,0 +1,18 @@
+# Generated by Django 4.2.23 on 2026-10-19 09:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('processors', '0044_videologs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='processingstatus',
+            name='expires_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
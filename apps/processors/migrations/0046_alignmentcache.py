@@ -0,0 +1,30 @@
+# Generated by Django 4.2.23 on 2026-10-19 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('processors', '0045_processingstatus_expires_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AlignmentCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('audio_hash', models.CharField(max_length=64)),
+                ('words_hash', models.CharField(max_length=64)),
+                ('engine', models.CharField(default='elevenlabs', max_length=20)),
+                ('fragments', models.JSONField()),
+                ('word_count', models.IntegerField(default=0)),
+                ('hits', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_used_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'unique_together': {('audio_hash', 'words_hash')},
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.23 on 2026-10-19 13:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('processors', '0046_alignmentcache'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='video',
+            index=models.Index(fields=['updated_at'], name='video_updated_at_idx'),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import User
 from .constants import RESOLUTIONS
 
@@ -29,6 +30,10 @@ class Video(models.Model):
     preview_text = models.TextField(null=True, blank=True)  # Text content for previewing history
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            # Output retention sweeps (OUTPUT_RETENTION_DAYS)
+            models.Index(fields=["updated_at"], name="video_updated_at_idx"),
+        ]
 
 class Clips(models.Model):
     video = models.ForeignKey(Video, on_delete=models.CASCADE)
@@ -108,12 +113,24 @@ class ProcessingStatus(models.Model):
     progress = models.IntegerField(default=0)  # Progress as a percentage (0-100)
     current_step = models.CharField(max_length=100, blank=True, null=True)
     error_message = models.TextField(blank=True, null=True)
+    # Finished records stay readable until this time, then the beat sweep removes them
+    expires_at = models.DateTimeField(blank=True, null=True, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    TERMINAL_STATUSES = ('completed', 'error', 'cancelled')
+
     def __str__(self):
         return f"Processing status for Video #{self.video.id}: {self.status} ({self.progress}%)"
 
+    @property
+    def is_finished(self):
+        return self.status in self.TERMINAL_STATUSES or self.progress >= 100
+
+    @property
+    def is_expired(self):
+        return self.expires_at is not None and self.expires_at <= timezone.now()
+
 
 
 
@@ -125,4 +142,22 @@ class VideoLogs(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
-        return f"Logs for Video #{self.video.id} at {self.created_at.strftime('%Y-%m-%d %H:%M:%S')}"
\ No newline at end of file
+        return f"Logs for Video #{self.video.id} at {self.created_at.strftime('%Y-%m-%d %H:%M:%S')}"
+
+
+class AlignmentCache(models.Model):
+    """Forced-alignment results keyed by the exact audio bytes and word sequence"""
+    audio_hash = models.CharField(max_length=64)
+    words_hash = models.CharField(max_length=64)
+    engine = models.CharField(max_length=20, default='elevenlabs')  # Engine that produced the fragments
+    fragments = models.JSONField()
+    word_count = models.IntegerField(default=0)
+    hits = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('audio_hash', 'words_hash')
+
+    def __str__(self):
+        return f"Alignment {self.audio_hash[:12]}/{self.words_hash[:12]} ({self.engine}, {self.hits} hits)"
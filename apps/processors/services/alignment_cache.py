@@ -0,0 +1,116 @@
+import hashlib
+import logging
+from datetime import timedelta
+
+from django.db.models import F
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+STATS_KEY = "alignment_cache:stats"
+# A hit refreshes last_used_at at most this often, so hot entries don't write on every lookup
+TOUCH_INTERVAL = timedelta(hours=1)
+
+
+def hash_audio_file(audio_path, chunk_size=1024 * 1024):
+    """SHA-256 of the audio bytes, read in chunks so long voiceovers aren't held in memory"""
+    digest = hashlib.sha256()
+    with open(audio_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hash_words(text):
+    """SHA-256 of the normalized word sequence (case and whitespace insensitive)"""
+    words = text.lower().split()
+    return hashlib.sha256("\n".join(words).encode("utf-8")).hexdigest()
+
+
+def _record_lookup(engine, hit):
+    try:
+        from django_redis import get_redis_connection
+        conn = get_redis_connection("default")
+        pipe = conn.pipeline()
+        pipe.hincrby(STATS_KEY, "hits" if hit else "misses", 1)
+        pipe.hincrby(STATS_KEY, f"{engine}_{'hits' if hit else 'misses'}", 1)
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"Could not record alignment cache lookup: {e}")
+
+
+def get_cached_alignment(audio_hash, words_hash, engine="elevenlabs"):
+    """
+    Look up a previous alignment of the same audio and words.
+
+    Args:
+        audio_hash (str): Result of hash_audio_file
+        words_hash (str): Result of hash_words
+        engine (str): Engine about to run, only used for hit-rate reporting
+
+    Returns:
+        Optional[Dict]: Aeneas-format alignment ({"fragments": [...]}) or None
+    """
+    from apps.processors.models import AlignmentCache
+
+    try:
+        entry = AlignmentCache.objects.filter(audio_hash=audio_hash, words_hash=words_hash).first()
+    except Exception as e:
+        logger.warning(f"Alignment cache lookup failed: {e}")
+        return None
+
+    _record_lookup(engine, entry is not None)
+    if entry is None:
+        return None
+
+    # update() keeps concurrent hits from overwriting each other; it skips
+    # auto_now, so last_used_at is set explicitly
+    changes = {"hits": F("hits") + 1}
+    now = timezone.now()
+    if entry.last_used_at is None or entry.last_used_at < now - TOUCH_INTERVAL:
+        changes["last_used_at"] = now
+    AlignmentCache.objects.filter(pk=entry.pk).update(**changes)
+    print(f"♻️ Reusing cached {entry.engine} alignment ({entry.word_count} words, {entry.hits + 1} hits)")
+    return {"fragments": entry.fragments}
+
+
+def store_alignment(audio_hash, words_hash, alignment, engine="elevenlabs"):
+    """Save an Aeneas-format alignment for reuse; failures are logged, not raised"""
+    from apps.processors.models import AlignmentCache
+
+    fragments = alignment.get("fragments", [])
+    if not fragments:
+        return
+    try:
+        AlignmentCache.objects.update_or_create(
+            audio_hash=audio_hash,
+            words_hash=words_hash,
+            defaults={
+                "engine": engine,
+                "fragments": fragments,
+                "word_count": len(fragments),
+            },
+        )
+    except Exception as e:
+        logger.warning(f"Could not store alignment in cache: {e}")
+
+
+def get_alignment_cache_stats():
+    """
+    Hit/miss counters since the stats were last reset.
+
+    Returns:
+        Dict: hits, misses, hit_rate and per-engine counters
+    """
+    from django_redis import get_redis_connection
+
+    raw = get_redis_connection("default").hgetall(STATS_KEY)
+    stats = {
+        (k.decode() if isinstance(k, bytes) else k): int(v)
+        for k, v in raw.items()
+    }
+    lookups = stats.get("hits", 0) + stats.get("misses", 0)
+    stats.setdefault("hits", 0)
+    stats.setdefault("misses", 0)
+    stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+    return stats
@@ -0,0 +1,273 @@
+import time
+import random
+import asyncio
+import hashlib
+import logging
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+STATS_KEY = "api_limiter:stats"
+
+# (tokens per second, burst) per provider endpoint, per API key.
+# API_RATE_LIMITS in settings overrides entries, e.g. {"elevenlabs:tts": [1, 2]}
+DEFAULT_BUDGETS = {
+    "elevenlabs:tts": (2.0, 4),
+    "elevenlabs:alignment": (1.0, 3),
+    "elevenlabs:account": (5.0, 10),
+    "openai:chat": (3.0, 5),
+}
+FALLBACK_BUDGET = (2.0, 4)
+
+# KEYS[1] bucket hash; ARGV: rate/s, burst, tokens wanted
+# Returns 0 when the tokens were taken, otherwise milliseconds until they can be
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local wanted = tonumber(ARGV[3])
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) * 1000 + math.floor(tonumber(now_parts[2]) / 1000)
+
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1])
+local ts = tonumber(state[2])
+if tokens == nil then
+    tokens = burst
+    ts = now
+end
+if ts > now then
+    -- paused after a 429 until ts
+    return ts - now
+end
+if now > ts then
+    tokens = math.min(burst, tokens + (now - ts) * rate / 1000)
+    ts = now
+end
+
+local wait = 0
+if tokens >= wanted then
+    tokens = tokens - wanted
+else
+    wait = math.ceil((wanted - tokens) * 1000 / rate)
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(ts))
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst * 1000 / rate) + 60000)
+return wait
+"""
+
+
+class RateLimitExceeded(Exception):
+    """No token became available within the caller's wait budget"""
+
+
+class CircuitOpen(Exception):
+    """The provider failed repeatedly and calls are being short-circuited"""
+
+
+def _redis():
+    from django_redis import get_redis_connection
+    return get_redis_connection("default")
+
+
+def _budget(provider, endpoint):
+    overrides = getattr(settings, "API_RATE_LIMITS", {}) or {}
+    name = f"{provider}:{endpoint}"
+    rate, burst = overrides.get(name) or DEFAULT_BUDGETS.get(name, FALLBACK_BUDGET)
+    return float(rate), int(burst)
+
+
+def _record(provider, endpoint, **counters):
+    try:
+        pipe = _redis().pipeline()
+        for field, amount in counters.items():
+            pipe.hincrbyfloat(STATS_KEY, f"{provider}:{endpoint}:{field}", amount)
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"Could not record API limiter stats: {e}")
+
+
+class ApiLimiter:
+    """
+    Cross-process token bucket and circuit breaker for one provider and API
+    key. Buckets live in Redis per endpoint, so every web worker, Celery
+    worker and pipeline thread using the same key shares one budget.
+
+    If Redis is unreachable the limiter lets calls through rather than
+    blocking the pipeline.
+    """
+
+    def __init__(self, provider, api_key):
+        self.provider = provider
+        self.key_hash = hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:16]
+        self.failure_threshold = getattr(settings, "API_CIRCUIT_FAILURES", 5)
+        self.cooldown = getattr(settings, "API_CIRCUIT_COOLDOWN", 30)
+
+    def _key(self, kind, endpoint=""):
+        return f"api_limiter:{kind}:{self.provider}:{self.key_hash}" + (f":{endpoint}" if endpoint else "")
+
+    def acquire(self, endpoint, max_wait=None):
+        """
+        Take one token for ``endpoint``, waiting (with jitter) until one is free.
+
+        Args:
+            endpoint (str): Budget name, e.g. "tts" or "account"
+            max_wait (Optional[float]): Seconds to wait before giving up
+
+        Returns:
+            float: Seconds spent waiting
+
+        Raises:
+            CircuitOpen: If the provider is failing
+            RateLimitExceeded: If no token was free within ``max_wait``
+        """
+        self.check_circuit(endpoint)
+        if max_wait is None:
+            max_wait = getattr(settings, "API_RATE_LIMIT_MAX_WAIT", 120)
+
+        waited = 0.0
+        while True:
+            delay = self._take(endpoint, waited, max_wait)
+            if delay is None:
+                return waited
+            time.sleep(delay)
+            waited += delay
+
+    async def aacquire(self, endpoint, max_wait=None):
+        """
+        acquire() for async views: waits with asyncio.sleep, so the event
+        loop keeps serving other requests while this one is throttled.
+        """
+        take = sync_to_async(self._take, thread_sensitive=False)
+        await sync_to_async(self.check_circuit, thread_sensitive=False)(endpoint)
+        if max_wait is None:
+            max_wait = getattr(settings, "API_RATE_LIMIT_MAX_WAIT", 120)
+
+        waited = 0.0
+        while True:
+            delay = await take(endpoint, waited, max_wait)
+            if delay is None:
+                return waited
+            await asyncio.sleep(delay)
+            waited += delay
+
+    def _take(self, endpoint, waited, max_wait):
+        """Try to take a token: None once taken, otherwise seconds to sleep before trying again"""
+        rate, burst = _budget(self.provider, endpoint)
+        try:
+            wait_ms = int(_redis().eval(TOKEN_BUCKET_SCRIPT, 1, self._key("bucket", endpoint), rate, burst, 1))
+        except Exception as e:
+            logger.warning(f"Rate limiter unavailable, not throttling {self.provider}:{endpoint}: {e}")
+            return None
+        if wait_ms <= 0:
+            _record(self.provider, endpoint, acquired=1, wait_seconds=waited)
+            if waited >= 1:
+                print(f"⏳ Waited {waited:.1f}s for {self.provider}:{endpoint} rate limit")
+            return None
+        if waited + wait_ms / 1000 > max_wait:
+            _record(self.provider, endpoint, rejected=1, wait_seconds=waited)
+            raise RateLimitExceeded(f"{self.provider}:{endpoint} rate limit wait exceeded {max_wait}s")
+        # Jitter keeps waiting processes from retrying in lockstep
+        return wait_ms / 1000 * random.uniform(1.0, 1.5)
+
+    def throttled(self, endpoint, retry_after=None):
+        """
+        Record a 429: the shared bucket is emptied (for ``retry_after``
+        seconds if the provider said so), so every caller slows down
+        instead of each one discovering the limit separately.
+        """
+        _record(self.provider, endpoint, throttled=1)
+        rate, burst = _budget(self.provider, endpoint)
+        pause_ms = int((retry_after or 1.0 / rate) * 1000)
+        try:
+            conn = _redis()
+            # A timestamp in the future makes refills start only after the pause
+            now_seconds, now_micros = conn.time()
+            now_ms = now_seconds * 1000 + now_micros // 1000
+            conn.hset(self._key("bucket", endpoint), mapping={"tokens": 0, "ts": now_ms + pause_ms})
+        except Exception as e:
+            logger.warning(f"Could not drain rate limit bucket: {e}")
+
+    def check_circuit(self, endpoint=""):
+        try:
+            open_for = _redis().pttl(self._key("open"))
+        except Exception:
+            return
+        if open_for and open_for > 0:
+            _record(self.provider, endpoint or "all", short_circuited=1)
+            raise CircuitOpen(f"{self.provider} is unavailable, retry in {open_for / 1000:.0f}s")
+
+    def record_success(self):
+        """A healthy response resets the failure count and closes a half-open circuit"""
+        try:
+            _redis().delete(self._key("failures"), self._key("probation"))
+        except Exception:
+            pass
+
+    def record_failure(self, endpoint=""):
+        """
+        Count a provider-side failure (5xx, timeout, connection error). The
+        circuit opens after API_CIRCUIT_FAILURES failures within the cooldown
+        window; a failure while half-open (just after it closes) reopens it
+        immediately.
+        """
+        _record(self.provider, endpoint or "all", failures=1)
+        try:
+            conn = _redis()
+            pipe = conn.pipeline()
+            pipe.incr(self._key("failures"))
+            pipe.expire(self._key("failures"), self.cooldown)
+            pipe.exists(self._key("probation"))
+            failures, _, probation = pipe.execute()
+            if failures >= self.failure_threshold or probation:
+                pipe = conn.pipeline()
+                pipe.set(self._key("open"), 1, ex=self.cooldown)
+                pipe.set(self._key("probation"), 1, ex=self.cooldown * 3)
+                pipe.delete(self._key("failures"))
+                pipe.execute()
+                print(f"⚡ Circuit opened for {self.provider} for {self.cooldown}s after {failures} failures")
+        except Exception as e:
+            logger.warning(f"Could not update circuit breaker: {e}")
+
+    async def athrottled(self, endpoint, retry_after=None):
+        await sync_to_async(self.throttled, thread_sensitive=False)(endpoint, retry_after)
+
+    async def arecord_success(self):
+        await sync_to_async(self.record_success, thread_sensitive=False)()
+
+    async def arecord_failure(self, endpoint=""):
+        await sync_to_async(self.record_failure, thread_sensitive=False)(endpoint)
+
+    def backoff(self, attempt, retry_after=None, cap=None):
+        """Seconds to wait before retry ``attempt`` (full jitter, capped)"""
+        if retry_after:
+            return float(retry_after) + random.uniform(0, 1)
+        cap = cap or getattr(settings, "API_BACKOFF_CAP", 30)
+        return random.uniform(0, min(cap, 1.0 * (2 ** attempt)))
+
+
+def retry_after_seconds(response):
+    """Retry-After header of a response in seconds, if it has one"""
+    value = getattr(response, "headers", {}).get("Retry-After")
+    try:
+        return float(value) if value else None
+    except (TypeError, ValueError):
+        return None
+
+
+def get_api_limiter_stats():
+    """
+    Counters per provider endpoint: acquired, wait_seconds, rejected,
+    throttled (429s), failures and short_circuited calls.
+
+    Returns:
+        Dict[str, Dict[str, float]]
+    """
+    raw = _redis().hgetall(STATS_KEY)
+    stats = {}
+    for field, value in raw.items():
+        field = field.decode() if isinstance(field, bytes) else field
+        provider, endpoint, counter = field.rsplit(":", 2)
+        stats.setdefault(f"{provider}:{endpoint}", {})[counter] = float(value)
+    return stats
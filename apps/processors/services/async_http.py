@@ -0,0 +1,32 @@
+import asyncio
+import weakref
+
+import httpx
+from django.conf import settings
+
+# event loop -> client; an AsyncClient's pooled connections belong to the loop that opened them
+_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """
+    Keep-alive AsyncClient shared by the async views of this worker, so
+    concurrent upstream waits reuse TCP/TLS connections instead of each
+    holding a thread and a socket of its own.
+
+    Must be called from inside a running event loop.
+    """
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        max_connections = getattr(settings, "ASYNC_HTTP_MAX_CONNECTIONS", 200)
+        client = httpx.AsyncClient(
+            timeout=httpx.Timeout(120.0, connect=10.0),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max(10, max_connections // 4),
+                keepalive_expiry=60,
+            ),
+        )
+        _clients[loop] = client
+    return client
@@ -0,0 +1,232 @@
+import os
+import re
+import json
+import shutil
+import tempfile
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+
+SILENCE_NOISE_DB = -35
+SILENCE_MIN_DURATION = 0.25
+
+_SILENCE_START = re.compile(r"silence_start:\s*([\d.]+)")
+_SILENCE_END = re.compile(r"silence_end:\s*([\d.]+)")
+
+
+def chunking_enabled(duration):
+    """Whether audio of ``duration`` seconds is long enough to align in chunks"""
+    min_seconds = getattr(settings, "ALIGNMENT_CHUNK_MIN_SECONDS", 180)
+    return bool(duration) and min_seconds > 0 and duration >= min_seconds
+
+
+def detect_silences(audio_path):
+    """
+    Midpoints of the pauses in ``audio_path``, in seconds.
+
+    Returns:
+        List[float]: Sorted silence midpoints
+    """
+    from apps.processors.services.process_control import run_ffmpeg
+
+    result = run_ffmpeg([
+        "ffmpeg", "-hide_banner", "-nostats", "-i", audio_path,
+        "-af", f"silencedetect=noise={SILENCE_NOISE_DB}dB:d={SILENCE_MIN_DURATION}",
+        "-f", "null", "-",
+    ], capture_output=True, text=True)
+
+    midpoints = []
+    start = None
+    for line in (result.stderr or "").splitlines():
+        match = _SILENCE_START.search(line)
+        if match:
+            start = float(match.group(1))
+            continue
+        match = _SILENCE_END.search(line)
+        if match and start is not None:
+            midpoints.append((start + float(match.group(1))) / 2)
+            start = None
+    return midpoints
+
+
+def plan_chunks(units, duration, silences, sentence_ends=None, target_seconds=None):
+    """
+    Split text units (words or lines) and the audio into chunks that break
+    at a pause which lines up with a sentence boundary.
+
+    Where each unit is spoken is estimated from its character offset; a
+    boundary is only used when a detected silence lies close to that
+    estimate, so the text and audio of a chunk stay in step.
+
+    Args:
+        units (List[str]): Text units in reading order
+        duration (float): Audio duration in seconds
+        silences (List[float]): Result of detect_silences
+        sentence_ends (Optional[Set[int]]): Indices of units that end a
+            sentence; every unit ends one when None
+        target_seconds (Optional[float]): Preferred chunk length
+
+    Returns:
+        List[tuple]: (first unit, end unit exclusive, start time, end time or None)
+    """
+    target = target_seconds or getattr(settings, "ALIGNMENT_CHUNK_SECONDS", 60)
+    tolerance = max(2.0, 0.03 * duration)
+
+    total_chars = sum(len(unit) + 1 for unit in units) or 1
+    chunks = []
+    chunk_unit = 0
+    chunk_time = 0.0
+    chars = 0
+    for k, unit in enumerate(units[:-1]):
+        chars += len(unit) + 1
+        if sentence_ends is not None and k not in sentence_ends:
+            continue
+        estimate = duration * chars / total_chars
+        if estimate - chunk_time < target or duration - estimate < target / 3:
+            continue
+
+        pos = bisect_left(silences, estimate)
+        nearby = [s for s in silences[max(pos - 1, 0):pos + 1] if abs(s - estimate) <= tolerance]
+        if not nearby:
+            continue
+        cut = min(nearby, key=lambda s: abs(s - estimate))
+        if cut <= chunk_time:
+            continue
+
+        chunks.append((chunk_unit, k + 1, chunk_time, cut))
+        chunk_unit = k + 1
+        chunk_time = cut
+
+    chunks.append((chunk_unit, len(units), chunk_time, None))
+    return chunks
+
+
+def extract_audio_segment(audio_path, start_time, end_time, output_path):
+    """Decode ``start_time``..``end_time`` (None: to the end) of ``audio_path`` to 16 kHz mono WAV"""
+    from apps.processors.services.process_control import run_ffmpeg
+
+    cmd = ["ffmpeg", "-y", "-ss", f"{start_time:.3f}"]
+    if end_time is not None:
+        cmd += ["-t", f"{end_time - start_time:.3f}"]
+    # bitexact output keeps the bytes (and so the alignment cache key) stable between runs
+    cmd += [
+        "-i", audio_path, "-ac", "1", "-ar", "16000", "-c:a", "pcm_s16le",
+        "-map_metadata", "-1", "-fflags", "+bitexact", output_path,
+    ]
+    run_ffmpeg(cmd, check=True, capture_output=True)
+    return output_path
+
+
+def _align_chunk(audio_path, text, config_string, output_path):
+    """Run one Aeneas task; executed in a worker process"""
+    from aeneas.executetask import ExecuteTask
+    from aeneas.task import Task
+
+    text_path = os.path.splitext(output_path)[0] + ".txt"
+    with open(text_path, "w") as f:
+        f.write(text)
+
+    task = Task(config_string=config_string)
+    task.audio_file_path_absolute = os.path.abspath(audio_path)
+    task.text_file_path_absolute = os.path.abspath(text_path)
+    task.sync_map_file_path_absolute = os.path.abspath(output_path)
+    ExecuteTask(task).execute()
+    task.output_sync_map_file()
+    return output_path
+
+
+def _run_jobs(jobs):
+    configured = getattr(settings, "ALIGNMENT_MAX_WORKERS", 0)
+    workers = max(1, min(len(jobs), configured or os.cpu_count() or 1))
+    if workers > 1:
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                return list(pool.map(_align_chunk, *zip(*jobs)))
+        except (AssertionError, OSError, BrokenProcessPool) as e:
+            # e.g. daemonic worker processes can't start children
+            print(f"⚠️ Parallel alignment unavailable ({e}), aligning chunks sequentially")
+    return [_align_chunk(*job) for job in jobs]
+
+
+def _shift(fragment, offset, new_id=None):
+    shifted = dict(fragment)
+    shifted["begin"] = f"{float(fragment.get('begin', 0)) + offset:.3f}"
+    shifted["end"] = f"{float(fragment.get('end', 0)) + offset:.3f}"
+    if fragment.get("children"):
+        shifted["children"] = [_shift(child, offset) for child in fragment["children"]]
+    if new_id:
+        shifted["id"] = new_id
+    return shifted
+
+
+def merge_chunk_alignments(chunks, output_paths):
+    """
+    Shift every chunk's fragments by the chunk start and renumber them; at
+    each chunk boundary an overlap between the neighbouring fragments is
+    split at its midpoint.
+
+    Returns:
+        Dict: Aeneas-format alignment of the whole audio
+    """
+    fragments = []
+    for (_, _, start_time, _), path in zip(chunks, output_paths):
+        with open(path, "r", encoding="utf-8") as f:
+            chunk_fragments = json.load(f).get("fragments", [])
+        boundary = len(fragments)
+        for fragment in chunk_fragments:
+            fragments.append(_shift(fragment, start_time, f"f{len(fragments) + 1:06d}"))
+
+        if 0 < boundary < len(fragments):
+            prev, cur = fragments[boundary - 1], fragments[boundary]
+            prev_end, cur_begin = float(prev["end"]), float(cur["begin"])
+            if prev_end > cur_begin:
+                mid = f"{(prev_end + cur_begin) / 2:.3f}"
+                prev["end"] = mid
+                cur["begin"] = mid
+    return {"fragments": fragments}
+
+
+def align_in_chunks(audio_path, units, joiner, config_string, output_json_path, duration, sentence_ends=None):
+    """
+    Align long audio by splitting it at pauses into chunks aligned in
+    parallel processes, then merging them into one Aeneas-format file.
+
+    Args:
+        audio_path (str): Audio file path
+        units (List[str]): Text units (words or lines) in reading order
+        joiner (str): How units are joined in a chunk's text file
+        config_string (str): Aeneas task configuration used for every chunk
+        output_json_path (str): Where to write the merged alignment
+        duration (float): Audio duration in seconds
+        sentence_ends (Optional[Set[int]]): Units that may end a chunk
+
+    Returns:
+        Optional[str]: output_json_path, or None if the audio has no usable
+        split points and should be aligned in one task
+    """
+    chunks = plan_chunks(units, duration, detect_silences(audio_path), sentence_ends)
+    if len(chunks) < 2:
+        return None
+    print(f"🔄 Aligning {duration:.0f}s of audio in {len(chunks)} chunks")
+
+    work_dir = tempfile.mkdtemp(prefix="align_chunks_")
+    try:
+        jobs = []
+        for idx, (first, end, start_time, end_time) in enumerate(chunks):
+            chunk_audio = os.path.join(work_dir, f"chunk_{idx:03d}.wav")
+            extract_audio_segment(audio_path, start_time, end_time, chunk_audio)
+            jobs.append((
+                chunk_audio,
+                joiner.join(units[first:end]),
+                config_string,
+                os.path.join(work_dir, f"chunk_{idx:03d}.json"),
+            ))
+
+        merged = merge_chunk_alignments(chunks, _run_jobs(jobs))
+        with open(output_json_path, "w", encoding="utf-8") as f:
+            json.dump(merged, f, indent=1, ensure_ascii=False)
+        return output_json_path
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
@@ -6,6 +6,31 @@ import io
 import time
 from typing import Dict, Any, List, Optional
 import re
+import math
+import difflib
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+from apps.processors.services.api_limiter import (
+    ApiLimiter,
+    CircuitOpen,
+    RateLimitExceeded,
+    retry_after_seconds,
+)
+from apps.processors.services.chunked_alignment import (
+    align_in_chunks,
+    chunking_enabled,
+    detect_silences,
+    extract_audio_segment,
+    plan_chunks,
+)
+from apps.processors.services.alignment_cache import (
+    get_cached_alignment,
+    hash_audio_file,
+    hash_words,
+    store_alignment,
+)
 
 
 class ElevenLabsTextAlignment:
@@ -25,6 +50,7 @@ class ElevenLabsTextAlignment:
         self.api_key = api_key
         self.base_url = base_url
         self.headers = {"xi-api-key": api_key}
+        self.limiter = ApiLimiter("elevenlabs", api_key)
     
     def preprocess_text(self, text: str) -> str:
         """
@@ -63,12 +89,12 @@ class ElevenLabsTextAlignment:
             Optional[float]: Duration in seconds or None if unable to determine
         """
         try:
-            import subprocess
+            from apps.processors.services.process_control import run_ffmpeg
             cmd = [
                 'ffprobe', '-v', 'quiet', '-print_format', 'json',
                 '-show_format', audio_path
             ]
-            result = subprocess.run(cmd, capture_output=True, text=True)
+            result = run_ffmpeg(cmd, capture_output=True, text=True)
             
             if result.returncode == 0:
                 data = json.loads(result.stdout)
@@ -102,17 +128,28 @@ class ElevenLabsTextAlignment:
             # Preprocess the script
             processed_script = self.preprocess_text(script)
             
+            # Identical audio and words always align the same way
+            audio_hash = hash_audio_file(audio_path)
+            words_hash = hash_words(processed_script)
+            if self._write_cached_alignment(audio_hash, words_hash, output_json_path, "elevenlabs"):
+                return output_json_path
+            
             # Get audio duration for optimization
             duration = self._get_audio_duration(audio_path)
             if duration:
                 print(f"📊 Audio duration: {duration:.2f} seconds")
             
-            # Try ElevenLabs first
-            alignment_data = self._perform_elevenlabs_alignment(audio_path, processed_script)
+            # Try ElevenLabs first; long voiceovers go up as concurrent chunks
+            plan = self._plan_alignment_chunks(audio_path, script, duration)
+            if plan:
+                alignment_data = self._perform_chunked_alignment(audio_path, *plan, duration)
+            else:
+                alignment_data = self._perform_elevenlabs_alignment(audio_path, processed_script)
             
             if alignment_data:
                 # ElevenLabs successful - convert to Aeneas format
                 aeneas_format = self._convert_to_aeneas_format(alignment_data, processed_script)
+                store_alignment(audio_hash, words_hash, aeneas_format, engine="elevenlabs")
                 
                 # Save to output file
                 with open(output_json_path, 'w', encoding='utf-8') as f:
@@ -132,21 +169,54 @@ class ElevenLabsTextAlignment:
             # Fall back to Aeneas
             # return self._create_fallback_alignment(script, audio_path, output_json_path)
     
-    def _perform_elevenlabs_alignment(self, audio_path: str, text: str) -> Optional[List[Dict]]:
+    def _write_cached_alignment(self, audio_hash: str, words_hash: str,
+                                output_json_path: str, engine: str) -> bool:
         """
-        Perform forced alignment using ElevenLabs API with exponential backoff for rate limiting
+        Write a cached alignment to ``output_json_path`` if there is one
+        
+        Returns:
+            bool: True on a cache hit
+        """
+        cached = get_cached_alignment(audio_hash, words_hash, engine=engine)
+        if not cached:
+            return False
+        with open(output_json_path, 'w', encoding='utf-8') as f:
+            json.dump(cached, f, indent=1, ensure_ascii=False)
+        print(f"✅ Cached alignment saved to: {output_json_path}")
+        return True
+    
+    def _perform_elevenlabs_alignment(self, audio_path: str, text: str,
+                                      max_retries: int = 10,
+                                      max_wait: Optional[float] = None,
+                                      filename: str = 'audio.mp3',
+                                      content_type: str = 'audio/mpeg') -> Optional[List[Dict]]:
+        """
+        Perform forced alignment using ElevenLabs API. Requests go through the
+        shared rate limiter: a 429 pauses every caller on this key until the
+        provider's Retry-After, and repeated server errors open the circuit so
+        later attempts fail fast instead of sleeping.
         
         Args:
             audio_path (str): Path to audio file
             text (str): Text to align
+            max_retries (int): Attempts before giving up
+            max_wait (Optional[float]): Upper bound for a single backoff wait (jittered)
+            filename (str): File name sent with the upload
+            content_type (str): MIME type of the audio
             
         Returns:
             Optional[List[Dict]]: List of word timestamps or None if failed
         """
-        max_retries = 10
-        base_wait_time = 5  # Start with 5 seconds
+        def backoff(attempt):
+            return self.limiter.backoff(attempt, cap=max_wait)
         
         for attempt in range(max_retries):
+            try:
+                self.limiter.acquire("alignment")
+            except (CircuitOpen, RateLimitExceeded) as e:
+                print(f"❌ ElevenLabs alignment not attempted: {e}")
+                return None
+            
             try:
                 url = f"{self.base_url}/forced-alignment"
                 
@@ -156,7 +226,7 @@ class ElevenLabsTextAlignment:
                 
                 # Prepare multipart form data
                 files = {
-                    'file': ('audio.mp3', io.BytesIO(audio_bytes), 'audio/mpeg')
+                    'file': (filename, io.BytesIO(audio_bytes), content_type)
                 }
                 
                 data = {
@@ -175,18 +245,20 @@ class ElevenLabsTextAlignment:
                 
                 # Check for rate limiting (429) or server errors (5xx)
                 if response.status_code == 429:
-                    wait_time = base_wait_time * (2 ** attempt)  # Exponential backoff
-                    print(f"⚠️ Rate limited (429). Waiting {wait_time} seconds before retry {attempt + 1}/{max_retries}...")
-                    time.sleep(wait_time)
+                    # The next acquire() waits out the shared pause
+                    self.limiter.throttled("alignment", retry_after_seconds(response))
+                    print(f"⚠️ Rate limited (429). Pausing alignment requests before retry {attempt + 1}/{max_retries}...")
                     continue
                 elif response.status_code >= 500:
-                    wait_time = base_wait_time * (2 ** attempt)  # Also backoff for server errors
-                    print(f"⚠️ Server error ({response.status_code}). Waiting {wait_time} seconds before retry {attempt + 1}/{max_retries}...")
+                    self.limiter.record_failure("alignment")
+                    wait_time = backoff(attempt)
+                    print(f"⚠️ Server error ({response.status_code}). Waiting {wait_time:.1f} seconds before retry {attempt + 1}/{max_retries}...")
                     time.sleep(wait_time)
                     continue
                 
                 # Raise for other HTTP errors (4xx except 429)
                 response.raise_for_status()
+                self.limiter.record_success()
                 
                 result = response.json()
                 
@@ -212,12 +284,15 @@ class ElevenLabsTextAlignment:
                 return processed_words
                 
             except requests.exceptions.RequestException as e:
+                # Client errors (4xx) say nothing about the provider's health
+                if not isinstance(e, requests.exceptions.HTTPError):
+                    self.limiter.record_failure("alignment")
                 if attempt == max_retries - 1:
                     print(f"❌ ElevenLabs API request failed after {max_retries} attempts: {e}")
                     return None
                 else:
-                    wait_time = base_wait_time * (2 ** attempt)
-                    print(f"⚠️ Request failed: {e}. Waiting {wait_time} seconds before retry {attempt + 1}/{max_retries}...")
+                    wait_time = backoff(attempt)
+                    print(f"⚠️ Request failed: {e}. Waiting {wait_time:.1f} seconds before retry {attempt + 1}/{max_retries}...")
                     time.sleep(wait_time)
                     continue
                     
@@ -226,14 +301,151 @@ class ElevenLabsTextAlignment:
                     print(f"❌ Error in ElevenLabs alignment after {max_retries} attempts: {e}")
                     return None
                 else:
-                    wait_time = base_wait_time * (2 ** attempt)
-                    print(f"⚠️ Unexpected error: {e}. Waiting {wait_time} seconds before retry {attempt + 1}/{max_retries}...")
+                    wait_time = backoff(attempt)
+                    print(f"⚠️ Unexpected error: {e}. Waiting {wait_time:.1f} seconds before retry {attempt + 1}/{max_retries}...")
                     time.sleep(wait_time)
                     continue
         
         print(f"❌ All {max_retries} retry attempts failed")
         return None
     
+    def _plan_alignment_chunks(self, audio_path: str, script: str, duration: Optional[float]):
+        """
+        Split a long voiceover into sentence groups that start and end at a pause
+        
+        Returns:
+            Optional[tuple]: (words, chunks) as planned by plan_chunks, or None
+            when the audio is short or has no usable split point
+        """
+        min_seconds = getattr(settings, 'ELEVENLABS_ALIGNMENT_CHUNK_MIN_SECONDS', 120)
+        if not duration or min_seconds <= 0 or duration < min_seconds:
+            return None
+        units, sentence_ends = self._sentence_units(script)
+        if not units:
+            return None
+        chunks = plan_chunks(
+            units, duration, detect_silences(audio_path), sentence_ends,
+            target_seconds=getattr(settings, 'ELEVENLABS_ALIGNMENT_CHUNK_SECONDS', 90),
+        )
+        return (units, chunks) if len(chunks) > 1 else None
+    
+    def _align_chunk(self, audio_path: str, text: str) -> List[Dict]:
+        """
+        Align one chunk, reusing a cached result so a retried job only sends
+        the chunks that failed before
+        
+        Raises:
+            Exception: If the chunk still fails after its retries
+        """
+        audio_hash = hash_audio_file(audio_path)
+        words_hash = hash_words(text)
+        cached = get_cached_alignment(audio_hash, words_hash, engine="elevenlabs")
+        if cached:
+            return [
+                {
+                    "word": " ".join(fragment.get("lines", [])),
+                    "start_time_s": float(fragment["begin"]),
+                    "end_time_s": float(fragment["end"]),
+                }
+                for fragment in cached["fragments"]
+            ]
+        
+        words = self._perform_elevenlabs_alignment(
+            audio_path, text,
+            max_retries=getattr(settings, 'ELEVENLABS_ALIGNMENT_CHUNK_RETRIES', 4),
+            max_wait=30,
+            filename='audio.wav',
+            content_type='audio/wav',
+        )
+        if words is None:
+            raise Exception(f"Alignment of chunk {os.path.basename(audio_path)} failed")
+        store_alignment(audio_hash, words_hash, self._convert_to_aeneas_format(words, text), engine="elevenlabs")
+        return words
+    
+    @staticmethod
+    def _match_words(sent: List[str], received: List[Dict]) -> List[Optional[int]]:
+        """Position in ``sent`` of each word the API returned (None if unmatched)"""
+        def normalize(word):
+            return re.sub(r'^\W+|\W+$', '', word.lower())
+        
+        received_words = [normalize(w["word"]) for w in received]
+        sent_words = [normalize(w) for w in sent]
+        if received_words == sent_words:
+            return list(range(len(sent)))
+        
+        positions = [None] * len(received)
+        matcher = difflib.SequenceMatcher(None, received_words, sent_words, autojunk=False)
+        for a, b, size in matcher.get_matching_blocks():
+            for k in range(size):
+                positions[a + k] = b + k
+        return positions
+    
+    def _perform_chunked_alignment(self, audio_path: str, units: List[str], chunks: List[tuple],
+                                   duration: float) -> Optional[List[Dict]]:
+        """
+        Align a long voiceover as overlapping chunks sent concurrently.
+        
+        Each chunk's audio is padded by ELEVENLABS_ALIGNMENT_OVERLAP_SECONDS on
+        both sides and its text by about as many words from the neighbouring
+        chunks. Only words inside a chunk's own range are kept, so boundary
+        words are always timed with context on both sides; the stitched
+        timings are then forced to be monotonic.
+        
+        Returns:
+            Optional[List[Dict]]: Word timestamps for the whole audio or None if a chunk failed
+        """
+        overlap = getattr(settings, 'ELEVENLABS_ALIGNMENT_OVERLAP_SECONDS', 1.5)
+        pad_words = max(2, math.ceil(overlap * len(units) / duration))
+        concurrency = getattr(settings, 'ELEVENLABS_ALIGNMENT_CONCURRENCY', 3)
+        last = len(chunks) - 1
+        print(f"🔄 Aligning {duration:.0f}s of audio as {len(chunks)} chunks ({concurrency} at a time)")
+        
+        with tempfile.TemporaryDirectory() as work_dir:
+            def run(idx):
+                first, end, start_time, end_time = chunks[idx]
+                lo = max(0, first - pad_words) if idx > 0 else 0
+                hi = min(len(units), end + pad_words) if idx < last else len(units)
+                audio_start = max(0.0, start_time - overlap) if idx > 0 else 0.0
+                audio_end = min(duration, end_time + overlap) if end_time is not None else None
+                
+                chunk_path = os.path.join(work_dir, f"chunk_{idx:03d}.wav")
+                extract_audio_segment(audio_path, audio_start, audio_end, chunk_path)
+                words = self._align_chunk(chunk_path, " ".join(units[lo:hi]))
+                return lo, audio_start, words, self._match_words(units[lo:hi], words)
+            
+            with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+                futures = [pool.submit(run, idx) for idx in range(len(chunks))]
+                results = []
+                failed = 0
+                for idx, future in enumerate(futures):
+                    try:
+                        results.append(future.result())
+                    except Exception as e:
+                        print(f"❌ Chunk {idx + 1}/{len(chunks)} failed: {e}")
+                        failed += 1
+        
+        if failed:
+            print(f"❌ {failed}/{len(chunks)} chunks failed; completed chunks are cached for the next attempt")
+            return None
+        
+        stitched = []
+        for (first, end, _, _), (lo, offset, words, positions) in zip(chunks, results):
+            for word, pos in zip(words, positions):
+                if pos is None or not first <= lo + pos < end:
+                    continue
+                start = word["start_time_s"] + offset
+                finish = word["end_time_s"] + offset
+                if stitched and start < stitched[-1]["end_time_s"]:
+                    start = stitched[-1]["end_time_s"]
+                stitched.append({
+                    "word": word["word"],
+                    "start_time_s": start,
+                    "end_time_s": max(start, finish),
+                })
+        
+        print(f"✅ Stitched {len(stitched)} word alignments from {len(chunks)} chunks")
+        return stitched
+    
     def _convert_to_aeneas_format(self, alignment_data: List[Dict], original_text: str) -> Dict[str, Any]:
         """
         Convert ElevenLabs alignment data to Aeneas format
@@ -306,6 +518,23 @@ class ElevenLabsTextAlignment:
             # Last resort: simple estimation
             return self._create_simple_estimation_alignment(script, audio_path, output_json_path)
     
+    def _sentence_units(self, script: str):
+        """
+        Preprocessed words of ``script`` and the indices of the words that
+        end a sentence, for choosing where long audio may be split
+
+        Returns:
+            tuple: (List[str] words, Set[int] sentence-ending word indices)
+        """
+        units = []
+        sentence_ends = set()
+        for raw_word in script.split():
+            words = [w for w in self.preprocess_text(raw_word).split() if re.search(r'\w', w)]
+            units.extend(words)
+            if units and raw_word.rstrip('"\')]').endswith(('.', '!', '?')):
+                sentence_ends.add(len(units) - 1)
+        return units, sentence_ends
+
     def _use_aeneas_alignment(self, script: str, audio_path: str, output_json_path: str) -> str:
         """
         Use Aeneas for alignment with the same enhanced configuration as original
@@ -328,6 +557,11 @@ class ElevenLabsTextAlignment:
             # Preprocess the script (same as original)
             processed_script = self.preprocess_text(script)
             
+            audio_hash = hash_audio_file(audio_path)
+            words_hash = hash_words(processed_script)
+            if self._write_cached_alignment(audio_hash, words_hash, output_json_path, "aeneas"):
+                return output_json_path
+            
             # Get audio duration to select optimal config (same logic as original)
             duration = self._get_audio_duration(audio_path)
             
@@ -398,14 +632,26 @@ class ElevenLabsTextAlignment:
                         "is_text_mapping=word"
                     )
                 
-                # Create and execute Aeneas task
-                task = Task(config_string=config_string)
-                task.audio_file_path_absolute = os.path.abspath(audio_path)
-                task.text_file_path_absolute = os.path.abspath(text_file)
-                task.sync_map_file_path_absolute = os.path.abspath(output_json_path)
+                # Long voiceovers are split at pauses and aligned on all cores
+                chunked_path = None
+                if chunking_enabled(duration):
+                    units, sentence_ends = self._sentence_units(script)
+                    chunked_path = align_in_chunks(
+                        audio_path, units, " ", config_string, output_json_path, duration, sentence_ends
+                    )
+                
+                if not chunked_path:
+                    # Create and execute Aeneas task
+                    task = Task(config_string=config_string)
+                    task.audio_file_path_absolute = os.path.abspath(audio_path)
+                    task.text_file_path_absolute = os.path.abspath(text_file)
+                    task.sync_map_file_path_absolute = os.path.abspath(output_json_path)
 
-                ExecuteTask(task).execute()
-                task.output_sync_map_file()
+                    ExecuteTask(task).execute()
+                    task.output_sync_map_file()
+                
+                with open(output_json_path, 'r', encoding='utf-8') as f:
+                    store_alignment(audio_hash, words_hash, json.load(f), engine="aeneas")
                 
                 print(f"✅ Aeneas fallback alignment completed: {output_json_path}")
                 return output_json_path
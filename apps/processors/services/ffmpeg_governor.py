@@ -0,0 +1,302 @@
+import os
+import time
+import uuid
+import fcntl
+import socket
+import logging
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Lower value = served first
+PRIORITY_INTERACTIVE = 0   # A user is waiting on the HTTP response
+PRIORITY_RENDER = 5        # Video generation pipeline
+PRIORITY_BACKGROUND = 9    # Admin actions, maintenance
+
+_local = threading.local()
+
+# Atomically prune dead holders/waiters, enqueue the caller and grant a slot
+# if it is at the front of the queue and both process and thread budgets allow.
+# Returns 1 for a slot granted on an idle host, 2 when other holders are running.
+ACQUIRE_SCRIPT = """
+local holders = KEYS[1]
+local threads = KEYS[2]
+local waiters = KEYS[3]
+local seen = KEYS[4]
+local lease = ARGV[1]
+local score = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local lease_ttl = tonumber(ARGV[4])
+local waiter_ttl = tonumber(ARGV[5])
+local max_procs = tonumber(ARGV[6])
+local max_threads = tonumber(ARGV[7])
+local want = tonumber(ARGV[8])
+
+for _, dead in ipairs(redis.call('ZRANGEBYSCORE', holders, '-inf', now)) do
+    redis.call('HDEL', threads, dead)
+end
+redis.call('ZREMRANGEBYSCORE', holders, '-inf', now)
+for _, gone in ipairs(redis.call('ZRANGEBYSCORE', seen, '-inf', now - waiter_ttl)) do
+    redis.call('ZREM', waiters, gone)
+end
+redis.call('ZREMRANGEBYSCORE', seen, '-inf', now - waiter_ttl)
+
+redis.call('ZADD', waiters, 'NX', score, lease)
+redis.call('ZADD', seen, now, lease)
+
+local running = redis.call('ZCARD', holders)
+local rank = redis.call('ZRANK', waiters, lease)
+if rank >= max_procs - running then
+    return 0
+end
+
+local used = 0
+for _, n in ipairs(redis.call('HVALS', threads)) do
+    used = used + tonumber(n)
+end
+if running > 0 and used + want > max_threads then
+    return 0
+end
+
+redis.call('ZREM', waiters, lease)
+redis.call('ZREM', seen, lease)
+redis.call('ZADD', holders, now + lease_ttl, lease)
+redis.call('HSET', threads, lease, want)
+if running > 0 then
+    return 2
+end
+return 1
+"""
+
+
+class FfmpegLease:
+    """
+    A granted ffmpeg slot; keep it alive with ``refresh`` and give it back
+    with ``release``. ``contended`` is set when other ffmpeg processes held
+    slots at grant time, which is when ``threads`` should be enforced.
+    """
+
+    def __init__(self, governor, lease_id, threads, waited, lock_file=None, contended=True):
+        self.governor = governor
+        self.lease_id = lease_id
+        self.threads = threads
+        self.waited = waited
+        self.lock_file = lock_file
+        self.contended = contended
+        self._last_refresh = time.monotonic()
+
+    def refresh(self):
+        if self.lock_file is not None:
+            return
+        if time.monotonic() - self._last_refresh < self.governor.lease_ttl / 3:
+            return
+        self._last_refresh = time.monotonic()
+        try:
+            self.governor.redis.zadd(
+                self.governor.holders_key,
+                {self.lease_id: time.time() + self.governor.lease_ttl},
+                xx=True,
+            )
+        except Exception as e:
+            logger.warning(f"Could not refresh ffmpeg lease {self.lease_id}: {e}")
+
+    def release(self):
+        self.governor.release(self)
+
+
+class FfmpegGovernor:
+    """
+    Host-wide cap on concurrent ffmpeg processes and encoder threads.
+
+    Slots are tracked in Redis, keyed by hostname, so every gunicorn worker,
+    request thread and Celery worker on the same machine shares one budget.
+    Waiters are served by priority, then arrival order. Leases expire if a
+    holder dies without releasing. When Redis is unreachable a set of
+    ``flock`` slot files in FFMPEG_LOCK_DIR is used instead (no priorities,
+    and every lease counts as contended).
+    """
+
+    POLL_INTERVAL = 0.25
+
+    def __init__(self):
+        self.max_procs = getattr(settings, "FFMPEG_MAX_PROCESSES", os.cpu_count() or 2)
+        self.max_threads = getattr(settings, "FFMPEG_MAX_THREADS", os.cpu_count() or 2)
+        self.default_threads = getattr(settings, "FFMPEG_THREADS_PER_PROCESS", 2)
+        self.lease_ttl = getattr(settings, "FFMPEG_LEASE_TTL", 120)
+        self.lock_dir = getattr(settings, "FFMPEG_LOCK_DIR", "/tmp/videocrafter_ffmpeg_slots")
+        host = socket.gethostname()
+        self.holders_key = f"ffmpeg_gov:{host}:holders"
+        self.threads_key = f"ffmpeg_gov:{host}:threads"
+        self.waiters_key = f"ffmpeg_gov:{host}:waiters"
+        self.seen_key = f"ffmpeg_gov:{host}:seen"
+        self.stats_key = f"ffmpeg_gov:{host}:stats"
+        self.waits_key = f"ffmpeg_gov:{host}:waits"
+        self._script = None
+
+    @property
+    def redis(self):
+        from django_redis import get_redis_connection
+        return get_redis_connection("default")
+
+    def acquire(self, priority=PRIORITY_RENDER, threads=None, token=None):
+        threads = max(1, min(threads or self.default_threads, self.max_threads))
+        try:
+            return self._acquire_redis(priority, threads, token)
+        except Exception as e:
+            logger.warning(f"ffmpeg governor falling back to file locks: {e}")
+            return self._acquire_file(threads, token)
+
+    def _acquire_redis(self, priority, threads, token):
+        from apps.processors.services.process_control import ProcessingCancelled
+
+        conn = self.redis
+        if self._script is None:
+            self._script = conn.register_script(ACQUIRE_SCRIPT)
+        lease_id = uuid.uuid4().hex
+        queued_at = time.time()
+        # Priority dominates, arrival time breaks ties
+        score = priority * 1e10 + queued_at
+        keys = [self.holders_key, self.threads_key, self.waiters_key, self.seen_key]
+        try:
+            while True:
+                granted = self._script(
+                    keys=keys,
+                    args=[lease_id, score, time.time(), self.lease_ttl, 30,
+                          self.max_procs, self.max_threads, threads],
+                )
+                if granted:
+                    waited = time.time() - queued_at
+                    self._record_wait(waited, priority)
+                    return FfmpegLease(self, lease_id, threads, waited, contended=granted == 2)
+                if token is not None:
+                    token.raise_if_cancelled()
+                time.sleep(self.POLL_INTERVAL)
+        except (Exception, ProcessingCancelled):
+            # Leave the queue so we don't block the waiters behind us
+            try:
+                pipe = conn.pipeline()
+                pipe.zrem(self.waiters_key, lease_id)
+                pipe.zrem(self.seen_key, lease_id)
+                pipe.execute()
+            except Exception:
+                pass
+            raise
+
+    def _acquire_file(self, threads, token):
+        os.makedirs(self.lock_dir, exist_ok=True)
+        queued_at = time.time()
+        while True:
+            for slot in range(self.max_procs):
+                lock_file = open(os.path.join(self.lock_dir, f"slot_{slot}.lock"), "w")
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    lock_file.close()
+                    continue
+                waited = time.time() - queued_at
+                return FfmpegLease(self, f"file:{slot}", threads, waited, lock_file=lock_file)
+            if token is not None:
+                token.raise_if_cancelled()
+            time.sleep(self.POLL_INTERVAL)
+
+    def release(self, lease):
+        if lease.lock_file is not None:
+            try:
+                fcntl.flock(lease.lock_file, fcntl.LOCK_UN)
+            finally:
+                lease.lock_file.close()
+            return
+        try:
+            pipe = self.redis.pipeline()
+            pipe.zrem(self.holders_key, lease.lease_id)
+            pipe.hdel(self.threads_key, lease.lease_id)
+            pipe.execute()
+        except Exception as e:
+            # The lease TTL reclaims the slot if this fails
+            logger.warning(f"Could not release ffmpeg lease {lease.lease_id}: {e}")
+
+    def _record_wait(self, waited, priority):
+        waited_ms = int(waited * 1000)
+        if waited >= getattr(settings, "FFMPEG_SLOW_WAIT_SECONDS", 5):
+            logger.warning(f"ffmpeg waited {waited:.1f}s for a slot (priority {priority})")
+        try:
+            pipe = self.redis.pipeline()
+            pipe.hincrby(self.stats_key, "acquired", 1)
+            pipe.hincrby(self.stats_key, "wait_ms_total", waited_ms)
+            pipe.hincrby(self.stats_key, f"acquired_p{priority}", 1)
+            pipe.hincrby(self.stats_key, f"wait_ms_total_p{priority}", waited_ms)
+            pipe.lpush(self.waits_key, waited_ms)
+            pipe.ltrim(self.waits_key, 0, 999)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Could not record ffmpeg wait time: {e}")
+
+    def stats(self):
+        """Current occupancy and queue wait statistics for this host"""
+        conn = self.redis
+        pipe = conn.pipeline()
+        pipe.zcard(self.holders_key)
+        pipe.hvals(self.threads_key)
+        pipe.zcard(self.waiters_key)
+        pipe.hgetall(self.stats_key)
+        pipe.lrange(self.waits_key, 0, -1)
+        running, thread_values, waiting, counters, waits = pipe.execute()
+
+        counters = {k.decode() if isinstance(k, bytes) else k: int(v) for k, v in counters.items()}
+        waits = sorted(int(w) for w in waits)
+
+        def percentile(p):
+            if not waits:
+                return 0
+            return waits[min(len(waits) - 1, int(len(waits) * p))]
+
+        acquired = counters.get("acquired", 0)
+        return {
+            "running": running,
+            "threads_in_use": sum(int(v) for v in thread_values),
+            "waiting": waiting,
+            "max_processes": self.max_procs,
+            "max_threads": self.max_threads,
+            "acquired": acquired,
+            "avg_wait_ms": counters.get("wait_ms_total", 0) / acquired if acquired else 0,
+            "p50_wait_ms": percentile(0.5),
+            "p95_wait_ms": percentile(0.95),
+            "max_recent_wait_ms": waits[-1] if waits else 0,
+            "counters": counters,
+        }
+
+
+def current_priority():
+    """Priority used by ``run_ffmpeg`` calls that don't pass one explicitly"""
+    return getattr(_local, "priority", PRIORITY_RENDER)
+
+
+@contextmanager
+def ffmpeg_priority(priority):
+    """
+    Run every ffmpeg call made by this thread inside the block at ``priority``.
+    Lets a view mark the work it does for a waiting user as interactive
+    without threading a parameter through the service layer.
+    """
+    previous = current_priority()
+    _local.priority = priority
+    try:
+        yield
+    finally:
+        _local.priority = previous
+
+
+_governor = None
+_governor_lock = threading.Lock()
+
+
+def get_governor():
+    global _governor
+    if _governor is None:
+        with _governor_lock:
+            if _governor is None:
+                _governor = FfmpegGovernor()
+    return _governor
@@ -0,0 +1,220 @@
+import os
+import json
+import wave
+import hashlib
+import logging
+import tempfile
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+from apps.core.services.storage_cache import PinnedFiles
+from apps.processors.services.alignment_cache import hash_audio_file
+from apps.processors.services.process_control import run_ffmpeg
+
+logger = logging.getLogger(__name__)
+
+# Every segment is decoded to this format before joining, so offsets are exact sample counts
+SAMPLE_RATE = 44100
+SEGMENT_PREFIX = "tts_segments"
+
+
+def segment_cache_key(text, voice_id, model_id, voice_settings):
+    """Stable key for one synthesized clip; any change to text or voice gives a new key"""
+    payload = json.dumps(
+        {
+            "text": " ".join(text.split()),
+            "voice_id": voice_id,
+            "model_id": model_id,
+            "voice_settings": voice_settings,
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def segment_storage_key(cache_key):
+    return f"{SEGMENT_PREFIX}/{cache_key[:2]}/{cache_key}.mp3"
+
+
+def manifest_storage_key(video_id):
+    return f"{SEGMENT_PREFIX}/manifests/video_{video_id}.json"
+
+
+def _decode_to_wav(mp3_path, wav_path):
+    run_ffmpeg([
+        "ffmpeg", "-y", "-i", mp3_path,
+        "-ac", "1", "-ar", str(SAMPLE_RATE), "-c:a", "pcm_s16le",
+        wav_path,
+    ], check=True, capture_output=True)
+
+
+def build_voiceover(video, handler, clips, work_dir, output_path):
+    """
+    Synthesize the voiceover clip by clip, reusing any segment already
+    generated with the same text, voice, model and settings, then join the
+    segments sample-accurately.
+
+    Args:
+        video: Video the voiceover is for
+        handler: ElevenLabsHandler used for missing segments
+        clips: Clips in playback order
+        work_dir: Scratch directory for segment files
+        output_path: Where to write the joined MP3
+
+    Returns:
+        Dict: Manifest with per-segment offsets, durations and cache keys
+    """
+    model_id = handler.DEFAULT_MODEL_ID
+    voice_settings = dict(handler.DEFAULT_VOICE_SETTINGS)
+
+    segments = []
+    for clip in clips:
+        text = (clip.text or "").strip()
+        if not text:
+            continue
+        key = segment_cache_key(text, handler.voice_id, model_id, voice_settings)
+        segments.append({"clip_id": clip.id, "text": text, "key": key})
+
+    missing = [s for s in segments if not default_storage.exists(segment_storage_key(s["key"]))]
+    missing_chars = sum(len(s["text"]) for s in missing)
+    print(f"Voiceover for video {video.id}: {len(segments) - len(missing)}/{len(segments)} segments cached, "
+          f"synthesizing {len(missing)} ({missing_chars} characters)")
+
+    if missing and not handler.has_sufficient_credits(missing_chars):
+        raise Exception("Insufficient credits to generate voiceover")
+
+    missing_keys = {s["key"] for s in missing}
+    joined_wav = os.path.join(work_dir, "voiceover.wav")
+    offset_frames = 0
+    # Reused segments are read straight from the worker's storage cache
+    with wave.open(joined_wav, "wb") as out, PinnedFiles() as files:
+        out.setnchannels(1)
+        out.setsampwidth(2)
+        out.setframerate(SAMPLE_RATE)
+
+        for idx, segment in enumerate(segments):
+            mp3_path = os.path.join(work_dir, f"segment_{idx:04d}.mp3")
+            storage_key = segment_storage_key(segment["key"])
+            if segment["key"] in missing_keys:
+                handler.generate_voiceover(
+                    text=segment["text"],
+                    output_path=mp3_path,
+                    voice_settings=voice_settings,
+                    model_id=model_id,
+                    check_credits=False,
+                )
+                if not default_storage.exists(storage_key):
+                    with open(mp3_path, "rb") as f:
+                        default_storage.save(storage_key, File(f))
+                missing_keys.discard(segment["key"])
+            else:
+                mp3_path = files.get(storage_key)
+
+            wav_path = os.path.join(work_dir, f"segment_{idx:04d}.wav")
+            _decode_to_wav(mp3_path, wav_path)
+            with wave.open(wav_path, "rb") as seg:
+                frames = seg.readframes(seg.getnframes())
+                frame_count = seg.getnframes()
+            out.writeframes(frames)
+            os.unlink(wav_path)
+
+            segment["offset"] = offset_frames / SAMPLE_RATE
+            segment["duration"] = frame_count / SAMPLE_RATE
+            segment["audio_hash"] = hash_audio_file(mp3_path)
+            offset_frames += frame_count
+
+    run_ffmpeg([
+        "ffmpeg", "-y", "-i", joined_wav,
+        "-c:a", "libmp3lame", "-b:a", "192k",
+        output_path,
+    ], check=True, capture_output=True)
+    os.unlink(joined_wav)
+
+    return {
+        "video_id": video.id,
+        "voice_id": handler.voice_id,
+        "model_id": model_id,
+        "audio_hash": hash_audio_file(output_path),
+        "duration": offset_frames / SAMPLE_RATE,
+        "synthesized_characters": missing_chars,
+        "segments": segments,
+    }
+
+
+def save_manifest(video_id, manifest):
+    key = manifest_storage_key(video_id)
+    if default_storage.exists(key):
+        default_storage.delete(key)
+    default_storage.save(key, ContentFile(json.dumps(manifest).encode("utf-8")))
+
+
+def load_manifest(video_id, audio_path):
+    """
+    Return the segment manifest for a video if it describes ``audio_path``,
+    otherwise None (e.g. the voiceover came from a history item instead).
+    """
+    key = manifest_storage_key(video_id)
+    try:
+        if not default_storage.exists(key):
+            return None
+        with default_storage.open(key, "rb") as f:
+            manifest = json.loads(f.read().decode("utf-8"))
+    except Exception as e:
+        logger.warning(f"Could not read voiceover manifest for video {video_id}: {e}")
+        return None
+    if manifest.get("audio_hash") != hash_audio_file(audio_path):
+        return None
+    return manifest
+
+
+def align_segments(aligner, manifest, output_json_path):
+    """
+    Align each segment on its own and shift its word timings by the segment
+    offset. Unchanged segments are served from the alignment cache, so only
+    edited clips reach the alignment API.
+
+    Returns:
+        str: Path to the combined Aeneas-format JSON
+
+    Raises:
+        RuntimeError: If a segment could not be aligned
+    """
+    fragments = []
+    with tempfile.TemporaryDirectory() as work_dir, PinnedFiles() as files:
+        for idx, segment in enumerate(manifest["segments"]):
+            json_path = os.path.join(work_dir, f"segment_{idx:04d}.json")
+            mp3_path = files.get(segment_storage_key(segment["key"]))
+
+            words = "\n".join(segment["text"].split())
+            result = aligner.align_text_with_audio(script=words, audio_path=mp3_path, output_json_path=json_path)
+            if not result or not os.path.exists(json_path):
+                raise RuntimeError(f"Alignment of voiceover segment {idx} ({segment['key']}) failed")
+            try:
+                with open(json_path, "r", encoding="utf-8") as f:
+                    segment_fragments = json.load(f).get("fragments", [])
+            except (OSError, ValueError) as e:
+                raise RuntimeError(f"Alignment of voiceover segment {idx} ({segment['key']}) is unreadable: {e}")
+
+            offset = segment["offset"]
+            segment_end = offset + segment["duration"]
+            for fragment in segment_fragments:
+                begin = min(float(fragment.get("begin", 0)) + offset, segment_end)
+                end = min(float(fragment.get("end", 0)) + offset, segment_end)
+                fragments.append({
+                    **fragment,
+                    "begin": f"{begin:.3f}",
+                    "end": f"{end:.3f}",
+                    "id": f"f{len(fragments) + 1:06d}",
+                })
+
+    with open(output_json_path, "w", encoding="utf-8") as f:
+        json.dump({"fragments": fragments}, f, indent=1, ensure_ascii=False)
+    print(f"Aligned {len(manifest['segments'])} segments ({len(fragments)} words)")
+    return output_json_path
+
+
+def incremental_tts_enabled():
+    return getattr(settings, "INCREMENTAL_TTS_ENABLED", True)
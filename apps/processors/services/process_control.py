@@ -0,0 +1,253 @@
+import os
+import time
+import signal
+import logging
+import subprocess
+import threading
+import uuid
+
+from apps.processors.services.ffmpeg_governor import current_priority, get_governor
+
+logger = logging.getLogger(__name__)
+
+
+class ProcessingCancelled(BaseException):
+    """
+    Raised inside a render when the user has cancelled it. Derives from
+    BaseException so the many broad ``except Exception`` fallbacks in the
+    render code (black-screen substitutes etc.) do not swallow it.
+    """
+
+
+def _cancel_key(video_id):
+    return f"video_cancel:{video_id}"
+
+
+def _run_key(video_id):
+    return f"video_run:{video_id}"
+
+
+def _get_redis():
+    from django_redis import get_redis_connection
+    return get_redis_connection("default")
+
+
+class CancellationToken:
+    """
+    Cooperative cancellation flag for one video render.
+
+    The flag lives in Redis so a cancel request served by any web process
+    reaches renders running in other threads, processes or Celery workers.
+    Child ffmpeg processes started through ``run_ffmpeg`` are registered
+    here and have their whole process group terminated on cancel.
+
+    Only a token created with a ``run_id`` (or given one by ``reset``)
+    watches the shared flag; it also counts as cancelled once a newer run
+    of the same video has been started, so a re-submitted render stops the
+    one it replaces. A token without a run only reacts to its own
+    ``cancel``, so work outside a render (background music mixes on
+    download and the like) isn't stopped by a flag left from an earlier
+    cancel.
+    """
+
+    # How long a negative Redis lookup is trusted before asking again
+    CHECK_INTERVAL = 0.5
+
+    def __init__(self, video_id, run_id=None):
+        self.video_id = video_id
+        self.run_id = run_id
+        # True when the render was replaced by a newer run rather than cancelled outright
+        self.superseded = False
+        self._cancelled = False
+        self._last_check = 0
+        self._lock = threading.Lock()
+        self._processes = set()
+
+    def cancel(self, ttl=3600):
+        """Flag the render as cancelled and kill any children started here"""
+        self._cancelled = True
+        try:
+            _get_redis().set(_cancel_key(self.video_id), "1", ex=ttl)
+        except Exception as e:
+            logger.warning(f"Could not store cancel flag for video {self.video_id}: {e}")
+        self.kill_processes()
+
+    def reset(self, ttl=24 * 3600):
+        """
+        Clear the flag before a new run of the same video starts and make
+        that run the current one. Returns the new run id.
+        """
+        self._cancelled = False
+        self.run_id = uuid.uuid4().hex
+        try:
+            conn = _get_redis()
+            pipe = conn.pipeline()
+            pipe.delete(_cancel_key(self.video_id))
+            pipe.set(_run_key(self.video_id), self.run_id, ex=ttl)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Could not clear cancel flag for video {self.video_id}: {e}")
+        return self.run_id
+
+    def is_cancelled(self):
+        if self._cancelled or not self.run_id:
+            return self._cancelled
+        now = time.monotonic()
+        if now - self._last_check < self.CHECK_INTERVAL:
+            return False
+        self._last_check = now
+        try:
+            conn = _get_redis()
+            pipe = conn.pipeline()
+            pipe.exists(_cancel_key(self.video_id))
+            pipe.get(_run_key(self.video_id))
+            flagged, current_run = pipe.execute()
+            if isinstance(current_run, bytes):
+                current_run = current_run.decode("utf-8")
+            self.superseded = bool(self.run_id and current_run and current_run != self.run_id)
+            self._cancelled = bool(flagged) or self.superseded
+        except Exception as e:
+            logger.warning(f"Could not read cancel flag for video {self.video_id}: {e}")
+        return self._cancelled
+
+    def raise_if_cancelled(self):
+        if self.is_cancelled():
+            raise ProcessingCancelled(f"Processing of video {self.video_id} was cancelled")
+
+    def wait(self, seconds):
+        """Sleep for up to ``seconds``, returning True early if cancelled"""
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            if self.is_cancelled():
+                return True
+            time.sleep(min(self.CHECK_INTERVAL, max(0, deadline - time.monotonic())))
+        return self.is_cancelled()
+
+    def register(self, process):
+        with self._lock:
+            self._processes.add(process)
+
+    def unregister(self, process):
+        with self._lock:
+            self._processes.discard(process)
+
+    def kill_processes(self):
+        with self._lock:
+            processes = list(self._processes)
+        for process in processes:
+            terminate_process_group(process)
+
+
+def terminate_process_group(process, grace=5):
+    """SIGTERM the process group of ``process``, then SIGKILL it if it lingers"""
+    if process.poll() is not None:
+        return
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait(timeout=grace)
+    except subprocess.TimeoutExpired:
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+    except ProcessLookupError:
+        pass
+
+
+def _is_encode(cmd):
+    """Only ffmpeg runs that read an input take a slot; -h/-version probes don't"""
+    return bool(cmd) and os.path.basename(str(cmd[0])) == "ffmpeg" and "-i" in cmd
+
+
+def _with_thread_limit(cmd, threads):
+    """Cap encoder threads unless the caller already chose a value"""
+    if "-threads" in cmd or len(cmd) < 2:
+        return cmd
+    # Output options go right before the output path, which is always last here
+    return list(cmd[:-1]) + ["-threads", str(threads), cmd[-1]]
+
+
+def run_ffmpeg(cmd, token=None, check=False, capture_output=False, text=False, timeout=None,
+               priority=None, threads=None):
+    """
+    Drop-in replacement for ``subprocess.run`` for ffmpeg/ffprobe commands.
+
+    ffmpeg invocations first take a lease from the host-wide governor, so the
+    number of concurrent encodes and encoder threads stays bounded across all
+    web and Celery processes on the machine. Encoder threads are only capped
+    (at ``threads`` or FFMPEG_THREADS_PER_PROCESS) when ``threads`` is given
+    or other encodes are already running; ``priority`` (defaulting to the
+    one set with ``ffmpeg_priority``) decides who is served first when the
+    host is saturated. ffprobe calls are cheap and run ungoverned.
+
+    The child runs in its own process group so it (and anything it spawns)
+    can be killed as a unit. When a cancellation token is given it is polled
+    while the command runs and the group is terminated as soon as the render
+    is cancelled.
+
+    Returns:
+        subprocess.CompletedProcess
+    """
+    if token is not None:
+        token.raise_if_cancelled()
+
+    lease = None
+    if _is_encode(cmd):
+        if priority is None:
+            priority = current_priority()
+        lease = get_governor().acquire(priority=priority, threads=threads, token=token)
+        # A lone encode gets every core; the cap only applies while others share the host
+        if lease.contended or threads is not None:
+            cmd = _with_thread_limit(cmd, lease.threads)
+        if lease.waited >= 1:
+            print(f"ffmpeg waited {lease.waited:.2f}s for a slot (priority {priority})")
+
+    try:
+        pipe = subprocess.PIPE if capture_output else None
+        process = subprocess.Popen(
+            cmd,
+            stdout=pipe,
+            stderr=pipe,
+            text=text,
+            start_new_session=True,
+        )
+    except BaseException:
+        if lease is not None:
+            lease.release()
+        raise
+    if token is not None:
+        token.register(process)
+
+    started = time.monotonic()
+    try:
+        while True:
+            try:
+                stdout, stderr = process.communicate(timeout=CancellationToken.CHECK_INTERVAL)
+                break
+            except subprocess.TimeoutExpired:
+                if token is not None and token.is_cancelled():
+                    terminate_process_group(process)
+                    raise ProcessingCancelled(f"Processing of video {token.video_id} was cancelled")
+                if timeout is not None and time.monotonic() - started > timeout:
+                    terminate_process_group(process)
+                    raise subprocess.TimeoutExpired(cmd, timeout)
+                if lease is not None:
+                    lease.refresh()
+    except BaseException:
+        # Never leave an orphaned ffmpeg behind, whatever interrupted us
+        terminate_process_group(process)
+        raise
+    finally:
+        if token is not None:
+            token.unregister(process)
+        if lease is not None:
+            lease.release()
+
+    if check and process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, cmd, output=stdout, stderr=stderr)
+    return subprocess.CompletedProcess(cmd, process.returncode, stdout, stderr)
+
+
+def check_ffmpeg_output(cmd, token=None, timeout=None):
+    """``subprocess.check_output`` counterpart of ``run_ffmpeg``, mostly for ffprobe"""
+    return run_ffmpeg(cmd, token=token, check=True, capture_output=True, timeout=timeout).stdout
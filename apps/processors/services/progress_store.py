@@ -0,0 +1,278 @@
+import json
+import time
+import asyncio
+import logging
+
+from django.conf import settings
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Terminal states end an SSE stream and always force a DB checkpoint
+TERMINAL_STATUSES = ("completed", "error", "cancelled")
+
+# Fields mirrored onto the ProcessingStatus row during a checkpoint
+CHECKPOINT_FIELDS = ("status", "progress", "current_step", "error_message")
+
+
+def _progress_key(video_id):
+    return f"video_progress:{video_id}"
+
+
+def _progress_channel(video_id):
+    return f"video_progress:{video_id}:events"
+
+
+def _decode(value):
+    if isinstance(value, bytes):
+        return value.decode("utf-8")
+    return value
+
+
+def _coerce(data):
+    """Turn a raw Redis hash into the JSON shape the loading page expects"""
+    data = {_decode(k): _decode(v) for k, v in data.items()}
+    for field in ("progress", "stage_progress"):
+        if data.get(field) not in (None, ""):
+            try:
+                data[field] = int(float(data[field]))
+            except ValueError:
+                pass
+    if data.get("error_message") == "":
+        data["error_message"] = None
+    if data.get("output") == "":
+        data["output"] = None
+    return data
+
+
+def get_redis():
+    from django_redis import get_redis_connection
+    return get_redis_connection("default")
+
+
+class ProgressTracker:
+    """
+    Keeps the live processing state of a video in a Redis hash and publishes
+    every change on a pub/sub channel for the SSE endpoint. The
+    ProcessingStatus row is only written on status changes and at most once
+    every PROGRESS_CHECKPOINT_INTERVAL seconds.
+    """
+
+    def __init__(self, video_id, status_obj=None):
+        self.video_id = video_id
+        self.status_obj = status_obj
+        self.key = _progress_key(video_id)
+        self.channel = _progress_channel(video_id)
+        self.ttl = getattr(settings, "PROGRESS_TTL", 24 * 3600)
+        self.terminal_ttl = getattr(settings, "PROGRESS_TERMINAL_TTL", 60)
+        self.checkpoint_interval = getattr(settings, "PROGRESS_CHECKPOINT_INTERVAL", 15)
+        self._last_checkpoint = 0
+        self._last_status = status_obj.status if status_obj else None
+
+    def start(self, user_id):
+        """Reset the hash for a new run"""
+        state = {
+            "video_id": self.video_id,
+            "user_id": user_id,
+            "status": "processing",
+            "progress": 0,
+            "stage": "queued",
+            "stage_progress": 0,
+            "current_step": "Queued",
+            "error_message": "",
+            "output": "",
+            "started_at": timezone.now().isoformat(),
+        }
+        try:
+            conn = get_redis()
+            pipe = conn.pipeline()
+            pipe.delete(self.key)
+            pipe.hset(self.key, mapping={k: str(v) for k, v in state.items()})
+            pipe.expire(self.key, self.ttl)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Could not initialise progress hash for video {self.video_id}: {e}")
+        self._last_status = "processing"
+        self._last_checkpoint = time.time()
+
+    def update(self, progress=None, step=None, status=None, error=None, stage=None,
+               stage_progress=None, checkpoint=False, **extra):
+        """
+        Record a progress change. Extra keyword arguments are stored as
+        additional per-stage fields (e.g. runpod_job_id, clips_done).
+        """
+        fields = {"updated_at": timezone.now().isoformat()}
+        if progress is not None:
+            fields["progress"] = progress
+        if step is not None:
+            fields["current_step"] = step
+        if stage is not None:
+            fields["stage"] = stage
+            fields["stage_progress"] = 0 if stage_progress is None else stage_progress
+        elif stage_progress is not None:
+            fields["stage_progress"] = stage_progress
+        if error is not None:
+            status = status or "error"
+            fields["error_message"] = error
+        if status is not None:
+            fields["status"] = status
+        fields.update(extra)
+
+        published = self._publish(fields)
+
+        status_changed = status is not None and status != self._last_status
+        due = time.time() - self._last_checkpoint >= self.checkpoint_interval
+        if checkpoint or status_changed or due or not published:
+            self.checkpoint(fields)
+        if status is not None:
+            self._last_status = status
+
+    def fail(self, error):
+        self.update(status="error", error=error)
+
+    def complete(self, output=None):
+        self.update(progress=100, status="completed", step="Processing complete",
+                    stage="done", stage_progress=100, output=output or "")
+
+    def _publish(self, fields):
+        try:
+            conn = get_redis()
+            pipe = conn.pipeline()
+            pipe.hset(self.key, mapping={k: "" if v is None else str(v) for k, v in fields.items()})
+            # Finished runs only linger long enough for pollers to see the final state
+            pipe.expire(self.key, self.terminal_ttl if fields.get("status") in TERMINAL_STATUSES else self.ttl)
+            pipe.hgetall(self.key)
+            result = pipe.execute()
+            conn.publish(self.channel, json.dumps(_coerce(result[-1])))
+            return True
+        except Exception as e:
+            logger.warning(f"Could not publish progress for video {self.video_id}: {e}")
+            return False
+
+    def checkpoint(self, fields=None):
+        """Mirror the current state onto the ProcessingStatus row"""
+        from apps.processors.models import ProcessingStatus
+
+        state = self.snapshot() or {}
+        if fields:
+            state.update({k: v for k, v in fields.items() if v is not None})
+        values = {f: state[f] for f in CHECKPOINT_FIELDS if f in state}
+        if "progress" in values:
+            values["progress"] = int(float(values["progress"]))
+        if values.get("error_message") == "":
+            values["error_message"] = None
+        self._last_checkpoint = time.time()
+
+        try:
+            if values.get("status") in TERMINAL_STATUSES:
+                # Terminal states go through save() so post_save receivers still run
+                status_obj = self.status_obj
+                if status_obj is None:
+                    status_obj, _ = ProcessingStatus.objects.get_or_create(video_id=self.video_id)
+                for field, value in values.items():
+                    setattr(status_obj, field, value)
+                status_obj.save()
+                return
+
+            # update() skips pre_save, so clear any expiry left by a previous run here
+            values["updated_at"] = timezone.now()
+            values["expires_at"] = None
+            updated = ProcessingStatus.objects.filter(video_id=self.video_id).update(**values)
+            if not updated:
+                values.pop("updated_at")
+                values.pop("expires_at")
+                values.setdefault("status", "processing")
+                values.setdefault("current_step", "Processing")
+                self.status_obj = ProcessingStatus.objects.create(video_id=self.video_id, **values)
+        except Exception as e:
+            print(f"Error checkpointing processing status: {e}")
+
+    def snapshot(self):
+        return get_progress(self.video_id)
+
+
+def get_progress(video_id):
+    """Return the live progress hash for a video, or None if there is none"""
+    try:
+        data = get_redis().hgetall(_progress_key(video_id))
+    except Exception as e:
+        logger.warning(f"Could not read progress for video {video_id}: {e}")
+        return None
+    if not data:
+        return None
+    return _coerce(data)
+
+
+def clear_progress(video_id):
+    try:
+        get_redis().delete(_progress_key(video_id))
+    except Exception as e:
+        logger.warning(f"Could not clear progress for video {video_id}: {e}")
+
+
+def _sse(data, event=None):
+    message = ""
+    if event:
+        message += f"event: {event}\n"
+    return message + f"data: {json.dumps(data)}\n\n"
+
+
+def stream_progress_events(video_id, heartbeat=15, max_duration=3600):
+    """Blocking SSE generator, used when the request is served over WSGI"""
+    conn = get_redis()
+    pubsub = conn.pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe(_progress_channel(video_id))
+    started = time.time()
+    last_sent = time.time()
+    try:
+        current = get_progress(video_id)
+        if current:
+            yield _sse(current)
+            if current.get("status") in TERMINAL_STATUSES:
+                return
+        while time.time() - started < max_duration:
+            message = pubsub.get_message(timeout=1.0)
+            if message and message.get("type") == "message":
+                data = json.loads(_decode(message["data"]))
+                yield _sse(data)
+                last_sent = time.time()
+                if data.get("status") in TERMINAL_STATUSES:
+                    return
+            elif time.time() - last_sent >= heartbeat:
+                yield ": keep-alive\n\n"
+                last_sent = time.time()
+    finally:
+        pubsub.close()
+
+
+async def astream_progress_events(video_id, heartbeat=15, max_duration=3600):
+    """Non-blocking SSE generator, used when the request is served over ASGI"""
+    import redis.asyncio as aioredis
+
+    client = aioredis.from_url(settings.REDIS_URL)
+    pubsub = client.pubsub(ignore_subscribe_messages=True)
+    await pubsub.subscribe(_progress_channel(video_id))
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    last_sent = loop.time()
+    try:
+        current = await client.hgetall(_progress_key(video_id))
+        if current:
+            current = _coerce(current)
+            yield _sse(current)
+            if current.get("status") in TERMINAL_STATUSES:
+                return
+        while loop.time() - started < max_duration:
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            if message and message.get("type") == "message":
+                data = json.loads(_decode(message["data"]))
+                yield _sse(data)
+                last_sent = loop.time()
+                if data.get("status") in TERMINAL_STATUSES:
+                    return
+            elif loop.time() - last_sent >= heartbeat:
+                yield ": keep-alive\n\n"
+                last_sent = loop.time()
+    finally:
+        await pubsub.aclose()
+        await client.aclose()
@@ -1,12 +1,10 @@
 import json
 import requests
-import os
-import tempfile
 import time
 from django.conf import settings
-from django.core.files.storage import default_storage
 from django.core.files import File
 
+from apps.core.services.storage_io import download_to_tempfile
 from apps.processors.utils import generate_signed_url, generate_signed_url_for_upload
 from apps.processors.models import Video, Clips, Subclip, BackgroundMusic, VideoLogs
 
@@ -23,10 +21,7 @@ class RunPodVideoProcessor:
             return None
         s3_path = s3_path.replace('media/', '')
         try:
-            with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(s3_path)[1]) as tmp:
-                with default_storage.open(s3_path, 'rb') as s3_file:
-                    tmp.write(s3_file.read())
-                return tmp.name
+            return download_to_tempfile(s3_path)
         except Exception as e:
             print(f"Error downloading {s3_path}: {str(e)}")
             return None
@@ -422,13 +417,33 @@ class RunPodVideoProcessor:
             return False
 
 
-    def poll_until_complete(self, job_id, max_attempts=1000, delay=10):
+    def cancel_job(self, job_id):
+        """Cancel a queued or running job so it stops using RunPod capacity"""
+        cancel_url = f"https://api.runpod.ai/v2/{self.endpoint_id}/cancel/{job_id}"
+        headers = {
+            "Authorization": f"Bearer {self.api_key}"
+        }
+        
+        try:
+            response = requests.post(cancel_url, headers=headers, timeout=30)
+            response.raise_for_status()
+            print(f"Cancelled RunPod job {job_id}")
+            return response.json()
+        except Exception as e:
+            print(f"Error cancelling RunPod job {job_id}: {str(e)}")
+            return {
+                "success": False,
+                "error": str(e)
+            }
+
+    def poll_until_complete(self, job_id, max_attempts=1000, delay=10, cancel_token=None):
         """Poll the job status until it completes or fails
         
         Args:
             job_id: The RunPod job ID
             max_attempts: Maximum number of polling attempts
             delay: Delay between polling attempts in seconds
+            cancel_token: Optional CancellationToken; the job is cancelled on RunPod when it fires
             
         Returns:
             dict: Status information including success, status, and output data
@@ -437,6 +452,14 @@ class RunPodVideoProcessor:
         
         while True:
             attempt += 1
+
+            if cancel_token is not None and cancel_token.is_cancelled():
+                self.cancel_job(job_id)
+                return {
+                    "success": False,
+                    "status": "cancelled",
+                    "error": "Processing was cancelled"
+                }
             
             # Get the job status
             status_result = self.check_job_status(job_id)
@@ -466,8 +489,11 @@ class RunPodVideoProcessor:
                 
             print(f"Job {job_id} is still running. Status: {status}, Progress: {progress}")
             
-            # Wait before checking again
-            time.sleep(delay)
+            # Wait before checking again, waking up early if the render is cancelled
+            if cancel_token is not None:
+                cancel_token.wait(delay)
+            else:
+                time.sleep(delay)
             
         # If we've reached the maximum attempts, return a timeout error
         return {
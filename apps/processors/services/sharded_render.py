@@ -0,0 +1,224 @@
+import os
+import time
+import uuid
+import shutil
+import tempfile
+import logging
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db.models import Max
+
+from apps.core.services.storage_cache import get_storage_cache
+from apps.core.services.storage_io import download_to_path
+from apps.processors.models import Video, Clips
+from apps.processors.services.process_control import CancellationToken, run_ffmpeg
+
+logger = logging.getLogger(__name__)
+
+
+def plan_shards(video: Video, shard_count):
+    """
+    Split the clip timeline into at most ``shard_count`` contiguous shards of
+    roughly equal duration. Shards are only cut at clip (scene) boundaries so
+    no clip, subclip or subtitle straddles two shards.
+
+    Returns:
+        list: Dicts with index, start, end, clip_ids and is_last
+    """
+    clips = list(Clips.objects.filter(video=video).order_by("start_time"))
+    if not clips:
+        return []
+
+    total_duration = max(clip.end_time or 0 for clip in clips)
+    target = total_duration / max(shard_count, 1)
+
+    shards = []
+    current = []
+    shard_start = 0.0
+    for idx, clip in enumerate(clips):
+        current.append(clip)
+        remaining_clips = len(clips) - idx - 1
+        remaining_shards = shard_count - len(shards) - 1
+        if (
+            remaining_shards > 0
+            and remaining_clips > 0
+            and (clip.end_time or 0) - shard_start >= target
+        ):
+            shards.append({
+                "index": len(shards),
+                "start": shard_start,
+                "end": clip.end_time,
+                "clip_ids": [c.id for c in current],
+                "is_last": False,
+            })
+            shard_start = clip.end_time
+            current = []
+
+    if current:
+        shards.append({
+            "index": len(shards),
+            "start": shard_start,
+            "end": total_duration,
+            "clip_ids": [c.id for c in current],
+            "is_last": True,
+        })
+    return shards
+
+
+def should_shard(video: Video):
+    """Only long timelines are worth spreading across workers"""
+    shard_count = getattr(settings, "VIDEO_RENDER_SHARDS", 1)
+    if shard_count < 2:
+        return False
+    # MAX ignores clips without timings, which would sort first on PostgreSQL
+    end_time = Clips.objects.filter(video=video).aggregate(end=Max("end_time"))["end"]
+    if not end_time:
+        return False
+    return end_time >= getattr(settings, "SHARD_RENDER_MIN_DURATION", 120)
+
+
+def shard_storage_key(video_id, job_id, index):
+    return f"render_shards/{video_id}/{job_id}/shard_{index:03d}.mp4"
+
+
+def render_shard(video_id, shard, add_watermark, job_id, run_id=None):
+    """Render one shard locally and upload it so the coordinator can fetch it"""
+    from apps.processors.services.video_processor import VideoProcessorService
+
+    video = Video.objects.get(id=video_id)
+    processor = VideoProcessorService(video, cancel_token=CancellationToken(video_id, run_id=run_id))
+    try:
+        local_path = processor.generate_video(add_watermark=add_watermark, shard=shard)
+    finally:
+        processor.close()
+
+    key = shard_storage_key(video_id, job_id, shard["index"])
+    try:
+        with open(local_path, "rb") as f:
+            key = default_storage.save(key, File(f))
+    finally:
+        if os.path.exists(local_path):
+            os.unlink(local_path)
+    print(f"Uploaded shard {shard['index']} of video {video_id} to {key}")
+    return key
+
+
+def render_video_sharded(video: Video, add_watermark=False, status_callback=None, cancel_token=None):
+    """
+    Render a video by fanning shards out to Celery workers, then join them with
+    a stream-copy concat and mux the voiceover once.
+
+    Args:
+        cancel_token: Token of the run this render belongs to; a new run is
+            started (clearing any earlier cancel) when None
+
+    Returns:
+        str: Local path of the assembled video
+    """
+    from celery import group
+    from apps.processors.tasks import render_video_shard_task
+
+    if cancel_token is None:
+        cancel_token = CancellationToken(video.id)
+        cancel_token.reset()
+
+    def report(progress, step):
+        if status_callback:
+            status_callback(video.id, progress, step)
+
+    shards = plan_shards(video, getattr(settings, "VIDEO_RENDER_SHARDS", 1))
+    if not shards:
+        raise ValueError(f"No clips found for video {video.id}")
+
+    job_id = uuid.uuid4().hex[:12]
+    render_start = time.time()
+    print(f"Rendering video {video.id} as {len(shards)} shards (job {job_id})")
+    report(10, f"Rendering {len(shards)} shards")
+
+    result = group(
+        render_video_shard_task.s(video.id, shard, add_watermark, job_id, cancel_token.run_id)
+        for shard in shards
+    ).apply_async()
+
+    timeout = getattr(settings, "SHARD_RENDER_TIMEOUT", 3600)
+    deadline = time.time() + timeout
+    done = 0
+    try:
+        while not result.ready():
+            if cancel_token.is_cancelled():
+                # Shard workers notice the flag themselves; revoking stops the queued ones
+                result.revoke(terminate=True)
+                cancel_token.raise_if_cancelled()
+            if time.time() > deadline:
+                result.revoke(terminate=True)
+                raise TimeoutError(f"Sharded render of video {video.id} timed out after {timeout}s")
+            completed = result.completed_count()
+            if completed != done:
+                done = completed
+                report(10 + int(70 * done / len(shards)), f"Rendered {done}/{len(shards)} shards")
+            time.sleep(2)
+
+        # All shards are done, so read their results directly instead of result.get(),
+        # which a coordinator running in a worker may not call. In shard order; failures re-raised
+        shard_keys = []
+        for index, shard_result in enumerate(result.results):
+            if not shard_result.successful():
+                error = shard_result.result
+                if isinstance(error, BaseException):
+                    raise error
+                raise RuntimeError(f"Shard {index} of video {video.id} ended as {shard_result.state}")
+            shard_keys.append(shard_result.result)
+    except BaseException:
+        # Don't leave uploaded shards behind when the render is abandoned
+        for shard_result in result.results:
+            if shard_result.successful():
+                default_storage.delete(shard_result.result)
+        # A shard that stopped because of a cancel is reported as cancelled, not failed
+        cancel_token.raise_if_cancelled()
+        raise
+    print(f"All {len(shards)} shards of video {video.id} rendered in {time.time() - render_start:.2f} seconds")
+    report(80, "Joining shards")
+
+    temp_dir = tempfile.mkdtemp(suffix=f"videocrafter_shards_{video.id}")
+    cached_audio = None
+    try:
+        concat_file_path = os.path.join(temp_dir, "concat.txt")
+        with open(concat_file_path, "w") as concat_file:
+            for idx, key in enumerate(shard_keys):
+                local_path = os.path.join(temp_dir, f"shard_{idx:03d}.mp4")
+                download_to_path(key, local_path)
+                concat_file.write(f"file '{local_path}'\n")
+
+        output_path = os.path.join(tempfile.gettempdir(), f"video_{video.id}_output_{int(time.time())}.mp4")
+        cmd = ["ffmpeg", "-y", "-f", "concat", "-safe", "0", "-i", concat_file_path]
+
+        if video.audio_file:
+            cached_audio = get_storage_cache().open(video.audio_file.name)
+            audio_path = cached_audio.path
+            cmd.extend([
+                "-i", audio_path,
+                "-map", "0:v:0",
+                "-map", "1:a:0",
+                "-c:v", "copy",
+                "-c:a", "aac",
+            ])
+        else:
+            cmd.extend(["-c", "copy"])
+
+        cmd.extend(["-movflags", "+faststart", output_path])
+        print(f"Joining shards with command: {' '.join(cmd)}")
+        run_ffmpeg(cmd, check=True, token=cancel_token)
+    finally:
+        if cached_audio is not None:
+            cached_audio.release()
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        for key in shard_keys:
+            try:
+                default_storage.delete(key)
+            except Exception as e:
+                logger.warning(f"Could not delete shard {key}: {e}")
+
+    print(f"Sharded render of video {video.id} completed in {time.time() - render_start:.2f} seconds")
+    return output_path
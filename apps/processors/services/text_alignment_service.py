@@ -8,6 +8,8 @@ from aeneas.executetask import ExecuteTask
 from aeneas.task import Task
 from aeneas.textfile import TextFileFormat
 
+from apps.processors.services.chunked_alignment import align_in_chunks, chunking_enabled
+
 class TextAudioAligner:
     def __init__(self):
         # Check if aeneas is installed
@@ -318,6 +320,13 @@ class TextAudioAligner:
                     "is_text_mapping=word"  # Force word-level mapping
                 )
 
+            # Long audio is split at pauses between phrases and aligned on all cores
+            if chunking_enabled(duration):
+                lines = [line.strip() for line in text_content.splitlines() if line.strip()]
+                if align_in_chunks(audio_path, lines, "\n", config_string, output_path, duration):
+                    print("Successfully aligned text with audio")
+                    return output_path
+
             task = Task(config_string=config_string)
             task.audio_file_path_absolute = os.path.abspath(audio_path)
             task.text_file_path_absolute = os.path.abspath(text_path)
@@ -0,0 +1,138 @@
+import logging
+import threading
+from contextlib import contextmanager
+
+from django.db import transaction
+
+from apps.processors.services.token_aligner import get_token_alignment
+from apps.processors.services.transcript_index import get_transcript_index
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp')
+
+_state = threading.local()
+
+
+@contextmanager
+def suppress_timing_signals():
+    """Skip the SRT-matching pre_save handlers for saves made inside the block"""
+    previous = getattr(_state, "suppressed", False)
+    _state.suppressed = True
+    try:
+        yield
+    finally:
+        _state.suppressed = previous
+
+
+def timing_signals_suppressed():
+    return getattr(_state, "suppressed", False)
+
+
+def _end_after(index, end_idx):
+    """Start of the next fragment once ``end_idx`` has ended, else its own end"""
+    next_idx = index.next_fragment_after(end_idx)
+    return index.begins[next_idx] if next_idx is not None else index.ends[end_idx]
+
+
+def _first_word(text):
+    words = (text or "").strip().split()
+    return words[0].lower() if words else ""
+
+
+def solve_video_timings(video):
+    """
+    Compute start/end times of every clip and subclip of a video in one
+    forward pass over the transcript and write them with bulk_update.
+
+    Clip texts are aligned against the transcript word by word in sequence
+    order, so repeated sentences resolve to successive occurrences.
+    Subclips are located inside their clip's words and take the timings of
+    the fragments those words were aligned to.
+
+    Args:
+        video: Video whose srt_file holds the alignment
+
+    Returns:
+        int: Number of clips matched against the transcript
+    """
+    from apps.processors.models import Clips, Subclip
+
+    index = get_transcript_index(video)
+    if index is None or not len(index):
+        raise ValueError(f"No fragments found in SRT file for video #{video.id}")
+
+    clips = list(Clips.objects.filter(video=video).order_by("sequence"))
+    subclips_by_clip = {}
+    for subclip in Subclip.objects.filter(clip__video=video).order_by("id"):
+        subclips_by_clip.setdefault(subclip.clip_id, []).append(subclip)
+
+    alignment = get_token_alignment(index, [clip.text or "" for clip in clips])
+
+    # Clip pass
+    matched = 0
+    last_end_idx = None
+    for position, clip in enumerate(clips):
+        clip.start_time = None
+        span = alignment.clip_span(position)
+        if not span:
+            logger.warning(f"Clip #{clip.id}: no match found in transcript")
+            continue
+        clip.start_time = index.begins[span[0]]
+        last_end_idx = span[1]
+        matched += 1
+
+    if clips:
+        clips[0].start_time = 0
+    for i, clip in enumerate(clips):
+        if clip.start_time is None:
+            clip.start_time = clips[i - 1].start_time
+    for i, clip in enumerate(clips):
+        if i + 1 < len(clips):
+            clip.end_time = clips[i + 1].start_time
+        elif last_end_idx is not None:
+            clip.end_time = _end_after(index, last_end_idx)
+        else:
+            clip.end_time = index.ends[-1]
+        if clip.end_time <= clip.start_time:
+            clip.end_time = clip.start_time + 0.5
+
+    video_end_time = clips[-1].end_time if clips else None
+    for clip in clips:
+        clip.video_end_time = video_end_time
+
+    # Subclip pass
+    subclips = []
+    for position, clip in enumerate(clips):
+        clip_subclips = subclips_by_clip.get(clip.id, [])
+        if not clip_subclips:
+            continue
+        clip_words = alignment.text_tokens[position]
+
+        def position_in_clip(subclip):
+            _, offset = alignment.sub_span(position, subclip.text or "")
+            return (offset if offset is not None else len(clip_words), subclip.id)
+
+        cursor = 0
+        for subclip in sorted(clip_subclips, key=position_in_clip):
+            if subclip.video_file:
+                subclip.is_image = subclip.video_file.name.lower().endswith(IMAGE_EXTENSIONS)
+            span, offset = alignment.sub_span(position, subclip.text or "", cursor)
+            if offset is not None:
+                cursor = offset + 1
+            if span:
+                subclip.start_time = index.begins[span[0]]
+                subclip.end_time = _end_after(index, span[1])
+            else:
+                logger.warning(f"Subclip #{subclip.id}: no match found in transcript")
+
+            if clip.sequence == 1 and _first_word(subclip.text) and _first_word(subclip.text) == _first_word(clip.text):
+                subclip.start_time = 0
+            subclips.append(subclip)
+
+    with transaction.atomic(), suppress_timing_signals():
+        Clips.objects.bulk_update(clips, ["start_time", "end_time", "video_end_time"], batch_size=500)
+        Subclip.objects.bulk_update(subclips, ["start_time", "end_time", "is_image"], batch_size=500)
+
+    print(f"Solved timings for video {video.id}: {matched}/{len(clips)} clips matched, {len(subclips)} subclips")
+    return matched
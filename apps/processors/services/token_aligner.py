@@ -0,0 +1,148 @@
+import re
+import threading
+from collections import OrderedDict
+from difflib import SequenceMatcher
+
+import numpy as np
+
+# Punctuation glued to a word ("hello," / "(world") is dropped before comparing
+_EDGE_PUNCTUATION = re.compile(r"^\W+|\W+$")
+
+# A text counts as found when at least this share of its words matched
+MIN_COVERAGE = 0.3
+
+_CACHE_SIZE = 16
+_alignments = OrderedDict()
+_alignments_lock = threading.Lock()
+
+
+def tokenize(text):
+    """Normalized words of ``text``, as compared by the aligner"""
+    from apps.processors.utils import clean_text_for_alignment
+
+    tokens = []
+    for word in clean_text_for_alignment(text or "").split():
+        word = _EDGE_PUNCTUATION.sub("", word)
+        if word:
+            tokens.append(word)
+    return tokens
+
+
+class TokenAlignment:
+    """
+    Word-level alignment of a script (clip texts, in playback order) against
+    the fragments of a TranscriptIndex.
+
+    Both sides are tokenized once and encoded as integer word IDs, then a
+    single SequenceMatcher pass pairs script words with transcript words.
+    Matching blocks are monotonic, so repeated sentences map to successive
+    occurrences, and a few mismatched words only leave small gaps instead of
+    failing the whole clip.
+    """
+
+    def __init__(self, index, texts):
+        self.index = index
+        vocabulary = {}
+
+        def encode(words):
+            return np.fromiter(
+                (vocabulary.setdefault(w, len(vocabulary)) for w in words),
+                dtype=np.int32,
+                count=len(words),
+            )
+
+        transcript_words = []
+        fragment_of = []
+        for fragment_idx, text in enumerate(index.words):
+            words = tokenize(text)
+            transcript_words.extend(words)
+            fragment_of.extend([fragment_idx] * len(words))
+        self.transcript_ids = encode(transcript_words)
+        self.fragment_of = np.asarray(fragment_of, dtype=np.int32)
+
+        self.text_tokens = [tokenize(text) for text in texts]
+        self.offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+        np.cumsum([len(tokens) for tokens in self.text_tokens], out=self.offsets[1:])
+        self.script_ids = encode([w for tokens in self.text_tokens for w in tokens])
+
+        # script word -> transcript word, -1 where the word wasn't matched
+        self.mapping = np.full(len(self.script_ids), -1, dtype=np.int64)
+        # autojunk would drop every word making up more than 1% of a long
+        # transcript, so clips of common words could never be anchored
+        matcher = SequenceMatcher(None, self.script_ids.tolist(), self.transcript_ids.tolist(), autojunk=False)
+        for a, b, size in matcher.get_matching_blocks():
+            if size:
+                self.mapping[a:a + size] = np.arange(b, b + size)
+
+    def _fragment_span(self, start, stop):
+        if stop <= start:
+            return None
+        hits = self.mapping[start:stop]
+        hits = hits[hits >= 0]
+        if hits.size == 0 or hits.size < MIN_COVERAGE * (stop - start):
+            return None
+        return int(self.fragment_of[hits[0]]), int(self.fragment_of[hits[-1]])
+
+    def clip_span(self, position):
+        """
+        Fragments spoken for the text at ``position`` in the script.
+
+        Returns:
+            Optional[tuple]: (start fragment index, end fragment index) or None
+        """
+        return self._fragment_span(self.offsets[position], self.offsets[position + 1])
+
+    def sub_span(self, position, text, cursor=0):
+        """
+        Fragments spoken for ``text``, a highlight inside the text at
+        ``position``, searching from word ``cursor`` of that text.
+
+        Returns:
+            tuple: ((start fragment, end fragment) or None, word offset of
+            ``text`` inside the text at ``position`` or None when absent)
+        """
+        words = tokenize(text)
+        clip_words = self.text_tokens[position]
+        if not words:
+            return None, None
+
+        offset = None
+        for k in range(cursor, len(clip_words) - len(words) + 1):
+            if clip_words[k] == words[0] and clip_words[k:k + len(words)] == words:
+                offset = k
+                break
+        if offset is None:
+            # Closest run of the highlight's words inside the clip
+            blocks = [
+                block for block in SequenceMatcher(None, words, clip_words[cursor:], autojunk=False).get_matching_blocks()
+                if block.size
+            ]
+            if not blocks:
+                return None, None
+            offset = cursor + blocks[0].b - blocks[0].a
+
+        base = int(self.offsets[position])
+        start = base + max(offset, 0)
+        stop = min(base + offset + len(words), int(self.offsets[position + 1]))
+        return self._fragment_span(start, stop), max(offset, 0)
+
+
+def get_token_alignment(index, texts):
+    """
+    TokenAlignment of ``texts`` against ``index``, reused while neither the
+    transcript index nor any of the texts change.
+    """
+    key = (id(index), tuple(texts))
+    with _alignments_lock:
+        cached = _alignments.get(key)
+        if cached is not None and cached.index is index:
+            _alignments.move_to_end(key)
+            return cached
+
+    alignment = TokenAlignment(index, texts)
+    with _alignments_lock:
+        _alignments[key] = alignment
+        _alignments.move_to_end(key)
+        while len(_alignments) > _CACHE_SIZE:
+            _alignments.popitem(last=False)
+    return alignment
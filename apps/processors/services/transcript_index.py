@@ -0,0 +1,199 @@
+import json
+import time
+import logging
+import threading
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class TranscriptIndex:
+    """
+    Read-only view of an alignment ("SRT") file built once per file version.
+
+    Fragments are sorted by begin time and their words joined into a single
+    lowercase transcript. ``char_starts[i]`` is the offset of fragment ``i``
+    in that transcript, so a character position maps back to its fragment
+    with a bisect instead of a per-character lookup table.
+    """
+
+    def __init__(self, fragments):
+        fragments = sorted(fragments, key=lambda f: float(f.get("begin", 0)))
+        self.ids = [f.get("id") for f in fragments]
+        self.lines = [f.get("lines", []) for f in fragments]
+        self.begins = [float(f.get("begin", 0)) for f in fragments]
+        self.ends = [float(f.get("end", 0)) for f in fragments]
+        self.words = [" ".join(lines).lower() for lines in self.lines]
+
+        self.char_starts = []
+        offset = 0
+        for word in self.words:
+            self.char_starts.append(offset)
+            offset += len(word) + 1  # +1 for the joining space
+        self.transcript = " ".join(self.words)
+
+    def __len__(self):
+        return len(self.words)
+
+    def first_index_after(self, threshold):
+        """Index of the first fragment beginning at or after ``threshold``"""
+        return bisect_left(self.begins, float(threshold or 0))
+
+    def fragment_at(self, char_pos):
+        """Fragment containing transcript position ``char_pos``"""
+        return bisect_right(self.char_starts, char_pos) - 1
+
+    def find(self, text, threshold=0):
+        """
+        Locate ``text`` in the part of the transcript that begins at or after
+        ``threshold``.
+
+        Returns:
+            Optional[tuple]: (start fragment index, end fragment index) or None
+        """
+        start = self.first_index_after(threshold)
+        if start >= len(self.words):
+            return None
+        match = self.locate(text, self.char_starts[start])
+        return match[:2] if match else None
+
+    def locate(self, text, char_pos=0):
+        """
+        Find ``text`` at or after transcript position ``char_pos``.
+
+        Returns:
+            Optional[tuple]: (start fragment, end fragment, start char, end char) or None
+        """
+        if not text:
+            return None
+        pos = self.transcript.find(text, char_pos)
+        if pos == -1:
+            return None
+        end = pos + len(text) - 1
+        return self.fragment_at(pos), self.fragment_at(end), pos, end
+
+    def next_fragment_after(self, index):
+        """First fragment after ``index`` that starts once fragment ``index`` has ended"""
+        nxt = bisect_left(self.begins, self.ends[index], lo=index + 1)
+        return nxt if nxt < len(self.begins) else None
+
+    def partial_matches(self, text, threshold=0, start=None, limit=None):
+        """
+        Indices of fragments whose text is contained in ``text`` or contains it,
+        from fragment ``start`` (or the first one after ``threshold``) and at
+        most ``limit`` fragments on.
+        """
+        if start is None:
+            start = self.first_index_after(threshold)
+        stop = len(self.words) if limit is None else min(len(self.words), start + limit)
+        return [
+            i for i in range(start, stop)
+            if self.words[i] in text or text in self.words[i]
+        ]
+
+    def fragment(self, index):
+        return {
+            "id": self.ids[index],
+            "begin": self.begins[index],
+            "end": self.ends[index],
+            "lines": self.lines[index],
+        }
+
+    def to_json(self):
+        return json.dumps({
+            "fragments": [
+                {"id": i, "begin": b, "end": e, "lines": l}
+                for i, b, e, l in zip(self.ids, self.begins, self.ends, self.lines)
+            ]
+        })
+
+    @classmethod
+    def from_json(cls, payload):
+        return cls(json.loads(payload)["fragments"])
+
+
+# name -> (version, index, validated_at)
+_local_indexes = OrderedDict()
+_local_lock = threading.Lock()
+
+
+def _file_version(field_file):
+    """ETag of the stored file (size + mtime on non-S3 storages)"""
+    storage = field_file.storage
+    name = field_file.name
+    try:
+        if hasattr(storage, "bucket_name"):
+            from apps.core.services.s3_service import get_s3_client
+
+            location = (getattr(storage, "location", "") or "").strip("/")
+            key = f"{location}/{name}" if location else name
+            head = get_s3_client().head_object(Bucket=storage.bucket_name, Key=key)
+            return head["ETag"].strip('"')
+        return f"{storage.size(name)}-{storage.get_modified_time(name).timestamp()}"
+    except Exception as e:
+        logger.warning(f"Could not read version of {name}: {e}")
+        return ""
+
+
+def _redis():
+    from django_redis import get_redis_connection
+    return get_redis_connection("default")
+
+
+def _remember(name, version, index):
+    max_entries = getattr(settings, "TRANSCRIPT_INDEX_LOCAL_ENTRIES", 32)
+    with _local_lock:
+        _local_indexes[name] = (version, index, time.monotonic())
+        _local_indexes.move_to_end(name)
+        while len(_local_indexes) > max_entries:
+            _local_indexes.popitem(last=False)
+
+
+def get_transcript_index(video):
+    """
+    Return the TranscriptIndex for ``video.srt_file``, or None without one.
+
+    Lookups go process memory -> Redis -> storage. The in-process copy is
+    trusted for TRANSCRIPT_INDEX_REVALIDATE seconds before its ETag is
+    checked again, so a burst of clip/subclip saves costs one parse.
+    """
+    if not video.srt_file:
+        return None
+    name = video.srt_file.name
+    revalidate = getattr(settings, "TRANSCRIPT_INDEX_REVALIDATE", 30)
+
+    with _local_lock:
+        cached = _local_indexes.get(name)
+    if cached and time.monotonic() - cached[2] < revalidate:
+        return cached[1]
+
+    version = _file_version(video.srt_file)
+    if cached and version and cached[0] == version:
+        _remember(name, version, cached[1])
+        return cached[1]
+
+    redis_key = f"transcript_index:{name}:{version}"
+    if version:
+        try:
+            payload = _redis().get(redis_key)
+            if payload:
+                index = TranscriptIndex.from_json(payload)
+                _remember(name, version, index)
+                return index
+        except Exception as e:
+            logger.warning(f"Could not read transcript index from Redis: {e}")
+
+    with video.srt_file.open("r") as srt_file:
+        index = TranscriptIndex(json.load(srt_file).get("fragments", []))
+    print(f"Built transcript index for video {video.id} ({len(index)} fragments)")
+
+    if version:
+        try:
+            _redis().set(redis_key, index.to_json(), ex=getattr(settings, "TRANSCRIPT_INDEX_TTL", 24 * 3600))
+        except Exception as e:
+            logger.warning(f"Could not store transcript index in Redis: {e}")
+    _remember(name, version, index)
+    return index
@@ -11,22 +11,29 @@ from django.core.files import File
 from django.core.files.storage import default_storage
 from django.conf import settings
 from apps.core.utils import get_media_info, process_background_track, create_final_mix
+from apps.processors.services.process_control import CancellationToken, check_ffmpeg_output, run_ffmpeg
+from apps.core.services.storage_cache import PinnedFiles
 # Set up logging
-import requests
 import shutil
 
 logger = logging.getLogger(__name__)
 
 class VideoProcessorService:
 
-    def __init__(self, video: Video, status_callback=None):
+    def __init__(self, video: Video, status_callback=None, cancel_token=None):
         self.video = video
         self.status_callback = status_callback
+        # Checked between stages and polled by every ffmpeg child of the render
+        self.cancel_token = cancel_token or CancellationToken(video.id)
+        # Set by generate_video when rendering one shard of a sharded render
+        self.shard = None
         # Configuration for clip duration management
         self.min_clip_duration = 3.0  # Minimum clip duration in seconds
         self.max_clip_duration = 15.0  # Maximum clip duration in seconds
 
         # Font configuration - S3 compatible approach
+        # Storage inputs come from the worker's disk cache and stay pinned until close()
+        self.files = PinnedFiles()
         self.font_path = None
         if self.video.subtitle_font:
             try:
@@ -35,11 +42,7 @@ class VideoProcessorService:
                 
                 font_path_rel = self.video.subtitle_font.font_path
                 if default_storage.exists(font_path_rel):
-                    # Create a temp file for the font
-                    with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(font_path_rel)[1]) as tmp_font:
-                        with default_storage.open(font_path_rel, 'rb') as s3_file:
-                            tmp_font.write(s3_file.read())
-                        self.font_path = tmp_font.name
+                    self.font_path = self.files.get(font_path_rel)
                     print(f"Using specified font from storage: {self.video.subtitle_font.name} at {self.font_path}")
                 else:
                     self.font_path = self._find_available_font()
@@ -81,6 +84,11 @@ class VideoProcessorService:
 
         # Maximum words per line for subtitle wrapping
         self.max_words_per_line = 5
+
+    def close(self):
+        """Release the cached storage files this processor pinned"""
+        self.files.close()
+
     def _find_available_font(self):
         """Find an available font from common locations"""
         # Look for fonts in project folders first
@@ -108,6 +116,9 @@ class VideoProcessorService:
 
     def _update_progress(self, progress, step=None, error=None):
         """Update processing progress if callback is available"""
+        # Every stage boundary reports progress, so this doubles as the cancellation point
+        if not error:
+            self.cancel_token.raise_if_cancelled()
         if self.status_callback:
             self.status_callback(self.video.id, progress, step, error)
 
@@ -269,9 +280,37 @@ class VideoProcessorService:
             return segment_files
 
 
-    def generate_video(self, add_watermark=False):
+    def _shard_encoder_args(self):
+        """
+        Encoder settings shared by every shard of a sharded render. All shards
+        must be bit-compatible so they can be joined with a stream copy, so the
+        codec is fixed and every GOP is closed and starts on a keyframe.
+        """
+        gop = self.framerate * 2
+        return [
+            "-preset", getattr(settings, "SHARD_RENDER_PRESET", "medium"),
+            "-profile:v", "high",
+            "-crf", str(getattr(settings, "SHARD_RENDER_CRF", 20)),
+            "-g", str(gop),
+            "-keyint_min", str(gop),
+            "-sc_threshold", "0",
+            "-flags", "+cgop",
+            "-bf", "2",
+        ]
+
+    def generate_video(self, add_watermark=False, shard=None):
+        """
+        Render the video. When ``shard`` is given only the clips in
+        ``shard["clip_ids"]`` are rendered, on a timeline starting at
+        ``shard["start"]``, without audio and without saving to the model;
+        the local path of the shard is returned for reassembly.
+        """
         start_time = time.time()
-        print(f"Starting video generation for video {self.video.id}")
+        self.shard = shard
+        if shard:
+            print(f"Starting shard {shard['index']} of video {self.video.id} ({shard['start']:.3f}s to {shard['end']:.3f}s)")
+        else:
+            print(f"Starting video generation for video {self.video.id}")
         self._update_progress(1, "Checking system capabilities")
 
         # Check if NVIDIA GPU is available and determine supported presets
@@ -310,6 +349,9 @@ class VideoProcessorService:
             self._update_progress(2, "Falling back to CPU encoding")
 
         clips = Clips.objects.filter(video=self.video).order_by("start_time")
+        if shard:
+            clips = clips.filter(id__in=shard["clip_ids"])
+        timeline_offset = shard["start"] if shard else 0.0
 
         if not clips.exists():
             error_msg = f"No clips found for video {self.video.id}"
@@ -357,7 +399,7 @@ class VideoProcessorService:
             segment_files = []
 
             # Track the expected start time of the next clip
-            expected_time = 0.0
+            expected_time = timeline_offset
             process_tasks = []
 
             clip_start_time = time.time()
@@ -708,20 +750,24 @@ class VideoProcessorService:
             
             # Replace with our updated subtitles with exact timing
             subtitle_timings = updated_subtitles
+
+            # A shard's output starts at zero, so move its subtitles onto the shard timeline
+            if timeline_offset:
+                for subtitle in subtitle_timings:
+                    subtitle["start"] = max(0.0, subtitle["start"] - timeline_offset)
+                    subtitle["end"] = max(0.0, subtitle["end"] - timeline_offset)
             print(f"Using {len(subtitle_timings)} subtitles with exact timing from clip objects only (subclip text removed)")
 
             # If we have an audio file, get its EXACT duration
             precise_audio_duration = 0
-            if self.video.audio_file:
+            # Only the last shard is padded out to the length of the audio
+            if self.video.audio_file and (not shard or shard.get("is_last")):
                 try:
                     # Download audio file to temporary location for processing
 
                     
-                    with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as temp_audio:
-                        # Download the audio file
-                        with default_storage.open(self.video.audio_file.name, 'rb') as s3_file:
-                            temp_audio.write(s3_file.read())
-                        audio_temp_path = temp_audio.name
+                    # Fetch the audio file from the worker cache
+                    audio_temp_path = self.files.get(self.video.audio_file.name)
                     # Get PRECISE audio duration using ffprobe
                     probe_cmd = [
                         "ffprobe",
@@ -734,7 +780,7 @@ class VideoProcessorService:
                        audio_temp_path ,
                     ]
                     precise_audio_duration = float(
-                        subprocess.check_output(probe_cmd).decode("utf-8").strip()
+                        check_ffmpeg_output(probe_cmd, token=self.cancel_token).decode("utf-8").strip()
                     )
                     print(
                         f"PRECISE Audio duration: {precise_audio_duration:.6f}s, Current video end: {expected_time:.6f}s"
@@ -856,7 +902,7 @@ class VideoProcessorService:
             ]
             
             print(f"DEBUG: Running concat command: {' '.join(concat_cmd)}")
-            subprocess.run(concat_cmd, check=True)
+            run_ffmpeg(concat_cmd, check=True, token=self.cancel_token)
 
             # Verify intermediate output duration
             try:
@@ -867,7 +913,7 @@ class VideoProcessorService:
                     "-of", "default=noprint_wrappers=1:nokey=1",
                     intermediate_output
                 ]
-                intermediate_duration = float(subprocess.check_output(probe_cmd).decode("utf-8").strip())
+                intermediate_duration = float(check_ffmpeg_output(probe_cmd, token=self.cancel_token).decode("utf-8").strip())
                 print(f"CRITICAL: Concatenated video duration: {intermediate_duration:.3f}s vs expected {expected_total_duration:.3f}s")
                 
                 # Alert if we lost significant content
@@ -1270,7 +1316,11 @@ class VideoProcessorService:
             # GPU-accelerated encoder for the final video
             video_codec = "h264_nvenc" if use_gpu else "libx264"
 
-            if use_gpu:
+            if shard:
+                # Shards may run on different hosts, so they all use the same CPU encoder
+                video_codec = "libx264"
+                video_options = self._shard_encoder_args()
+            elif use_gpu:
                 video_options = ["-preset", nvenc_preset]
             else:
                 video_options = ["-preset", "medium"]
@@ -1278,15 +1328,13 @@ class VideoProcessorService:
             # Debug overlay status
             print(f"PNG Overlays available: {hasattr(self, '_png_overlays')} with {len(self._png_overlays) if hasattr(self, '_png_overlays') else 0} items")
 
-            # Check if we have an audio file to include
-            if self.video.audio_file:
+            # Check if we have an audio file to include; shards are muxed with audio once reassembled
+            if self.video.audio_file and not shard:
 
                 
-                with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as temp_audio:
-                    # Download the audio file
-                    with default_storage.open(self.video.audio_file.name, 'rb') as s3_file:
-                        temp_audio.write(s3_file.read())
-                    audio_temp_path = temp_audio.name                # Apply text overlays and add audio
+                # Fetch the audio file from the worker cache
+                audio_temp_path = self.files.get(self.video.audio_file.name)
+                # Apply text overlays and add audio
                 if hasattr(self, '_png_overlays') and self._png_overlays:
                     # We have PNG overlays to include
                     print(f"Including {len(self._png_overlays)} rounded box overlays in final video")
@@ -1387,9 +1435,8 @@ class VideoProcessorService:
                 
                 try:
                     print(f"Executing FFmpeg command...")
-                    subprocess.run(cmd, check=True)
+                    run_ffmpeg(cmd, check=True, token=self.cancel_token)
                     print(f"FFmpeg command completed successfully")
-                    os.unlink(audio_temp_path)
                 except subprocess.CalledProcessError as e:
                     print(f"Error generating final video: {str(e)}")
                     raise Exception(f"Error generating final video: {str(e)}")
@@ -1485,7 +1532,7 @@ class VideoProcessorService:
                 
                 try:
                     print(f"Executing FFmpeg command...")
-                    subprocess.run(cmd, check=True)
+                    run_ffmpeg(cmd, check=True, token=self.cancel_token)
                     print(f"FFmpeg command completed successfully")
                 except subprocess.CalledProcessError as e:
                     print(f"Error generating final video: {str(e)}")
@@ -1503,8 +1550,7 @@ class VideoProcessorService:
             
             # Create a copy of the file in a location that won't be deleted when the temp dir is closed
             permanent_output_path = os.path.join(tempfile.gettempdir(), f"video_{self.video.id}_output_{int(time.time())}.mp4")
-            with open(final_output_path, "rb") as src, open(permanent_output_path, "wb") as dst:
-                dst.write(src.read())
+            shutil.copyfile(final_output_path, permanent_output_path)
 
             # Apply watermark if requested
             if add_watermark:
@@ -1555,6 +1601,10 @@ class VideoProcessorService:
                 else:
                     print("Watermark image not found in standard locations, skipping watermark")
 
+            if shard:
+                print(f"Shard {shard['index']} of video {self.video.id} rendered in {time.time() - start_time:.2f} seconds")
+                return permanent_output_path
+
             # Save the final output file to the video model using Django's File API
             with open(permanent_output_path, 'rb') as output_file:
                 output_filename = f"video_{self.video.id}_output.mp4"
@@ -1598,6 +1648,9 @@ class VideoProcessorService:
 
     def _process_clip(self, task_data, width, height, use_gpu=False, nvenc_preset=None):
         """Process an individual clip, segment, or subclip to standardized dimensions with blurred background without stretching"""
+        # Skip queued clips once the render has been cancelled
+        self.cancel_token.raise_if_cancelled()
+
         # Unpack task data with precise timing information
         (
             clip_data,
@@ -1632,12 +1685,8 @@ class VideoProcessorService:
                 # Check if there's a valid video file available
                 if main_clip.video_file:
                     try:
-                        # Create a temporary file for processing
-                        with tempfile.NamedTemporaryFile(delete=False, suffix=".mp4") as temp_file:
-                            # Download the file from storage
-                            with default_storage.open(main_clip.video_file.name, 'rb') as s3_file:
-                                temp_file.write(s3_file.read())
-                            temp_file_path = temp_file.name
+                        # Fetch the file from the worker cache
+                        temp_file_path = self.files.get(main_clip.video_file.name)
                         
                         # Build filter for segment extraction and standardization
                         start_offset = clip_data["start_offset"]  # Time from the start of the original clip
@@ -1698,11 +1747,9 @@ class VideoProcessorService:
                             output_path,
                         ])
                         
-                        subprocess.run(cmd, check=True)
+                        run_ffmpeg(cmd, check=True, token=self.cancel_token)
                         print(f"Processed clip segment {index}: from offset {start_offset:.3f}s, duration {segment_duration:.3f}s")
-                        
-                        # Clean up temp file
-                        os.unlink(temp_file_path)
+
                     except Exception as e:
                         print(f"Error processing clip segment file: {str(e)}")
                         # Create black video as fallback
@@ -1719,12 +1766,8 @@ class VideoProcessorService:
                 
                 if clip_data.video_file:
                     try:
-                        # Create a temporary file for processing
-                        with tempfile.NamedTemporaryFile(delete=False, suffix=".mp4") as temp_file:
-                            # Download the file from storage
-                            with default_storage.open(clip_data.video_file.name, 'rb') as s3_file:
-                                temp_file.write(s3_file.read())
-                            temp_file_path = temp_file.name
+                        # Fetch the file from the worker cache
+                        temp_file_path = self.files.get(clip_data.video_file.name)
                         
                         # Determine the actual duration of the subclip video file
                         try:
@@ -1735,7 +1778,7 @@ class VideoProcessorService:
                                 "-of", "default=noprint_wrappers=1:nokey=1",
                                 temp_file_path
                             ]
-                            actual_duration = float(subprocess.check_output(probe_cmd).decode("utf-8").strip())
+                            actual_duration = float(check_ffmpeg_output(probe_cmd, token=self.cancel_token).decode("utf-8").strip())
                         except Exception as e:
                             logger.warning(f"Could not determine actual duration of subclip: {str(e)}")
                             actual_duration = target_duration  # Fallback to target duration
@@ -1888,11 +1931,9 @@ class VideoProcessorService:
                         # Always set exact output duration to ensure perfect timing
                         cmd.extend(["-t", str(target_duration), output_path])
                         
-                        subprocess.run(cmd, check=True)
+                        run_ffmpeg(cmd, check=True, token=self.cancel_token)
                         print(f"Processed subclip {index}: duration {target_duration:.3f}s at position {start_time:.3f}s to {end_time:.3f}s")
-                        
-                        # Clean up temp file
-                        os.unlink(temp_file_path)
+
                     except Exception as e:
                         print(f"Error processing subclip file: {str(e)}")
                         # Create black video as fallback
@@ -1909,12 +1950,8 @@ class VideoProcessorService:
                 
                 if clip_data.video_file:
                     try:
-                        # Create a temporary file for processing
-                        with tempfile.NamedTemporaryFile(delete=False, suffix=".mp4") as temp_file:
-                            # Download the file from storage
-                            with default_storage.open(clip_data.video_file.name, 'rb') as s3_file:
-                                temp_file.write(s3_file.read())
-                            temp_file_path = temp_file.name
+                        # Fetch the file from the worker cache
+                        temp_file_path = self.files.get(clip_data.video_file.name)
                         
                         # Enhanced normalization filters with blurred background approach - NO stretching
                         normalize_filters = [
@@ -1995,11 +2032,9 @@ class VideoProcessorService:
                             output_path,
                         ])
                         
-                        subprocess.run(cmd, check=True)
+                        run_ffmpeg(cmd, check=True, token=self.cancel_token)
                         print(f"Processed clip {index}: duration {clip_duration:.3f}s with speed factor {speed_factor}")
-                        
-                        # Clean up temp file
-                        os.unlink(temp_file_path)
+
                     except Exception as e:
                         print(f"Error processing clip file: {str(e)}")
                         # Create black video as fallback
@@ -2062,7 +2097,7 @@ class VideoProcessorService:
         )
 
         try:
-            subprocess.run(cmd, check=True)
+            run_ffmpeg(cmd, check=True, token=self.cancel_token)
         except subprocess.CalledProcessError as e:
             logger.error(f"Error creating black video: {str(e)}")
             if use_gpu:
@@ -2077,8 +2112,6 @@ class VideoProcessorService:
             
          
     def apply_background_music_watermark(self, bg_music: BackgroundMusic):
-        from apps.processors.utils import generate_signed_url 
-
         """
         Applies background music to the video output.
         If music duration exceeds video duration, music is trimmed to match.
@@ -2107,20 +2140,9 @@ class VideoProcessorService:
             
             logger.info(f"Applying background music to video {video.id}")
             
-            # Create temporary files for processing
-            with tempfile.NamedTemporaryFile(suffix='.mp4', delete=False) as tmp_video:
-                # Write the response content to the temporary file
-                response = requests.get(generate_signed_url(video.output_with_bg_watermark.name), stream=True)
-                response.raise_for_status() 
-                shutil.copyfileobj(response.raw, tmp_video)
-                print(f"Video downloaded to temporary file: {tmp_video.name}")
-                video_temp_path = tmp_video.name
-                
-            with tempfile.NamedTemporaryFile(suffix='.mp3', delete=False) as tmp_audio:
-                # Download the audio file to temp location
-                with default_storage.open(bg_music.audio_file.name, 'rb') as s3_audio:
-                    tmp_audio.write(s3_audio.read())
-                audio_temp_path = tmp_audio.name
+            # Fetch the video and the music from the worker cache
+            video_temp_path = self.files.get(video.output_with_bg_watermark.name)
+            audio_temp_path = self.files.get(bg_music.audio_file.name)
             
             # Create output temp file
             temp_output_path = tempfile.mktemp(suffix='.mp4')
@@ -2133,7 +2155,7 @@ class VideoProcessorService:
                 "-of", "default=noprint_wrappers=1:nokey=1", 
                 video_temp_path
             ]
-            video_duration = float(subprocess.check_output(video_duration_cmd).decode("utf-8").strip())
+            video_duration = float(check_ffmpeg_output(video_duration_cmd, token=self.cancel_token).decode("utf-8").strip())
             
             # Check if the video has an audio track
             has_audio_cmd = [
@@ -2145,7 +2167,7 @@ class VideoProcessorService:
                 video_temp_path
             ]
             
-            has_audio_result = subprocess.run(has_audio_cmd, capture_output=True, text=True)
+            has_audio_result = run_ffmpeg(has_audio_cmd, capture_output=True, text=True, token=self.cancel_token)
             has_audio = has_audio_result.stdout.strip() == "audio"
             
             # Get audio duration
@@ -2157,8 +2179,8 @@ class VideoProcessorService:
                 audio_temp_path
             ]
             try:
-                audio_duration = float(subprocess.check_output(audio_duration_cmd).decode("utf-8").strip())
-            except:
+                audio_duration = float(check_ffmpeg_output(audio_duration_cmd, token=self.cancel_token).decode("utf-8").strip())
+            except Exception:
                 audio_duration = 0
                 
             # Check if audio needs to be trimmed
@@ -2230,7 +2252,7 @@ class VideoProcessorService:
             
             print(f"Preparing trimmed audio: {' '.join(audio_trim_cmd)}")
             try:
-                subprocess.run(audio_trim_cmd, capture_output=True, check=True)
+                run_ffmpeg(audio_trim_cmd, capture_output=True, check=True, token=self.cancel_token)
             except subprocess.CalledProcessError as e:
                 print(f"Error trimming audio: {str(e)}")
                 # Use the original audio if trimming fails
@@ -2251,7 +2273,7 @@ class VideoProcessorService:
                 
                 print(f"Extracting original audio: {' '.join(extract_cmd)}")
                 try:
-                    subprocess.run(extract_cmd, capture_output=True, check=True)
+                    run_ffmpeg(extract_cmd, capture_output=True, check=True, token=self.cancel_token)
                 except subprocess.CalledProcessError as e:
                     print(f"Error extracting original audio: {str(e)}")
                     # Continue with other approaches if extraction fails
@@ -2278,7 +2300,7 @@ class VideoProcessorService:
                 
                 print(f"Creating audio with reduced volume during bg music: {' '.join(reduce_vol_cmd)}")
                 try:
-                    subprocess.run(reduce_vol_cmd, capture_output=True, check=True)
+                    run_ffmpeg(reduce_vol_cmd, capture_output=True, check=True, token=self.cancel_token)
                 except subprocess.CalledProcessError as e:
                     print(f"Error creating reduced volume audio: {str(e)}")
                     # Just use the original audio
@@ -2298,7 +2320,7 @@ class VideoProcessorService:
                 
                 print(f"Creating padded background music: {' '.join(padding_cmd)}")
                 try:
-                    subprocess.run(padding_cmd, capture_output=True, check=True)
+                    run_ffmpeg(padding_cmd, capture_output=True, check=True, token=self.cancel_token)
                     music_positioned = True
                 except subprocess.CalledProcessError as e:
                     print(f"Error padding music: {str(e)}")
@@ -2318,7 +2340,7 @@ class VideoProcessorService:
                     
                     print(f"Positioning music at {start_time}s: {' '.join(position_cmd)}")
                     try:
-                        subprocess.run(position_cmd, capture_output=True, check=True)
+                        run_ffmpeg(position_cmd, capture_output=True, check=True, token=self.cancel_token)
                     except subprocess.CalledProcessError as e:
                         print(f"Error positioning music: {str(e)}")
                         # Use the padded version
@@ -2338,7 +2360,7 @@ class VideoProcessorService:
                     
                     print(f"Mixing audio: {' '.join(mix_cmd)}")
                     try:
-                        subprocess.run(mix_cmd, capture_output=True, check=True)
+                        run_ffmpeg(mix_cmd, capture_output=True, check=True, token=self.cancel_token)
                         # The mix worked, now combine with video
                         final_cmd = [
                             "ffmpeg",
@@ -2354,7 +2376,7 @@ class VideoProcessorService:
                         ]
                         
                         print(f"Final combine: {' '.join(final_cmd)}")
-                        subprocess.run(final_cmd, capture_output=True, check=True)
+                        run_ffmpeg(final_cmd, capture_output=True, check=True, token=self.cancel_token)
                         success = True
                     except subprocess.CalledProcessError as e:
                         print(f"Error in audio mixing or final combine: {str(e)}")
@@ -2394,9 +2416,9 @@ class VideoProcessorService:
                     ]
                     
                     print(f"Creating silent base with anullsrc: {' '.join(silence_cmd)}")
-                    subprocess.run(silence_cmd, capture_output=True, check=True)
+                    run_ffmpeg(silence_cmd, capture_output=True, check=True, token=self.cancel_token)
                     silence_created = True
-                except:
+                except Exception:
                     # If anullsrc fails, create a very short silence and extend it
                     try:
                         # Generate 0.1s of silence
@@ -2410,7 +2432,7 @@ class VideoProcessorService:
                         ]
                         
                         print(f"Creating short silence: {' '.join(silence_gen_cmd)}")
-                        subprocess.run(silence_gen_cmd, capture_output=True, check=True)
+                        run_ffmpeg(silence_gen_cmd, capture_output=True, check=True, token=self.cancel_token)
                         
                         # Now extend it to full duration
                         extended_silence_path = tempfile.mktemp(suffix='.mp3')
@@ -2424,13 +2446,13 @@ class VideoProcessorService:
                         ]
                         
                         print(f"Extending silence: {' '.join(extend_cmd)}")
-                        subprocess.run(extend_cmd, capture_output=True, check=True)
+                        run_ffmpeg(extend_cmd, capture_output=True, check=True, token=self.cancel_token)
                         
                         # Replace the original silence with the extended one
                         os.unlink(silent_base_path)
                         silent_base_path = extended_silence_path
                         silence_created = True
-                    except:
+                    except Exception:
                         print("Could not create silent base, using direct approach")
                         silence_created = False
                 
@@ -2450,7 +2472,7 @@ class VideoProcessorService:
                     
                     print(f"Creating overlay audio: {' '.join(overlay_cmd)}")
                     try:
-                        result = subprocess.run(overlay_cmd, capture_output=True, check=True)
+                        result = run_ffmpeg(overlay_cmd, capture_output=True, check=True, token=self.cancel_token)
                         final_audio_path = result.stdout.decode().strip()
                         
                         # Combine with video
@@ -2468,7 +2490,7 @@ class VideoProcessorService:
                         ]
                         
                         print(f"Final combine: {' '.join(final_cmd)}")
-                        subprocess.run(final_cmd, capture_output=True, check=True)
+                        run_ffmpeg(final_cmd, capture_output=True, check=True, token=self.cancel_token)
                         success = True
                     except subprocess.CalledProcessError as e:
                         print(f"Overlay or combine failed: {str(e)}")
@@ -2490,7 +2512,7 @@ class VideoProcessorService:
                     
                     print(f"Creating silent video: {' '.join(silent_cmd)}")
                     try:
-                        subprocess.run(silent_cmd, capture_output=True, check=True)
+                        run_ffmpeg(silent_cmd, capture_output=True, check=True, token=self.cancel_token)
                     except subprocess.CalledProcessError as e:
                         print(f"Error creating silent video: {str(e)}")
                         # Use the original video
@@ -2500,21 +2522,24 @@ class VideoProcessorService:
                     precise_audio_path = tempfile.mktemp(suffix='.mp3')
                     
                     # Create an audio track with specific timing
-                    ffmpeg_complex_filter = (
+                    delay_ms = int(start_time * 1000)
+                    complex_filter_cmd = [
+                        "ffmpeg",
+                        "-y",
                         # Create a silent audio track for the entire video duration
-                        f"-f lavfi -t {video_duration} -i anullsrc=r=44100:cl=stereo " +
+                        "-f", "lavfi", "-t", str(video_duration), "-i", "anullsrc=r=44100:cl=stereo",
                         # Add the trimmed music starting at the specified time
-                        f"-i {trimmed_audio_path} " +
+                        "-i", trimmed_audio_path,
                         # Mix them together
-                        f"-filter_complex \"[1:a]adelay={int(start_time*1000)}|{int(start_time*1000)}[delayed];" +
-                        f"[0:a][delayed]amix=inputs=2:duration=first[a]\" " +
+                        "-filter_complex",
+                        f"[1:a]adelay={delay_ms}|{delay_ms}[delayed];[0:a][delayed]amix=inputs=2:duration=first[a]",
                         # Output the mixed audio
-                        f"-map \"[a]\" -c:a aac -b:a 192k {precise_audio_path}"
-                    )
+                        "-map", "[a]", "-c:a", "aac", "-b:a", "192k", precise_audio_path
+                    ]
                     
-                    print(f"Attempting complex filter: {ffmpeg_complex_filter}")
+                    print(f"Attempting complex filter: {' '.join(complex_filter_cmd)}")
                     try:
-                        os.system(f"ffmpeg -y {ffmpeg_complex_filter}")
+                        run_ffmpeg(complex_filter_cmd, capture_output=True, check=True, token=self.cancel_token)
                         
                         # If that worked, combine with the video
                         final_cmd = [
@@ -2531,8 +2556,8 @@ class VideoProcessorService:
                         ]
                         
                         print(f"Final combine: {' '.join(final_cmd)}")
-                        subprocess.run(final_cmd, capture_output=True, check=True)
-                    except:
+                        run_ffmpeg(final_cmd, capture_output=True, check=True, token=self.cancel_token)
+                    except Exception:
                         print("Complex filter failed, using direct audio overlay")
                         
                         # Absolutely simplest approach - use direct concatenation
@@ -2551,9 +2576,9 @@ class VideoProcessorService:
                                 ]
                                 
                                 try:
-                                    subprocess.run(pre_silence_cmd, capture_output=True)
+                                    run_ffmpeg(pre_silence_cmd, capture_output=True, token=self.cancel_token)
                                     f.write(f"file '{pre_silence_path}'\n")
-                                except:
+                                except Exception:
                                     print("Could not create pre-silence")
                             
                             # Add the background music segment
@@ -2573,9 +2598,9 @@ class VideoProcessorService:
                                 ]
                                 
                                 try:
-                                    subprocess.run(post_silence_cmd, capture_output=True)
+                                    run_ffmpeg(post_silence_cmd, capture_output=True, token=self.cancel_token)
                                     f.write(f"file '{post_silence_path}'\n")
-                                except:
+                                except Exception:
                                     print("Could not create post-silence")
                         
                         # Concatenate the audio segments
@@ -2592,7 +2617,7 @@ class VideoProcessorService:
                         
                         print(f"Concatenating audio segments: {' '.join(concat_cmd)}")
                         try:
-                            subprocess.run(concat_cmd, capture_output=True, check=True)
+                            run_ffmpeg(concat_cmd, capture_output=True, check=True, token=self.cancel_token)
                             
                             # Finally, combine with the video
                             last_cmd = [
@@ -2609,7 +2634,7 @@ class VideoProcessorService:
                             ]
                             
                             print(f"Final combine: {' '.join(last_cmd)}")
-                            subprocess.run(last_cmd, capture_output=True, check=True)
+                            run_ffmpeg(last_cmd, capture_output=True, check=True, token=self.cancel_token)
                         except subprocess.CalledProcessError as e:
                             print(f"Error in final concatenation: {str(e)}")
                             
@@ -2629,7 +2654,7 @@ class VideoProcessorService:
                             ]
                             
                             print(f"Last resort command: {' '.join(last_resort_cmd)}")
-                            subprocess.run(last_resort_cmd, capture_output=True, check=True)
+                            run_ffmpeg(last_resort_cmd, capture_output=True, check=True, token=self.cancel_token)
             
             # Verify the output has audio
             verify_cmd = [
@@ -2641,7 +2666,7 @@ class VideoProcessorService:
                 temp_output_path
             ]
             
-            verify_result = subprocess.run(verify_cmd, capture_output=True, text=True)
+            verify_result = run_ffmpeg(verify_cmd, capture_output=True, text=True, token=self.cancel_token)
             has_output_audio = verify_result.stdout.strip() == "audio"
             
             print(f"- Output video has audio track: {has_output_audio}")
@@ -2652,9 +2677,9 @@ class VideoProcessorService:
                 # Save to output_with_bg instead of output
                 video.output_with_bg_watermark.save(filename, File(f), save=True)
 
-            # Clean up temporary files
-            for temp_file in [video_temp_path, audio_temp_path, temp_output_path, trimmed_audio_path]:
-                if os.path.exists(temp_file):
+            # Clean up temporary files (the cached inputs are left in the cache)
+            for temp_file in [temp_output_path, trimmed_audio_path]:
+                if temp_file != audio_temp_path and os.path.exists(temp_file):
                     try:
                         os.unlink(temp_file)
                     except:
@@ -2667,8 +2692,11 @@ class VideoProcessorService:
             logger.error(f"Error applying background music to video {video.id}: {str(e)}")
             print(f"Error applying background music: {str(e)}")
             # Clean up temporary files if they exist
-            for var_name in ['video_temp_path', 'audio_temp_path', 'temp_output_path', 'trimmed_audio_path']:
-                if var_name in locals() and locals()[var_name] and os.path.exists(locals()[var_name]):
+            for var_name in ['temp_output_path', 'trimmed_audio_path']:
+                if (
+                    var_name in locals() and locals()[var_name] and os.path.exists(locals()[var_name])
+                    and locals()[var_name] != locals().get('audio_temp_path')
+                ):
                     try:
                         os.unlink(locals()[var_name])
                     except:
@@ -2679,8 +2707,6 @@ class VideoProcessorService:
 
 
     def apply_background_music(self,  bg_music_queryset):
-        from apps.processors.utils import generate_signed_url 
-
         """
         Applies multiple background music tracks to a video while preserving the original audio.
         
@@ -2717,15 +2743,8 @@ class VideoProcessorService:
         try:
             logger.info(f"Processing {bg_music_queryset.count()} background music tracks for video {video.id}")
             
-            # Step 1: Download video to temporary file
-            with tempfile.NamedTemporaryFile(suffix='.mp4', delete=False) as tmp_video:
-                # Write the response content to the temporary file
-                response = requests.get(generate_signed_url(video.output.name), stream=True)
-                response.raise_for_status() 
-                shutil.copyfileobj(response.raw, tmp_video)
-                print(f"Video downloaded to temporary file: {tmp_video.name}")
-                video_path = tmp_video.name
-                temp_files.append(video_path)
+            # Step 1: Fetch the video from the worker cache
+            video_path = self.files.get(video.output.name)
             
             # Step 2: Get video properties
             video_info = get_media_info(video_path)
@@ -2742,12 +2761,8 @@ class VideoProcessorService:
                     logger.warning(f"Skipping background music {bg_music.id} - no audio file")
                     continue
                 
-                # Download audio file
-                with tempfile.NamedTemporaryFile(suffix='.mp3', delete=False) as tmp_audio:
-                    with default_storage.open(bg_music.audio_file.name, 'rb') as audio_file:
-                        tmp_audio.write(audio_file.read())
-                    audio_path = tmp_audio.name
-                    temp_files.append(audio_path)
+                # Fetch audio file from the worker cache
+                audio_path = self.files.get(bg_music.audio_file.name)
                 
                 # Process timing
                 track_info = process_background_track(
@@ -2811,7 +2826,6 @@ class VideoProcessorService:
 
 
     def apply_all_background_music_watermark(self,  bg_music_queryset):
-        from apps.processors.utils import generate_signed_url
         """
         Applies multiple background music tracks to a video while preserving the original audio.
         
@@ -2848,15 +2862,8 @@ class VideoProcessorService:
         try:
             logger.info(f"Processing {bg_music_queryset.count()} background music tracks for video {video.id}")
             
-            # Step 1: Download video to temporary file
-            with tempfile.NamedTemporaryFile(suffix='.mp4', delete=False) as tmp_video:
-                # Write the response content to the temporary file
-                response = requests.get(generate_signed_url(video.output_with_watermark.name), stream=True)
-                response.raise_for_status() 
-                shutil.copyfileobj(response.raw, tmp_video)
-                print(f"Video downloaded to temporary file: {tmp_video.name}")
-                video_path = tmp_video.name
-                temp_files.append(video_path)
+            # Step 1: Fetch the video from the worker cache
+            video_path = self.files.get(video.output_with_watermark.name)
 
             # Step 2: Get video properties
             video_info = get_media_info(video_path)
@@ -2873,12 +2880,8 @@ class VideoProcessorService:
                     logger.warning(f"Skipping background music {bg_music.id} - no audio file")
                     continue
                 
-                # Download audio file
-                with tempfile.NamedTemporaryFile(suffix='.mp3', delete=False) as tmp_audio:
-                    with default_storage.open(bg_music.audio_file.name, 'rb') as audio_file:
-                        tmp_audio.write(audio_file.read())
-                    audio_path = tmp_audio.name
-                    temp_files.append(audio_path)
+                # Fetch audio file from the worker cache
+                audio_path = self.files.get(bg_music.audio_file.name)
                 
                 # Process timing
                 track_info = process_background_track(
@@ -3364,18 +3367,9 @@ class VideoProcessorService:
                 logger.error(f"No video file exists for subclip {subclip.id}")
                 return False
             
-            # Create temporary files for processing
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".mp4") as temp_file:
-                # Download the subclip file from storage
-                with default_storage.open(subclip.video_file.name, 'rb') as s3_file:
-                    temp_file.write(s3_file.read())
-                subclip_video_path = temp_file.name
-                
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".mp4") as temp_file:
-                # Download the main video file from storage
-                with default_storage.open(self.video.output.name, 'rb') as s3_file:
-                    temp_file.write(s3_file.read())
-                main_video_path = temp_file.name
+            # Fetch the subclip and the main video from the worker cache
+            subclip_video_path = self.files.get(subclip.video_file.name)
+            main_video_path = self.files.get(self.video.output.name)
                 
             # Create temp directory for intermediate files
             with tempfile.TemporaryDirectory() as temp_dir:
@@ -3427,7 +3421,7 @@ class VideoProcessorService:
                     subclip_video_path
                 ]
                 try:
-                    actual_subclip_duration = float(subprocess.check_output(probe_cmd).decode("utf-8").strip())
+                    actual_subclip_duration = float(check_ffmpeg_output(probe_cmd, token=self.cancel_token).decode("utf-8").strip())
                     print(f"Actual subclip duration: {actual_subclip_duration}s, target duration: {duration}s")
                 except Exception as e:
                     logger.warning(f"Could not determine subclip duration: {str(e)}")
@@ -3488,7 +3482,7 @@ class VideoProcessorService:
                 ])
                 
                 print(f"Processing subclip with command: {' '.join(subclip_cmd)}")
-                subprocess.run(subclip_cmd, check=True)
+                run_ffmpeg(subclip_cmd, check=True, token=self.cancel_token)
                 
                 # Create subtitle text for overlay
                 # Extract the main clip text for subtitles
@@ -3836,7 +3830,7 @@ class VideoProcessorService:
                     ])
                     
                     print(f"Adding text to subclip: {' '.join(subclip_with_text_cmd)}")
-                    subprocess.run(subclip_with_text_cmd, check=True)
+                    run_ffmpeg(subclip_with_text_cmd, check=True, token=self.cancel_token)
                     
                     # Now build a complex filter chain with PNG box overlays
                     overlay_chain_cmd = ["ffmpeg", "-y", "-i", with_text_path]
@@ -3870,7 +3864,7 @@ class VideoProcessorService:
                     ])
                     
                     print(f"Adding rounded box overlays: {' '.join(overlay_chain_cmd)}")
-                    subprocess.run(overlay_chain_cmd, check=True)
+                    run_ffmpeg(overlay_chain_cmd, check=True, token=self.cancel_token)
                     
                     # Update processed_subclip_path to point to the version with text and rounded boxes
                     processed_subclip_path = os.path.join(temp_dir, "subclip_with_overlays.mp4")
@@ -3927,7 +3921,7 @@ class VideoProcessorService:
                     ])
                 
                 print(f"Replacing subclip with command: {' '.join(overlay_cmd)}")
-                subprocess.run(overlay_cmd, check=True)
+                run_ffmpeg(overlay_cmd, check=True, token=self.cancel_token)
                 
                 # Verify the final video
                 if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
@@ -3940,22 +3934,10 @@ class VideoProcessorService:
                 else:
                     raise Exception(f"Output file not created or empty: {output_path}")
 
-            # Clean up temp files
-            for path in [subclip_video_path, main_video_path]:
-                if os.path.exists(path):
-                    os.unlink(path)
-                    
             return True
             
         except Exception as e:
             logger.error(f"Error replacing subclip {subclip.id}: {str(e)}")
-            # Attempt to clean up temp files if they exist
-            for var in ['subclip_video_path', 'main_video_path']:
-                if var in locals() and locals()[var] and os.path.exists(locals()[var]):
-                    try:
-                        os.unlink(locals()[var])
-                    except:
-                        pass
             return False
         
 
@@ -3976,12 +3958,8 @@ class VideoProcessorService:
             with tempfile.TemporaryDirectory() as temp_dir:
                 # Process regular output
                 if video.output and default_storage.exists(video.output.name):
-                    # Create temp file for the input video
-                    with tempfile.NamedTemporaryFile(delete=False, suffix=".mp4") as temp_file:
-                        # Download the file from storage
-                        with default_storage.open(video.output.name, 'rb') as s3_file:
-                            temp_file.write(s3_file.read())
-                        input_path = temp_file.name
+                    # Fetch the input video from the worker cache
+                    input_path = self.files.get(video.output.name)
                     
                     # Create path for watermarked output
                     output_path = os.path.join(temp_dir, f"output_watermarked_{int(time.time())}.mp4")
@@ -3996,18 +3974,12 @@ class VideoProcessorService:
                     else:
                         print("Failed to apply watermark to regular output")
                         success = False
-                    
-                    # Clean up input temp file
-                    os.unlink(input_path)
+
                 
                 # Process output with background music if it exists
                 if video.output_with_bg and default_storage.exists(video.output_with_bg.name):
-                    # Create temp file for the input video with bg music
-                    with tempfile.NamedTemporaryFile(delete=False, suffix=".mp4") as temp_file:
-                        # Download the file from storage
-                        with default_storage.open(video.output_with_bg.name, 'rb') as s3_file:
-                            temp_file.write(s3_file.read())
-                        bg_input_path = temp_file.name
+                    # Fetch the input video with bg music from the worker cache
+                    bg_input_path = self.files.get(video.output_with_bg.name)
                     
                     # Create path for watermarked output
                     bg_output_path = os.path.join(temp_dir, f"output_bg_watermarked_{int(time.time())}.mp4")
@@ -4022,9 +3994,7 @@ class VideoProcessorService:
                     else:
                         print("Failed to apply watermark to output with background music")
                         success = False
-                    
-                    # Clean up temp file
-                    os.unlink(bg_input_path)
+
             
             return success
             
@@ -4075,7 +4045,7 @@ class VideoProcessorService:
                 input_path
             ]
             
-            dimensions = subprocess.check_output(probe_cmd).decode("utf-8").strip()
+            dimensions = check_ffmpeg_output(probe_cmd, token=self.cancel_token).decode("utf-8").strip()
             width, height = map(int, dimensions.split('x'))
             print(f"Video dimensions: {width}x{height}")
             
@@ -4094,7 +4064,11 @@ class VideoProcessorService:
             video_codec = "h264_nvenc" if use_gpu else "libx264"
             
             # Set encoder preset options
-            if use_gpu:
+            if getattr(self, "shard", None):
+                # Keep shard encoder settings identical so shards can be stream-copied together
+                video_codec = "libx264"
+                preset_option = self._shard_encoder_args()
+            elif use_gpu:
                 preset_option = ["-preset", nvenc_preset] if nvenc_preset else ["-preset", "p4"]
             else:
                 # CPU optimization - faster preset for watermarking
@@ -4127,7 +4101,7 @@ class VideoProcessorService:
             ])
             
             print(f"Applying watermark with command: {' '.join(cmd)}")
-            subprocess.run(cmd, check=True)
+            run_ffmpeg(cmd, check=True, token=self.cancel_token)
             
             # Verify the output file was created
             if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
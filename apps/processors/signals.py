@@ -9,9 +9,14 @@ import subprocess  # Add this import
 
 from apps.processors.models import Subclip, Clips, BackgroundMusic, Video, ProcessingStatus
 from apps.processors.services.video_processor import VideoProcessorService, Video
-from apps.processors.utils import clean_text_for_alignment
+from apps.processors.services.transcript_index import get_transcript_index
+from apps.processors.services.timing_solver import timing_signals_suppressed
+from apps.processors.services.token_aligner import get_token_alignment
 import time
 import traceback
+from datetime import timedelta
+from django.conf import settings
+from django.utils import timezone
 
 
 logger = logging.getLogger(__name__)
@@ -377,6 +382,10 @@ def configure_subclip(sender, instance:Subclip, **kwargs):
     The end time will be the start time of the next fragment when available.
     The first subclip of a video will always have a start time of zero.
     """
+    # Batch writes from the timing solver already carry their timings
+    if timing_signals_suppressed():
+        return
+
     # Check if this is the first subclip for this clip
     is_first_subclip = False
     if instance.clip.sequence == 1:
@@ -417,135 +426,38 @@ def configure_subclip(sender, instance:Subclip, **kwargs):
         return
     
     try:
-        # Load the SRT JSON content
-        with video.srt_file.open('r') as srt_file:
-            srt_data = json.load(srt_file)
-        threshold = (
-            Subclip.objects
-            .filter(clip__sequence__lt=instance.clip.sequence, clip__video=instance.clip.video)
-            .order_by('clip__sequence')
-            .last()
-            .end_time
-            if Subclip.objects.filter(clip__sequence__lt=instance.clip.sequence, clip__video=instance.clip.video).exists()
-            else 0
-        )
-        # Convert threshold to float if needed
-        threshold = 0 if threshold is None else threshold
-        threshold = float(threshold)
-
-        # Filter fragments after the threshold
-        filtered_fragments = [
-            fragment for fragment in srt_data['fragments']
-            if float(fragment['begin']) >= threshold
-    ]
-
-        # Get all fragments sorted by begin time
-        all_fragments = sorted(filtered_fragments, key=lambda x: float(x.get('begin', 0)))
-
-        print(f"Total fragments in SRT: {len(all_fragments)}")
-        
-        # Get subclip text in lowercase for comparison
-        subclip_text = clean_text_for_alignment(instance.text)
-        # subclip_text = instance.text.lower().strip()
-        
-        # Concatenate all fragment texts to form a transcript
-        full_transcript = ""
-        fragment_positions = []  # Keep track of which fragment each position belongs to
-        
-        for i, fragment in enumerate(all_fragments):
-            fragment_text = ' '.join(fragment.get('lines', [])).lower()
-            fragment_positions.extend([i] * (len(fragment_text) + 1))  # +1 for the space
-            full_transcript += fragment_text + " "
-            
-        full_transcript = full_transcript.strip()
-        
-        # If transcript is longer than our positions mapping, trim the positions
-        if len(fragment_positions) > len(full_transcript):
-            fragment_positions = fragment_positions[:len(full_transcript)]
-        
-
-        # Find the subclip text in the transcript
-        if subclip_text in full_transcript:
-            # Find the start and end positions
-            start_pos = full_transcript.find(subclip_text)
-            end_pos = start_pos + len(subclip_text) - 1
-            
-            # Get the corresponding fragments
-            if 0 <= start_pos < len(fragment_positions) and 0 <= end_pos < len(fragment_positions):
-                start_fragment_index = fragment_positions[start_pos]
-                end_fragment_index = fragment_positions[end_pos]
-                
-                # Set the start time only if this is not the first subclip
-                if not is_first_subclip:
-                    start_fragment = all_fragments[start_fragment_index]
-                    instance.start_time = float(start_fragment.get('begin', 0))
-                    print(f"Start fragment: {start_fragment.get('lines')} at {instance.start_time}")
-                
-                # Set the end time
-                end_fragment = all_fragments[end_fragment_index]
-                end_fragment_id = end_fragment.get('id')
-                print(f"End fragment ID: {end_fragment_id}, text: {end_fragment.get('lines')}")
-                
-                # Find the next fragment that actually starts after this one ends
-                end_fragment_end_time = float(end_fragment.get('end', 0))
-                next_fragment = None
-                
-                for i in range(end_fragment_index + 1, len(all_fragments)):
-                    potential_next = all_fragments[i]
-                    if float(potential_next.get('begin', 0)) >= end_fragment_end_time:
-                        next_fragment = potential_next
-                        break
-                
-                if next_fragment:
-                    # Use the start time of the next fragment that starts after this one ends
-                    instance.end_time = float(next_fragment.get('begin', 0))
-                    print( float(next_fragment.get('begin', 0)))
-                    print(f"End time set to next fragment start: {instance.end_time}, ID: {next_fragment.get('id')}, text: {next_fragment.get('lines')}")
-                else:
-                    # Use the end time of the current fragment
-                    instance.end_time = end_fragment_end_time
-                    print(f"No next fragment after this one ends, using current end: {instance.end_time}")
-                
-                return
-        
-        # Fallback method - try partial matching
-        print("Exact match not found, trying partial matching...")
-        matching_fragments = []
-        
-        for fragment in all_fragments:
-            fragment_text = ' '.join(fragment.get('lines', [])).lower()
-            
-            # Check if the fragment text is in the subclip or vice versa
-            if fragment_text in subclip_text or subclip_text in fragment_text:
-                matching_fragments.append(fragment)
-        
-        if matching_fragments:
-            # Sort matching fragments by start time
-            matching_fragments.sort(key=lambda x: float(x.get('begin', 0)))
-            
-            # Set start time to the first matching fragment only if not the first subclip
+        # Parsed once per SRT version and shared by every clip/subclip save
+        index = get_transcript_index(video)
+        clips = list(Clips.objects.filter(video=video).order_by('sequence').values_list('id', 'text'))
+        texts = [clip.text if clip_id == clip.pk else text for clip_id, text in clips]
+        position = [clip_id for clip_id, _ in clips].index(clip.pk)
+
+        # Word-level alignment of all clip texts, shared until one of them changes
+        alignment = get_token_alignment(index, texts)
+        span, _ = alignment.sub_span(position, instance.text)
+        if span:
+            start_fragment_index, end_fragment_index = span
+            
+            # Set the start time only if this is not the first subclip
             if not is_first_subclip:
-                instance.start_time = float(matching_fragments[0].get('begin', 0))
-            
-            # Get the last matching fragment's index in the full list
-            last_match = matching_fragments[-1]
-            last_match_index = -1
-            
-            for i, fragment in enumerate(all_fragments):
-                if fragment.get('id') == last_match.get('id'):
-                    last_match_index = i
-                    break
-            
-            # Set end time
-            if last_match_index + 1 < len(all_fragments):
-                # Use start time of next fragment
-                next_fragment = all_fragments[last_match_index + 1]
-                instance.end_time = float(next_fragment.get('begin', 0))
-                print(f"Partial match: using next fragment start: {instance.end_time}")
+                instance.start_time = index.begins[start_fragment_index]
+                print(f"Start fragment: {index.lines[start_fragment_index]} at {instance.start_time}")
+            
+            # Set the end time
+            print(f"End fragment ID: {index.ids[end_fragment_index]}, text: {index.lines[end_fragment_index]}")
+            
+            # Find the next fragment that actually starts after this one ends
+            next_index = index.next_fragment_after(end_fragment_index)
+            if next_index is not None:
+                # Use the start time of the next fragment that starts after this one ends
+                instance.end_time = index.begins[next_index]
+                print(f"End time set to next fragment start: {instance.end_time}, ID: {index.ids[next_index]}, text: {index.lines[next_index]}")
             else:
-                # Use end time of last matching fragment
-                instance.end_time = float(last_match.get('end', 0))
-                print(f"Partial match: no next fragment, using last fragment end: {instance.end_time}")
+                # Use the end time of the current fragment
+                instance.end_time = index.ends[end_fragment_index]
+                print(f"No next fragment after this one ends, using current end: {instance.end_time}")
+        else:
+            print("No matching fragments found")
     except (json.JSONDecodeError, IOError, ValueError) as e:
         logger.error(f"Error processing SRT file: {e}")
 
@@ -682,6 +594,10 @@ def configure_subclip_from_clips(sender, instance: Clips, **kwargs):
     The end time will be the start time of the next fragment when available.
     The first clip of a video will always have a start time of zero.
     """
+    # Batch writes from the timing solver already carry their timings
+    if timing_signals_suppressed():
+        return
+
     # Check if this is the first clip for this video
     is_first_clip = False
     if instance.sequence == 1:
@@ -720,142 +636,43 @@ def configure_subclip_from_clips(sender, instance: Clips, **kwargs):
         return
     
     try:
-        # Load the SRT JSON content
+        # Parsed once per SRT version and shared by every clip/subclip save
         print(f"Processing video ID: {video.id}")
-        with video.srt_file.open('r') as srt_file:
-            srt_data = json.load(srt_file)
+        index = get_transcript_index(video)
         
-        # Calculate threshold based on previous clips
-        threshold = (
-            Clips.objects
-            .filter(sequence__lt=instance.sequence, video=instance.video)
-            .order_by('sequence')
-            .last()
-            .end_time
-            if Clips.objects.filter(sequence__lt=instance.sequence, video=instance.video).exists()
-            else 0
+        # Place this clip's (possibly edited) text among the others by sequence
+        others = list(
+            Clips.objects.filter(video=video).exclude(pk=instance.pk).order_by('sequence').values_list('sequence', 'text')
         )
-        print(f"Threshold for clip: {threshold}")
-        
-        # Convert threshold to float if needed
-        if threshold is None:
-            threshold = 0.0
-        else:
-            threshold = float(threshold)
-                
-        # Filter fragments after the threshold
-        filtered_fragments = [
-            fragment for fragment in srt_data['fragments']
-            if float(fragment['begin']) >= threshold
-        ]
+        position = sum(1 for sequence, _ in others if sequence < instance.sequence)
+        texts = [text for _, text in others]
+        texts.insert(position, instance.text)
 
-        # Get all fragments sorted by begin time
-        all_fragments = sorted(filtered_fragments, key=lambda x: float(x.get('begin', 0)))
-
-        print(f"Total fragments in SRT after threshold: {len(all_fragments)}")
-        
-        # Get clip text in lowercase for comparison
-        clip_text = clean_text_for_alignment(instance.text)
-        # clip_text = instance.text.lower().strip()
-        
-        # Concatenate all fragment texts to form a transcript
-        full_transcript = ""
-        fragment_positions = []  # Keep track of which fragment each position belongs to
-        
-        for i, fragment in enumerate(all_fragments):
-            fragment_text = ' '.join(fragment.get('lines', [])).lower()
-            fragment_positions.extend([i] * (len(fragment_text) + 1))  # +1 for the space
-            full_transcript += fragment_text + " "
+        # Word-level alignment of all clip texts, shared until one of them changes
+        alignment = get_token_alignment(index, texts)
+        span = alignment.clip_span(position)
+        if span:
+            start_fragment_index, end_fragment_index = span
             
-        full_transcript = full_transcript.strip()
-        
-        # If transcript is longer than our positions mapping, trim the positions
-        if len(fragment_positions) > len(full_transcript):
-            fragment_positions = fragment_positions[:len(full_transcript)]
-
-        # Find the clip text in the transcript
-        if clip_text in full_transcript:
-            # Find the start and end positions
-            start_pos = full_transcript.find(clip_text)
-            end_pos = start_pos + len(clip_text) - 1
-            
-            # Get the corresponding fragments
-            if 0 <= start_pos < len(fragment_positions) and 0 <= end_pos < len(fragment_positions):
-                start_fragment_index = fragment_positions[start_pos]
-                end_fragment_index = fragment_positions[end_pos]
-                
-                # Set the start time only if this is not the first clip
-                if not is_first_clip:
-                    start_fragment = all_fragments[start_fragment_index]
-                    instance.start_time = float(start_fragment.get('begin', 0))
-                    print(f"Start fragment: {start_fragment.get('lines')} at {instance.start_time}")
-                
-                # Set the end time
-                end_fragment = all_fragments[end_fragment_index]
-                end_fragment_id = end_fragment.get('id')
-                print(f"End fragment ID: {end_fragment_id}, text: {end_fragment.get('lines')}")
-                
-                # Find the next fragment that actually starts after this one ends
-                end_fragment_end_time = float(end_fragment.get('end', 0))
-                next_fragment = None
-                
-                for i in range(end_fragment_index + 1, len(all_fragments)):
-                    potential_next = all_fragments[i]
-                    if float(potential_next.get('begin', 0)) >= end_fragment_end_time:
-                        next_fragment = potential_next
-                        break
-                
-                if next_fragment:
-                    # Use the start time of the next fragment that starts after this one ends
-                    instance.end_time = float(next_fragment.get('begin', 0))
-                    print(f"End time set to next fragment start: {instance.end_time}")
-                    print(f"Next fragment ID: {next_fragment.get('id')}, text: {next_fragment.get('lines')}")
-                else:
-                    # Use the end time of the current fragment
-                    instance.end_time = end_fragment_end_time
-                    print(f"No next fragment after this one ends, using current end: {instance.end_time}")
-                
-                return
-        
-        # Fallback method - try partial matching
-        print("Exact match not found, trying partial matching...")
-        matching_fragments = []
-        
-        for fragment in all_fragments:
-            fragment_text = ' '.join(fragment.get('lines', [])).lower()
-            
-            # Check if the fragment text is in the clip text or vice versa
-            if fragment_text in clip_text or clip_text in fragment_text:
-                matching_fragments.append(fragment)
-        
-        if matching_fragments:
-            # Sort matching fragments by start time
-            matching_fragments.sort(key=lambda x: float(x.get('begin', 0)))
-            
-            # Set start time to the first matching fragment only if not the first clip
+            # Set the start time only if this is not the first clip
             if not is_first_clip:
-                instance.start_time = float(matching_fragments[0].get('begin', 0))
-                print(f"Partial match start time: {instance.start_time}")
-            
-            # Get the last matching fragment's index in the full list
-            last_match = matching_fragments[-1]
-            last_match_index = -1
-            
-            for i, fragment in enumerate(all_fragments):
-                if fragment.get('id') == last_match.get('id'):
-                    last_match_index = i
-                    break
-            
-            # Set end time
-            if last_match_index + 1 < len(all_fragments):
-                # Use start time of next fragment
-                next_fragment = all_fragments[last_match_index + 1]
-                instance.end_time = float(next_fragment.get('begin', 0))
-                print(f"Partial match: using next fragment start: {instance.end_time}")
+                instance.start_time = index.begins[start_fragment_index]
+                print(f"Start fragment: {index.lines[start_fragment_index]} at {instance.start_time}")
+            
+            # Set the end time
+            print(f"End fragment ID: {index.ids[end_fragment_index]}, text: {index.lines[end_fragment_index]}")
+            
+            # Find the next fragment that actually starts after this one ends
+            next_index = index.next_fragment_after(end_fragment_index)
+            if next_index is not None:
+                # Use the start time of the next fragment that starts after this one ends
+                instance.end_time = index.begins[next_index]
+                print(f"End time set to next fragment start: {instance.end_time}")
+                print(f"Next fragment ID: {index.ids[next_index]}, text: {index.lines[next_index]}")
             else:
-                # Use end time of last matching fragment
-                instance.end_time = float(last_match.get('end', 0))
-                print(f"Partial match: no next fragment, using last fragment end: {instance.end_time}")
+                # Use the end time of the current fragment
+                instance.end_time = index.ends[end_fragment_index]
+                print(f"No next fragment after this one ends, using current end: {instance.end_time}")
         else:
             print("No matching fragments found")
             
@@ -1089,13 +906,20 @@ def update_video_name(sender, instance:Video, created, **kwargs):
             instance.save()
 
 
-@receiver(post_save, sender=ProcessingStatus)
-def delete_when_reach_hundred(sender, instance:ProcessingStatus, created, **kwargs):
-    if instance.progress >= 100:
-        # Sleep for 5 seconds before deleting
-        time.sleep(5)
-        instance.delete()
-        logger.info(f"Deleted ProcessingStatus instance with ID {instance.id} as progress reached 100%.")
+@receiver(pre_save, sender=ProcessingStatus)
+def set_processing_status_expiry(sender, instance:ProcessingStatus, **kwargs):
+    """
+    Stamp finished records with an expiry instead of deleting them inline.
+    The reap_expired_processing_statuses beat task removes them once the
+    grace window has passed.
+    """
+    if instance.is_finished:
+        if instance.expires_at is None:
+            grace = getattr(settings, 'PROCESSING_STATUS_GRACE_PERIOD', 60)
+            instance.expires_at = timezone.now() + timedelta(seconds=grace)
+    else:
+        # A restarted run must not be reaped
+        instance.expires_at = None
 
 @receiver(pre_save, sender=Subclip)
 def check_image(sender, instance:Subclip, **kwargs):
@@ -4,6 +4,8 @@ import glob
 import logging
 from datetime import datetime, timedelta
 import tempfile
+from celery import shared_task
+from django.utils import timezone
 
 def cleanup_temp_files(temp_dir=None, max_age_days=1, file_patterns=None):
     """
@@ -62,4 +64,49 @@ def cleanup_temp_files(temp_dir=None, max_age_days=1, file_patterns=None):
         
     except Exception as e:
         logging.error(f"Cleanup failed: {str(e)}")
-        return 0, [f"Cleanup operation failed: {str(e)}"]
\ No newline at end of file
+        return 0, [f"Cleanup operation failed: {str(e)}"]
+
+
+@shared_task(name='reap_expired_processing_statuses_task')
+def reap_expired_processing_statuses_task():
+    """
+    Delete finished ProcessingStatus records whose grace window has passed.
+
+    Returns:
+        int: Number of records deleted
+    """
+    from apps.processors.models import ProcessingStatus
+
+    deleted, _ = ProcessingStatus.objects.filter(
+        expires_at__lte=timezone.now(),
+        status__in=ProcessingStatus.TERMINAL_STATUSES,
+    ).delete()
+    if deleted:
+        logging.info(f"Reaped {deleted} expired processing status records")
+    return deleted
+
+
+@shared_task(name='render_video_shard_task')
+def render_video_shard_task(video_id, shard, add_watermark=False, job_id=None, run_id=None):
+    """
+    Render one shard of a sharded render on this worker.
+
+    Args:
+        video_id (int): Video being rendered
+        shard (dict): Shard description from plan_shards
+        add_watermark (bool): Whether to burn in the watermark
+        job_id (str): Identifier shared by all shards of one render
+        run_id (str): Run of the coordinating render, so a cancel reaches the shard
+
+    Returns:
+        str: Storage key of the rendered shard
+    """
+    from apps.processors.services.sharded_render import render_shard
+    from apps.processors.services.process_control import ProcessingCancelled
+
+    logging.info(f"Rendering shard {shard['index']} of video {video_id}")
+    try:
+        return render_shard(video_id, shard, add_watermark, job_id, run_id=run_id)
+    except ProcessingCancelled as e:
+        # ProcessingCancelled is a BaseException; surface it as an ordinary task failure
+        raise RuntimeError(str(e))
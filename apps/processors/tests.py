@@ -1,3 +1,15 @@
-from django.test import TestCase
+from django.test import SimpleTestCase
 
-# Create your tests here.
+
+class ProcessorsImportTests(SimpleTestCase):
+    """The views and admin import helpers from utils at module load; a missing one breaks the app"""
+
+    def test_views_import(self):
+        from apps.processors import views
+
+        self.assertTrue(callable(views.generate_clips_from_srt))
+
+    def test_admin_import(self):
+        from apps.processors import admin
+
+        self.assertTrue(callable(admin.generate_clips_from_srt))
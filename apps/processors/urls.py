@@ -13,8 +13,11 @@ from .views import (
     process_video_view,  # Add this import
     start_video_processing,  # Add this import
     get_processing_status,  # Add this import
+    stream_processing_status,
+    cancel_video_processing,
     delete_background_music,  # Add this import
     generate_scene_suggestions,
+    generate_scene_suggestions_batch,
     save_draft,
     update_video_credentials,
 get_processing_status_with_credentials,
@@ -44,8 +47,11 @@ urlpatterns = [
     path('process-video/<int:video_id>/', process_video_view, name='process_video'),  # Add this URL pattern
     path('videos/<int:video_id>/process-video/', start_video_processing, name='start_video_processing'),  # Add this URL pattern
     path('videos/<int:video_id>/processing-status/', get_processing_status, name='get_processing_status'),  # Add this URL pattern
+    path('videos/<int:video_id>/processing-events/', stream_processing_status, name='stream_processing_status'),
+    path('videos/<int:video_id>/cancel-processing/', cancel_video_processing, name='cancel_video_processing'),
     path('delete-background-music/', delete_background_music, name='delete_background_music'),  # Add this URL pattern
     path('generate-scene-suggestions/', generate_scene_suggestions, name='generate_scene_suggestions'),  # Add this URL pattern
+    path('generate-scene-suggestions/batch/', generate_scene_suggestions_batch, name='generate_scene_suggestions_batch'),
     path('save-draft/', save_draft, name='save_draft'),  # Add this URL pattern
     path('videos/<int:video_id>/update-credentials/', update_video_credentials, name='update_video_credentials'),
     path('videos/<int:video_id>/processing-status/', get_processing_status_with_credentials, name='get_processing_status_with_credentials'),
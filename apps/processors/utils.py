@@ -3,7 +3,6 @@ import chardet
 import json
 import re
 import datetime
-import boto3
 from django.core.files.base import ContentFile
 # from .services.text_alignment_service import TextAudioAligner
 from .services.elevenlabs_text_alignment import ElevenLabsTextAlignment
@@ -13,7 +12,9 @@ from .models import Clips, Video, ProcessingStatus, Subclip, BackgroundMusic
 import subprocess
 from django.conf import settings
 from django.core.files import File
-from apps.core.services.s3_service import get_s3_client
+from apps.core.services.s3_service import get_s3_client, S3MultipartWriter
+from apps.core.services.storage_cache import get_storage_cache
+import shutil
 import tempfile
 import hashlib
 import logging
@@ -23,13 +24,30 @@ from django.core.files.temp import NamedTemporaryFile
 from apps.core.models import Subscription
 from django.core.files.storage import default_storage
 from apps.core.models import AppVariables
+from .services.progress_store import ProgressTracker
+from .services.sharded_render import should_shard, render_video_sharded
+from .services.process_control import CancellationToken, ProcessingCancelled, check_ffmpeg_output, run_ffmpeg
+from .services.timing_solver import solve_video_timings
+from .services.token_aligner import get_token_alignment
+from .services.transcript_index import TranscriptIndex
+from .services.incremental_voiceover import (
+    align_segments,
+    build_voiceover,
+    incremental_tts_enabled,
+    load_manifest,
+    save_manifest,
+)
+
+# Trackers are reused per video so checkpoint throttling survives between calls
+_progress_trackers = {}
 
 def generate_final_video(video: Video) -> bool:
     """Generate the final video for a Video instance with progress tracking."""
-    # Ensure all subclips are saved
-    for subclip in Subclip.objects.filter(clip__video=video):
-        subclip.save()
-        
+    # Ensure all subclip timings match the current transcript
+    if video.srt_file and Clips.objects.filter(video=video).exists():
+        solve_video_timings(video)
+
+    processor = None
     try:
         # Get or create processing status
         status_obj, created = ProcessingStatus.objects.get_or_create(
@@ -49,9 +67,18 @@ def generate_final_video(video: Video) -> bool:
             status_obj.error_message = None
             status_obj.save()
 
+        tracker = ProgressTracker(video.id, status_obj=status_obj)
+        tracker.start(video.user_id)
+        tracker.update(step="Initializing video generation", stage="render")
+        _progress_trackers[video.id] = tracker
+
+        # Start a new run, so a cancel left over from an earlier one doesn't stop this render
+        cancel_token = CancellationToken(video.id)
+        cancel_token.reset()
+
         # Create processor with progress callback
         processor = VideoProcessorService(
-            video, status_callback=update_processing_status
+            video, status_callback=update_processing_status, cancel_token=cancel_token
         )
         
         # Check if we need to process a specific subclip
@@ -75,18 +102,23 @@ def generate_final_video(video: Video) -> bool:
             
         if updated_successfully:
             # Update status to completed
-            status_obj.progress = 100
-            status_obj.status = "completed"
-            status_obj.current_step = "Video generation complete"
-            status_obj.save()            
+            tracker.complete(output=video.output.url if video.output else None)
+            _progress_trackers.pop(video.id, None)
             cleanup_temp_files()
             
             return True
 
-        output_path = processor.generate_video(
-            add_watermark="free"
-            in Subscription.objects.filter(user=video.user).first().plan.name.lower()
-        )
+        add_watermark = "free" in Subscription.objects.filter(user=video.user).first().plan.name.lower()
+        if should_shard(video):
+            # Long timelines are split at scene boundaries and rendered across workers
+            output_path = render_video_sharded(
+                video,
+                add_watermark=add_watermark,
+                status_callback=update_processing_status,
+                cancel_token=cancel_token,
+            )
+        else:
+            output_path = processor.generate_video(add_watermark=add_watermark)
 
         # Process background music if needed
         if BackgroundMusic.objects.filter(video=video).exists():
@@ -99,30 +131,62 @@ def generate_final_video(video: Video) -> bool:
             video.output.save(output_filename, File(f), save=True)
 
         # Update status to completed
-        status_obj.progress = 100
-        status_obj.status = "completed"
-        status_obj.current_step = "Video generation complete"
-        status_obj.save()
+        tracker.complete(output=video.output.url)
+        _progress_trackers.pop(video.id, None)
 
         # Clean up temporary files older than an hour
         cleanup_temp_files()
         
         return True
 
+    except ProcessingCancelled:
+        print(f"Video generation for Video #{video.id} was cancelled")
+        tracker = _progress_trackers.pop(video.id, None) or ProgressTracker(video.id)
+        tracker.update(status="cancelled", step="Processing cancelled")
+        cleanup_render_temp_files(video.id)
+        return False
+
     except Exception as e:
         # Log the error
         print(f"Error generating final video for Video #{video.id}: {str(e)}")
 
         # Update status to error
         try:
-            status_obj = ProcessingStatus.objects.get(video=video)
-            status_obj.status = "error"
-            status_obj.error_message = str(e)
-            status_obj.save()
+            tracker = _progress_trackers.pop(video.id, None) or ProgressTracker(video.id)
+            tracker.fail(str(e))
         except:
             pass
 
         return False
+    finally:
+        if processor is not None:
+            processor.close()
+
+def cleanup_render_temp_files(video_id):
+    """Remove temp files and folders left behind by a cancelled render of one video"""
+    import glob
+    import shutil
+
+    temp_dir = tempfile.gettempdir()
+    patterns = [
+        f"*videocrafter_temp_{video_id}_*",
+        f"*videocrafter_shards_{video_id}",
+        f"video_{video_id}_output_*.mp4",
+        f"video_{video_id}_watermarked_*.mp4",
+    ]
+    removed = 0
+    for pattern in patterns:
+        for item_path in glob.glob(os.path.join(temp_dir, pattern)):
+            try:
+                if os.path.isdir(item_path):
+                    shutil.rmtree(item_path)
+                else:
+                    os.remove(item_path)
+                removed += 1
+            except Exception as e:
+                print(f"Error removing {item_path}: {e}")
+    return removed
+
 
 def cleanup_temp_files():
     """Clean up temporary files older than an hour, but preserve recently streamed files"""
@@ -186,34 +250,47 @@ def cleanup_temp_files():
         print(f"Error during temp cleanup: {str(e)}")
 
 
-def update_processing_status(video_id, progress, step=None, error=None):
-    """Update the processing status for a video."""
-    try:
-        status_obj = ProcessingStatus.objects.get(video_id=video_id)
-        status_obj.progress = progress
-
-        if step:
-            status_obj.current_step = step
+def update_processing_status(video_id, progress, step=None, error=None, **fields):
+    """
+    Update the processing status for a video.
 
+    Progress goes to the Redis progress hash; the ProcessingStatus row is only
+    checkpointed periodically and on status changes.
+    """
+    try:
+        tracker = _progress_trackers.get(video_id)
+        if tracker is None:
+            tracker = ProgressTracker(video_id)
+            _progress_trackers[video_id] = tracker
+        tracker.update(progress=progress, step=step, error=error, **fields)
         if error:
-            status_obj.status = "error"
-            status_obj.error_message = error
-
-        status_obj.save()
-    except ProcessingStatus.DoesNotExist:
-        # Create a new status object if it doesn't exist
-        ProcessingStatus.objects.create(
-            video_id=video_id,
-            status="processing" if not error else "error",
-            progress=progress,
-            current_step=step or "Processing",
-            error_message=error,
-        )
+            _progress_trackers.pop(video_id, None)
     except Exception as e:
         # Log error but don't interrupt processing
         print(f"Error updating processing status: {e}")
 
 
+def _open_voiceover_upload(video):
+    """
+    Start a multipart upload for the video's next audio file when media is
+    stored on S3.
+
+    Returns:
+        Optional[tuple]: (storage name, S3MultipartWriter) or None to fall back to a regular save
+    """
+    if not hasattr(default_storage, "bucket_name"):
+        return None
+    try:
+        name = video.audio_file.field.generate_filename(video, f"video_{video.id}_audio.mp3")
+        name = default_storage.get_available_name(name)
+        location = (getattr(default_storage, "location", "") or "").strip("/")
+        key = f"{location}/{name}" if location else name
+        return name, S3MultipartWriter(key, content_type="audio/mpeg", bucket=default_storage.bucket_name)
+    except Exception as e:
+        print(f"Could not start streaming upload, falling back to a regular save: {e}")
+        return None
+
+
 def generate_audio_file(video, user_id):
     """
     Generate audio file from text using ElevenLabs with better error handling
@@ -262,22 +339,56 @@ def generate_audio_file(video, user_id):
             api_key=video.elevenlabs_api_key
         )
         
+        if clips.exists() and not video.history_id and incremental_tts_enabled():
+            # Only clips whose text (or voice) changed are sent to ElevenLabs
+            try:
+                with tempfile.TemporaryDirectory() as work_dir:
+                    manifest = build_voiceover(
+                        video, handler, list(clips.order_by("sequence")), work_dir, temp_audio_path
+                    )
+            except Exception:
+                os.unlink(temp_audio_path)
+                raise
+            with open(temp_audio_path, "rb") as f:
+                video.audio_file.save(f"video_{video.id}_audio.mp3", File(f), save=True)
+            save_manifest(video.id, manifest)
+            # Keep the local copy in the worker cache so alignment and rendering don't download it again
+            get_storage_cache().add(video.audio_file.name, temp_audio_path)
+            return True
+
         # Check credits before attempting generation
         if not handler.has_sufficient_credits(len(text_content)):
             # Clean up temp file before raising exception
             os.unlink(temp_audio_path)
             raise Exception("Insufficient credits to generate voiceover")
-        if video.history_id:
-            handler.get_history_audio(video.history_id, output_path=temp_audio_path)
-        else:
-            handler.generate_voiceover(text=text_content, output_path=temp_audio_path)
+
+        # Stream the audio into storage while it is being written locally
+        upload = _open_voiceover_upload(video)
+        sink = upload[1] if upload else None
+        try:
+            if video.history_id:
+                handler.get_history_audio(video.history_id, output_path=temp_audio_path, sink=sink)
+            else:
+                # Credits were checked above
+                handler.generate_voiceover(text=text_content, output_path=temp_audio_path, sink=sink, check_credits=False)
+            if upload:
+                sink.close()
+        except Exception:
+            if upload:
+                sink.abort()
+            os.unlink(temp_audio_path)
+            raise
         
-        # Save audio file to the video model using Django's File API
-        with open(temp_audio_path, "rb") as f:
-            video.audio_file.save(f"video_{video.id}_audio.mp3", File(f), save=True)
+        if upload:
+            video.audio_file.name = upload[0]
+            video.save()
+        else:
+            # Save audio file to the video model using Django's File API
+            with open(temp_audio_path, "rb") as f:
+                video.audio_file.save(f"video_{video.id}_audio.mp3", File(f), save=True)
         
-        # Clean up temp file
-        os.unlink(temp_audio_path)
+        # Keep the local copy in the worker cache so alignment and rendering don't download it again
+        get_storage_cache().add(video.audio_file.name, temp_audio_path)
         
         return True
         
@@ -370,12 +481,9 @@ def generate_srt_file(video, user_id):
         from django.core.files import File
         from django.core.files.storage import default_storage
         
-        # Create temporary files for processing
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as temp_audio:
-            # Download the audio file to the temp location
-            with default_storage.open(video.audio_file.name, 'rb') as s3_file:
-                temp_audio.write(s3_file.read())
-            temp_audio_path = temp_audio.name
+        # generate_audio_file usually left the voiceover in the worker cache
+        cached_audio = get_storage_cache().open(video.audio_file.name)
+        temp_audio_path = cached_audio.path
         
         # Get text content
         clips = Clips.objects.filter(video=video).order_by("sequence")
@@ -407,11 +515,20 @@ def generate_srt_file(video, user_id):
         
         # Generate SRT file from text and audio
         aligner = ElevenLabsTextAlignment(AppVariables.objects.get(key="ELEVENLABS_ALIGNMENT_KEY").value)
-        srt_path = aligner.align_text_with_audio(
-            script=text_one_word_per_line,
-            output_json_path=json_path,
-            audio_path=temp_audio_path,  # Use the temporary audio file
-        )
+        manifest = load_manifest(video.id, temp_audio_path) if clips.exists() else None
+        srt_path = None
+        if manifest:
+            # Voiceover was built per clip: align clip by clip and offset the timings
+            try:
+                srt_path = align_segments(aligner, manifest, json_path)
+            except RuntimeError as e:
+                print(f"⚠️ Per-clip alignment failed for video {video.id}, aligning the whole voiceover: {e}")
+        if not srt_path:
+            srt_path = aligner.align_text_with_audio(
+                script=text_one_word_per_line,
+                output_json_path=json_path,
+                audio_path=temp_audio_path,  # Use the temporary audio file
+            )
         
         # Save the SRT file to the model
         if srt_path and os.path.exists(srt_path):
@@ -420,7 +537,7 @@ def generate_srt_file(video, user_id):
                 video.srt_file.save(file_name, ContentFile(srt_file.read()), save=True)
                 
                 # Clean up temp files
-                os.unlink(temp_audio_path)
+                cached_audio.release()
                 os.unlink(json_path)
                 if os.path.exists(srt_path) and srt_path != json_path:
                     os.unlink(srt_path)
@@ -428,7 +545,7 @@ def generate_srt_file(video, user_id):
                 return True
                 
         # Clean up temp files
-        os.unlink(temp_audio_path)
+        cached_audio.release()
         if os.path.exists(json_path):
             os.unlink(json_path)
             
@@ -446,29 +563,26 @@ def update_clip_timings_from_alignment(video, alignment_data):
         video: Video object
         alignment_data: Alignment data from TextAudioAligner
     """
-    # Get all clips
-    clips = Clips.objects.filter(video=video).order_by("id")
+    # Get all clips in playback order
+    clips = list(Clips.objects.filter(video=video).order_by("sequence", "id"))
 
-    if not clips.exists():
+    if not clips:
         return
 
     # Extract fragments from alignment data
-    fragments = alignment_data.get("fragments", [])
-
-    # Match clips to fragments based on text content
-    for clip in clips:
-        clip_text = clip.text.lower().strip()
-
-        # Find matching fragment(s) for this clip
-        matching_fragments = []
-        for fragment in fragments:
-            fragment_text = (
-                fragment.get("text", "").lower().strip()
-                or " ".join(fragment.get("lines", [])).lower().strip()
-            )
-
-            if fragment_text in clip_text or clip_text in fragment_text:
-                matching_fragments.append(fragment)
+    fragments = [
+        fragment if fragment.get("lines") else {**fragment, "lines": [fragment.get("text", "")]}
+        for fragment in alignment_data.get("fragments", [])
+    ]
+    index = TranscriptIndex(fragments)
+
+    # Match all clips to fragments in one word-level pass
+    alignment = get_token_alignment(index, [clip.text or "" for clip in clips])
+    for position, clip in enumerate(clips):
+        span = alignment.clip_span(position)
+        matching_fragments = (
+            [index.fragment(i) for i in range(span[0], span[1] + 1)] if span else []
+        )
 
         # If we found matching fragments, update the clip timing
         if matching_fragments:
@@ -553,37 +667,25 @@ def update_clip_timings(video):
             raise ValueError("Audio file not available")
 
         # Import necessary modules
-        import tempfile
-        import os
-        import subprocess
-        from django.core.files.storage import default_storage
         
-        # Create temporary file for processing
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as temp_audio:
-            # Download the audio file to the temp location
-            with default_storage.open(video.audio_file.name, 'rb') as s3_file:
-                temp_audio.write(s3_file.read())
-            temp_audio_path = temp_audio.name
-
-        # Get audio duration using ffprobe
-        cmd = [
-            "ffprobe",
-            "-v",
-            "error",
-            "-show_entries",
-            "format=duration",
-            "-of",
-            "default=noprint_wrappers=1:nokey=1",
-            temp_audio_path,
-        ]
-        audio_duration = float(subprocess.check_output(cmd).decode("utf-8").strip())
+        # Get audio duration using ffprobe on the worker's cached copy
+        with get_storage_cache().open(video.audio_file.name) as cached_audio:
+            cmd = [
+                "ffprobe",
+                "-v",
+                "error",
+                "-show_entries",
+                "format=duration",
+                "-of",
+                "default=noprint_wrappers=1:nokey=1",
+                cached_audio.path,
+            ]
+            audio_duration = float(check_ffmpeg_output(cmd).decode("utf-8").strip())
 
         # Get all clips
         clips = Clips.objects.filter(video=video).order_by("id")
 
         if not clips.exists():
-            # Clean up temp file
-            os.unlink(temp_audio_path)
             raise ValueError("No clips found")
 
         # Calculate time per clip
@@ -614,9 +716,6 @@ def update_clip_timings(video):
 
             current_time += time_per_clip
 
-        # Clean up temp file
-        os.unlink(temp_audio_path)
-        
         return True
     except Exception as e:
         print(f"Error updating clip timings: {str(e)}")
@@ -668,109 +767,13 @@ def generate_clips_from_text_file(video: Video):
     return clips_created
 
 
-# def generate_clips_from_srt(video):
-#     """Update existing clips with timing information from SRT file"""
-#     try:
-#         # Import necessary modules
-#         import tempfile
-#         import os
-#         import json
-#         from django.core.files.storage import default_storage
-        
-#         if not video.srt_file:
-#             raise ValueError(f"Video #{video.id} doesn't have an SRT file.")
-
-#         # Get all existing clips
-#         clips = list(Clips.objects.filter(video=video).order_by("sequence"))
-#         if not clips:
-#             raise ValueError(f"No clips found for video #{video.id}.")
-
-#         # Download SRT file to temporary location
-#         with tempfile.NamedTemporaryFile(delete=False, suffix=".srt") as temp_srt:
-#             # Download the SRT file
-#             with default_storage.open(video.srt_file.name, 'rb') as s3_file:
-#                 temp_srt.write(s3_file.read())
-#             srt_file_path = temp_srt.name
-
-#         # Read SRT file as JSON
-#         with open(srt_file_path, "r", encoding="utf-8") as file:
-#             srt_data = json.load(file)
-
-#         # Clean up temp file
-#         os.unlink(srt_file_path)
-
-#         # Extract all words from SRT fragments
-#         all_words = []
-#         for fragment in srt_data.get("fragments", []):
-#             begin_time = float(fragment.get("begin", "0"))
-#             end_time = float(fragment.get("end", "0"))
-#             word = " ".join(fragment.get("lines", []))
-#             if word:
-#                 all_words.append({"word": word, "begin": begin_time, "end": end_time})
-
-#         # Update each clip
-#         word_index = 0  # Track our position in all_words
-
-#         for clip in clips:
-#             clip_text = clip.text
-#             clip_words = clip_text.split()
-#             clip_start_time = None
-#             clip_end_time = None
-#             words_matched = 0
-
-#             # Start from the current position in all_words
-#             temp_word_index = word_index
-#             while temp_word_index < len(all_words) and words_matched < len(clip_words):
-#                 word_data = all_words[temp_word_index]
-#                 srt_word = word_data["word"].lower()
-
-#                 if srt_word == clip_words[words_matched].lower():
-#                     if clip_start_time is None:
-#                         clip_start_time = word_data["begin"]
-
-#                     clip_end_time = word_data["end"]
-#                     words_matched += 1
-
-#                 temp_word_index += 1
-
-#             # If we've found all words in the clip
-#             if (
-#                 words_matched > 0
-#                 and clip_start_time is not None
-#                 and clip_end_time is not None
-#             ):
-#                 clip.start_time = clip_start_time
-#                 clip.end_time = clip_end_time
-#                 clip.save()
-#                 word_index = temp_word_index  # Update our position for the next clip
-
-#         # Adjust clip times: first clip starts at 0, each clip ends at the start of the next
-#         clips = list(Clips.objects.filter(video=video).order_by("start_time"))
-#         if clips:
-#             # Set first clip to start at 0
-#             first_clip = clips[0]
-#             first_clip.start_time = 0
-#             first_clip.save()
-
-#             # Adjust each clip to end at the start of the next clip
-#             for i in range(len(clips) - 1):
-#                 current_clip = clips[i]
-#                 next_clip = clips[i + 1]
-#                 current_clip.end_time = next_clip.start_time
-#                 current_clip.save()
-
-#         return len(clips)
-#     except Exception as e:
-#         print(f"Error in generate_clips_from_srt: {str(e)}")
-#         raise
-
 def generate_clips_from_srt(video):
     """
-    Update existing clips with timing information from SRT file using the sophisticated
-    matching algorithm from configure_subclip. Handles repeated sentences by maintaining
-    proper sequence order in matching.
+    Update existing clips and their subclips with timing information from the
+    SRT file. All timings are solved in memory in one forward pass over the
+    transcript (so repeated sentences keep their sequence order) and written
+    with a single bulk update.
     """
-    import json
     import logging
     
     logger = logging.getLogger(__name__)
@@ -779,180 +782,20 @@ def generate_clips_from_srt(video):
         if not video.srt_file:
             raise ValueError(f"Video #{video.id} doesn't have an SRT file.")
 
-        # Get all existing clips
-        clips = list(Clips.objects.filter(video=video).order_by("sequence"))
-        if not clips:
+        if not Clips.objects.filter(video=video).exists():
             raise ValueError(f"No clips found for video #{video.id}.")
 
-        # Load the SRT JSON content
         try:
-            with video.srt_file.open('r') as srt_file:
-                srt_data = json.load(srt_file)
+            return solve_video_timings(video)
         except (json.JSONDecodeError, IOError) as e:
             logger.error(f"Error reading SRT file: {e}")
             raise ValueError(f"Could not read SRT file for video #{video.id}: {e}")
         
-        # Get all fragments sorted by begin time
-        all_fragments = sorted(
-            srt_data.get('fragments', []), 
-            key=lambda x: float(x.get('begin', 0))
-        )
-        
-        if not all_fragments:
-            raise ValueError(f"No fragments found in SRT file for video #{video.id}")
-        
-        logger.info(f"Total fragments in SRT: {len(all_fragments)}")
-        
-        # Concatenate all fragment texts to form a full transcript
-        full_transcript = ""
-        fragment_positions = []  # Track which fragment each position belongs to
-        
-        for j, fragment in enumerate(all_fragments):
-            fragment_text = ' '.join(fragment.get('lines', [])).lower()
-            fragment_positions.extend([j] * (len(fragment_text) + 1))  # +1 for the space
-            full_transcript += fragment_text + " "
-            
-        full_transcript = full_transcript.strip()
-        
-        # If transcript is longer than our positions mapping, trim the positions
-        if len(fragment_positions) > len(full_transcript):
-            fragment_positions = fragment_positions[:len(full_transcript)]
-        
-        # Keep track of where we last found a match to handle repeated sentences
-        last_matched_position = 0
-        
-        # First pass: Match clips to fragments using the sophisticated text matching algorithm
-        updated_clips = 0
-        
-        for i, clip in enumerate(clips):
-            # The first clip always starts at time 0
-            if i == 0:
-                clip.start_time = 0
-                updated_clips += 1
-            else:
-                # Process clip text matching
-                clip_text = clip.text.lower().strip()
-                
-                # For repeated sentences, search only from the last matched position
-                search_transcript = full_transcript[last_matched_position:]
-                
-                # Find the clip text in the remaining transcript - exact match
-                if clip_text in search_transcript:
-                    # Find the start and end positions relative to the search segment
-                    rel_start_pos = search_transcript.find(clip_text)
-                    rel_end_pos = rel_start_pos + len(clip_text) - 1
-                    
-                    # Convert to absolute positions in the full transcript
-                    start_pos = last_matched_position + rel_start_pos
-                    end_pos = last_matched_position + rel_end_pos
-                    
-                    # Get the corresponding fragments
-                    if 0 <= start_pos < len(fragment_positions) and 0 <= end_pos < len(fragment_positions):
-                        start_fragment_index = fragment_positions[start_pos]
-                        end_fragment_index = fragment_positions[end_pos]
-                        
-                        # Set the start time 
-                        start_fragment = all_fragments[start_fragment_index]
-                        clip.start_time = float(start_fragment.get('begin', 0))
-                        logger.debug(f"Clip #{clip.id}: matched text exactly, start time: {clip.start_time}")
-                        
-                        # Update the last matched position to the end of this match
-                        # This ensures we don't match the same text twice
-                        last_matched_position = end_pos + 1
-                        
-                        updated_clips += 1
-                    else:
-                        logger.warning(f"Clip #{clip.id}: Match found but position out of bounds")
-                else:
-                    # Fallback method - partial matching
-                    logger.debug(f"Clip #{clip.id}: exact match not found, trying partial matching...")
-                    
-                    # Only consider fragments that come after the last matched position
-                    last_fragment_index = -1
-                    if last_matched_position < len(fragment_positions):
-                        last_fragment_index = fragment_positions[last_matched_position]
-                    
-                    # Get fragments that appear after our last match
-                    candidate_fragments = []
-                    if last_fragment_index >= 0:
-                        candidate_fragments = all_fragments[last_fragment_index:]
-                    else:
-                        candidate_fragments = all_fragments
-                    
-                    matching_fragments = []
-                    
-                    for fragment in candidate_fragments:
-                        fragment_text = ' '.join(fragment.get('lines', [])).lower()
-                        
-                        # Check if the fragment text is in the clip or vice versa
-                        if fragment_text in clip_text or clip_text in fragment_text:
-                            matching_fragments.append(fragment)
-                    
-                    if matching_fragments:
-                        # Sort matching fragments by start time
-                        matching_fragments.sort(key=lambda x: float(x.get('begin', 0)))
-                        
-                        # Set start time to the first matching fragment
-                        clip.start_time = float(matching_fragments[0].get('begin', 0))
-                        logger.debug(f"Clip #{clip.id}: matched text partially, start time: {clip.start_time}")
-                        
-                        # Get the last matching fragment
-                        last_match = matching_fragments[-1]
-                        
-                        # Find this fragment's index in the original list
-                        for idx, fragment in enumerate(all_fragments):
-                            if fragment.get('id') == last_match.get('id'):
-                                # Update last_matched_position based on the index of this fragment
-                                # in the original transcript
-                                for pos, frag_idx in enumerate(fragment_positions):
-                                    if frag_idx > idx:
-                                        last_matched_position = pos
-                                        break
-                                break
-                        
-                        updated_clips += 1
-                    else:
-                        logger.warning(f"Clip #{clip.id}: No match found, start time might be incorrect")
-            
-            # Save the clip with its new start time
-            clip.save()
-        
-        # Second pass: Adjust end times so each clip ends at the start of the next clip
-        clips = list(Clips.objects.filter(video=video).order_by("sequence"))
-        
-        for i in range(len(clips) - 1):
-            current_clip = clips[i]
-            next_clip = clips[i + 1]
-            
-            # Set the current clip's end time to the next clip's start time
-            current_clip.end_time = next_clip.start_time
-            current_clip.save()
-            
-        # Set the last clip's end time to the end of its last matching fragment or the video duration
-        if clips:
-            last_clip = clips[-1]
-            # If we don't have an end time yet, try to determine it from SRT
-            if last_clip.end_time is None:
-                # Use the last fragment's end time as a fallback
-                last_fragment = all_fragments[-1]
-                last_clip.end_time = float(last_fragment.get('end', 0))
-                last_clip.save()
-            
-            # Set video_end_time for all clips
-            video_end_time = last_clip.end_time
-            for clip in clips:
-                clip.video_end_time = video_end_time
-                clip.save()
-        
-
-        for subclip in Subclip.objects.filter(clip__video=video):
-            subclip.save()
-        return updated_clips
-        
     except Exception as e:
         logger.error(f"Error in generate_clips_from_srt: {str(e)}")
         raise
 
+
 def process_background_music(video):
     """
     Process background music for a video
@@ -966,10 +809,7 @@ def process_background_music(video):
     try:
         # Import necessary modules
         import tempfile
-        import os
-        import subprocess
         import logging
-        from django.core.files.storage import default_storage
         
         # Get all background music items for this video
         bg_music_items = BackgroundMusic.objects.filter(video=video).order_by(
@@ -986,12 +826,9 @@ def process_background_music(video):
             if not item.audio_file:
                 continue
 
-            # Download audio file to temporary location
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as temp_audio:
-                # Download the audio file
-                with default_storage.open(item.audio_file.name, 'rb') as s3_file:
-                    temp_audio.write(s3_file.read())
-                audio_file_path = temp_audio.name
+            # Fetch the audio file from the worker cache (pinned until released)
+            cached_audio = get_storage_cache().open(item.audio_file.name)
+            audio_file_path = cached_audio.path
 
             # Create a temporary file for the processed audio
             with tempfile.NamedTemporaryFile(suffix=".mp3", delete=False) as tmp_file:
@@ -1016,14 +853,13 @@ def process_background_music(video):
                     output_path,
                 ]
 
-                subprocess.run(cmd, check=True)
+                run_ffmpeg(cmd, check=True)
                 processed_paths.append(output_path)
-                
-                # Clean up original temp file
-                os.unlink(audio_file_path)
             else:
-                # Just use the downloaded file if no trimming is needed
-                processed_paths.append(audio_file_path)
+                # No trimming needed: hand out a copy, the cached file stays in the cache
+                shutil.copyfile(audio_file_path, output_path)
+                processed_paths.append(output_path)
+            cached_audio.release()
 
         return processed_paths
     except Exception as e:
@@ -1052,16 +888,13 @@ def add_background_music(
             raise ValueError("Either music_url or music_file must be provided")
 
         # Import necessary modules
-        import tempfile
         import os
-        import subprocess
         import requests
         import hashlib
         import datetime
         from urllib.parse import urlparse
         from django.core.files import File
         from django.core.files.temp import NamedTemporaryFile
-        from django.core.files.storage import default_storage
         
         # No need to create directories explicitly in S3
         # Generate a unique filename
@@ -1101,7 +934,7 @@ def add_background_music(
                 "default=noprint_wrappers=1:nokey=1",
                 temp_path,
             ]
-            audio_duration = float(subprocess.check_output(cmd).decode("utf-8").strip())
+            audio_duration = float(check_ffmpeg_output(cmd).decode("utf-8").strip())
 
             # Create BackgroundMusic object
             bg_music = BackgroundMusic.objects.create(
@@ -1132,7 +965,7 @@ def add_background_music(
                 "default=noprint_wrappers=1:nokey=1",
                 temp_path,
             ]
-            audio_duration = float(subprocess.check_output(cmd).decode("utf-8").strip())
+            audio_duration = float(check_ffmpeg_output(cmd).decode("utf-8").strip())
 
             # Create BackgroundMusic object
             bg_music = BackgroundMusic.objects.create(
@@ -1150,7 +983,8 @@ def add_background_music(
         import logging
         logging.error(f"Error adding background music: {str(e)}")
         return None
-    generate_clips_from_srt
+
+
 def apply_background_music(video, video_path):
     """
     Apply background music to the video
@@ -1166,9 +1000,7 @@ def apply_background_music(video, video_path):
         # Import necessary modules
         import tempfile
         import os
-        import subprocess
         import logging
-        from django.core.files.storage import default_storage
         
         # Get background music items
         bg_music_items = BackgroundMusic.objects.filter(video=video).order_by(
@@ -1192,7 +1024,7 @@ def apply_background_music(video, video_path):
             "default=noprint_wrappers=1:nokey=1",
             video_path,
         ]
-        video_duration = float(subprocess.check_output(cmd).decode("utf-8").strip())
+        video_duration = float(check_ffmpeg_output(cmd).decode("utf-8").strip())
 
         # Create a silent audio track for the full video duration
         silence_path = os.path.join(temp_dir, "silence.mp3")
@@ -1207,7 +1039,7 @@ def apply_background_music(video, video_path):
             "libmp3lame",
             silence_path,
         ]
-        subprocess.run(cmd, check=True)
+        run_ffmpeg(cmd, check=True)
 
         # Process each background music file
         audio_inputs = [silence_path]
@@ -1218,12 +1050,9 @@ def apply_background_music(video, video_path):
             if not item.audio_file:
                 continue
 
-            # Download audio file to temporary location
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as temp_audio:
-                # Download the audio file
-                with default_storage.open(item.audio_file.name, 'rb') as s3_file:
-                    temp_audio.write(s3_file.read())
-                audio_file_path = temp_audio.name
+            # Fetch the audio file from the worker cache (pinned until released)
+            cached_audio = get_storage_cache().open(item.audio_file.name)
+            audio_file_path = cached_audio.path
 
             # Create temp file for processed audio
             processed_audio_path = os.path.join(temp_dir, f"bg_music_{i}.mp3")
@@ -1246,10 +1075,8 @@ def apply_background_music(video, video_path):
             # Output options
             cmd.extend(["-c:a", "libmp3lame", "-q:a", "2", processed_audio_path])
 
-            subprocess.run(cmd, check=True)
-            
-            # Clean up original temp file
-            os.unlink(audio_file_path)
+            run_ffmpeg(cmd, check=True)
+            cached_audio.release()
 
             # Add audio input
             audio_inputs.append(processed_audio_path)
@@ -1284,7 +1111,7 @@ def apply_background_music(video, video_path):
         cmd.extend(["-c:v", "copy", "-c:a", "aac", "-b:a", "192k", output_path])
 
         # Execute ffmpeg command
-        subprocess.run(cmd, check=True)
+        run_ffmpeg(cmd, check=True)
 
         return output_path
     except Exception as e:
@@ -1304,10 +1131,9 @@ def generate_signed_url_for_upload(s3_key, expires_in=3600):
     """
     try:
         from django.conf import settings
-        import boto3
         
-        # Initialize the S3 client using settings from Django settings
-        s3_client = boto3.client('s3', region_name='us-east-1')
+        # Shared S3 client, signing for us-east-1 as before
+        s3_client = get_s3_client(region_name='us-east-1')
 
         # Now define the bucket and object key
         bucket_name = settings.AWS_STORAGE_BUCKET_NAME
@@ -1350,12 +1176,7 @@ def generate_signed_url(s3_key, expires_in=3600):
         str: The pre-signed URL
     """
     try:
-        s3_client = boto3.client(
-            's3',
-            aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-            region_name=settings.AWS_REGION
-        )
+        s3_client = get_s3_client()
         
         url = s3_client.generate_presigned_url(
             'get_object',
@@ -1430,7 +1251,7 @@ def process_video_watermarks(video_id, bg_music=False):
         ]
 
         # Run FFmpeg
-        subprocess.run(ffmpeg_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+        run_ffmpeg(ffmpeg_cmd, capture_output=True, check=True)
 
         return processed_video_path
 
@@ -9,22 +9,32 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.parsers import MultiPartParser, FormParser
 from django.db.models import F
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 from django.contrib.auth.decorators import login_required
+from asgiref.sync import sync_to_async
 import json
 from .models import BackgroundMusic, Video, Clips, Subclip, BackgroundMusic, ProcessingStatus
 from .serializers import BackgroundMusicSerializer
-from .utils import add_background_music, generate_audio_file, generate_srt_file, generate_clips_from_srt, generate_final_video, update_clip_timings, generate_signed_url
+from .utils import add_background_music, generate_audio_file, generate_srt_file, generate_clips_from_srt, generate_final_video, update_clip_timings, generate_signed_url, cleanup_render_temp_files
 from apps.processors.services.video_processor import VideoProcessorService
 from apps.core.models import Subscription
-from django.views.decorators.http import require_http_methods
+from apps.core.decorators import async_csrf_exempt, async_login_required, async_require_http_methods
 from apps.processors.handler.elevenlabs import ElevenLabsHandler
+from apps.processors.services.process_control import CancellationToken, ProcessingCancelled
+from apps.processors.services.timing_solver import solve_video_timings
+from apps.processors.services.progress_store import (
+    ProgressTracker,
+    get_progress,
+    stream_progress_events,
+    astream_progress_events,
+)
 
 import traceback
 from apps.core.models import UserAsset
-from apps.core.services.s3_service import get_s3_client
+from apps.core.services.storage_cache import get_storage_cache
 from django.db.models import Count, Min
 
 import tempfile
@@ -35,6 +45,7 @@ import logging
 from django.db.models.signals import pre_save, post_save
 from .signals import configure_subclip
 from django.db.models import Q
+from django.utils import timezone
 
 logger = logging.getLogger(__name__)
 
@@ -545,19 +556,10 @@ def handle_clip_assignment(request):
                     # Find the asset
                     asset = UserAsset.objects.get(user=request.user, key=asset_key)
                     
-                    # Create a temporary file to handle the transfer
-                    import tempfile
                     from django.core.files import File
                     
-                    with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(asset.filename)[1]) as tmp:
-                        # Download the asset from S3
-                        s3_client = get_s3_client()
-                        s3_client.download_fileobj(
-                            settings.AWS_STORAGE_BUCKET_NAME, 
-                            asset_key,
-                            tmp
-                        )
-                        tmp_path = tmp.name
+                    # Fetch the asset through the worker's storage cache
+                    cached_asset = get_storage_cache().open(asset_key, absolute_key=True)
                     
                     # Create or update the subclip
                     subclip, created = Subclip.objects.get_or_create(
@@ -572,12 +574,9 @@ def handle_clip_assignment(request):
                     clip.save()
                     # Save the asset to the subclip's video_file field
                     # This works with any storage backend including S3
-                    with open(tmp_path, 'rb') as f:
+                    with cached_asset, open(cached_asset.path, 'rb') as f:
                         subclip.video_file.save(asset.filename, File(f))
                     
-                    # Clean up the temp file
-                    os.unlink(tmp_path)
-                    
                     return JsonResponse({
                         'success': True,
                         'message': 'Clip assigned successfully',
@@ -885,15 +884,24 @@ def start_video_processing(request, video_id):
                     "status": status_obj.status, 
                     "progress": status_obj.progress
                 })
+
+            # Reuse a finished record for the new run; saving it clears its expiry
+            status_obj.status = 'processing'
+            status_obj.progress = 0
+            status_obj.error_message = None
+            status_obj.save()
                 
         except ProcessingStatus.DoesNotExist:
             # Create a new processing status object
             status_obj = ProcessingStatus.objects.create(video=video, status='processing', progress=0)
+
+        run_id = CancellationToken(video.id).reset()
+        ProgressTracker(video.id, status_obj=status_obj).start(request.user.id)
         
         # Start the processing in a background thread
         thread = threading.Thread(
             target=_process_video_background,
-            args=(video, request.user.id, status_obj)
+            args=(video, request.user.id, status_obj, run_id)
         )
         thread.daemon = True
         thread.start()
@@ -912,26 +920,74 @@ def get_processing_status(request, video_id):
     API endpoint to get the current processing status of a video
     """
     try:
+        # Live progress is served from Redis without touching the database
+        progress = get_progress(video_id)
+        if progress and str(progress.get("user_id")) == str(request.user.id):
+            return JsonResponse(progress)
+
         # Get the video
         video = get_object_or_404(Video, id=video_id, user=request.user)
         
-        try:
-            status_obj = ProcessingStatus.objects.get(video=video)
-            return JsonResponse({
-                "status": status_obj.status,
-                "progress": status_obj.progress,
-                "current_step": status_obj.current_step,
-                "error_message": status_obj.error_message,
-                "updated_at": status_obj.updated_at.isoformat() if status_obj.updated_at else None,
-                "output": video.output.url if video.output else None,
-            })
-        except ProcessingStatus.DoesNotExist:
+        # Finished records stay readable until their grace window ends
+        status_obj = ProcessingStatus.objects.filter(video=video).filter(
+            Q(expires_at__isnull=True) | Q(expires_at__gt=timezone.now())
+        ).first()
+        if status_obj is None:
             return JsonResponse(
                 {"status": "not_started", "progress": 0}
             )
+        return JsonResponse({
+            "status": status_obj.status,
+            "progress": status_obj.progress,
+            "current_step": status_obj.current_step,
+            "error_message": status_obj.error_message,
+            "updated_at": status_obj.updated_at.isoformat() if status_obj.updated_at else None,
+            "output": video.output.url if video.output else None,
+        })
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=500)
+
+@csrf_exempt
+@require_POST
+@login_required(login_url='login')
+def cancel_video_processing(request, video_id):
+    """
+    API endpoint to cancel an in-flight render. The render notices the flag
+    between stages, kills its ffmpeg children and cancels its RunPod job.
+    """
+    try:
+        video = get_object_or_404(Video, id=video_id, user=request.user)
+        progress = get_progress(video.id)
+        if not progress or progress.get("status") != "processing":
+            if not ProcessingStatus.objects.filter(video=video, status='processing').exists():
+                return JsonResponse({'success': False, 'error': 'Video is not being processed'}, status=400)
+
+        CancellationToken(video.id).cancel()
+        ProgressTracker(video.id).update(status="cancelled", step="Cancelling")
+        return JsonResponse({'success': True, 'message': 'Cancellation requested', 'status': 'cancelled'})
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
 
+@login_required(login_url='login')
+def stream_processing_status(request, video_id):
+    """
+    Server-Sent Events stream of processing progress for a video.
+    Served with an async iterator under ASGI so no worker thread is held open.
+    """
+    progress = get_progress(video_id)
+    if not progress or str(progress.get("user_id")) != str(request.user.id):
+        get_object_or_404(Video, id=video_id, user=request.user)
+
+    if isinstance(request, ASGIRequest):
+        events = astream_progress_events(video_id)
+    else:
+        events = stream_progress_events(video_id)
+
+    response = StreamingHttpResponse(events, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
 # def _process_video_background(video:Video, user_id, status_obj):
 #     """Background task to process the video"""
     
@@ -1077,8 +1133,12 @@ def get_processing_status(request, video_id):
 #         print(traceback.format_exc())
 
 
-def _process_video_background(video: Video, user_id, status_obj):
+def _process_video_background(video: Video, user_id, status_obj, run_id=None):
     """Background task to process the video with better error handling"""
+    tracker = ProgressTracker(video.id, status_obj=status_obj)
+    cancel_token = CancellationToken(video.id, run_id=run_id)
+    processor = None
+    job_id = None
     
     try:
         all_clips = Clips.objects.filter(video=video).order_by('sequence')
@@ -1095,84 +1155,69 @@ def _process_video_background(video: Video, user_id, status_obj):
         if not video.audio_file:
             is_text_changed = True
         # Step 1: Generate audio (20% of progress)
-        status_obj.progress = 5
-        status_obj.current_step = "Generating audio"
-        status_obj.save()
+        cancel_token.raise_if_cancelled()
+        tracker.update(progress=5, step="Generating audio", stage="audio")
         
         if is_text_changed is True:
             try:
                 success = generate_audio_file(video, user_id)
                 if not success:
-                    status_obj.status = 'error'
-                    status_obj.error_message = "Failed to generate audio file"
-                    status_obj.save()
+                    tracker.fail("Failed to generate audio file")
                     return
             except Exception as e:
                 error_msg = str(e)
                 # Check if it's a credits issue
                 if "Insufficient credits" in error_msg:
-                    status_obj.status = 'error'
-                    status_obj.error_message = "Insufficient credits to generate voiceover"
-                    status_obj.save()
+                    tracker.fail("Insufficient credits to generate voiceover")
                     return
                 elif "payment_issue" in error_msg or "failed or incomplete payment" in error_msg:
-                    status_obj.status = 'error'
-                    status_obj.error_message = "ElevenLabs payment issue: Your subscription has a failed or incomplete payment. Complete the latest invoice to continue usage."
-                    status_obj.save()
+                    tracker.fail("ElevenLabs payment issue: Your subscription has a failed or incomplete payment. Complete the latest invoice to continue usage.")
                     return
                 elif "Invalid ElevenLabs API key" in error_msg:
-                    status_obj.status = 'error'  
-                    status_obj.error_message = "Invalid ElevenLabs API key"
-                    status_obj.save()
+                    tracker.fail("Invalid ElevenLabs API key")
                     return
                 elif "Invalid Voice ID" in error_msg:
-                    status_obj.status = 'error'
-                    status_obj.error_message = "Invalid Voice ID"  
-                    status_obj.save()
+                    tracker.fail("Invalid Voice ID")
                     return
                 else:
                     # Re-raise other exceptions
                     raise e
                     
-        status_obj.progress = 20
-        status_obj.save()
+        tracker.update(progress=20, stage_progress=100)
         
         # Rest of your existing processing code remains the same...
         # Step 2: Generate SRT file (40% of progress)
-        status_obj.current_step = "Generating SRT file"
-        status_obj.save()
+        cancel_token.raise_if_cancelled()
+        tracker.update(step="Generating SRT file", stage="alignment")
 
         if is_text_changed is True:
             success = generate_srt_file(video, user_id)
 
             if not success:
-                status_obj.status = 'error'
-                status_obj.error_message = "Failed to generate SRT file"
-                status_obj.save()
+                tracker.fail("Failed to generate SRT file")
                 return
             
-        status_obj.progress = 40
-        status_obj.save()
+        tracker.update(progress=40, stage_progress=100)
         
         # Step 3: Generate clips from SRT (60% of progress)
-        status_obj.current_step = "Generating video clips"
-        status_obj.save()
+        cancel_token.raise_if_cancelled()
+        tracker.update(step="Generating video clips", stage="clips")
         if is_text_changed is True:
             generate_clips_from_srt(video)
         
-        status_obj.progress = 60
-        status_obj.save()
+        tracker.update(progress=60, stage_progress=100)
         
         # Step 4: Submit to RunPod for video processing (70% of progress)
-        status_obj.current_step = "Submitting to RunPod for processing"
-        status_obj.save()
+        cancel_token.raise_if_cancelled()
+        tracker.update(step="Submitting to RunPod for processing", stage="submit")
         
         # Initialize RunPod processor
         from apps.processors.services.runpod_videoprocessor import RunPodVideoProcessor
         processor = RunPodVideoProcessor(video.id)
 
-        for subclip in Subclip.objects.filter(clip__video=video).order_by('clip__sequence', 'start_time'):
-            subclip.save()
+        # generate_clips_from_srt already solved the timings when the text changed
+        if not is_text_changed and video.srt_file:
+            solve_video_timings(video)
 
         # Find subclips with duplicate start_time, delete those with lower IDs
         duplicate_start_times = (
@@ -1204,23 +1249,20 @@ def _process_video_background(video: Video, user_id, status_obj):
 
 
         # Submit job to RunPod
+        cancel_token.raise_if_cancelled()
         if is_text_changed is False and video.output:
             result = processor.replace_subclips(video)
         else:
             result = processor.process_video(video)
         
         if not result["success"]:
-            status_obj.status = 'error'
-            status_obj.error_message = f"Failed to submit job to RunPod: {result.get('error', 'Unknown error')}"
-            status_obj.save()
+            tracker.fail(f"Failed to submit job to RunPod: {result.get('error', 'Unknown error')}")
             return
         
         # Job submitted successfully
         print(result)
         job_id = result["job_id"]
-        status_obj.current_step = "Processing on RunPod"
-        status_obj.progress = 70
-        status_obj.save()
+        tracker.update(progress=70, step="Processing on RunPod", stage="render", runpod_job_id=job_id)
         
         # Step 5: Poll RunPod until job completes (up to 90% progress)
         max_attempts = 60  # Adjust based on your expected processing time
@@ -1228,32 +1270,30 @@ def _process_video_background(video: Video, user_id, status_obj):
         print("Polling RunPod for job completion...")
         print("Job ID:", job_id)
         # Poll for results
-        poll_result = processor.poll_until_complete(job_id, max_attempts, delay_seconds)
+        poll_result = processor.poll_until_complete(job_id, max_attempts, delay_seconds, cancel_token=cancel_token)
+        if poll_result.get("status") == "cancelled":
+            job_id = None  # Already cancelled on RunPod by the poller
+            raise ProcessingCancelled(poll_result["error"])
         
         if not poll_result["success"]:
-            status_obj.status = 'error'
-            status_obj.error_message = f"RunPod processing failed: {poll_result.get('error', 'Unknown error')}"
-            status_obj.save()
+            tracker.fail(f"RunPod processing failed: {poll_result.get('error', 'Unknown error')}")
             return
         
         # Processing successful, save results
+        job_id = None
         output_data = poll_result["output"]
         print("RunPod processing completed successfully.")
         print("Output data:", output_data)
         save_success = processor.save_results(video, output_data)
         
         if not save_success:
-            status_obj.status = 'error'
-            status_obj.error_message = "Failed to save results from RunPod"
-            status_obj.save()
+            tracker.fail("Failed to save results from RunPod")
             return
         
-        status_obj.progress = 90
-        status_obj.save()
+        tracker.update(progress=90, stage_progress=100)
         
         # Step 6: Apply any additional processing if needed (100% progress)
-        status_obj.current_step = "Finalizing video"
-        status_obj.save()
+        tracker.update(step="Finalizing video", stage="finalize")
         
         # Check if we need to set output_with_bg from output
         if video.output:
@@ -1267,16 +1307,20 @@ def _process_video_background(video: Video, user_id, status_obj):
         Clips.objects.filter(video=video).update(is_changed=False)
         
         # Update status to completed
-        status_obj.progress = 100
-        status_obj.status = 'completed'
-        status_obj.current_step = "Processing complete"
-        status_obj.save()
+        tracker.complete(output=video.output.url if video.output else None)
     
+    except ProcessingCancelled:
+        print(f"Processing of video {video.id} was cancelled")
+        if processor is not None and job_id:
+            processor.cancel_job(job_id)
+        # A superseded run must not touch the state or temp files of the run that replaced it
+        if not cancel_token.superseded:
+            tracker.update(status="cancelled", step="Processing cancelled")
+            cleanup_render_temp_files(video.id)
+
     except Exception as e:
         # Update status to error
-        status_obj.status = 'error'
-        status_obj.error_message = str(e)
-        status_obj.save()
+        tracker.fail(str(e))
         print(f"Error processing video: {str(e)}")
         import traceback
         print(traceback.format_exc())
@@ -1316,9 +1360,8 @@ def delete_background_music(request):
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
 
-@api_view(['POST'])
-# @permission_classes([IsAuthenticated])
-def generate_scene_suggestions(request):
+@async_require_http_methods(["POST"])
+async def generate_scene_suggestions(request):
     """
     API endpoint to generate video scene suggestions using OpenAI.
     
@@ -1331,11 +1374,11 @@ def generate_scene_suggestions(request):
         JSON response with scene suggestions and search URLs
     """
     try:
-        data = request.data
+        data = json.loads(request.body or b'{}')
         prompt = data.get('prompt')
         print("--- Prompt received:", prompt)
         if not prompt:
-            return Response({
+            return JsonResponse({
                 'status': 'error',
                 'message': 'Prompt is required'
             }, status=400)
@@ -1344,13 +1387,108 @@ def generate_scene_suggestions(request):
         openai_handler = OpenAIHandler()
         
         # Generate scene suggestions
-        result = openai_handler.generate_scene_suggestions(prompt)
+        result = await openai_handler.agenerate_scene_suggestions(prompt)
         
-        return Response(result)
+        return JsonResponse(result)
         
+    except json.JSONDecodeError:
+        return JsonResponse({
+            'status': 'error',
+            'message': 'Invalid JSON data'
+        }, status=400)
     except Exception as e:
         logger.error(f"Error generating scene suggestions: {str(e)}")
-        return Response({
+        return JsonResponse({
+            'status': 'error',
+            'message': f'Failed to generate scene suggestions: {str(e)}'
+        }, status=500)
+
+def _scene_highlights(user, clip_id=None, video_id=None):
+    """Subclip ids and texts of a clip or video owned by ``user``, in script order"""
+    subclips = Subclip.objects.filter(clip__video__user=user)
+    if clip_id:
+        subclips = subclips.filter(clip_id=clip_id)
+    else:
+        subclips = subclips.filter(clip__video_id=video_id)
+    subclips = list(subclips.order_by('clip__sequence', 'id').values('id', 'text'))
+    return [subclip['id'] for subclip in subclips], [subclip['text'] or '' for subclip in subclips]
+
+
+@async_require_http_methods(["POST"])
+@async_login_required(login_url='login')
+async def generate_scene_suggestions_batch(request):
+    """
+    API endpoint to generate scene suggestions for every highlight of a clip
+    or video (or a list of prompts) with one batched OpenAI request.
+    
+    Expected request body (one of):
+    {
+        "prompts": ["Are you struggling with sciatica?", "..."]
+    }
+    {
+        "clip_id": 12
+    }
+    {
+        "video_id": 3
+    }
+    
+    At most SCENE_SUGGESTIONS_MAX_PROMPTS highlights are accepted per request.
+
+    Returns:
+        JSON response with one suggestions entry per highlight, in order
+    """
+    try:
+        data = json.loads(request.body or b'{}')
+        prompts = data.get('prompts')
+        subclip_ids = None
+
+        if prompts is None:
+            clip_id = data.get('clip_id')
+            video_id = data.get('video_id')
+            if not clip_id and not video_id:
+                return JsonResponse({
+                    'status': 'error',
+                    'message': 'prompts, clip_id or video_id is required'
+                }, status=400)
+            subclip_ids, prompts = await sync_to_async(_scene_highlights)(request.user, clip_id, video_id)
+
+        if not isinstance(prompts, list) or not all(isinstance(prompt, str) for prompt in prompts):
+            return JsonResponse({
+                'status': 'error',
+                'message': 'prompts must be a list of strings'
+            }, status=400)
+        max_prompts = getattr(settings, 'SCENE_SUGGESTIONS_MAX_PROMPTS', 100)
+        if len(prompts) > max_prompts:
+            return JsonResponse({
+                'status': 'error',
+                'message': f'At most {max_prompts} highlights can be sent per request'
+            }, status=400)
+        print(f"--- Batched scene suggestions for {len(prompts)} highlights")
+
+        openai_handler = OpenAIHandler()
+        suggestions = await openai_handler.agenerate_scene_suggestions_batch(prompts)
+
+        results = []
+        for i, (prompt, result) in enumerate(zip(prompts, suggestions)):
+            entry = {'prompt': prompt, **result}
+            if subclip_ids is not None:
+                entry['subclip_id'] = subclip_ids[i]
+            results.append(entry)
+
+        return JsonResponse({
+            'status': 'success',
+            'count': len(results),
+            'results': results
+        })
+
+    except json.JSONDecodeError:
+        return JsonResponse({
+            'status': 'error',
+            'message': 'Invalid JSON data'
+        }, status=400)
+    except Exception as e:
+        logger.error(f"Error generating batched scene suggestions: {str(e)}")
+        return JsonResponse({
             'status': 'error',
             'message': f'Failed to generate scene suggestions: {str(e)}'
         }, status=500)
@@ -1383,16 +1521,35 @@ def save_draft(request):
 
 
 
-@csrf_exempt  
-@require_http_methods(["POST"])
-@login_required(login_url='login')
-def update_video_credentials(request, video_id):
+def _apply_video_credentials(video, api_key, voice_id):
+    """Store new ElevenLabs credentials and reset the video so it is reprocessed"""
+    video.elevenlabs_api_key = api_key
+    video.voice_id = voice_id
+    video.audio_file = None
+    video.srt_file = None
+    video.output = None
+    video.output_with_bg = None
+    video.output_with_watermark = None
+    video.output_with_bg_watermark = None
+    video.save()
+
+    # Mark all clips as changed to force regeneration
+    Clips.objects.filter(video=video).update(is_changed=True)
+
+    # Reset processing status to allow reprocessing
+    ProcessingStatus.objects.filter(video=video).delete()
+
+
+@async_csrf_exempt
+@async_require_http_methods(["POST"])
+@async_login_required(login_url='login')
+async def update_video_credentials(request, video_id):
 
     """
     API endpoint to update video ElevenLabs credentials
     """
     try:
-        video = get_object_or_404(Video, id=video_id, user=request.user)
+        video = await sync_to_async(get_object_or_404)(Video, id=video_id, user=request.user)
         
         data = json.loads(request.body)
         api_key = data.get('elevenlabs_api_key', '').strip()
@@ -1406,18 +1563,14 @@ def update_video_credentials(request, video_id):
         
         # Validate the credentials before saving
         try:
-            handler = ElevenLabsHandler(api_key=api_key, voice_id=voice_id)
             # This will raise an exception if invalid
-            handler._verify_api_key()
+            handler = await ElevenLabsHandler.acreate(api_key=api_key, voice_id=voice_id)
             print(video.content)
-            if handler.has_sufficient_credits(len(video.content)) is False:
+            if await handler.ahas_sufficient_credits(len(video.content)) is False:
                 return JsonResponse({
                     'success': False, 
                     'error': 'Insufficient credits to generate voiceover'
                 })
-            video.elevenlabs_api_key = api_key
-            video.voice_id = voice_id
-            video.save()
         except Exception as e:
             error_msg = str(e)
             if "Insufficient credits" in error_msg:
@@ -1435,22 +1588,8 @@ def update_video_credentials(request, video_id):
                 'error': error_to_return
             })
         
-        # Update video with new credentials
-        
-        # Reset processing status to allow reprocessing
-        video.audio_file = None
-        video.srt_file = None
-        video.output = None
-        video.output_with_bg = None
-        video.output_with_watermark = None
-        video.output_with_bg_watermark = None
-        video.save()
-
-        # Mark all clips as changed to force regeneration
-        Clips.objects.filter(video=video).update(is_changed=True)
-
-        # Reset processing status to allow reprocessing
-        ProcessingStatus.objects.filter(video=video).delete()
+        # Update video with new credentials and reset processing status to allow reprocessing
+        await sync_to_async(_apply_video_credentials)(video, api_key, voice_id)
         
         return JsonResponse({
             'success': True, 
@@ -1494,20 +1633,20 @@ def get_processing_status_with_credentials(request, video_id):
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
-@login_required(login_url='login')
-def get_elevenlabs_voices(request, video_id):
+@async_login_required(login_url='login')
+async def get_elevenlabs_voices(request, video_id):
     """
     API endpoint to get available ElevenLabs voices for the current user
     """
     try:
-        video = get_object_or_404(Video, id=video_id, user=request.user)
+        video = await sync_to_async(get_object_or_404)(Video, id=video_id, user=request.user)
         
         if not video.elevenlabs_api_key:
             return JsonResponse({'success': False, 'error': 'API key is required to fetch voices'}, status=400)
         
         
-        handler = ElevenLabsHandler(api_key=video.elevenlabs_api_key)
-        voices = handler.get_available_voices()
+        handler = await ElevenLabsHandler.acreate(api_key=video.elevenlabs_api_key)
+        voices = await handler.aget_available_voices()
         
         return JsonResponse({
             'success': True,
@@ -1517,38 +1656,39 @@ def get_elevenlabs_voices(request, video_id):
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
 
-@login_required(login_url='login')
-def get_voiceover_history(request, video_id):
+@async_login_required(login_url='login')
+async def get_voiceover_history(request, video_id):
     """
     API endpoint to get voiceover history for a video
     """
     try:
         print("Fetching voiceover history for video ID:", video_id)
         print("User:", request.user)
-        video = get_object_or_404(Video, id=video_id)
+        video = await sync_to_async(get_object_or_404)(Video, id=video_id)
         if not video.elevenlabs_api_key:
             return JsonResponse({'success': False, 'error': 'API key is required to fetch voiceover history'}, status=400)
         
-        handler = ElevenLabsHandler(api_key=video.elevenlabs_api_key)  
-        return JsonResponse({'success': False, 'history': handler.get_history().get('history')}, status=200)
+        handler = await ElevenLabsHandler.acreate(api_key=video.elevenlabs_api_key)
+        history = await handler.aget_history()
+        return JsonResponse({'success': False, 'history': history.get('history')}, status=200)
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
 
-@login_required(login_url='login')
-def get_saved_history(request, video_id):
+@async_login_required(login_url='login')
+async def get_saved_history(request, video_id):
     """
     API endpoint to get voiceover history for a video with saved HTML
     """
     try:
         print("Fetching voiceover history from history ID for video ID:", video_id)
         print("User:", request.user)
-        video = get_object_or_404(Video, id=video_id)
+        video = await sync_to_async(get_object_or_404)(Video, id=video_id)
 
         if not video.elevenlabs_api_key:
             return JsonResponse({'success': False, 'error': 'API key is required to fetch voiceover history'}, status=400)
         
-        handler = ElevenLabsHandler(api_key=video.elevenlabs_api_key)
-        history_item = handler.get_history_by_id(video.history_id)
+        handler = await ElevenLabsHandler.acreate(api_key=video.elevenlabs_api_key)
+        history_item = await handler.aget_history_by_id(video.history_id)
         
         # ADD: Include saved HTML and split data
         response_data = {
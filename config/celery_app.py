@@ -32,6 +32,12 @@ app.conf.beat_schedule = {
         'schedule': 3600,  # Run every hour (3600 seconds)
         'args': (),
     },
+    # Remove finished processing status records once their grace window ends
+    'reap-expired-processing-statuses': {
+        'task': 'reap_expired_processing_statuses_task',
+        'schedule': 60,  # Run every minute
+        'args': (),
+    },
 }
 
 @app.task(bind=True)
@@ -0,0 +1,17 @@
+"""
+Gunicorn settings for serving config.asgi with Uvicorn workers.
+
+Async views wait on ElevenLabs, OpenAI and S3 on each worker's event loop,
+so one process holds many concurrent upstream calls; sync views keep
+running in Django's thread pool.
+"""
+import os
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+worker_class = "uvicorn_worker.UvicornWorker"
+workers = int(os.environ.get("WEB_CONCURRENCY", 4))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 300))
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = 5
+reload = bool(int(os.environ.get("GUNICORN_RELOAD", 0)))
+accesslog = "-"
@@ -1,26 +1,45 @@
 # middleware.py
 import traceback
 import logging
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
 from django.utils.deprecation import MiddlewareMixin
 
 logger = logging.getLogger(__name__)
 
 class S3DebugMiddleware:
+    # Async-capable so async views aren't run through a thread under ASGI
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
 
     def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
         try:
             response = self.get_response(request)
             return response
         except Exception as e:
-            if "This backend doesn't support absolute paths" in str(e):
-                logger.error("S3 absolute path error detected!", exc_info=True)
-                # Get full stack trace
-                tb = traceback.format_exc()
-                logger.error(f"Full traceback:\n{tb}")
+            self._log_s3_error(e)
+            raise
+
+    async def __acall__(self, request):
+        try:
+            return await self.get_response(request)
+        except Exception as e:
+            self._log_s3_error(e)
             raise
 
+    def _log_s3_error(self, e):
+        if "This backend doesn't support absolute paths" in str(e):
+            logger.error("S3 absolute path error detected!", exc_info=True)
+            # Get full stack trace
+            tb = traceback.format_exc()
+            logger.error(f"Full traceback:\n{tb}")
+
 
 from django.http import HttpResponse
 from django.conf import settings
@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 
 from pathlib import Path
 import os
+import json
 import dj_database_url
 from dotenv import load_dotenv
 from datetime import timedelta
@@ -88,6 +89,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'config.wsgi.application'
+ASGI_APPLICATION = 'config.asgi.application'
 
 
 # Database
@@ -161,6 +163,18 @@ CACHES = {
     }
 }
 
+# Live processing progress (Redis hash + SSE), checkpointed to ProcessingStatus
+PROGRESS_CHECKPOINT_INTERVAL = int(os.environ.get('PROGRESS_CHECKPOINT_INTERVAL', 15))
+PROGRESS_TTL = int(os.environ.get('PROGRESS_TTL', 24 * 3600))
+# Finished ProcessingStatus rows (and their Redis hash) stay readable for this long
+PROCESSING_STATUS_GRACE_PERIOD = int(os.environ.get('PROCESSING_STATUS_GRACE_PERIOD', 60))
+PROGRESS_TERMINAL_TTL = int(os.environ.get('PROGRESS_TERMINAL_TTL', PROCESSING_STATUS_GRACE_PERIOD))
+
+# Parsed alignment files shared by the clip/subclip timing signals (process memory + Redis)
+TRANSCRIPT_INDEX_REVALIDATE = int(os.environ.get('TRANSCRIPT_INDEX_REVALIDATE', 30))
+TRANSCRIPT_INDEX_TTL = int(os.environ.get('TRANSCRIPT_INDEX_TTL', 24 * 3600))
+TRANSCRIPT_INDEX_LOCAL_ENTRIES = int(os.environ.get('TRANSCRIPT_INDEX_LOCAL_ENTRIES', 32))
+
 # Session settings
 SESSION_ENGINE = "django.contrib.sessions.backends.cache"
 SESSION_CACHE_ALIAS = "default"
@@ -178,8 +192,30 @@ ENABLE_GPU_ACCELERATION = bool(int(os.environ.get('ENABLE_GPU_ACCELERATION', 1))
 USE_MIXED_PRECISION = bool(int(os.environ.get('USE_MIXED_PRECISION', 1)))
 VIDEO_PROCESSING_BATCH_SIZE = int(os.environ.get('VIDEO_PROCESSING_BATCH_SIZE', 4))
 VIDEO_MAX_RESOLUTION = os.environ.get('VIDEO_MAX_RESOLUTION', '1920x1080')
+
+# Sharded rendering: long videos are split at scene boundaries and rendered on
+# several Celery workers, then joined with a stream copy. 1 disables sharding.
+VIDEO_RENDER_SHARDS = int(os.environ.get('VIDEO_RENDER_SHARDS', 1))
+SHARD_RENDER_MIN_DURATION = float(os.environ.get('SHARD_RENDER_MIN_DURATION', 120))
+SHARD_RENDER_TIMEOUT = int(os.environ.get('SHARD_RENDER_TIMEOUT', 3600))
+SHARD_RENDER_PRESET = os.environ.get('SHARD_RENDER_PRESET', 'medium')
+SHARD_RENDER_CRF = int(os.environ.get('SHARD_RENDER_CRF', 20))
 VIDEO_DEFAULT_FPS = int(os.environ.get('VIDEO_DEFAULT_FPS', 30))
 
+# Host-wide ffmpeg governor, shared by web workers, request threads and Celery
+FFMPEG_MAX_PROCESSES = int(os.environ.get('FFMPEG_MAX_PROCESSES', os.cpu_count() or 2))
+FFMPEG_MAX_THREADS = int(os.environ.get('FFMPEG_MAX_THREADS', os.cpu_count() or 2))
+# Encoder threads per ffmpeg while other encodes share the host; a lone encode isn't capped
+FFMPEG_THREADS_PER_PROCESS = int(os.environ.get('FFMPEG_THREADS_PER_PROCESS', 2))
+FFMPEG_LEASE_TTL = int(os.environ.get('FFMPEG_LEASE_TTL', 120))
+FFMPEG_SLOW_WAIT_SECONDS = float(os.environ.get('FFMPEG_SLOW_WAIT_SECONDS', 5))
+FFMPEG_LOCK_DIR = os.environ.get('FFMPEG_LOCK_DIR', '/tmp/videocrafter_ffmpeg_slots')
+
+# Offline (Aeneas) alignment of long audio is split at pauses and run in parallel
+ALIGNMENT_CHUNK_MIN_SECONDS = float(os.environ.get('ALIGNMENT_CHUNK_MIN_SECONDS', 180))
+ALIGNMENT_CHUNK_SECONDS = float(os.environ.get('ALIGNMENT_CHUNK_SECONDS', 60))
+ALIGNMENT_MAX_WORKERS = int(os.environ.get('ALIGNMENT_MAX_WORKERS', 0))  # 0 = one per CPU
+
 # Stripe Settings
 STRIPE_PUBLISHABLE_KEY = os.environ.get('STRIPE_PUBLISHABLE_KEY', '')
 STRIPE_SECRET_KEY = os.environ.get('STRIPE_SECRET_KEY', '')
@@ -191,11 +227,64 @@ AWS_SECRET_ACCESS_KEY = os.environ.get('AWS_SECRET_ACCESS_KEY')
 AWS_STORAGE_BUCKET_NAME = os.environ.get('AWS_STORAGE_BUCKET_NAME')
 AWS_REGION = os.environ.get('AWS_REGION')
 AWS_S3_CUSTOM_DOMAIN = f'{AWS_STORAGE_BUCKET_NAME}.s3.{AWS_REGION}.amazonaws.com'
+# Shared S3 client pool and multipart transfer tuning (bytes for sizes)
+S3_MAX_POOL_CONNECTIONS = int(os.environ.get('S3_MAX_POOL_CONNECTIONS', 50))
+S3_MULTIPART_THRESHOLD = int(os.environ.get('S3_MULTIPART_THRESHOLD', 16 * 1024 * 1024))
+S3_MULTIPART_CHUNKSIZE = int(os.environ.get('S3_MULTIPART_CHUNKSIZE', 16 * 1024 * 1024))
+S3_TRANSFER_CONCURRENCY = int(os.environ.get('S3_TRANSFER_CONCURRENCY', 8))
+# Worker-local LRU disk cache of storage objects read by renders (fonts, voiceovers, music, clips)
+STORAGE_CACHE_ENABLED = bool(int(os.environ.get('STORAGE_CACHE_ENABLED', 1)))
+STORAGE_CACHE_DIR = os.environ.get('STORAGE_CACHE_DIR', '')
+STORAGE_CACHE_MAX_BYTES = int(os.environ.get('STORAGE_CACHE_MAX_BYTES', 20 * 1024 ** 3))
+# Browser-to-S3 multipart uploads (the bucket's CORS rules must allow PUT and expose ETag)
+DIRECT_UPLOAD_MAX_BYTES = int(os.environ.get('DIRECT_UPLOAD_MAX_BYTES', 10 * 1024 ** 3))
+DIRECT_UPLOAD_SESSION_TTL = int(os.environ.get('DIRECT_UPLOAD_SESSION_TTL', 24 * 3600))
+DIRECT_UPLOAD_URL_TTL = int(os.environ.get('DIRECT_UPLOAD_URL_TTL', 3600))
+# Parallel member uploads per ZIP ingest job
+ZIP_INGEST_WORKERS = int(os.environ.get('ZIP_INGEST_WORKERS', 8))
+# Cached flat S3 listings of asset libraries (seconds) and parallel library downloads
+S3_LISTING_CACHE_TTL = int(os.environ.get('S3_LISTING_CACHE_TTL', 300))
+ASSET_DOWNLOAD_CONCURRENCY = int(os.environ.get('ASSET_DOWNLOAD_CONCURRENCY', 8))
+# Batched expiry of UserAsset rows past expires_at; video outputs expire only when OUTPUT_RETENTION_DAYS > 0
+ASSET_EXPIRY_WORKERS = int(os.environ.get('ASSET_EXPIRY_WORKERS', 4))
+ASSET_EXPIRY_MAX_PER_RUN = int(os.environ.get('ASSET_EXPIRY_MAX_PER_RUN', 50000))
+OUTPUT_RETENTION_DAYS = int(os.environ.get('OUTPUT_RETENTION_DAYS', 0))
+# Opt-in: days a newly uploaded UserAsset is kept (sets UserAsset.expires_at). 0 keeps assets
+# forever; rows uploaded while it was 0 keep expires_at NULL and are never expired
+ASSET_RETENTION_DAYS = int(os.environ.get('ASSET_RETENTION_DAYS', 0))
+# Concurrent server-side copies per folder move
+ASSET_MOVE_WORKERS = int(os.environ.get('ASSET_MOVE_WORKERS', 16))
 
 # ElevenLabs TTS Settings
 ELEVENLABS_API_URL = os.environ.get('ELEVENLABS_API_URL', 'https://api.elevenlabs.io/v1')
 ELEVENLABS_DEFAULT_VOICE_ID = os.environ.get('ELEVENLABS_DEFAULT_VOICE_ID', '')
 ELEVENLABS_DEFAULT_MODEL_ID = os.environ.get('ELEVENLABS_DEFAULT_MODEL_ID', 'eleven_monolingual_v1')
+# Synthesize voiceovers clip by clip and reuse unchanged clips' audio and alignment
+INCREMENTAL_TTS_ENABLED = bool(int(os.environ.get('INCREMENTAL_TTS_ENABLED', 1)))
+# Long voiceovers are force-aligned as overlapping chunks sent concurrently
+ELEVENLABS_ALIGNMENT_CHUNK_MIN_SECONDS = float(os.environ.get('ELEVENLABS_ALIGNMENT_CHUNK_MIN_SECONDS', 120))
+ELEVENLABS_ALIGNMENT_CHUNK_SECONDS = float(os.environ.get('ELEVENLABS_ALIGNMENT_CHUNK_SECONDS', 90))
+ELEVENLABS_ALIGNMENT_OVERLAP_SECONDS = float(os.environ.get('ELEVENLABS_ALIGNMENT_OVERLAP_SECONDS', 1.5))
+ELEVENLABS_ALIGNMENT_CONCURRENCY = int(os.environ.get('ELEVENLABS_ALIGNMENT_CONCURRENCY', 3))
+ELEVENLABS_ALIGNMENT_CHUNK_RETRIES = int(os.environ.get('ELEVENLABS_ALIGNMENT_CHUNK_RETRIES', 4))
+# Cached ElevenLabs account data (seconds); credits and history are dropped after each generation
+ELEVENLABS_USER_CACHE_TTL = int(os.environ.get('ELEVENLABS_USER_CACHE_TTL', 60))
+ELEVENLABS_VOICES_CACHE_TTL = int(os.environ.get('ELEVENLABS_VOICES_CACHE_TTL', 600))
+ELEVENLABS_HISTORY_CACHE_TTL = int(os.environ.get('ELEVENLABS_HISTORY_CACHE_TTL', 60))
+# Shared rate limiting for ElevenLabs/OpenAI, per API key and endpoint budget.
+# API_RATE_LIMITS overrides budgets as JSON, e.g. {"elevenlabs:tts": [1, 2]} (tokens/s, burst)
+API_RATE_LIMITS = json.loads(os.environ.get('API_RATE_LIMITS', '{}'))
+API_RATE_LIMIT_MAX_WAIT = float(os.environ.get('API_RATE_LIMIT_MAX_WAIT', 120))
+API_BACKOFF_CAP = float(os.environ.get('API_BACKOFF_CAP', 30))
+API_CIRCUIT_FAILURES = int(os.environ.get('API_CIRCUIT_FAILURES', 5))
+API_CIRCUIT_COOLDOWN = int(os.environ.get('API_CIRCUIT_COOLDOWN', 30))
+# Scene suggestions are cached per normalized highlight (seconds); the lock single-flights generation
+SCENE_SUGGESTIONS_CACHE_TTL = int(os.environ.get('SCENE_SUGGESTIONS_CACHE_TTL', 7 * 24 * 3600))
+SCENE_SUGGESTIONS_LOCK_TIMEOUT = int(os.environ.get('SCENE_SUGGESTIONS_LOCK_TIMEOUT', 90))
+# Highlights accepted by one batched scene suggestions request
+SCENE_SUGGESTIONS_MAX_PROMPTS = int(os.environ.get('SCENE_SUGGESTIONS_MAX_PROMPTS', 100))
+# Connection pool of the AsyncClient shared by async views (per worker process)
+ASYNC_HTTP_MAX_CONNECTIONS = int(os.environ.get('ASYNC_HTTP_MAX_CONNECTIONS', 200))
 
 # Authentication backends
 AUTHENTICATION_BACKENDS = [
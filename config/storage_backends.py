@@ -1,5 +1,10 @@
 from storages.backends.s3boto3 import S3Boto3Storage
 
+from apps.core.services.storage_io import get_client_config, get_transfer_config
+
 class MediaStorage(S3Boto3Storage):
     location = 'media'
-    file_overwrite = False
\ No newline at end of file
+    file_overwrite = False
+    # FileField saves stream as multipart uploads with the same tuning as storage_io
+    client_config = get_client_config()
+    transfer_config = get_transfer_config()
\ No newline at end of file
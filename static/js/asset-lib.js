@@ -524,8 +524,26 @@ async function createZipFromSubfolder(files, subfolderName) {
     }
 }
 
-// Function to upload a single ZIP file to the server
-function uploadZipFile(zipFile, folderName, csrfToken) {
+// Function to upload a single ZIP file: straight to S3, then extracted by a background job
+async function uploadZipFile(zipFile, folderName, csrfToken) {
+    if (typeof DirectUpload !== 'undefined') {
+        let result = null;
+        try {
+            result = await DirectUpload.upload(zipFile, { purpose: 'zip' }, fraction => {
+                updateUploadStatus(`Uploading ${folderName}: ${Math.round(fraction * 100)}%`);
+            });
+        } catch (error) {
+            console.warn(`Direct upload of ${folderName} failed, posting it instead:`, error);
+        }
+        if (result && result.job_id) {
+            return waitForZipIngest(result.job_id, folderName);
+        }
+    }
+    return postZipFile(zipFile, folderName, csrfToken);
+}
+
+// Fallback: post the ZIP through the server, which stages it for the same background job
+function postZipFile(zipFile, folderName, csrfToken) {
     return new Promise((resolve, reject) => {
         // Create a FormData object for this upload
         const formData = new FormData();
@@ -560,7 +578,10 @@ function uploadZipFile(zipFile, folderName, csrfToken) {
                     const response = JSON.parse(xhr.responseText);
 
                     // Consider 200 status as success even if response doesn't have a success field
-                    if (response.success === undefined || response.success) {
+                    if (response.job_id) {
+                        // Extraction runs in the background; wait for it before reporting success
+                        waitForZipIngest(response.job_id, folderName).then(resolve);
+                    } else if (response.success === undefined || response.success) {
                         updateUploadStatus(`Uploaded ${folderName} successfully!`);
                         resolve({ success: true, response });
                     } else {
@@ -600,6 +621,49 @@ function uploadZipFile(zipFile, folderName, csrfToken) {
     });
 }
 
+// Poll a background ZIP ingest job until its files are in the asset library
+async function waitForZipIngest(jobId, folderName) {
+    let failures = 0;
+    while (true) {
+        await new Promise(r => setTimeout(r, 2000));
+        try {
+            const res = await fetch(`/zip-ingest/${jobId}/`, { credentials: 'same-origin' });
+            const progress = await res.json();
+            if (!res.ok || !progress.success) {
+                throw new Error(progress.error || `Server returned ${res.status}`);
+            }
+            failures = 0;
+
+            if (progress.status === 'completed') {
+                updateUploadStatus(`Uploaded ${folderName} successfully! (${progress.created} assets)`);
+                return { success: true, response: progress };
+            }
+            if (progress.status === 'partial') {
+                // Some files made it into the library, the rest have to be uploaded again
+                const error = `${progress.failed} of ${progress.total} files could not be uploaded`;
+                updateUploadStatus(`Upload incomplete for ${folderName}: ${error}`);
+                return { success: false, error: error, response: progress };
+            }
+            if (progress.status === 'failed') {
+                updateUploadStatus(`Upload failed for ${folderName}: ${progress.error || 'Unknown error'}`);
+                return { success: false, error: progress.error || 'Unknown error' };
+            }
+            if (progress.total) {
+                const percent = Math.round((progress.bytes_done / Math.max(progress.bytes_total, 1)) * 100);
+                updateUploadStatus(`Extracting ${folderName}: ${progress.done}/${progress.total} files (${percent}%)`);
+            } else {
+                updateUploadStatus(`Extracting ${folderName}...`);
+            }
+        } catch (error) {
+            // Tolerate a few transient errors before giving up
+            if (++failures >= 5) {
+                updateUploadStatus(`Upload failed for ${folderName}: ${error.message}`);
+                return { success: false, error: error.message };
+            }
+        }
+    }
+}
+
 function startRename(id, currentName) {
     // Show an alert to verify this function is being called
     alert("Starting rename for asset ID: " + id + " with current name: " + currentName);
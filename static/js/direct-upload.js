@@ -0,0 +1,116 @@
+// Uploads files straight to S3 as presigned multipart uploads, so large
+// media never passes through the web server. The server opens the upload,
+// hands out a presigned URL per part and creates the asset/subclip record
+// once the parts are assembled.
+const DirectUpload = (() => {
+    const PARALLEL_PARTS = 4;
+    const URL_BATCH = 20;
+    const MAX_RETRIES = 3;
+
+    function getCookie(name) {
+        let cookieValue = null;
+        if (document.cookie && document.cookie !== '') {
+            const cookies = document.cookie.split(';');
+            for (let i = 0; i < cookies.length; i++) {
+                const cookie = cookies[i].trim();
+                if (cookie.substring(0, name.length + 1) === (name + '=')) {
+                    cookieValue = decodeURIComponent(cookie.substring(name.length + 1));
+                    break;
+                }
+            }
+        }
+        return cookieValue;
+    }
+
+    async function post(url, body) {
+        const response = await fetch(url, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'X-CSRFToken': getCookie('csrftoken'),
+            },
+            body: JSON.stringify(body)
+        });
+        const data = await response.json();
+        if (!response.ok || !data.success) {
+            throw new Error(data.error || `Request failed (${response.status})`);
+        }
+        return data;
+    }
+
+    async function putPart(url, blob) {
+        for (let attempt = 0; ; attempt++) {
+            try {
+                const response = await fetch(url, { method: 'PUT', body: blob });
+                if (!response.ok) {
+                    throw new Error(`Part upload failed (${response.status})`);
+                }
+                const etag = response.headers.get('ETag');
+                if (!etag) {
+                    throw new Error('ETag header is not exposed by the bucket CORS rules');
+                }
+                return etag;
+            } catch (error) {
+                if (attempt + 1 >= MAX_RETRIES) throw error;
+                await new Promise(resolve => setTimeout(resolve, 1000 * 2 ** attempt));
+            }
+        }
+    }
+
+    /**
+     * Upload one file.
+     *
+     * @param {File} file
+     * @param {Object} options - {purpose: 'asset', target_folder}, {purpose: 'subclip', clip_id, text}
+     *                            or {purpose: 'zip', parent_folder}
+     * @param {Function} onProgress - called with the uploaded fraction (0..1)
+     * @returns {Promise<Object>} completion result (asset_id/key, subclip_id/file_url or the ZIP ingest job_id)
+     */
+    async function upload(file, options = {}, onProgress = null) {
+        const session = await post('/direct-upload/start/', {
+            filename: file.name,
+            size: file.size,
+            content_type: file.type,
+            ...options
+        });
+        const urls = { ...session.urls };
+        const parts = [];
+        let uploaded = 0;
+        let nextPart = 1;
+
+        async function urlFor(number) {
+            if (!urls[number]) {
+                const batch = [];
+                for (let n = number; n < number + URL_BATCH && n <= session.part_count; n++) {
+                    batch.push(n);
+                }
+                const data = await post('/direct-upload/parts/', { upload_id: session.upload_id, part_numbers: batch });
+                Object.assign(urls, data.urls);
+            }
+            return urls[number];
+        }
+
+        async function sendParts() {
+            while (nextPart <= session.part_count) {
+                const number = nextPart++;
+                const start = (number - 1) * session.part_size;
+                const blob = file.slice(start, Math.min(start + session.part_size, file.size));
+                const etag = await putPart(await urlFor(number), blob);
+                parts.push({ PartNumber: number, ETag: etag });
+                uploaded += blob.size;
+                if (onProgress) onProgress(uploaded / file.size);
+            }
+        }
+
+        try {
+            const workers = Math.min(PARALLEL_PARTS, session.part_count);
+            await Promise.all(Array.from({ length: workers }, sendParts));
+            return await post('/direct-upload/complete/', { upload_id: session.upload_id, parts: parts });
+        } catch (error) {
+            post('/direct-upload/abort/', { upload_id: session.upload_id }).catch(() => {});
+            throw error;
+        }
+    }
+
+    return { upload };
+})();
@@ -1551,6 +1551,35 @@ async function fetchNoSubclipIds() {
 //     }
 // }
 
+// Upload the files of existing clips' highlights with DirectUpload.
+// Returns the highlight IDs that were uploaded; the rest go with the form.
+async function uploadHighlightFilesDirect(processedSlides) {
+    const uploaded = new Set();
+    if (!window.videoFiles || typeof DirectUpload === 'undefined') return uploaded;
+
+    const buttonText = document.getElementById('button-text');
+    for (const slide of processedSlides) {
+        if (!(slide.id > 0)) continue;
+        for (const highlight of slide.highlights) {
+            const file = window.videoFiles[highlight.highlightId];
+            if (!file) continue;
+            try {
+                await DirectUpload.upload(file, {
+                    purpose: 'subclip',
+                    clip_id: slide.id,
+                    text: highlight.text
+                }, fraction => {
+                    buttonText.textContent = `Uploading ${file.name}... ${Math.round(fraction * 100)}%`;
+                });
+                uploaded.add(highlight.highlightId);
+            } catch (error) {
+                console.warn(`Direct upload of ${file.name} failed, sending it with the form:`, error);
+            }
+        }
+    }
+    return uploaded;
+}
+
 async function handleProceedWithValidation(event) {
     event.preventDefault(); // Prevent default navigation
     
@@ -1702,9 +1731,13 @@ async function handleProceedWithValidation(event) {
     // Add processed slides to FormData
     formData.append('slides_data', JSON.stringify(processedSlides));
 
-    // Add only new files from window.videoFiles
+    // Upload highlight files straight to S3; the server creates their subclips
+    const directUploaded = await uploadHighlightFilesDirect(processedSlides);
+
+    // Add only new files from window.videoFiles that couldn't be uploaded directly
     if (window.videoFiles) {
         Object.entries(window.videoFiles).forEach(([highlightId, file]) => {
+            if (directUploaded.has(highlightId)) return;
             formData.append(`file_${highlightId}`, file);
             console.log(`Adding file: ${highlightId} = ${file.name}`);
         });